@@ -0,0 +1,105 @@
+"""Benchmark DeepSeek-V3.2 prompt encoding on long agent traces.
+
+Compares, for each history length, the per-message reference encoder
+(every message rendered against the whole conversation), the single-pass
+``encode_messages``, and ``IncrementalEncoder`` appending one tool turn
+to an already encoded history.
+
+Usage: python benchmarks/dsv32_encoding.py [--lengths 250 1000 4000]
+"""
+
+import argparse
+import json
+import time
+
+from gpt_task.inference.prompt_adapters.encoding_dsv32 import (
+    IncrementalEncoder,
+    bos_token,
+    drop_thinking_messages,
+    encode_messages,
+    render_message,
+)
+
+
+def reference_encode(messages, thinking_mode):
+    full_messages = messages
+    if thinking_mode == "thinking":
+        full_messages = drop_thinking_messages(messages)
+    prompt = bos_token
+    for idx in range(len(messages)):
+        prompt += render_message(idx, full_messages, thinking_mode)
+    return prompt
+
+
+def agent_trace(length):
+    """One user request followed by assistant tool calls and results."""
+    tools = [{"type": "function", "function": {"name": "shell", "parameters": {}}}]
+    messages = [
+        {"role": "system", "content": "You are an agent.", "tools": tools},
+        {"role": "user", "content": "Fix the failing build."},
+    ]
+    step = 0
+    while len(messages) < length:
+        arguments = json.dumps({"command": f"make step-{step}"})
+        messages.append(
+            {
+                "role": "assistant",
+                "content": "",
+                "reasoning_content": f"Step {step}.",
+                "tool_calls": [
+                    {"type": "function", "function": {"name": "shell", "arguments": arguments}}
+                ],
+            }
+        )
+        messages.append({"role": "tool", "content": f"step {step} ok\n" * 8})
+        step += 1
+    return messages[:length]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[250, 1000, 4000])
+    parser.add_argument("--thinking-mode", choices=["chat", "thinking"], default="thinking")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'reference ms':>13} {'single-pass ms':>15} {'incremental ms':>15}")
+    for length in args.lengths:
+        messages = agent_trace(length)
+        mode = args.thinking_mode
+
+        expected = reference_encode(messages, mode)
+        if encode_messages(messages, mode) != expected:
+            raise SystemExit("single-pass output differs from the reference")
+
+        encoder = IncrementalEncoder(mode)
+
+        def append_turn():
+            encoder.encode_messages(messages[:-2])
+            start = time.perf_counter()
+            output = encoder.encode_messages(messages)
+            elapsed = time.perf_counter() - start
+            if output != expected:
+                raise SystemExit("incremental output differs from the reference")
+            return elapsed
+
+        reference = best_of(lambda: reference_encode(messages, mode), args.repeat)
+        single_pass = best_of(lambda: encode_messages(messages, mode), args.repeat)
+        incremental = min(append_turn() for _ in range(args.repeat))
+        print(
+            f"{length:>8} {reference * 1e3:>13.2f} {single_pass * 1e3:>15.2f} "
+            f"{incremental * 1e3:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark the per-request Python overhead of binding task args and
+resolving the generation config.
+
+Compares, on a multimodal payload:
+- ``model_validate`` of the ``run_task`` keyword fields with fresh images
+  (every payload decoded) and with images the decoded-image store already
+  holds (a resend);
+- the ``trusted`` path for fields that already passed validation;
+- generation config resolution as before (a ``TypeAdapter`` built and the
+  model's config deep-copied per call) and with the cached adapter and
+  frozen base.
+
+Usage: python benchmarks/task_args.py [--images 8] [--image-bytes 2000000]
+"""
+
+import argparse
+import base64
+import copy
+import os
+import time
+
+from pydantic import TypeAdapter
+from transformers import GenerationConfig
+
+from gpt_task import models
+from gpt_task.inference.utils import bind_task_args, resolve_generation_config
+from gpt_task.models.images import get_decoded_image_store
+
+
+def task_fields(images, image_bytes):
+    content = [
+        {"type": "image", "base64": base64.b64encode(os.urandom(image_bytes)).decode()}
+        for _ in range(images)
+    ]
+    content.append({"type": "text", "text": "Compare the images."})
+    return {
+        "model": "test/vlm",
+        "messages": [{"role": "user", "content": content}],
+        "tools": None,
+        "generation_config": {"max_new_tokens": 512, "do_sample": True, "top_k": 20},
+        "template_args": None,
+        "seed": 1,
+        "dtype": "bfloat16",
+        "quantize_bits": None,
+    }
+
+
+def previous_resolve(base_generation_config, args):
+    generation_kwargs = {"num_return_sequences": 1, "max_new_tokens": 256}
+    if args.generation_config is not None:
+        customer_config = TypeAdapter(models.GPTGenerationConfig).dump_python(
+            args.generation_config, exclude_none=True, exclude_unset=True
+        )
+        generation_kwargs.update(
+            (k, v) for k, v in customer_config.items() if v is not None
+        )
+    resolved = copy.deepcopy(base_generation_config)
+    for k, v in generation_kwargs.items():
+        setattr(resolved, k, v)
+    resolved.max_length = None
+    return resolved
+
+
+def best_of(fn, repeat, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--image-bytes", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fields = task_fields(args.images, args.image_bytes)
+    validated = bind_task_args(**fields)
+    dumped = validated.model_dump()
+    base = GenerationConfig(eos_token_id=[1, 2], pad_token_id=0)
+    store = get_decoded_image_store()
+
+    rows = [
+        (
+            "validate, fresh images",
+            best_of(lambda: bind_task_args(**fields), args.repeat, store.clear),
+        ),
+        ("validate, resent images", best_of(lambda: bind_task_args(**fields), args.repeat)),
+        ("trusted", best_of(lambda: bind_task_args(True, **dumped), args.repeat)),
+        (
+            "generation config, previous",
+            best_of(lambda: previous_resolve(base, validated), args.repeat),
+        ),
+        (
+            "generation config, overlay",
+            best_of(lambda: resolve_generation_config(base, validated), args.repeat),
+        ),
+    ]
+
+    print(f"{args.images} images x {args.image_bytes} bytes")
+    for name, seconds in rows:
+        print(f"{name:<28} {seconds * 1e3:>10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark the cost of task logging per task.
+
+Emits the log records of one VLM task (arguments with base64 images,
+prompt token ids, raw output ids, response) through a handler writing to
+memory, once with the previous f-string formatting and once with the
+bounded ``loggable`` fields, at INFO and at DEBUG level. The cost is
+reported in milliseconds and as a share of ``--task-seconds``, the
+duration of the task being logged.
+
+Usage: python benchmarks/task_logging.py [--images 4] [--image-bytes 2000000]
+"""
+
+import argparse
+import base64
+import io
+import logging
+import os
+import time
+
+from gpt_task.inference.task_log import loggable
+from gpt_task.models import GPTTaskArgs
+
+logger = logging.getLogger("gpt_task.benchmarks.task_logging")
+
+
+def task_records(images, image_bytes, prompt_tokens, completion_tokens):
+    content = [
+        {"type": "image", "base64": base64.b64encode(os.urandom(image_bytes)).decode()}
+        for _ in range(images)
+    ]
+    content.append({"type": "text", "text": "Describe the images."})
+    args = GPTTaskArgs(model="test/vlm", messages=[{"role": "user", "content": content}])
+    input_ids = list(range(prompt_tokens))
+    output_ids = input_ids + list(range(completion_tokens))
+    text = "word " * completion_tokens
+    response = {
+        "model": args.model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+    return args, input_ids, output_ids, response
+
+
+def log_with_fstrings(args, input_ids, output_ids, response):
+    logger.info(f"task args: {args}")
+    logger.debug(f"Finding prompt tokens: input_tokens={input_ids}")
+    logger.debug(f"Finding prompt tokens: output_tokens={output_ids}")
+    logger.debug(f"Raw output: {output_ids}")
+    logger.info(f"task response: {response}")
+
+
+def log_bounded(args, input_ids, output_ids, response):
+    logger.info("task args: %s", loggable(args))
+    logger.debug("Finding prompt tokens: input_tokens=%s", loggable(input_ids))
+    logger.debug("Finding prompt tokens: output_tokens=%s", loggable(output_ids))
+    logger.debug("Raw output: %s", loggable(output_ids))
+    logger.info("task response: %s", loggable(response))
+
+
+def measure(log, records, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        logger.addHandler(handler)
+        try:
+            start = time.perf_counter()
+            log(*records)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            logger.removeHandler(handler)
+    return best, len(stream.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--image-bytes", type=int, default=2_000_000)
+    parser.add_argument("--prompt-tokens", type=int, default=4096)
+    parser.add_argument("--completion-tokens", type=int, default=512)
+    parser.add_argument("--task-seconds", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    records = task_records(
+        args.images, args.image_bytes, args.prompt_tokens, args.completion_tokens
+    )
+    logger.propagate = False
+
+    print(f"{'level':>6} {'logging':>9} {'ms':>9} {'% of task':>10} {'bytes logged':>13}")
+    for level in (logging.INFO, logging.DEBUG):
+        logger.setLevel(level)
+        for name, log in (("f-string", log_with_fstrings), ("bounded", log_bounded)):
+            seconds, size = measure(log, records, args.repeat)
+            print(
+                f"{logging.getLevelName(level):>6} {name:>9} {seconds * 1e3:>9.3f} "
+                f"{seconds / args.task_seconds * 100:>9.3f}% {size:>13}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from .entry_points import entry_point_names, get_entry_point, register_entry_point
+from .replay import ReplayOptions, ReplayResult, RequestResult, replay
+from .reproducibility import Mismatch, ReproducibilityResult, check_reproducibility
+from .summary import Regression, compare, summarize
+from .tiny_model import build_tiny_model
+from .trace import TraceRequest, load_trace
+
+__all__ = [
+    "Mismatch",
+    "Regression",
+    "ReplayOptions",
+    "ReplayResult",
+    "ReproducibilityResult",
+    "RequestResult",
+    "TraceRequest",
+    "build_tiny_model",
+    "check_reproducibility",
+    "compare",
+    "entry_point_names",
+    "get_entry_point",
+    "load_trace",
+    "register_entry_point",
+    "replay",
+    "summarize",
+]
@@ -0,0 +1,273 @@
+"""Trace-replay benchmark.
+
+Usage:
+    python -m gpt_task.benchmark run TRACE [--entry-point run_task]
+        [--rate 2] [--arrival poisson] [--concurrency 4] [--tiny-model]
+        [--output result.json] [--baseline baseline.json]
+    python -m gpt_task.benchmark compare BASELINE CURRENT
+    python -m gpt_task.benchmark tiny-model DIR
+    python -m gpt_task.benchmark from-records OUTPUT RECORDS...
+    python -m gpt_task.benchmark reproduce TRACE [--runs 3]
+        [--determinism strict] [--tiny-model]
+
+``run`` prints the summary as JSON, and with ``--baseline`` exits with
+status 1 when a metric regressed by more than ``--tolerance``.
+``reproduce`` runs every request several times and exits with status 1
+when an output is not bitwise equal across runs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import sys
+import tempfile
+from dataclasses import asdict, replace
+from typing import Any, Dict, List, Sequence, Tuple
+
+from gpt_task.cache import MemoryModelCache
+from gpt_task.config import Config, MemoryConfig
+
+from .entry_points import entry_point_names, get_entry_point
+from .records import read_records, trace_from_records
+from .replay import ReplayOptions, replay
+from .reproducibility import check_reproducibility
+from .summary import Regression, compare, summarize
+from .tiny_model import build_tiny_model
+from .trace import TraceRequest, load_trace
+
+
+def _override_models(
+    requests: List[TraceRequest], model: str | None, vlm_model: str | None
+) -> List[TraceRequest]:
+    overridden = []
+    for request in requests:
+        target = vlm_model if request.kind == "vlm" else model
+        if target is not None:
+            request = replace(request, args=request.args.model_copy(update={"model": target}))
+        overridden.append(request)
+    return overridden
+
+
+def _report_regressions(regressions: List[Regression]) -> Dict[str, Any]:
+    for regression in regressions:
+        print(
+            f"regression: {regression.key} {regression.baseline:.6g} -> "
+            f"{regression.current:.6g} ({regression.change:+.1%})",
+            file=sys.stderr,
+        )
+    return {"regressions": [asdict(regression) for regression in regressions]}
+
+
+def _load_summary(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run(args: argparse.Namespace) -> int:
+    with contextlib.ExitStack() as stack:
+        return _run(args, stack)
+
+
+def _prepare_requests(
+    args: argparse.Namespace, stack: contextlib.ExitStack
+) -> Tuple[List[TraceRequest], Config | None, int]:
+    requests = load_trace(args.trace)
+    config = None
+    model = args.model
+    skipped = 0
+    if args.tiny_model:
+        model_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="gpt_task_tiny_"))
+        model = build_tiny_model(model_dir, seed=args.seed)
+        config = Config(local_files_only=True, memory=MemoryConfig(allow_cpu_execution=True))
+        if args.vlm_model is None:
+            # The tiny model reads text only.
+            kept = [request for request in requests if request.kind != "vlm"]
+            skipped = len(requests) - len(kept)
+            requests = kept
+        requests = [
+            request
+            if request.kind == "vlm"
+            else replace(request, args=request.args.model_copy(update={"dtype": "float32"}))
+            for request in requests
+        ]
+    return _override_models(requests, model, args.vlm_model), config, skipped
+
+
+def _run(args: argparse.Namespace, stack: contextlib.ExitStack) -> int:
+    requests, config, skipped = _prepare_requests(args, stack)
+
+    options = ReplayOptions(
+        rate=args.rate,
+        arrival=args.arrival,
+        concurrency=args.concurrency,
+        seed=args.seed,
+    )
+    model_cache = None if args.no_model_cache else MemoryModelCache()
+    result = replay(
+        requests,
+        get_entry_point(args.entry_point),
+        options,
+        config=config,
+        model_cache=model_cache,
+    )
+    summary = summarize(
+        result,
+        trace=args.trace,
+        entry_point=args.entry_point,
+        rate=args.rate,
+        arrival=args.arrival,
+        concurrency=args.concurrency,
+        tiny_model=args.tiny_model,
+        skipped=skipped,
+    )
+
+    status = 0
+    if args.baseline is not None:
+        regressions = compare(_load_summary(args.baseline), summary, args.tolerance)
+        summary.update(_report_regressions(regressions))
+        status = 1 if regressions else 0
+
+    text = json.dumps(summary, indent=2)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return status
+
+
+def reproduce(args: argparse.Namespace) -> int:
+    with contextlib.ExitStack() as stack:
+        requests, config, skipped = _prepare_requests(args, stack)
+        config = (config or Config()).model_copy(update={"determinism": args.determinism})
+        model_cache = None if args.no_model_cache else MemoryModelCache()
+        result = check_reproducibility(
+            requests,
+            get_entry_point(args.entry_point),
+            args.runs,
+            config=config,
+            model_cache=model_cache,
+        )
+    print(
+        json.dumps(
+            {
+                "trace": args.trace,
+                "determinism": args.determinism,
+                "requests": result.requests,
+                "runs": result.runs,
+                "skipped": skipped,
+                "reproducible": result.reproducible,
+                "mismatches": [asdict(mismatch) for mismatch in result.mismatches],
+            },
+            indent=2,
+        )
+    )
+    return 0 if result.reproducible else 1
+
+
+def compare_files(args: argparse.Namespace) -> int:
+    regressions = compare(
+        _load_summary(args.baseline), _load_summary(args.current), args.tolerance
+    )
+    print(json.dumps(_report_regressions(regressions), indent=2))
+    return 1 if regressions else 0
+
+
+def tiny_model(args: argparse.Namespace) -> int:
+    print(build_tiny_model(args.path, seed=args.seed))
+    return 0
+
+
+def from_records(args: argparse.Namespace) -> int:
+    lines, skipped = trace_from_records(read_records(args.records), model=args.model)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(line) + "\n" for line in lines)
+    print(f"{len(lines)} requests written to {args.output}, {skipped} records skipped")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m gpt_task.benchmark",
+        description="Replay a JSONL trace of GPT tasks and report latency and throughput.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay a trace")
+    run_parser.add_argument("trace", help="JSONL file with one GPTTaskArgs per line")
+    run_parser.add_argument("--entry-point", default="run_task", choices=entry_point_names())
+    run_parser.add_argument(
+        "--rate", type=float, default=None, help="mean arrivals per second (default: all at once)"
+    )
+    run_parser.add_argument(
+        "--arrival", default="poisson", choices=["poisson", "uniform", "trace"]
+    )
+    run_parser.add_argument("--concurrency", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--model", help="run text and tool-call requests on this model")
+    run_parser.add_argument("--vlm-model", help="run image requests on this model")
+    run_parser.add_argument(
+        "--tiny-model",
+        action="store_true",
+        help="run text requests on a tiny random model on the CPU; "
+        "image requests are skipped unless --vlm-model is given",
+    )
+    run_parser.add_argument(
+        "--no-model-cache", action="store_true", help="load the model for every request"
+    )
+    run_parser.add_argument("--output", help="also write the summary to this file")
+    run_parser.add_argument("--baseline", help="summary to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.1)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two summaries")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+    compare_parser.set_defaults(handler=compare_files)
+
+    tiny_parser = commands.add_parser("tiny-model", help="write the tiny benchmark model")
+    tiny_parser.add_argument("path")
+    tiny_parser.add_argument("--seed", type=int, default=0)
+    tiny_parser.set_defaults(handler=tiny_model)
+
+    records_parser = commands.add_parser(
+        "from-records", help="write a trace shaped like recorded tasks"
+    )
+    records_parser.add_argument("output")
+    records_parser.add_argument("records", nargs="+", help="task recorder JSONL files")
+    records_parser.add_argument("--model", help="replace the recorded model")
+    records_parser.set_defaults(handler=from_records)
+
+    reproduce_parser = commands.add_parser(
+        "reproduce", help="check that a trace's outputs are bitwise reproducible"
+    )
+    reproduce_parser.add_argument("trace", help="JSONL file with one GPTTaskArgs per line")
+    reproduce_parser.add_argument("--entry-point", default="run_task", choices=entry_point_names())
+    reproduce_parser.add_argument("--runs", type=int, default=3)
+    reproduce_parser.add_argument(
+        "--determinism", default="strict", choices=["strict", "deterministic", "fast"]
+    )
+    reproduce_parser.add_argument("--seed", type=int, default=0)
+    reproduce_parser.add_argument("--model", help="run text and tool-call requests on this model")
+    reproduce_parser.add_argument("--vlm-model", help="run image requests on this model")
+    reproduce_parser.add_argument(
+        "--tiny-model",
+        action="store_true",
+        help="run text requests on a tiny random model on the CPU",
+    )
+    reproduce_parser.add_argument(
+        "--no-model-cache", action="store_true", help="load the model for every run"
+    )
+    reproduce_parser.set_defaults(handler=reproduce)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
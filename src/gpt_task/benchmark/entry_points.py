@@ -0,0 +1,49 @@
+"""Task entry points the benchmark can drive.
+
+An entry point is called like ``run_task``: with validated
+``GPTTaskArgs`` and the ``stream_callback``, ``config`` and
+``model_cache`` keywords. ``run_task`` and ``run_task_tp`` are built in;
+other entry points, such as a batched executor, are added with
+``register_entry_point``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+
+EntryPoint = Callable[..., Any]
+
+
+def _run_task(*args: Any, **kwargs: Any) -> Any:
+    from gpt_task.inference import run_task
+
+    return run_task(*args, **kwargs)
+
+
+def _run_task_tp(*args: Any, **kwargs: Any) -> Any:
+    from gpt_task.inference.tp import run_task_tp
+
+    return run_task_tp(*args, **kwargs)
+
+
+_ENTRY_POINTS: Dict[str, EntryPoint] = {
+    "run_task": _run_task,
+    "run_task_tp": _run_task_tp,
+}
+
+
+def register_entry_point(name: str, entry_point: EntryPoint) -> None:
+    _ENTRY_POINTS[name] = entry_point
+
+
+def get_entry_point(name: str) -> EntryPoint:
+    try:
+        return _ENTRY_POINTS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown entry point {name!r}, expected one of {', '.join(entry_point_names())}"
+        ) from None
+
+
+def entry_point_names() -> List[str]:
+    return sorted(_ENTRY_POINTS)
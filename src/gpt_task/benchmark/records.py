@@ -0,0 +1,79 @@
+"""Traces synthesized from recorded production traffic.
+
+The task recorder (``Config.recorder``) keeps the shape of each task but
+not its prompt, so a trace line rebuilt from a record approximates it: a
+filler prompt of about the recorded prompt length, ``max_new_tokens`` set
+to the recorded completion length, the recorded generation config,
+stream flag and arrival offset, and placeholder tools of the recorded
+count. Records of failed tasks and of tasks with images (which keep only
+image digests) are skipped.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+# A word most tokenizers encode as one token after a space.
+_FILLER_WORD = " the"
+
+
+def _placeholder_tools(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": f"tool_{index}",
+                "description": "Placeholder tool of a recorded task.",
+                "parameters": {"type": "object", "properties": {}},
+            },
+        }
+        for index in range(count)
+    ]
+
+
+def read_records(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def trace_from_records(
+    records: Iterable[Dict[str, Any]], model: str | None = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Trace lines for ``records`` in arrival order, and the number of
+    records skipped. ``model`` replaces the recorded model."""
+    kept = []
+    skipped = 0
+    for record in records:
+        if record.get("error") is not None or record.get("images") or not record.get("model"):
+            skipped += 1
+            continue
+        kept.append(record)
+    kept.sort(key=lambda record: record["time"])
+
+    lines = []
+    for record in kept:
+        generation_config = dict(record.get("generation_config") or {})
+        if record.get("completion_tokens"):
+            sequences = generation_config.get("num_return_sequences", 1)
+            generation_config["max_new_tokens"] = max(
+                1, record["completion_tokens"] // sequences
+            )
+        words = max(1, record.get("prompt_tokens") or 1)
+        line: Dict[str, Any] = {
+            "model": model or record["model"],
+            "messages": [{"role": "user", "content": (_FILLER_WORD * words).strip()}],
+            "generation_config": generation_config,
+            "dtype": record.get("dtype") or "auto",
+            "stream": bool(record.get("stream")),
+            "arrival": record["time"] - kept[0]["time"],
+        }
+        if record.get("quantize_bits") is not None:
+            line["quantize_bits"] = record["quantize_bits"]
+        if record.get("tools"):
+            line["tools"] = _placeholder_tools(record["tools"])
+        lines.append(line)
+    return lines, skipped
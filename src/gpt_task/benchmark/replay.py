@@ -0,0 +1,215 @@
+"""Open-loop replay of a request trace against a task entry point.
+
+Requests arrive on a schedule (Poisson or uniform at a given rate, or at
+the offsets recorded in the trace) independent of how fast earlier ones
+complete, and at most ``concurrency`` of them execute at a time; the rest
+wait in a queue. Latencies are therefore measured from a request's
+arrival, so they include the queueing a loaded node would add.
+
+Each request runs in its own task context, which keeps the timing report
+of concurrent requests apart. Time to first token and inter-token
+latencies come from the stream chunks of streaming requests, and from the
+task report otherwise.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Literal, Sequence, Tuple
+
+from gpt_task import models
+from gpt_task.cache import ModelCache
+from gpt_task.config import Config
+from gpt_task.inference import task_context
+
+from .entry_points import EntryPoint
+from .trace import TraceRequest
+
+
+@dataclass(frozen=True)
+class ReplayOptions:
+    # Mean arrival rate in requests per second. None sends every request
+    # at the replay start.
+    rate: float | None = None
+    arrival: Literal["poisson", "uniform", "trace"] = "poisson"
+    concurrency: int = 1
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class RequestResult:
+    index: int
+    kind: str
+    stream: bool
+    # Seconds from the replay start.
+    arrival: float
+    started: float
+    finished: float
+    time_to_first_token: float | None = None
+    inter_token_latencies: Tuple[float, ...] = ()
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    model_cache_hit: bool | None = None
+    error: str | None = None
+
+    @property
+    def latency(self) -> float:
+        return self.finished - self.arrival
+
+    @property
+    def queue_seconds(self) -> float:
+        return self.started - self.arrival
+
+
+@dataclass(frozen=True)
+class ReplayResult:
+    results: List[RequestResult]
+    wall_seconds: float
+
+
+def arrival_times(requests: Sequence[TraceRequest], options: ReplayOptions) -> List[float]:
+    """Arrival offset of each request, in trace order."""
+    if options.arrival == "trace":
+        missing = [i for i, request in enumerate(requests) if request.arrival is None]
+        if missing:
+            raise ValueError(f"Trace requests {missing[:5]} have no arrival offset")
+        return [float(request.arrival) for request in requests]
+    if options.rate is None:
+        return [0.0] * len(requests)
+    if options.rate <= 0:
+        raise ValueError("rate must be positive")
+
+    rng = random.Random(options.seed)
+    offsets = []
+    now = 0.0
+    for _ in requests:
+        offsets.append(now)
+        if options.arrival == "poisson":
+            now += rng.expovariate(options.rate)
+        else:
+            now += 1.0 / options.rate
+    return offsets
+
+
+def _stream_tokens(chunk: models.GPTTaskStreamResponse) -> bool:
+    return any(choice.get("finish_reason") is None for choice in chunk["choices"])
+
+
+def _run_request(
+    entry_point: EntryPoint,
+    index: int,
+    request: TraceRequest,
+    arrival: float,
+    origin: float,
+    config: Config | None,
+    model_cache: ModelCache | None,
+) -> RequestResult:
+    token_times: List[float] = []
+    usage: List[models.Usage] = []
+
+    def on_chunk(chunk: models.GPTTaskStreamResponse) -> None:
+        if _stream_tokens(chunk):
+            token_times.append(time.perf_counter() - origin)
+        usage[:] = [chunk["usage"]]
+
+    started = time.perf_counter() - origin
+    error = None
+    with task_context() as context:
+        try:
+            response = entry_point(
+                request.args,
+                stream_callback=on_chunk if request.stream else None,
+                config=config,
+                model_cache=model_cache,
+            )
+            if response is not None and "usage" in response:
+                usage[:] = [response["usage"]]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    finished = time.perf_counter() - origin
+
+    report = context.task_report
+    prompt_tokens = completion_tokens = None
+    if usage:
+        prompt_tokens = usage[0]["prompt_tokens"]
+        completion_tokens = usage[0]["completion_tokens"]
+    elif report is not None:
+        prompt_tokens, completion_tokens = report.prompt_tokens, report.completion_tokens
+
+    time_to_first_token = None
+    inter_token_latencies: Tuple[float, ...] = ()
+    if token_times:
+        time_to_first_token = token_times[0] - arrival
+        inter_token_latencies = tuple(b - a for a, b in zip(token_times, token_times[1:]))
+    elif report is not None and report.time_to_first_token is not None:
+        time_to_first_token = started - arrival + report.time_to_first_token
+        decode = report.stage_seconds("decode")
+        if decode is not None and completion_tokens is not None and completion_tokens > 1:
+            # Non-streaming requests only yield the mean decode step.
+            inter_token_latencies = (decode / (completion_tokens - 1),)
+
+    return RequestResult(
+        index=index,
+        kind=request.kind,
+        stream=request.stream,
+        arrival=arrival,
+        started=started,
+        finished=finished,
+        time_to_first_token=time_to_first_token,
+        inter_token_latencies=inter_token_latencies,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        model_cache_hit=None if report is None else report.model_cache_hit,
+        error=error,
+    )
+
+
+def replay(
+    requests: Sequence[TraceRequest],
+    entry_point: EntryPoint,
+    options: ReplayOptions = ReplayOptions(),
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+) -> ReplayResult:
+    """Replay ``requests`` against ``entry_point``. A failed request is
+    recorded with its error instead of stopping the replay."""
+    if options.concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    offsets = arrival_times(requests, options)
+    schedule = sorted(range(len(requests)), key=lambda i: offsets[i])
+
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=options.concurrency, thread_name_prefix="gpt_task_bench"
+    ) as pool:
+        futures: List[Future[RequestResult]] = []
+        try:
+            for index in schedule:
+                delay = offsets[index] - (time.perf_counter() - origin)
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(
+                    pool.submit(
+                        _run_request,
+                        entry_point,
+                        index,
+                        requests[index],
+                        offsets[index],
+                        origin,
+                        config,
+                        model_cache,
+                    )
+                )
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        results = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - origin
+    return ReplayResult(
+        results=sorted(results, key=lambda result: result.index),
+        wall_seconds=wall_seconds,
+    )
@@ -0,0 +1,120 @@
+"""Bitwise reproducibility check of a request trace.
+
+Every request of the trace runs ``runs`` times, one run after another, and
+each output is compared with the output of the first run: the whole
+response, or every stream chunk of a streaming request, must be equal.
+Requests without beam search also ask for a logits digest, so a mismatch
+names the first decoding step at which the logits diverged even when the
+text agrees. A request that fails must fail with the same error type in
+every run.
+
+The check covers one process on one device; see docs/determinism.md for
+the guarantee of each determinism level.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, List, Sequence, Tuple
+
+from gpt_task import models
+from gpt_task.cache import ModelCache
+from gpt_task.config import Config
+
+from .entry_points import EntryPoint
+from .trace import TraceRequest
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    # Request index in trace order and the run that differed from run 0.
+    index: int
+    run: int
+    # First decoding step whose logits digest differs, or None when the
+    # digests agree or the request has none.
+    first_divergent_step: int | None = None
+
+
+@dataclass(frozen=True)
+class ReproducibilityResult:
+    requests: int
+    runs: int
+    mismatches: List[Mismatch]
+
+    @property
+    def reproducible(self) -> bool:
+        return not self.mismatches
+
+
+def _with_digest(args: models.GPTTaskArgs) -> models.GPTTaskArgs:
+    if ((args.generation_config or {}).get("num_beams") or 1) > 1:
+        return args
+    return args.model_copy(update={"logits_digest": True})
+
+
+def _run_once(
+    request: TraceRequest,
+    entry_point: EntryPoint,
+    config: Config | None,
+    model_cache: ModelCache | None,
+) -> Any:
+    chunks: List[Any] = []
+    try:
+        response = entry_point(
+            _with_digest(request.args),
+            stream_callback=chunks.append if request.stream else None,
+            config=config,
+            model_cache=model_cache,
+        )
+    except Exception as e:
+        return {"error": type(e).__name__}
+    return chunks if request.stream else response
+
+
+def _digest_steps(output: Any) -> List[Tuple[str, ...]]:
+    responses = output if isinstance(output, list) else [output]
+    steps = []
+    for response in responses:
+        for choice in response.get("choices", []):
+            digest = choice.get("logits_digest")
+            if digest is not None:
+                steps.append(tuple(digest["steps"]))
+    return steps
+
+
+def first_divergent_step(reference: Any, output: Any) -> int | None:
+    """The first step at which the digest chains of two outputs differ."""
+    divergent = []
+    for first, second in zip(_digest_steps(reference), _digest_steps(output)):
+        for step, (a, b) in enumerate(zip(first, second)):
+            if a != b:
+                divergent.append(step)
+                break
+        else:
+            if len(first) != len(second):
+                divergent.append(min(len(first), len(second)))
+    return min(divergent) if divergent else None
+
+
+def check_reproducibility(
+    requests: Sequence[TraceRequest],
+    entry_point: EntryPoint,
+    runs: int = 2,
+    *,
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+) -> ReproducibilityResult:
+    if runs < 2:
+        raise ValueError("runs must be at least 2")
+    mismatches = []
+    for index, request in enumerate(requests):
+        reference = _run_once(request, entry_point, config, model_cache)
+        serialized = json.dumps(reference, sort_keys=True, default=repr)
+        for run in range(1, runs):
+            output = _run_once(request, entry_point, config, model_cache)
+            if json.dumps(output, sort_keys=True, default=repr) != serialized:
+                mismatches.append(
+                    Mismatch(index, run, first_divergent_step(reference, output))
+                )
+    return ReproducibilityResult(len(requests), runs, mismatches)
@@ -0,0 +1,151 @@
+"""Summary of a replay as JSON, and comparison against a baseline.
+
+Latency, time to first token and inter-token latency are summarized by
+their mean and p50/p95/p99 in seconds. Throughput is the completion
+tokens of all requests per wall-clock second of the replay, and the cache
+hit rate the share of requests that found their model loaded.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Sequence
+
+from .replay import ReplayResult, RequestResult
+
+# Dotted summary keys where a larger value is better; for every other
+# compared key a smaller value is better.
+_HIGHER_IS_BETTER = ("output_tokens_per_second", "requests_per_second", "model_cache_hit_rate")
+# Summary keys compared by default.
+DEFAULT_COMPARED_KEYS = (
+    "latency.p50",
+    "latency.p95",
+    "latency.p99",
+    "time_to_first_token.p50",
+    "time_to_first_token.p95",
+    "time_to_first_token.p99",
+    "inter_token_latency.p50",
+    "inter_token_latency.p95",
+    "inter_token_latency.p99",
+    "output_tokens_per_second",
+    "model_cache_hit_rate",
+    "error_rate",
+)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linearly interpolated ``q``-th percentile of non-empty ``values``."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def distribution(values: Iterable[float | None]) -> Dict[str, float] | None:
+    samples = [value for value in values if value is not None]
+    if not samples:
+        return None
+    return {
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def _summarize_results(results: List[RequestResult], wall_seconds: float) -> Dict[str, Any]:
+    completed = [result for result in results if result.error is None]
+    cache_lookups = [
+        result.model_cache_hit for result in completed if result.model_cache_hit is not None
+    ]
+    completion_tokens = sum(result.completion_tokens or 0 for result in completed)
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(completed),
+        "error_rate": (len(results) - len(completed)) / len(results) if results else 0.0,
+        "latency": distribution(result.latency for result in completed),
+        "queue_seconds": distribution(result.queue_seconds for result in completed),
+        "time_to_first_token": distribution(
+            result.time_to_first_token for result in completed
+        ),
+        "inter_token_latency": distribution(
+            latency for result in completed for latency in result.inter_token_latencies
+        ),
+        "prompt_tokens": sum(result.prompt_tokens or 0 for result in completed),
+        "completion_tokens": completion_tokens,
+        "output_tokens_per_second": completion_tokens / wall_seconds if wall_seconds else None,
+        "requests_per_second": len(completed) / wall_seconds if wall_seconds else None,
+        "model_cache_hit_rate": (
+            sum(cache_lookups) / len(cache_lookups) if cache_lookups else None
+        ),
+    }
+
+
+def summarize(replay_result: ReplayResult, **metadata: Any) -> Dict[str, Any]:
+    """JSON-serializable summary of a replay, overall and per request kind
+    (text, vlm, tool_call; streaming requests are counted under
+    ``stream``). ``metadata`` (entry point, rate, ...) is stored as is."""
+    results = replay_result.results
+    groups: Dict[str, List[RequestResult]] = {}
+    for result in results:
+        groups.setdefault(result.kind, []).append(result)
+    streamed = [result for result in results if result.stream]
+    if streamed:
+        groups["stream"] = streamed
+
+    summary = dict(metadata)
+    summary["wall_seconds"] = replay_result.wall_seconds
+    summary.update(_summarize_results(results, replay_result.wall_seconds))
+    summary["by_kind"] = {
+        kind: _summarize_results(group, replay_result.wall_seconds)
+        for kind, group in sorted(groups.items())
+    }
+    summary["failures"] = [
+        {"index": result.index, "error": result.error}
+        for result in results
+        if result.error is not None
+    ]
+    return summary
+
+
+@dataclass(frozen=True)
+class Regression:
+    key: str
+    baseline: float
+    current: float
+    # Relative change, positive when the current value is worse.
+    change: float
+
+
+def _lookup(summary: Dict[str, Any], key: str) -> Any:
+    value: Any = summary
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.1,
+    keys: Sequence[str] = DEFAULT_COMPARED_KEYS,
+) -> List[Regression]:
+    """Summary values of ``current`` worse than ``baseline`` by more than
+    ``tolerance`` (relative). Keys missing from either summary are skipped;
+    an error rate rising from zero is always a regression."""
+    regressions = []
+    for key in keys:
+        before, after = _lookup(baseline, key), _lookup(current, key)
+        if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+            continue
+        worse = before - after if key.endswith(_HIGHER_IS_BETTER) else after - before
+        if worse <= 0:
+            continue
+        change = worse / abs(before) if before else math.inf
+        if change > tolerance:
+            regressions.append(Regression(key, before, after, change))
+    return regressions
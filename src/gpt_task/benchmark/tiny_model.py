@@ -0,0 +1,85 @@
+"""Tiny random-weight chat model for CPU benchmarks.
+
+The model is a two-layer Llama over a byte-level vocabulary with a chat
+template that also renders tools. It loads through ``run_task`` from a
+local directory without network access: the directory declares its own
+text-generation pipeline, so ``pipeline(task=None)`` does not look the
+task up on the Hub.
+"""
+
+from __future__ import annotations
+
+import os
+
+import torch
+
+_PIPELINE_MODULE = "tiny_pipeline"
+_PIPELINE_SOURCE = """from transformers import TextGenerationPipeline
+
+
+class TinyTextGenerationPipeline(TextGenerationPipeline):
+    pass
+"""
+
+_CHAT_TEMPLATE = (
+    "{% if tools %}<s>tools: {{ tools | tojson }}\n{% endif %}"
+    "{% for message in messages %}<s>{{ message['role'] }}: "
+    "{% if message['content'] is string %}{{ message['content'] }}"
+    "{% elif message['content'] %}{% for block in message['content'] %}"
+    "{% if block['type'] == 'text' %}{{ block['text'] }}{% endif %}{% endfor %}"
+    "{% endif %}"
+    "{% if message['tool_calls'] %}{{ message['tool_calls'] | tojson }}{% endif %}\n"
+    "{% endfor %}{% if add_generation_prompt %}<s>assistant: {% endif %}"
+)
+
+
+def build_tiny_model(path: str, seed: int = 0, hidden_size: int = 32, layers: int = 2) -> str:
+    """Write the tiny model to ``path`` and return it. The weights only
+    depend on ``seed``, so every machine benchmarks the same model."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2}
+    for char in sorted(pre_tokenizers.ByteLevel.alphabet()):
+        vocab[char] = len(vocab)
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        bos_token="<s>",
+        eos_token="</s>",
+        pad_token="<pad>",
+    )
+    tokenizer.chat_template = _CHAT_TEMPLATE
+
+    config = LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        bos_token_id=1,
+        eos_token_id=2,
+        pad_token_id=0,
+    )
+    config.custom_pipelines = {
+        "text-generation": {
+            "impl": f"{_PIPELINE_MODULE}.TinyTextGenerationPipeline",
+            "pt": ["AutoModelForCausalLM"],
+        }
+    }
+    generator = torch.Generator().manual_seed(seed)
+    model = LlamaForCausalLM(config)
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.copy_(torch.randn(parameter.shape, generator=generator) * 0.02)
+
+    os.makedirs(path, exist_ok=True)
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    with open(os.path.join(path, f"{_PIPELINE_MODULE}.py"), "w") as f:
+        f.write(_PIPELINE_SOURCE)
+    return path
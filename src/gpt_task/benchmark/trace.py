@@ -0,0 +1,69 @@
+"""Request traces replayed by the benchmark.
+
+A trace is a JSONL file with one ``GPTTaskArgs`` object per line. Two
+optional keys of a line configure its replay and are not passed to the
+task:
+
+- ``stream``: run the request with a stream callback (default false);
+- ``arrival``: seconds from the replay start at which the request
+  arrives, for the ``trace`` arrival process.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import List, Literal
+
+from gpt_task import models
+
+RequestKind = Literal["text", "vlm", "tool_call"]
+
+
+@dataclass(frozen=True)
+class TraceRequest:
+    args: models.GPTTaskArgs
+    stream: bool = False
+    arrival: float | None = None
+
+    @property
+    def kind(self) -> RequestKind:
+        if _has_images(self.args):
+            return "vlm"
+        if self.args.tools:
+            return "tool_call"
+        return "text"
+
+
+def _has_images(args: models.GPTTaskArgs) -> bool:
+    for message in args.messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(
+            block.get("type") == "image" for block in content
+        ):
+            return True
+    return False
+
+
+def parse_trace_line(line: str) -> TraceRequest:
+    fields = json.loads(line)
+    stream = bool(fields.pop("stream", False))
+    arrival = fields.pop("arrival", None)
+    return TraceRequest(
+        args=models.GPTTaskArgs.model_validate(fields),
+        stream=stream,
+        arrival=None if arrival is None else float(arrival),
+    )
+
+
+def load_trace(path: str) -> List[TraceRequest]:
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                requests.append(parse_trace_line(line))
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: invalid trace request: {e}") from e
+    return requests
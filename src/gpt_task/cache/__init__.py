@@ -1,4 +1,34 @@
-from .abc import ModelCache
+from .abc import ModelCache, use_cached_model
+from .allocator import (
+    AllocatorStats,
+    GPUMemoryManager,
+    MemoryTrimPolicy,
+    ModelSwitchTrimPolicy,
+    NeverTrimPolicy,
+    WatermarkTrimPolicy,
+    get_memory_manager,
+)
 from .memory_impl import MemoryModelCache
+from .residency import (
+    VRAMArbiter,
+    VRAMResident,
+    get_vram_arbiter,
+    request_vram,
+)
 
-__all__ = ["ModelCache", "MemoryModelCache"]
+__all__ = [
+    "AllocatorStats",
+    "GPUMemoryManager",
+    "MemoryTrimPolicy",
+    "ModelCache",
+    "MemoryModelCache",
+    "ModelSwitchTrimPolicy",
+    "NeverTrimPolicy",
+    "VRAMArbiter",
+    "VRAMResident",
+    "WatermarkTrimPolicy",
+    "get_memory_manager",
+    "get_vram_arbiter",
+    "request_vram",
+    "use_cached_model",
+]
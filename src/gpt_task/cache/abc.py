@@ -1,4 +1,5 @@
-from typing import Protocol, Dict, Any, TypeVar, Callable
+from contextlib import contextmanager
+from typing import Protocol, Dict, Any, TypeVar, Callable, Iterator
 
 T = TypeVar("T")
 
@@ -9,3 +10,21 @@ class ModelCache(Protocol[T]):
 
     def clear(self) -> None:
         ...
+
+
+@contextmanager
+def use_cached_model(
+    cache: ModelCache[T], key: str, model_loader: Callable[[], T]
+) -> Iterator[T]:
+    """Load a model through ``cache`` and keep its entry in use for the
+    block, so it is not evicted while a task runs on it. Caches without
+    ``acquire``/``release`` only load it."""
+    acquire = getattr(cache, "acquire", None)
+    if acquire is None:
+        yield cache.load(key, model_loader)
+        return
+    model = acquire(key, model_loader)
+    try:
+        yield model
+    finally:
+        cache.release(key)  # type: ignore[attr-defined]
@@ -0,0 +1,237 @@
+"""GPU caching-allocator management between tasks.
+
+``torch.cuda.empty_cache()`` hands every unused cached block back to the
+driver, so the next task pays ``cudaMalloc`` again for memory it would
+otherwise reuse. ``GPUMemoryManager`` asks a trim policy whether a trim is
+worth it at each task boundary, decides from ``torch.cuda.memory_stats``,
+and records the allocator metrics of the finished task.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Literal, Protocol, Sequence
+
+import torch
+
+if TYPE_CHECKING:
+    from gpt_task.config import Config, MemoryConfig
+
+_logger = logging.getLogger(__name__)
+
+TRIM_POLICY_NEVER = "never"
+TRIM_POLICY_WATERMARK = "watermark"
+TRIM_POLICY_MODEL_SWITCH = "model_switch"
+
+MemoryEventKind = Literal["task_start", "task_end", "model_unload"]
+
+
+@dataclass(frozen=True)
+class AllocatorStats:
+    """Caching-allocator metrics summed over the devices a task used."""
+
+    allocated_bytes: int
+    reserved_bytes: int
+    peak_allocated_bytes: int
+    peak_reserved_bytes: int
+    inactive_split_bytes: int
+    alloc_retries: int
+    trimmed: bool
+
+
+@dataclass(frozen=True)
+class MemoryEvent:
+    kind: MemoryEventKind
+    model_key: str | None
+    previous_model_key: str | None
+    reserved_bytes: int
+    total_bytes: int
+
+
+class MemoryTrimPolicy(Protocol):
+    def should_trim(self, event: MemoryEvent) -> bool:
+        ...
+
+
+class NeverTrimPolicy:
+    def should_trim(self, event: MemoryEvent) -> bool:
+        return False
+
+
+class WatermarkTrimPolicy:
+    """Trim after a task or unload once the allocator reserves more than
+    ``watermark`` of the total device memory."""
+
+    def __init__(self, watermark: float) -> None:
+        if not 0 < watermark <= 1:
+            raise ValueError(f"trim watermark must be in (0, 1], got {watermark}")
+        self.watermark = watermark
+
+    def should_trim(self, event: MemoryEvent) -> bool:
+        if event.kind == "task_start" or event.total_bytes <= 0:
+            return False
+        return event.reserved_bytes > self.watermark * event.total_bytes
+
+
+class ModelSwitchTrimPolicy:
+    """Trim only when the resident model changes, keeping the pool warm for
+    back-to-back tasks on the same model."""
+
+    def should_trim(self, event: MemoryEvent) -> bool:
+        if event.kind == "model_unload":
+            return True
+        return (
+            event.kind == "task_start"
+            and event.previous_model_key is not None
+            and event.model_key != event.previous_model_key
+        )
+
+
+def resolve_trim_policy(memory_config: MemoryConfig) -> MemoryTrimPolicy:
+    if memory_config.trim_policy == TRIM_POLICY_NEVER:
+        return NeverTrimPolicy()
+    if memory_config.trim_policy == TRIM_POLICY_WATERMARK:
+        return WatermarkTrimPolicy(memory_config.trim_watermark)
+    if memory_config.trim_policy == TRIM_POLICY_MODEL_SWITCH:
+        return ModelSwitchTrimPolicy()
+    raise ValueError(f"Unsupported trim policy: {memory_config.trim_policy}")
+
+
+class GPUMemoryManager:
+    """Applies a trim policy at task boundaries on a fixed set of devices.
+
+    ``devices=None`` covers every visible CUDA device, which is what classic
+    ``device_map="auto"`` execution uses. A tensor parallel rank passes its
+    own device only.
+    """
+
+    def __init__(
+        self,
+        policy: MemoryTrimPolicy,
+        devices: Sequence[int] | None = None,
+    ) -> None:
+        self.policy = policy
+        self._devices = None if devices is None else list(devices)
+        self._model_key: str | None = None
+        self._trimmed = False
+        self._in_task = False
+
+    def _resolve_devices(self) -> List[int]:
+        if not torch.cuda.is_available():
+            return []
+        if self._devices is not None:
+            return self._devices
+        return list(range(torch.cuda.device_count()))
+
+    def _event(self, kind: MemoryEventKind, model_key: str | None) -> MemoryEvent:
+        reserved = 0
+        total = 0
+        for device in self._resolve_devices():
+            stats = torch.cuda.memory_stats(device)
+            reserved += int(stats.get("reserved_bytes.all.current", 0))
+            total += int(torch.cuda.get_device_properties(device).total_memory)
+        return MemoryEvent(
+            kind=kind,
+            model_key=model_key,
+            previous_model_key=self._model_key,
+            reserved_bytes=reserved,
+            total_bytes=total,
+        )
+
+    def _apply(self, event: MemoryEvent) -> None:
+        if self.policy.should_trim(event):
+            _logger.debug(
+                "Trimming CUDA caching allocator on %s (reserved=%d bytes)",
+                event.kind,
+                event.reserved_bytes,
+            )
+            torch.cuda.empty_cache()
+            self._trimmed = True
+
+    def begin_task(self, model_key: str) -> None:
+        """Reset per-task peaks and trim if the policy asks for it before
+        the task's model is loaded."""
+        devices = self._resolve_devices()
+        self._trimmed = False
+        self._in_task = True
+        if not devices:
+            self._model_key = model_key
+            return
+        for device in devices:
+            torch.cuda.reset_peak_memory_stats(device)
+        self._apply(self._event("task_start", model_key))
+        self._model_key = model_key
+
+    def end_task(self) -> AllocatorStats | None:
+        """Record the finished task's allocator metrics, then trim if the
+        policy asks for it. Returns None when CUDA is unavailable or no
+        task is open, so failure paths may end a task unconditionally."""
+        if not self._in_task:
+            return None
+        self._in_task = False
+        devices = self._resolve_devices()
+        if not devices:
+            return None
+
+        allocated = reserved = peak_allocated = peak_reserved = 0
+        inactive_split = retries = 0
+        for device in devices:
+            stats = torch.cuda.memory_stats(device)
+            allocated += int(stats.get("allocated_bytes.all.current", 0))
+            reserved += int(stats.get("reserved_bytes.all.current", 0))
+            peak_allocated += int(stats.get("allocated_bytes.all.peak", 0))
+            peak_reserved += int(stats.get("reserved_bytes.all.peak", 0))
+            inactive_split += int(stats.get("inactive_split_bytes.all.current", 0))
+            retries += int(stats.get("num_alloc_retries", 0))
+
+        self._apply(self._event("task_end", self._model_key))
+        return AllocatorStats(
+            allocated_bytes=allocated,
+            reserved_bytes=reserved,
+            peak_allocated_bytes=peak_allocated,
+            peak_reserved_bytes=peak_reserved,
+            inactive_split_bytes=inactive_split,
+            alloc_retries=retries,
+            trimmed=self._trimmed,
+        )
+
+    def model_unloaded(self) -> None:
+        """Called after a cached model was dropped."""
+        if not self._resolve_devices():
+            return
+        self._apply(self._event("model_unload", None))
+
+
+_manager_lock = threading.Lock()
+_manager: GPUMemoryManager | None = None
+_manager_config: MemoryConfig | None = None
+
+
+def get_memory_manager(
+    config: Config | None = None,
+    devices: Sequence[int] | None = None,
+) -> GPUMemoryManager:
+    """Return the process-wide manager, rebuilding it when the memory config
+    or device set changes. Without a config the current manager (or one
+    with the default policy) is returned."""
+    global _manager, _manager_config
+
+    with _manager_lock:
+        device_list = None if devices is None else list(devices)
+        if config is not None and (
+            _manager is None
+            or config.memory != _manager_config
+            or device_list != _manager._devices
+        ):
+            _manager = GPUMemoryManager(
+                resolve_trim_policy(config.memory), device_list
+            )
+            _manager_config = config.memory.model_copy()
+        elif _manager is None:
+            from gpt_task.config import MemoryConfig
+
+            _manager_config = MemoryConfig()
+            _manager = GPUMemoryManager(resolve_trim_policy(_manager_config))
+        return _manager
@@ -1,29 +1,117 @@
-from typing import Any, Dict, Callable
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
 
-import torch
+from .allocator import get_memory_manager
+from .residency import get_vram_arbiter
 
 
 class MemoryModelCache(object):
-    def __init__(self, max_size: int = 1) -> None:
+    """LRU of loaded models.
+
+    Entries acquired by a running task are in use until released and are
+    never evicted: not to make room for another model, not by idle
+    eviction and not by VRAM requests. The cache lock is not held while a
+    model loads, so eviction and VRAM requests do not wait for it; a
+    concurrent load of the same key waits for the first one instead.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self.max_size = max_size
 
-        self._cache: Dict[str, Any] = {}
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # Tasks holding each entry, and loads in progress.
+        self._in_use: Dict[str, int] = {}
+        self._loading: Dict[str, threading.Event] = {}
+        get_vram_arbiter().register(self)
 
     def load(self, key: str, model_loader: Callable[[], Any]):
-        if key in self._cache:
-            return self._cache[key]
-        else:
-            if len(self._cache) >= self.max_size:
-                keys = list(self._cache.keys())
-                t = self._cache.pop(keys[0])
-                del t
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
+        return self._load(key, model_loader, acquire=False)
+
+    def acquire(self, key: str, model_loader: Callable[[], Any]):
+        """Load like ``load`` and mark the entry in use until ``release``."""
+        return self._load(key, model_loader, acquire=True)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            count = self._in_use.get(key, 0) - 1
+            if count > 0:
+                self._in_use[key] = count
+            else:
+                self._in_use.pop(key, None)
+
+    def _load(self, key: str, model_loader: Callable[[], Any], acquire: bool):
+        while True:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self._last_used[key] = self._clock()
+                    if acquire:
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                    return self._cache[key]
+                loading = self._loading.get(key)
+                if loading is None:
+                    while len(self._cache) + len(self._loading) >= self.max_size:
+                        if not self._evict_lru():
+                            break
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another task is loading the same model.
+            loading.wait()
+
+        try:
             model = model_loader()
+        except BaseException:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+            raise
+        with self._lock:
+            del self._loading[key]
             self._cache[key] = model
-            return model
+            self._last_used[key] = self._clock()
+            if acquire:
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+        loading.set()
+        return model
+
+    def _evict_lru(self) -> bool:
+        key = next((key for key in self._cache if key not in self._in_use), None)
+        if key is None:
+            return False
+        t = self._cache.pop(key)
+        self._last_used.pop(key, None)
+        del t
+        get_memory_manager().model_unloaded()
+        return True
+
+    def idle_since(self) -> float | None:
+        with self._lock:
+            return next(
+                (
+                    self._last_used[key]
+                    for key in self._cache
+                    if key not in self._in_use
+                ),
+                None,
+            )
+
+    def release_lru(self) -> bool:
+        with self._lock:
+            return self._evict_lru()
 
     def clear(self) -> None:
-        self._cache.clear()
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        with self._lock:
+            had_models = len(self._cache) > 0
+            self._cache.clear()
+            self._last_used.clear()
+        if had_models:
+            get_memory_manager().model_unloaded()
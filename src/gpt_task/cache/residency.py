@@ -0,0 +1,191 @@
+"""Arbitration of GPU memory held by resident LLM state.
+
+Nodes also run other GPU workloads (for example Stable Diffusion tasks).
+Cached pipelines and the tensor parallel rank group would otherwise hold
+VRAM until something clears them explicitly. ``VRAMArbiter`` tracks every
+registered holder of LLM state, releases all of it after a configurable
+period without tasks, and lets another workload request free VRAM, which
+evicts LLM state in least-recently-used order.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Protocol
+
+import torch
+
+_logger = logging.getLogger(__name__)
+
+
+class VRAMResident(Protocol):
+    def idle_since(self) -> float | None:
+        """Clock time of the least recent use among the held entries, or
+        None when nothing is held or the holder cannot be released now."""
+        ...
+
+    def release_lru(self) -> bool:
+        """Release the least recently used entry. Returns False when
+        nothing was released."""
+        ...
+
+
+def _cuda_free_bytes() -> int:
+    if not torch.cuda.is_available():
+        return 0
+    return min(
+        torch.cuda.mem_get_info(device)[0]
+        for device in range(torch.cuda.device_count())
+    )
+
+
+class VRAMArbiter:
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        free_bytes: Callable[[], int] = _cuda_free_bytes,
+    ) -> None:
+        self._clock = clock
+        self._free_bytes = free_bytes
+        self._lock = threading.RLock()
+        self._residents: "weakref.WeakSet[VRAMResident]" = weakref.WeakSet()
+        self._active_tasks = 0
+        self._last_task_end = clock()
+
+    def register(self, resident: VRAMResident) -> None:
+        with self._lock:
+            self._residents.add(resident)
+
+    def unregister(self, resident: VRAMResident) -> None:
+        with self._lock:
+            self._residents.discard(resident)
+
+    @contextmanager
+    def task_scope(self) -> Iterator[None]:
+        """Mark a task as running so idle eviction never fires under it."""
+        with self._lock:
+            self._active_tasks += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_tasks -= 1
+                self._last_task_end = self._clock()
+
+    def _release_oldest(self) -> bool:
+        candidates: List[tuple[float, VRAMResident]] = []
+        for resident in list(self._residents):
+            since = resident.idle_since()
+            if since is not None:
+                candidates.append((since, resident))
+        for _, resident in sorted(candidates, key=lambda item: item[0]):
+            if resident.release_lru():
+                return True
+        return False
+
+    def release_idle(self, ttl: float) -> int:
+        """Release every resident entry when no task has run for ``ttl``
+        seconds. Returns the number of released entries."""
+        with self._lock:
+            if self._active_tasks > 0:
+                return 0
+            if self._clock() - self._last_task_end < ttl:
+                return 0
+            released = 0
+            while self._release_oldest():
+                released += 1
+        if released > 0:
+            _logger.info("Released %d idle LLM model entries", released)
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return released
+
+    def request_vram(self, nbytes: int) -> bool:
+        """Evict LLM state in LRU order until every visible device has at
+        least ``nbytes`` free. Returns whether the request is satisfied."""
+        with self._lock:
+            while self._free_bytes() < nbytes:
+                if not self._release_oldest():
+                    break
+                # Hand the freed blocks back to the driver so the other
+                # workload can allocate them, whatever the trim policy.
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            satisfied = self._free_bytes() >= nbytes
+        if not satisfied:
+            _logger.warning(
+                "VRAM request of %d bytes not satisfied after evicting all "
+                "releasable LLM state",
+                nbytes,
+            )
+        return satisfied
+
+
+class IdleReaper:
+    """Background thread that applies ``VRAMArbiter.release_idle``."""
+
+    def __init__(
+        self,
+        arbiter: VRAMArbiter,
+        ttl: float,
+        interval: float | None = None,
+    ) -> None:
+        if ttl <= 0:
+            raise ValueError(f"idle ttl must be > 0, got {ttl}")
+        self.ttl = ttl
+        self._arbiter = arbiter
+        self._interval = interval if interval is not None else min(ttl, 30.0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="gpt-task-idle-reaper", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self._arbiter.release_idle(self.ttl)
+            except Exception:
+                _logger.exception("Idle LLM eviction failed")
+
+
+_arbiter = VRAMArbiter()
+_reaper_lock = threading.Lock()
+_reaper: IdleReaper | None = None
+
+
+def get_vram_arbiter() -> VRAMArbiter:
+    return _arbiter
+
+
+def request_vram(nbytes: int) -> bool:
+    """Free at least ``nbytes`` of VRAM on every visible device for another
+    workload by evicting LLM state in LRU order."""
+    return _arbiter.request_vram(nbytes)
+
+
+def ensure_idle_reaper(idle_ttl: float | None) -> None:
+    """Start, restart or stop the process idle reaper to match the
+    configured TTL. ``None`` disables idle eviction."""
+    global _reaper
+
+    with _reaper_lock:
+        if _reaper is not None and _reaper.ttl == idle_ttl:
+            return
+        if _reaper is not None:
+            _reaper.stop()
+            _reaper = None
+        if idle_ttl is not None:
+            _reaper = IdleReaper(_arbiter, idle_ttl)
+            _reaper.start()
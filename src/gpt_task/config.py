@@ -1,5 +1,5 @@
 import os
-from typing import List, Tuple, Type
+from typing import Dict, List, Literal, Tuple, Type
 
 from pydantic import BaseModel
 from pydantic_settings import (
@@ -33,11 +33,108 @@ class ProxyConfig(BaseModel):
     password: str = ""
 
 
+class MemoryConfig(BaseModel):
+    # When to return cached CUDA allocator blocks to the driver:
+    # never, once reserved memory exceeds trim_watermark of the device
+    # total, or only when the resident model changes.
+    trim_policy: Literal["never", "watermark", "model_switch"] = "model_switch"
+    trim_watermark: float = 0.9
+    # Seconds without any task after which cached pipelines are unloaded and
+    # the tensor parallel rank group is shut down. None keeps them resident.
+    idle_ttl: float | None = None
+    # Run the classic pipeline on the CPU when no CUDA device is visible,
+    # for benchmarks and tests with tiny models. CPU kernels differ
+    # numerically from GPU kernels, so leave it off on serving nodes.
+    allow_cpu_execution: bool = False
+
+
+class VisionConfig(BaseModel):
+    # Byte budget of the decoded image and processed pixel cache; 0 disables.
+    pixel_cache_bytes: int = 512 << 20
+    # Byte budget of cached vision encoder outputs, held in device memory.
+    # 0 (the default) disables the cache.
+    embedding_cache_bytes: int = 0
+    # Threads decoding the images of a request in parallel; 0 decodes on
+    # the task thread.
+    preprocess_workers: int = 4
+    # Node vision limits. Tasks that exceed them after their own
+    # vision_budget are rejected rather than downscaled. None leaves the
+    # dimension unbounded.
+    max_pixels: int | None = None
+    max_tiles: int | None = None
+    max_vision_tokens: int | None = None
+
+
+class LoggingConfig(BaseModel):
+    # Bounds of task log fields (arguments, prompts, token ids, responses).
+    # Longer strings are truncated, longer sequences keep their head and
+    # tail, and nesting below max_depth is elided. Image payloads are
+    # always logged by size only.
+    max_field_chars: int = 256
+    max_items: int = 16
+    max_depth: int = 6
+    max_line_chars: int = 8192
+
+
+class ProfilerConfig(BaseModel):
+    # torch.profiler capture of the prefill and decode phases. A task is
+    # profiled when it is the sample_every-th task of the process (0
+    # disables sampling) or its model id matches model_pattern (fnmatch
+    # syntax, e.g. "Qwen/*").
+    sample_every: int = 0
+    model_pattern: str | None = None
+    # Chrome traces are written to output_dir; the oldest are deleted once
+    # the directory holds more than max_bytes of them.
+    output_dir: str = "profiles"
+    max_bytes: int = 1 << 30
+    record_shapes: bool = True
+    with_stack: bool = False
+
+
+class RecorderConfig(BaseModel):
+    # JSONL file receiving one record per task; None disables recording.
+    # See src/gpt_task/inference/recorder.py for the record fields.
+    path: str | None = None
+    # Size at which the file rotates, and rotated files kept.
+    max_bytes: int = 64 << 20
+    backups: int = 5
+    # Records waiting for the writer thread; later records are dropped.
+    max_pending: int = 1024
+
+
+class ResultCacheConfig(BaseModel):
+    # Whole responses of finished tasks, keyed by everything that decides
+    # them; see src/gpt_task/inference/result_cache.py. Byte budget of the
+    # in-memory tier; 0 (the default) disables it.
+    memory_bytes: int = 0
+    # Optional disk tier: a directory of result files, the oldest deleted
+    # once they exceed disk_bytes. None disables it.
+    disk_dir: str | None = None
+    disk_bytes: int = 1 << 30
+
+
+class SpeculativeConfig(BaseModel):
+    # Target model id -> draft model id sharing the target tokenizer. Greedy
+    # tasks on a mapped target that set speculative use assisted generation
+    # with the draft.
+    draft_models: Dict[str, str] = {}
+    num_assistant_tokens: int | None = None
+
+
 class Config(BaseSettings):
     preloaded_models: PreloadedModelsConfig = PreloadedModelsConfig(base=[])
     data_dir: DataDirConfig | None = None
     proxy: ProxyConfig | None = None
     local_files_only: bool = False
+    # Reproducibility level of task execution, see docs/determinism.md.
+    determinism: Literal["strict", "deterministic", "fast"] = "strict"
+    memory: MemoryConfig = MemoryConfig()
+    speculative: SpeculativeConfig = SpeculativeConfig()
+    vision: VisionConfig = VisionConfig()
+    logging: LoggingConfig = LoggingConfig()
+    profiler: ProfilerConfig = ProfilerConfig()
+    recorder: RecorderConfig = RecorderConfig()
+    result_cache: ResultCacheConfig = ResultCacheConfig()
 
     model_config = SettingsConfigDict(
         env_nested_delimiter="__",
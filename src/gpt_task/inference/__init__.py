@@ -1,11 +1,33 @@
+from gpt_task.cache import request_vram
+
+from .allocator_stats import get_allocator_stats
 from .executed_gpu_count import get_executed_gpu_count
 from .execution_dtype import get_execution_dtype
 from .inference import run_task
+from .model_adapters.input.vision.preprocess import prefetch_task_inputs
+from .speculative import SpeculativeStats, get_speculative_stats
+from .task_context import TaskContext, task_context
+from .task_report import StageTiming, TaskReport, export_task_spans, get_task_report
 from .tp.executor import shutdown_tp_executor
+from .verification import VerificationResult, verify_task, verify_tasks
 
 __all__ = [
+    "get_allocator_stats",
     "get_executed_gpu_count",
     "get_execution_dtype",
+    "get_speculative_stats",
+    "get_task_report",
+    "export_task_spans",
+    "prefetch_task_inputs",
+    "request_vram",
     "run_task",
+    "SpeculativeStats",
+    "StageTiming",
+    "TaskContext",
+    "task_context",
+    "TaskReport",
     "shutdown_tp_executor",
+    "VerificationResult",
+    "verify_task",
+    "verify_tasks",
 ]
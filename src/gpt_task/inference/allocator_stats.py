@@ -0,0 +1,25 @@
+"""Track the CUDA caching-allocator metrics of the current GPT task.
+
+Classic execution reports the sum over every visible device. Under tensor
+parallelism rank 0 reports its own device. The value is None when CUDA is
+unavailable.
+"""
+
+from __future__ import annotations
+
+from gpt_task.cache import AllocatorStats
+
+from .task_context import readable_task_context, writable_task_context
+
+
+def clear_allocator_stats() -> None:
+    writable_task_context().allocator_stats = None
+
+
+def set_allocator_stats(stats: AllocatorStats | None) -> None:
+    writable_task_context().allocator_stats = stats
+
+
+def get_allocator_stats() -> AllocatorStats | None:
+    context = readable_task_context()
+    return None if context is None else context.allocator_stats
@@ -0,0 +1,104 @@
+"""Post-processing of generated token ids.
+
+``generate()`` returns one row per sequence: the prompt, the completion,
+then padding once a sequence stopped before the longest one. Completion
+lengths, finish reasons and texts are derived from that tensor with
+vectorized ops and a single ``batch_decode``, without copying the output
+into Python int lists or looping over its tokens.
+
+A completion ends at its first stop token (the tokenizer's EOS or any EOS
+id of the generation config), which it includes. A completion without a
+stop token ends before its trailing padding, when padding uses a token of
+its own. The finish reason is ``"stop"`` when the completion ends with the
+tokenizer's EOS token and ``"length"`` otherwise.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, List, Literal, Sequence
+
+import torch
+
+
+@dataclass(frozen=True)
+class Completions:
+    texts: List[str]
+    finish_reasons: List[Literal["stop", "length"]]
+    # Completion tokens summed over all sequences.
+    completion_tokens: int
+    # Tokens of each completion, its stop token included.
+    lengths: List[int]
+
+
+def find_prompt_end(input_tokens: Sequence[int], sequence: torch.Tensor) -> int:
+    """Position right after the prompt within a generated ``sequence``, or 0
+    when the prompt cannot be located: the first occurrence of the last
+    prompt token that leaves room for the whole prompt after the first
+    occurrence of its first token."""
+    starts = (sequence == input_tokens[0]).nonzero()
+    if starts.numel() == 0:
+        return 0
+    lowest_end = int(starts[0]) + len(input_tokens) - 1
+    ends = (sequence[lowest_end:] == input_tokens[-1]).nonzero()
+    if ends.numel() == 0:
+        return 0
+    return lowest_end + int(ends[0]) + 1
+
+
+def _stop_token_ids(tokenizer: Any, generation_config: Any) -> List[int]:
+    ids = getattr(generation_config, "eos_token_id", None)
+    if isinstance(ids, int):
+        ids = [ids]
+    elif isinstance(ids, (list, tuple)):
+        ids = list(ids)
+    else:
+        ids = []
+    if tokenizer.eos_token_id is not None:
+        ids.append(tokenizer.eos_token_id)
+    return ids
+
+
+def decode_completions(
+    sequences: torch.Tensor,
+    prompt_tokens: int,
+    tokenizer: Any,
+    generation_config: Any,
+) -> Completions:
+    """Decode the completions of ``sequences`` (one row per sequence, the
+    prompt in its first ``prompt_tokens`` columns)."""
+    generated = sequences[:, prompt_tokens:]
+    rows, width = generated.shape
+
+    stop_ids = _stop_token_ids(tokenizer, generation_config)
+    lengths = torch.full((rows,), width, dtype=torch.long, device=generated.device)
+    pad_token_id = getattr(generation_config, "pad_token_id", None)
+    if pad_token_id is not None and pad_token_id not in stop_ids:
+        trailing_pads = (generated == pad_token_id).flip(1).cumprod(1).sum(1)
+        lengths -= trailing_pads
+    if stop_ids and width > 0:
+        is_stop = torch.isin(generated, torch.tensor(stop_ids, device=generated.device))
+        stopped = is_stop.any(1)
+        first_stop = is_stop.int().argmax(1)
+        lengths = torch.where(stopped, first_stop + 1, lengths)
+
+    ends_with_eos = torch.zeros(rows, dtype=torch.bool, device=generated.device)
+    if tokenizer.eos_token_id is not None and width > 0:
+        last = generated.gather(1, (lengths - 1).clamp(min=0).unsqueeze(1)).squeeze(1)
+        ends_with_eos = (lengths > 0) & (last == tokenizer.eos_token_id)
+
+    generated = generated.cpu()
+    lengths_list = lengths.tolist()
+    texts = tokenizer.batch_decode(
+        [generated[row, :length] for row, length in enumerate(lengths_list)],
+        skip_special_tokens=True,
+        clean_up_tokenization_spaces=True,
+    )
+    return Completions(
+        texts=[text.strip() for text in texts],
+        finish_reasons=[
+            "stop" if stop else "length" for stop in ends_with_eos.tolist()
+        ],
+        completion_tokens=sum(lengths_list),
+        lengths=lengths_list,
+    )
@@ -10,6 +10,8 @@ from pydantic import ValidationError
 from requests import ConnectionError, HTTPError
 from typing_extensions import ParamSpec
 
+from gpt_task.models.images import ImageSourceError
+
 __all__ = [
     "wrap_error",
     "error_context",
@@ -72,8 +74,20 @@ def match_exception(e: Exception, targets: Iterable[Type[Exception]]) -> bool:
 def error_context(local_files_only: bool = False):
     try:
         yield
+    except (
+        TaskArgsInvalid,
+        ModelInvalid,
+        ModelDownloadError,
+        ModelNotDownloaded,
+        TaskExecutionError,
+    ):
+        # Already classified, e.g. by a check inside the block.
+        raise
     except ValidationError as e:
         raise TaskArgsInvalid from e
+    except ImageSourceError as e:
+        # An image of the task cannot be read or decoded.
+        raise TaskArgsInvalid from e
     except EnvironmentError as e:
         # In local_files_only mode every model load failure caused by a
         # missing local cache entry is a not-downloaded model; invalid model
@@ -7,20 +7,19 @@ count. Worker error reports read this value after a failed task.
 
 from __future__ import annotations
 
-_executed_gpu_count: int | None = None
+from .task_context import readable_task_context, writable_task_context
 
 
 def clear_executed_gpu_count() -> None:
-    global _executed_gpu_count
-    _executed_gpu_count = None
+    writable_task_context().executed_gpu_count = None
 
 
 def set_executed_gpu_count(count: int) -> None:
-    global _executed_gpu_count
     if count < 0:
         raise ValueError(f"executed GPU count must be >= 0, got {count}")
-    _executed_gpu_count = count
+    writable_task_context().executed_gpu_count = count
 
 
 def get_executed_gpu_count() -> int | None:
-    return _executed_gpu_count
+    context = readable_task_context()
+    return None if context is None else context.executed_gpu_count
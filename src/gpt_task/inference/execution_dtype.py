@@ -4,7 +4,7 @@ from typing import Any
 
 import torch
 
-_execution_dtype: str | None = None
+from .task_context import readable_task_context, writable_task_context
 
 
 def resolve_model_execution_dtype(model: Any) -> str:
@@ -15,16 +15,15 @@ def resolve_model_execution_dtype(model: Any) -> str:
 
 
 def clear_execution_dtype() -> None:
-    global _execution_dtype
-    _execution_dtype = None
+    writable_task_context().execution_dtype = None
 
 
 def set_execution_dtype(dtype: str) -> None:
-    global _execution_dtype
     if not dtype:
         raise ValueError("execution dtype must not be empty")
-    _execution_dtype = dtype
+    writable_task_context().execution_dtype = dtype
 
 
 def get_execution_dtype() -> str | None:
-    return _execution_dtype
+    context = readable_task_context()
+    return None if context is None else context.execution_dtype
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Literal, Mapping, Sequence, Union, Callable
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import (Any, Callable, Dict, Iterator, List, Literal, Mapping,
+                    Sequence, Tuple, Union)
 
 import torch
 from accelerate.utils import get_max_memory
@@ -9,8 +12,12 @@ from transformers.generation.streamers import BaseStreamer
 
 from gpt_task import models
 from gpt_task.config import Config, get_config
-from gpt_task.cache import ModelCache
+from gpt_task.cache import (GPUMemoryManager, ModelCache, get_memory_manager,
+                            get_vram_arbiter, use_cached_model)
+from gpt_task.cache.residency import ensure_idle_reaper
 
+from .allocator_stats import clear_allocator_stats, set_allocator_stats
+from .completions import decode_completions, find_prompt_end
 from .errors import error_context
 from .executed_gpu_count import clear_executed_gpu_count, set_executed_gpu_count
 from .execution_dtype import (
@@ -19,12 +26,60 @@ from .execution_dtype import (
     set_execution_dtype,
 )
 from .input_rendering import render_task_input
-from .utils import (load_model_kwargs, resolve_generation_config,
-                    use_deterministic_mode)
+from .utils import (bind_task_args, launch_blocking, load_model_kwargs,
+                    resolve_generation_config, use_deterministic_mode)
 from .key import generate_model_key
-from .model_adapters import ModelAdapterContext
+from .logits_digest import LogitsDigest, task_logits_digest
+from .profiling import profiled_phase, task_profiling
+from .recorder import record_task_args, task_recording
+from .result_cache import cached_task_result, result_cache_key
+from .sampling import add_sampler, task_sampler
+from .shared_prefill import prefill_shared_prompt, shared_prefill_copies
+from .task_log import configure_task_log, loggable
+from .task_report import (
+    clear_task_report,
+    finish_task_report,
+    generation_stages,
+    get_task_timer,
+    task_stage,
+    task_timing,
+)
+from .speculative import (
+    SpeculativeStats,
+    attach_draft_model,
+    clear_speculative_stats,
+    count_forward_passes,
+    get_draft_model,
+    load_draft_model,
+    resolve_draft_model_id,
+    set_speculative_stats,
+    supports_assisted_generation,
+)
+from .model_adapters import (
+    ModelAdapterContext,
+    attach_adapter_plan,
+    build_adapter_plan,
+    get_adapter_plan,
+)
 from .model_adapters.artifacts import configure_artifacts
+from .model_adapters.input.vision.budget import (
+    check_vision_limit,
+    count_vision_tokens,
+    node_vision_limits,
+    resolve_vision_budget,
+    use_vision_budget,
+)
+from .model_adapters.input.vision.embedding_cache import (
+    encode_images_with_cache,
+    get_vision_embedding_cache,
+)
+from .model_adapters.input.vision.pixel_cache import get_pixel_cache
+from .model_adapters.input.vision.preprocess import (
+    get_preprocess_pool,
+    prefetch_task_inputs,
+)
 from .model_adapters.input import (
+    contains_image_blocks,
     content_to_text,
 )
 
@@ -47,6 +102,8 @@ class TokenStreamer(BaseStreamer):
         self.prompt_tokens = len(input_tokens)  # Initialize with input length, will be updated when prompt end is found
         self.model_name = model_name
         self.stream_callback = stream_callback  # Callback to send stream responses
+        self.vision_tokens: int | None = None  # Image placeholder tokens, for image tasks
+        self.logits_digest: LogitsDigest | None = None  # Digest chain, for tasks that ask for one
 
     def put(self, value):
         if len(value.shape) > 1:
@@ -66,7 +123,7 @@ class TokenStreamer(BaseStreamer):
                         self.found_prompt_end = True
                         self.prompt_tokens = prompt_end  # Update prompt tokens count to match non-streaming mode
                         self.tokens = self.tokens[prompt_end:]  # Keep only the new tokens
-                        _logger.debug(f"Found prompt end at position {prompt_end}")
+                        _logger.debug("Found prompt end at position %d", prompt_end)
 
                         # Check if we've already collected any completion tokens
                         for completion_token in self.tokens:
@@ -130,7 +187,7 @@ class TokenStreamer(BaseStreamer):
         # Send final chunk with finish_reason
         if self.stream_callback:
             finish_reason = self.get_finish_reason()
-            _logger.debug(f"Sending final chunk with finish_reason={finish_reason}")
+            _logger.debug("Sending final chunk with finish_reason=%s", finish_reason)
             response = {
                 "model": self.model_name,
                 "choices": [{
@@ -140,33 +197,40 @@ class TokenStreamer(BaseStreamer):
                 }],
                 "usage": self.get_usage()
             }
-            _logger.info(f"task response: {response}")
+            if self.logits_digest is not None:
+                # The chain covers the EOS token the completion count omits.
+                steps = self.completion_tokens + (1 if self.is_eos else 0)
+                response["choices"][0]["logits_digest"] = self.logits_digest.chains([steps])[0]
+            _logger.info("task response: %s", loggable(response))
             self.stream_callback(response)
 
     def get_finish_reason(self) -> Literal["stop", "length"]:
         return "stop" if self.is_eos else "length"
 
     def get_usage(self) -> models.Usage:
-        return {
+        usage: models.Usage = {
             "prompt_tokens": self.prompt_tokens,
             "completion_tokens": self.completion_tokens,
             "total_tokens": self.prompt_tokens + self.completion_tokens
         }
+        if self.vision_tokens is not None:
+            usage["vision_tokens"] = self.vision_tokens
+        return usage
 
 
 def _find_prompt_tokens(input_tokens: List[int], output_tokens: List[int]) -> int:
 
-    _logger.debug(f"Finding prompt tokens: input_tokens={input_tokens}")
-    _logger.debug(f"Finding prompt tokens: output_tokens={output_tokens}")
+    _logger.debug("Finding prompt tokens: input_tokens=%s", loggable(input_tokens))
+    _logger.debug("Finding prompt tokens: output_tokens=%s", loggable(output_tokens))
 
     try:
         start = output_tokens.index(input_tokens[0])
-        _logger.debug(f"Finding prompt tokens: start={start}")
+        _logger.debug("Finding prompt tokens: start=%d", start)
         end = output_tokens.index(input_tokens[-1], start + len(input_tokens) - 1)
-        _logger.debug(f"Finding prompt tokens: end={end}")
+        _logger.debug("Finding prompt tokens: end=%d", end)
         return end + 1
     except ValueError:
-        _logger.debug(f"Finding prompt tokens: ValueError")
+        _logger.debug("Finding prompt tokens: ValueError")
         return 0
 
 
@@ -258,6 +322,16 @@ def _to_token_id_list(token_ids: Any) -> List[int] | None:
     return None
 
 
+def _stack_token_rows(rows: List[Any]) -> torch.Tensor | None:
+    """One tensor of the token ids the pipeline returned per sequence, or
+    None when it returned text only."""
+    if any(row is None for row in rows):
+        return None
+    if torch.is_tensor(rows[0]):
+        return torch.stack(rows)
+    return torch.tensor(rows, dtype=torch.long)
+
+
 def _is_vlm_pipeline(pipe: Any) -> bool:
     return getattr(pipe, "task", None) == "image-text-to-text"
 
@@ -269,6 +343,7 @@ def _invoke_pipeline(
     *,
     return_tensors: bool = False,
     streamer: BaseStreamer | None = None,
+    generate_kwargs: Dict[str, Any] | None = None,
 ) -> Any:
     call_kwargs: Dict[str, Any] = {}
     if return_tensors:
@@ -282,22 +357,34 @@ def _invoke_pipeline(
     # Save and restore: the pipe object may be cached and reused across
     # calls (via model_cache), so we must not leave a modified
     # generation_config on it after we return.
-    saved_generation_config = pipe.generation_config
-    pipe.generation_config = generation_config
+    runtime_kwargs: Dict[str, Any] = dict(generate_kwargs or {})
+    if streamer is not None:
+        runtime_kwargs["streamer"] = streamer
+
+    # Pipelines of later transformers releases no longer keep a
+    # generation_config attribute; they take it as a generate() argument.
+    has_generation_config = hasattr(pipe, "generation_config")
+    if has_generation_config:
+        saved_generation_config = pipe.generation_config
+        pipe.generation_config = generation_config
+    else:
+        runtime_kwargs["generation_config"] = generation_config
 
     try:
-        if streamer is not None:
-            # streamer is a runtime arg for model.generate(), not part of
-            # GenerationConfig. TextGenerationPipeline accepts it as a flat
-            # kwarg; ImageTextToTextPipeline requires it inside a
-            # generate_kwargs dict — an upstream API inconsistency.
+        if runtime_kwargs:
+            # streamer and assistant_model are runtime args for
+            # model.generate(), not part of GenerationConfig.
+            # TextGenerationPipeline accepts them as flat kwargs;
+            # ImageTextToTextPipeline requires them inside a generate_kwargs
+            # dict — an upstream API inconsistency.
             if _is_vlm_pipeline(pipe):
-                call_kwargs["generate_kwargs"] = {"streamer": streamer}
+                call_kwargs["generate_kwargs"] = runtime_kwargs
             else:
-                call_kwargs["streamer"] = streamer
+                call_kwargs.update(runtime_kwargs)
         return pipe(inputs, **call_kwargs)
     finally:
-        pipe.generation_config = saved_generation_config
+        if has_generation_config:
+            pipe.generation_config = saved_generation_config
 
 
 def _resolve_prompt_input_tokens(
@@ -349,6 +436,134 @@ def _resolve_prompt_input_tokens(
     return baseline
 
 
+def _load_pipeline(
+    args: models.GPTTaskArgs, config: Config, draft_model_id: str | None
+) -> Any:
+    from transformers import AutoProcessor, pipeline
+
+    _logger.info("Start loading pipeline")
+
+    torch_dtype = None
+    if args.dtype == "float16":
+        torch_dtype = torch.float16
+    elif args.dtype == "float32":
+        torch_dtype = torch.float32
+    elif args.dtype == "bfloat16":
+        torch_dtype = torch.bfloat16
+
+    model_kwargs = load_model_kwargs(config=config)
+    local_files_only = config.local_files_only
+    _logger.debug(
+        f"model kwargs: {model_kwargs}, local_files_only: {local_files_only}"
+    )
+
+    with task_stage("processor_load"):
+        processor = AutoProcessor.from_pretrained(
+            args.model,
+            trust_remote_code=True,
+            local_files_only=local_files_only,
+            **model_kwargs,
+        )
+
+    if args.quantize_bits == 4:
+        from transformers import BitsAndBytesConfig
+        model_kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True
+        )
+    elif args.quantize_bits == 8:
+        from transformers import BitsAndBytesConfig
+        model_kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_8bit=True
+        )
+
+    # CPU/disk offload is prohibited: CPU kernels differ numerically from
+    # GPU kernels, so offloaded layers would produce divergent results.
+    # With a zero CPU budget the device_map="auto" planner can only place
+    # overflow on disk, and without an offload_folder that load fails --
+    # a model that does not fit the visible GPUs never starts executing.
+    max_memory = get_max_memory()
+    if not (config.memory.allow_cpu_execution and torch.cuda.device_count() == 0):
+        max_memory["cpu"] = 0
+
+    try:
+        # local_files_only must be a top-level argument: transformers 5.x
+        # merges hub kwargs and model_kwargs when loading the config and
+        # weights, so putting it inside model_kwargs raises a duplicate
+        # keyword argument error.
+        with task_stage("model_load"):
+            pipe = pipeline(
+                task=None,
+                model=args.model,
+                processor=processor,
+                trust_remote_code=True,
+                device_map="auto",
+                dtype=torch_dtype,
+                local_files_only=local_files_only,
+                model_kwargs=dict(
+                    max_memory=max_memory,
+                    **model_kwargs,
+                ),
+            )
+    except ValueError as e:
+        if "offload" in str(e):
+            raise torch.cuda.OutOfMemoryError(
+                "Model does not fit in the visible GPU memory"
+            ) from e
+        raise
+
+    # transformers 5.x forwards the top-level local_files_only into the
+    # pipeline constructor, where it ends up in the cached call parameters
+    # and later fails model.generate() as an unknown argument. Drop it
+    # from the cached parameter dicts.
+    for params in (
+        pipe._preprocess_params,
+        pipe._forward_params,
+        pipe._postprocess_params,
+    ):
+        params.pop("local_files_only", None)
+
+    context = ModelAdapterContext(
+        config=pipe.model.config,
+        model=pipe.model,
+        processor=getattr(pipe, "processor", None),
+        tokenizer=_resolve_pipeline_tokenizer(pipe),
+    )
+    configure_artifacts(context)
+    attach_adapter_plan(pipe, build_adapter_plan(context))
+    if draft_model_id is not None:
+        attach_draft_model(
+            pipe,
+            load_draft_model(draft_model_id, pipe.model, config, torch_dtype),
+        )
+    _logger.info("Loading pipeline completes")
+    return pipe
+
+
+@contextmanager
+def use_task_pipeline(
+    args: models.GPTTaskArgs,
+    config: Config,
+    model_key: str,
+    draft_model_id: str | None = None,
+    model_cache: ModelCache | None = None,
+) -> Iterator[Tuple[Any, bool]]:
+    """Yield the task's pipeline, from ``model_cache`` when it holds it,
+    and whether it was loaded by this call. The cache entry stays in use,
+    and is not evicted, until the block exits."""
+    loaded = False
+
+    def model_loader():
+        nonlocal loaded
+        loaded = True
+        return _load_pipeline(args, config, draft_model_id)
+
+    if model_cache is None:
+        yield model_loader(), True
+        return
+    with use_cached_model(model_cache, model_key, model_loader) as pipe:
+        yield pipe, loaded
+
+
 def run_task(
     args: models.GPTTaskArgs | None = None,
     *,
@@ -363,40 +578,54 @@ def run_task(
     quantize_bits: Literal[4, 8] | None = None,
     config: Config | None = None,
     model_cache: ModelCache | None = None,
+    trusted: bool = False,
 ) -> Union[models.GPTTaskResponse, models.GPTTaskStreamResponse]:
     if config is None:
         config = get_config()
 
-    clear_executed_gpu_count()
-    clear_execution_dtype()
-    # Classic execution uses every visible CUDA device via device_map="auto".
-    visible_gpus = torch.cuda.device_count()
-    set_executed_gpu_count(visible_gpus)
-    model_name = args.model if args is not None else model
-    _logger.info(
-        "Task execution plan: mode=%s, gpu_count=%d, visible_gpus=%d, model=%s",
-        "device_map",
-        visible_gpus,
-        visible_gpus,
-        model_name,
-    )
-
-    with error_context(local_files_only=config.local_files_only):
-        return _run_task(
-            args,
-            model=model,
-            messages=messages,
-            tools=tools,
-            generation_config=generation_config,
-            template_args=template_args,
-            stream_callback=stream_callback,
-            seed=seed,
-            dtype=dtype,
-            quantize_bits=quantize_bits,
-            config=config,
-            model_cache=model_cache,
+    # Before the task's first CUDA call, which may create the CUDA context.
+    with launch_blocking(config.determinism):
+        clear_executed_gpu_count()
+        clear_execution_dtype()
+        clear_allocator_stats()
+        clear_speculative_stats()
+        clear_task_report()
+        # Classic execution uses every visible CUDA device via device_map="auto".
+        visible_gpus = torch.cuda.device_count()
+        set_executed_gpu_count(visible_gpus)
+        model_name = args.model if args is not None else model
+        _logger.info(
+            "Task execution plan: mode=%s, gpu_count=%d, visible_gpus=%d, model=%s",
+            "device_map",
+            visible_gpus,
+            visible_gpus,
+            model_name,
         )
 
+        ensure_idle_reaper(config.memory.idle_ttl)
+        with (
+            task_recording(config, "device_map", stream_callback is not None),
+            task_timing(model_name, "device_map"),
+            task_profiling(config, model_name),
+            get_vram_arbiter().task_scope(),
+            error_context(local_files_only=config.local_files_only),
+        ):
+            return _run_task(
+                args,
+                model=model,
+                messages=messages,
+                tools=tools,
+                generation_config=generation_config,
+                template_args=template_args,
+                stream_callback=stream_callback,
+                seed=seed,
+                dtype=dtype,
+                quantize_bits=quantize_bits,
+                config=config,
+                model_cache=model_cache,
+                trusted=trusted,
+            )
+
 
 def _run_task(
     args: models.GPTTaskArgs | None = None,
@@ -412,131 +641,105 @@ def _run_task(
     quantize_bits: Literal[4, 8] | None = None,
     config: Config | None = None,
     model_cache: ModelCache | None = None,
+    trusted: bool = False,
 ) -> Union[models.GPTTaskResponse, models.GPTTaskStreamResponse]:
-    from transformers import set_seed
-
     if config is None:
         config = get_config()
 
     if args is None:
-        args = models.GPTTaskArgs.model_validate(
-            {
-                "model": model,
-                "messages": messages,
-                "tools": tools,
-                "generation_config": generation_config,
-                "template_args": template_args,
-                "seed": seed,
-                "dtype": dtype,
-                "quantize_bits": quantize_bits,
-            }
+        args = bind_task_args(
+            trusted,
+            model=model,
+            messages=messages,
+            tools=tools,
+            generation_config=generation_config,
+            template_args=template_args,
+            seed=seed,
+            dtype=dtype,
+            quantize_bits=quantize_bits,
         )
+    record_task_args(args)
 
+    configure_task_log(config)
     _logger.info("Task starts")
-    _logger.info(f"task args: {args}")
+    _logger.info("task args: %s", loggable(args))
 
-    use_deterministic_mode()
+    draft_model_id = resolve_draft_model_id(config, args)
+    model_key = generate_model_key(args, draft_model=draft_model_id)
+    result_key = result_cache_key(
+        config,
+        args,
+        mode="device_map",
+        gpu_count=torch.cuda.device_count(),
+        model_key=model_key,
+        stream=stream_callback is not None,
+        draft_model=draft_model_id,
+    )
+    return cached_task_result(
+        config,
+        result_key,
+        stream_callback,
+        lambda callback: _execute_task(
+            args, callback, config, model_cache, draft_model_id, model_key
+        ),
+    )
 
-    set_seed(args.seed)
 
-    model_key = generate_model_key(args)
+def _execute_task(
+    args: models.GPTTaskArgs,
+    stream_callback: Callable[[models.GPTTaskStreamResponse], None] | None,
+    config: Config,
+    model_cache: ModelCache | None,
+    draft_model_id: str | None,
+    model_key: str,
+) -> Union[models.GPTTaskResponse, models.GPTTaskStreamResponse]:
+    from transformers import set_seed
 
-    def model_loader():
-        from transformers import AutoProcessor, pipeline
-
-        _logger.info("Start loading pipeline")
-
-        torch_dtype = None
-        if args.dtype == "float16":
-            torch_dtype = torch.float16
-        elif args.dtype == "float32":
-            torch_dtype = torch.float32
-        elif args.dtype == "bfloat16":
-            torch_dtype = torch.bfloat16
-
-        model_kwargs = load_model_kwargs(config=config)
-        local_files_only = config.local_files_only
-        _logger.debug(
-            f"model kwargs: {model_kwargs}, local_files_only: {local_files_only}"
-        )
+    use_deterministic_mode(config.determinism)
 
-        processor = AutoProcessor.from_pretrained(
-            args.model,
-            trust_remote_code=True,
-            local_files_only=local_files_only,
-            **model_kwargs,
-        )
+    set_seed(args.seed)
 
-        if args.quantize_bits == 4:
-            from transformers import BitsAndBytesConfig
-            model_kwargs["quantization_config"] = BitsAndBytesConfig(
-                load_in_4bit=True
-            )
-        elif args.quantize_bits == 8:
-            from transformers import BitsAndBytesConfig
-            model_kwargs["quantization_config"] = BitsAndBytesConfig(
-                load_in_8bit=True
+    get_pixel_cache(config)
+    get_preprocess_pool(config)
+    if contains_image_blocks(args.messages):
+        # Decode the images on the pool while the model loads.
+        prefetch_task_inputs(args)
+    memory_manager = get_memory_manager(config)
+    memory_manager.begin_task(model_key)
+    try:
+        with use_task_pipeline(
+            args, config, model_key, draft_model_id, model_cache
+        ) as (pipe, loaded):
+            return _generate(
+                args,
+                stream_callback,
+                config,
+                model_key,
+                draft_model_id,
+                memory_manager,
+                pipe,
+                loaded,
             )
+    finally:
+        # _generate ends the tasks it finishes, which makes this a no-op; a
+        # failed one still has to end so the trim policy runs.
+        memory_manager.end_task()
 
-        # CPU/disk offload is prohibited: CPU kernels differ numerically from
-        # GPU kernels, so offloaded layers would produce divergent results.
-        # With a zero CPU budget the device_map="auto" planner can only place
-        # overflow on disk, and without an offload_folder that load fails --
-        # a model that does not fit the visible GPUs never starts executing.
-        max_memory = get_max_memory()
-        max_memory["cpu"] = 0
-
-        try:
-            # local_files_only must be a top-level argument: transformers 5.x
-            # merges hub kwargs and model_kwargs when loading the config and
-            # weights, so putting it inside model_kwargs raises a duplicate
-            # keyword argument error.
-            pipe = pipeline(
-                task=None,
-                model=args.model,
-                processor=processor,
-                trust_remote_code=True,
-                device_map="auto",
-                dtype=torch_dtype,
-                local_files_only=local_files_only,
-                model_kwargs=dict(
-                    max_memory=max_memory,
-                    **model_kwargs,
-                ),
-            )
-        except ValueError as e:
-            if "offload" in str(e):
-                raise torch.cuda.OutOfMemoryError(
-                    "Model does not fit in the visible GPU memory"
-                ) from e
-            raise
-
-        # transformers 5.x forwards the top-level local_files_only into the
-        # pipeline constructor, where it ends up in the cached call parameters
-        # and later fails model.generate() as an unknown argument. Drop it
-        # from the cached parameter dicts.
-        for params in (
-            pipe._preprocess_params,
-            pipe._forward_params,
-            pipe._postprocess_params,
-        ):
-            params.pop("local_files_only", None)
-
-        configure_artifacts(
-            ModelAdapterContext(
-                config=pipe.model.config,
-                model=pipe.model,
-                processor=getattr(pipe, "processor", None),
-                tokenizer=_resolve_pipeline_tokenizer(pipe),
-            )
-        )
-        _logger.info("Loading pipeline completes")
-        return pipe
 
-    if model_cache is not None:
-        pipe = model_cache.load(model_key, model_loader)
-    else:
-        pipe = model_loader()
+def _generate(
+    args: models.GPTTaskArgs,
+    stream_callback: Callable[[models.GPTTaskStreamResponse], None] | None,
+    config: Config,
+    model_key: str,
+    draft_model_id: str | None,
+    memory_manager: GPUMemoryManager,
+    pipe: Any,
+    loaded: bool,
+) -> Union[models.GPTTaskResponse, models.GPTTaskStreamResponse]:
+    timer = get_task_timer()
+    if timer is not None:
+        timer.model_cache_hit = not loaded
+        timer.determinism = config.determinism
 
     set_execution_dtype(resolve_model_execution_dtype(pipe.model))
     tokenizer = _resolve_pipeline_tokenizer(pipe)
@@ -547,6 +750,11 @@ def _run_task(
     resolved_generation_config = resolve_generation_config(
         pipe.model.generation_config, args
     )
+    digest = task_logits_digest(args, resolved_generation_config)
+    processor_kwargs = add_sampler(
+        digest.generate_kwargs() if digest is not None else {},
+        task_sampler(args, resolved_generation_config),
+    )
 
     adapter_context = ModelAdapterContext(
         config=pipe.model.config,
@@ -554,143 +762,217 @@ def _run_task(
         processor=getattr(pipe, "processor", None),
         tokenizer=tokenizer,
     )
-    rendered_input = render_task_input(
-        adapter_context,
-        args,
-        pipe.model.device,
+    adapter_context = replace(
+        adapter_context, plan=get_adapter_plan(pipe, adapter_context)
     )
+    with (
+        use_vision_budget(resolve_vision_budget(args), node_vision_limits(config)),
+        task_stage("adapter_render"),
+    ):
+        rendered_input = render_task_input(
+            adapter_context,
+            args,
+            pipe.model.device,
+        )
     inputs = rendered_input.generation_input
     encoded_vlm = rendered_input.encoded
     if encoded_vlm is not None:
         input_tokens = _to_token_id_list(encoded_vlm.get("input_ids"))
         if input_tokens is None:
             raise RuntimeError("VLM processor did not produce input_ids.")
+        vision_tokens = count_vision_tokens(
+            pipe.model.config, encoded_vlm.get("input_ids")
+        )
+        check_vision_limit(
+            node_vision_limits(config), "max_vision_tokens", vision_tokens
+        )
+        # Images already encoded for an earlier turn reach generate() as
+        # cached encoder outputs instead of pixels.
+        encoded_vlm = encode_images_with_cache(
+            pipe.model,
+            model_key,
+            args,
+            encoded_vlm,
+            get_vision_embedding_cache(config),
+        )
     else:
-        input_tokens = _resolve_prompt_input_tokens(
-            pipe,
-            tokenizer,
-            inputs,
-            args.messages,
+        vision_tokens = None
+        with task_stage("tokenization"):
+            input_tokens = _resolve_prompt_input_tokens(
+                pipe,
+                tokenizer,
+                inputs,
+                args.messages,
+            )
+
+    # Assisted generation only covers text input: the draft is a causal LM
+    # and cannot consume the pixel inputs of a VLM prompt. A task that asks
+    # for prompt lookup decoding drafts from its own prompt instead, and a
+    # task that asks for a logits digest is decoded one token per step.
+    draft = None
+    if (
+        draft_model_id is not None
+        and encoded_vlm is None
+        and digest is None
+        and supports_assisted_generation(resolved_generation_config)
+        and getattr(resolved_generation_config, "prompt_lookup_num_tokens", None)
+        is None
+    ):
+        draft = get_draft_model(pipe)
+    generate_kwargs: Dict[str, Any] = dict(processor_kwargs)
+    if draft is not None:
+        generate_kwargs["assistant_model"] = draft
+    # Multi-sequence text tasks prefill the prompt once and fork the cache.
+    # The prompt is tokenized by the pipeline itself so the cache covers
+    # exactly the ids the pipeline passes to generate().
+    if (
+        encoded_vlm is None
+        and isinstance(inputs, str)
+        and shared_prefill_copies(resolved_generation_config) > 1
+    ):
+        with task_stage("prefill"), profiled_phase():
+            shared_cache = prefill_shared_prompt(
+                pipe.model,
+                pipe.preprocess(inputs, **pipe._preprocess_params),
+                resolved_generation_config,
+            )
+        if shared_cache is not None:
+            generate_kwargs["past_key_values"] = shared_cache
+    forward_modules = (pipe.model, draft) if draft is not None else ()
+
+    def record_speculative_stats(completion_tokens: int) -> None:
+        if draft is None:
+            return
+        target_counter, draft_counter = forward_counters
+        set_speculative_stats(
+            SpeculativeStats(
+                draft_model=draft_model_id,
+                completion_tokens=completion_tokens,
+                target_forward_passes=target_counter.count,
+                draft_forward_passes=draft_counter.count,
+            )
         )
 
-    _logger.debug(f"Generation config: {resolved_generation_config}")
-    _logger.debug(f"Input text: {inputs}")
+    _logger.debug("Generation config: %s", loggable(resolved_generation_config))
+    _logger.debug("Input text: %s", loggable(inputs))
 
     if stream_callback is not None:
         streamer = TokenStreamer(tokenizer, input_tokens, args.model, stream_callback)
+        streamer.vision_tokens = vision_tokens
+        streamer.logits_digest = digest
         resolved_generation_config.pad_token_id = tokenizer.eos_token_id
         resolved_generation_config.use_cache = True
 
         if encoded_vlm is not None:
-            with torch.no_grad():
+            with torch.no_grad(), generation_stages(pipe.model), profiled_phase():
                 pipe.model.generate(
                     **encoded_vlm,
                     generation_config=resolved_generation_config,
                     streamer=streamer,
+                    **processor_kwargs,
                 )
         else:
-            _invoke_pipeline(
-                pipe,
-                inputs,
-                resolved_generation_config,
-                streamer=streamer,
-            )
+            with (
+                count_forward_passes(*forward_modules) as forward_counters,
+                generation_stages(pipe.model),
+                profiled_phase(),
+            ):
+                _invoke_pipeline(
+                    pipe,
+                    inputs,
+                    resolved_generation_config,
+                    streamer=streamer,
+                    generate_kwargs=generate_kwargs,
+                )
+            record_speculative_stats(streamer.completion_tokens)
 
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        allocator_stats = memory_manager.end_task()
+        set_allocator_stats(allocator_stats)
+        finish_task_report(
+            streamer.prompt_tokens, streamer.completion_tokens, allocator_stats
+        )
 
         _logger.info("Text generation completes")
 
         # Return None since we're using callbacks instead of returning a generator
         return None
 
-    generations: List[Dict[str, Any]] = []
+    sequences: torch.Tensor | None = None
+    generated_texts: List[str] = []
     if encoded_vlm is not None:
         if resolved_generation_config.pad_token_id is None:
             resolved_generation_config.pad_token_id = tokenizer.eos_token_id
-        with torch.no_grad():
-            output = pipe.model.generate(
+        with torch.no_grad(), generation_stages(pipe.model), profiled_phase():
+            sequences = pipe.model.generate(
                 **encoded_vlm,
                 generation_config=resolved_generation_config,
+                **processor_kwargs,
             )
-        _logger.debug(f"Raw output: {output}")
-        for sequence in output.tolist():
-            generations.append(
-                {
-                    "token_ids": [int(token) for token in sequence],
-                    "generated_text": "",
-                }
-            )
+        _logger.debug("Raw output: %s", loggable(sequences))
     else:
-        output = _invoke_pipeline(
-            pipe,
-            inputs,
-            resolved_generation_config,
-            return_tensors=True,
-        )
+        with (
+            count_forward_passes(*forward_modules) as forward_counters,
+            generation_stages(pipe.model),
+            profiled_phase(),
+        ):
+            output = _invoke_pipeline(
+                pipe,
+                inputs,
+                resolved_generation_config,
+                return_tensors=True,
+                generate_kwargs=generate_kwargs,
+            )
         assert output is not None
         assert isinstance(output, list)
-        _logger.debug(f"Raw output: {output}")
-        for single in output:
-            assert isinstance(single, dict)
-            token_ids = _to_token_id_list(single.get("generated_token_ids"))
-            generated_text = _extract_generated_text(single.get("generated_text"))
-            generations.append(
-                {
-                    "token_ids": token_ids,
-                    "generated_text": generated_text,
-                }
-            )
-
-    assert len(generations) > 0
+        assert len(output) > 0
+        _logger.debug("Raw output: %s", loggable(output))
+        sequences = _stack_token_rows(
+            [single.get("generated_token_ids") for single in output]
+        )
+        if sequences is None:
+            generated_texts = [
+                _extract_generated_text(single.get("generated_text"))
+                for single in output
+            ]
+        del output
 
-    del output
+    del generate_kwargs
 
     prompt_tokens = len(input_tokens)
-    first_generation_tokens = generations[0].get("token_ids")
-    if isinstance(first_generation_tokens, list):
-        detected_prompt_tokens = _find_prompt_tokens(input_tokens, first_generation_tokens)
+    digests = None
+    if sequences is not None:
+        detected_prompt_tokens = find_prompt_end(input_tokens, sequences[0])
         if detected_prompt_tokens > 0:
             prompt_tokens = detected_prompt_tokens
+        with task_stage("detokenize"):
+            completions = decode_completions(
+                sequences, prompt_tokens, tokenizer, resolved_generation_config
+            )
+        output_texts = completions.texts
+        finish_reasons = completions.finish_reasons
+        completion_tokens = completions.completion_tokens
+        if digest is not None:
+            digests = digest.chains(completions.lengths)
+        del sequences
+    else:
+        output_texts = [text.strip() for text in generated_texts]
+        finish_reasons = ["length"] * len(generated_texts)
+        completion_tokens = sum(
+            len(tokenizer.encode(text, add_special_tokens=False))
+            for text in generated_texts
+        )
 
     del input_tokens
 
-    completion_tokens = 0
-    output_texts: List[str] = []
-    finish_reasons = []
-
-    for generation in generations:
-        token_ids = generation.get("token_ids")
-        generated_text = generation.get("generated_text", "")
-        if isinstance(token_ids, list):
-            # when the last token is eos token, finish reason is stop, otherwise is length
-            if token_ids[-1] == tokenizer.eos_token_id:
-                finish_reason = "stop"
-            else:
-                finish_reason = "length"
-            finish_reasons.append(finish_reason)
-
-            completion_tokens += max(len(token_ids) - prompt_tokens, 0)
-
-            text = tokenizer.decode(
-                token_ids[prompt_tokens:],
-                skip_special_tokens=True,
-                clean_up_tokenization_spaces=True,
-            ).strip()
-
-            output_texts.append(text)
-        else:
-            finish_reasons.append("length")
-            completion_tokens += len(
-                tokenizer.encode(generated_text, add_special_tokens=False)
-            )
-            output_texts.append(generated_text.strip())
+    record_speculative_stats(completion_tokens)
 
     usage: models.Usage = {
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "total_tokens": prompt_tokens + completion_tokens,
     }
+    if vision_tokens is not None:
+        usage["vision_tokens"] = vision_tokens
 
     choices: List[models.ResponseChoice] = []
     for i, (reason, text) in enumerate(zip(finish_reasons, output_texts)):
@@ -701,6 +983,8 @@ def _run_task(
                 "index": i,
             }
         )
+        if digests is not None:
+            choices[i]["logits_digest"] = digests[i]
 
     resp: models.GPTTaskResponse = {
         "model": args.model,
@@ -708,11 +992,10 @@ def _run_task(
         "usage": usage,
     }
 
-    del generations
-
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
+    allocator_stats = memory_manager.end_task()
+    set_allocator_stats(allocator_stats)
+    finish_task_report(prompt_tokens, completion_tokens, allocator_stats)
 
-    _logger.info(f"task response: {resp}")
+    _logger.info("task response: %s", loggable(resp))
     _logger.info("Text generation completes")
     return resp
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Mapping, Union
 
 import torch
 
@@ -30,14 +30,24 @@ def render_task_input(
     if contains_image_blocks(args.messages):
         if context.processor is None:
             raise RuntimeError("Image input requires a loaded processor.")
-        adapter = resolve_vision_input_adapter(context)
+        adapter = (
+            context.plan.vision_adapter
+            if context.plan is not None
+            else resolve_vision_input_adapter(context)
+        )
         encoded = adapter.render_input(context, args)
         return RenderedTaskInput(
-            generation_input=to_hf_chat_messages(args.messages),
+            # Only the encoded inputs reach generate(); in-process image
+            # sources are not read a second time for this copy.
+            generation_input=to_hf_chat_messages(args.messages, read_sources=False),
             encoded=_move_tensors_to_device(encoded, device),
         )
 
-    adapter = resolve_text_input_adapter(context)
+    adapter = (
+        context.plan.text_adapter
+        if context.plan is not None
+        else resolve_text_input_adapter(context)
+    )
     return RenderedTaskInput(
         generation_input=adapter.render_input(context, args),
         encoded=None,
@@ -59,10 +69,32 @@ def encode_rendered_task_input(
     return _move_tensors_to_device(encoded, device)
 
 
+# Host tensors at least this large (pixel values) are staged in pinned
+# memory and copied without blocking the task thread; small ones (token
+# ids read back with .tolist()) are copied synchronously.
+_PINNED_COPY_MIN_BYTES = 1 << 20
+
+
+def _tensor_to_device(value: torch.Tensor, device: Any) -> torch.Tensor:
+    target = torch.device(device)
+    if (
+        target.type == "cuda"
+        and value.device.type == "cpu"
+        and value.element_size() * value.nelement() >= _PINNED_COPY_MIN_BYTES
+        and torch.cuda.is_available()
+    ):
+        # The caching host allocator keeps the pinned buffer alive until the
+        # copy on the current stream has completed.
+        return value.pin_memory().to(target, non_blocking=True)
+    return value.to(target)
+
+
 def _move_tensors_to_device(value: Any, device: Any) -> Any:
     if torch.is_tensor(value):
-        return value.to(device)
-    if isinstance(value, dict):
+        return _tensor_to_device(value, device)
+    # Processor output (BatchFeature/BatchEncoding) is a Mapping but not a
+    # dict.
+    if isinstance(value, Mapping):
         return {
             key: _move_tensors_to_device(item, device)
             for key, item in value.items()
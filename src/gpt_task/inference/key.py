@@ -5,10 +5,14 @@ from typing import Any, Dict
 from gpt_task import models
 
 
-def generate_model_key(args: models.GPTTaskArgs) -> str:
+def generate_model_key(
+    args: models.GPTTaskArgs, draft_model: str | None = None
+) -> str:
     model_args: Dict[str, Any] = {"model": args.model, "dtype": args.dtype}
     if args.quantize_bits is not None:
         model_args["quantize_bits"] = args.quantize_bits
+    if draft_model is not None:
+        model_args["draft_model"] = draft_model
 
     model_args_str = json.dumps(
         model_args, ensure_ascii=False, separators=(",", ":"), sort_keys=True
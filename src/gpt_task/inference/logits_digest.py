@@ -0,0 +1,149 @@
+"""Per-step digest chain of the logits behind a completion.
+
+Comparing results across nodes by their decoded text says whether nodes
+agree, not where they diverged. A task with ``logits_digest=True`` also
+returns, per sequence, a chain of step digests: step ``t`` folds the
+quantized top-k logits the sequence's ``t``-th token was chosen from, and
+the chosen token, into the digest of step ``t - 1``. Two nodes agree up to
+the last equal step, so a validator compares the ``root`` and, on a
+mismatch, finds the first divergent step without exchanging any text.
+
+The logits are taken after the repetition and other processors and before
+the sampling warpers (temperature, top-k, top-p). Each of the ``TOP_K``
+largest is rounded to ``1 / SCALE``, so differences below that resolution
+do not change the digest unless they move a value across a rounding
+boundary or reorder the top-k.
+
+The chain is computed on the device inside ``generate()`` with integer
+arithmetic modulo a prime, two independent 31-bit lanes per sequence, so
+it is exact on every device and needs no host sync per step. The chain is
+copied to the host once after generation; ``root`` is the SHA-256 of the
+step digests.
+
+Beam search reorders rows between steps and is not supported; assisted
+generation is disabled for tasks that ask for a digest.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, List, Sequence
+
+import torch
+from transformers import (
+    LogitsProcessor,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+
+from gpt_task import models
+
+from .errors import TaskArgsInvalid
+
+TOP_K = 8
+SCALE = 16
+
+_PRIME = (1 << 31) - 1
+# Per-lane multipliers of the rolling hash and weights of the 2 * TOP_K
+# values (indices, then quantized logits) folded per step.
+_MULTIPLIERS = (48271, 69621)
+_WEIGHTS = (
+    tuple(pow(7, 2 * i + 1, _PRIME) for i in range(2 * TOP_K)),
+    tuple(pow(5, 2 * i + 1, _PRIME) for i in range(2 * TOP_K)),
+)
+
+
+class _DigestProcessor(LogitsProcessor):
+    def __init__(self, digest: "LogitsDigest") -> None:
+        self._digest = digest
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor):
+        self._digest._fold_scores(scores)
+        return scores
+
+
+class _DigestCriteria(StoppingCriteria):
+    def __init__(self, digest: "LogitsDigest") -> None:
+        self._digest = digest
+
+    def __call__(self, input_ids: torch.LongTensor, scores: Any, **kwargs: Any):
+        self._digest._fold_tokens(input_ids[:, -1])
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class LogitsDigest:
+    """Digest chain of one ``generate()`` call, one chain per row."""
+
+    def __init__(self) -> None:
+        self._state: torch.Tensor | None = None
+        self._weights: torch.Tensor | None = None
+        self._multipliers: torch.Tensor | None = None
+        self._steps: List[torch.Tensor] = []
+
+    def generate_kwargs(self) -> Dict[str, Any]:
+        """Arguments that make ``generate()`` compute the chain."""
+        return {
+            "logits_processor": LogitsProcessorList([_DigestProcessor(self)]),
+            "stopping_criteria": StoppingCriteriaList([_DigestCriteria(self)]),
+        }
+
+    def _fold(self, values: torch.Tensor) -> None:
+        # values: (rows, lanes) residues modulo the prime.
+        state = self._state
+        assert state is not None and self._multipliers is not None
+        self._state = (state * self._multipliers + values) % _PRIME
+
+    def _fold_scores(self, scores: torch.Tensor) -> None:
+        device = scores.device
+        if self._state is None:
+            self._state = torch.zeros((scores.shape[0], 2), dtype=torch.long, device=device)
+            self._weights = torch.tensor(_WEIGHTS, dtype=torch.long, device=device).T
+            self._multipliers = torch.tensor(_MULTIPLIERS, dtype=torch.long, device=device)
+        values, indices = scores.float().topk(min(TOP_K, scores.shape[-1]), dim=-1)
+        quantized = torch.round(
+            values.nan_to_num(nan=0.0, posinf=1e6, neginf=-1e6).clamp(-1e6, 1e6) * SCALE
+        ).long()
+        folded = torch.cat([indices, quantized], dim=-1) % _PRIME
+        weights = self._weights[: folded.shape[-1]]
+        # Each product stays below 2**62; reducing it first keeps the sum
+        # of 2 * TOP_K terms within int64.
+        terms = (folded[:, :, None] * weights[None]) % _PRIME
+        self._fold(terms.sum(1) % _PRIME)
+
+    def _fold_tokens(self, tokens: torch.Tensor) -> None:
+        if self._state is None:
+            return
+        self._fold(tokens.long()[:, None].expand(-1, 2) % _PRIME)
+        self._steps.append(self._state)
+
+    def chains(self, lengths: Sequence[int]) -> List[models.LogitsDigest]:
+        """The chains of the first ``len(lengths)`` rows, each cut to the
+        row's completion length."""
+        if not self._steps:
+            steps: List[List[List[int]]] = [[] for _ in lengths]
+        else:
+            steps = torch.stack(self._steps, dim=1).cpu().tolist()
+        digests: List[models.LogitsDigest] = []
+        for row, length in enumerate(lengths):
+            chain = [f"{first:08x}{second:08x}" for first, second in steps[row][:length]]
+            digests.append(
+                {
+                    "root": hashlib.sha256("".join(chain).encode("ascii")).hexdigest(),
+                    "steps": chain,
+                }
+            )
+        return digests
+
+
+def task_logits_digest(
+    args: models.GPTTaskArgs, generation_config: Any
+) -> LogitsDigest | None:
+    """The digest of a task that asks for one. Prompt lookup decoding is
+    turned off for it, since drafted tokens are accepted several per step."""
+    if not args.logits_digest:
+        return None
+    if (getattr(generation_config, "num_beams", None) or 1) > 1:
+        raise TaskArgsInvalid("logits_digest does not support beam search")
+    generation_config.prompt_lookup_num_tokens = None
+    return LogitsDigest()
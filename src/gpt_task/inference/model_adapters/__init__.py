@@ -1,3 +1,15 @@
 from .context import ModelAdapterContext
+from .plan import (
+    ModelAdapterPlan,
+    attach_adapter_plan,
+    build_adapter_plan,
+    get_adapter_plan,
+)
 
-__all__ = ["ModelAdapterContext"]
+__all__ = [
+    "ModelAdapterContext",
+    "ModelAdapterPlan",
+    "attach_adapter_plan",
+    "build_adapter_plan",
+    "get_adapter_plan",
+]
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from ..context import ModelAdapterContext
+from ..input.vision.pixel_cache import install_pixel_cache
 
 
 class StandardArtifactAdapter:
@@ -8,4 +9,4 @@ class StandardArtifactAdapter:
         return True
 
     def configure(self, context: ModelAdapterContext) -> None:
-        return None
+        install_pixel_cache(context.processor)
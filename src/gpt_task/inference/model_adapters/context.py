@@ -10,3 +10,6 @@ class ModelAdapterContext:
     model: Any = None
     processor: Any = None
     tokenizer: Any = None
+    # ModelAdapterPlan of the loaded model; adapters resolve what it holds
+    # on the fly when it is None.
+    plan: Any = None
@@ -1,11 +1,13 @@
 from .utils import (
     contains_image_blocks,
     content_to_text,
+    image_blocks,
     to_hf_chat_messages,
 )
 
 __all__ = [
     "contains_image_blocks",
     "content_to_text",
+    "image_blocks",
     "to_hf_chat_messages",
 ]
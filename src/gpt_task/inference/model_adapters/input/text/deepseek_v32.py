@@ -1,17 +1,25 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import threading
+from typing import Any, Dict, List, Tuple
 
 from gpt_task import models
 
 from ...context import ModelAdapterContext
-from ....prompt_adapters.encoding_dsv32 import encode_messages
+from ....prompt_adapters.encoding_dsv32 import IncrementalEncoder
 from ..utils import copy_messages, copy_tools
 
 _MODEL_TYPE = "deepseek_v32"
 
 
 class DeepSeekV32TextInputAdapter:
+    def __init__(self) -> None:
+        # Agent traces resend the whole history every turn; one encoder per
+        # option set re-renders only the messages that changed since the
+        # previous request.
+        self._encoders: Dict[Tuple[str, bool, bool], IncrementalEncoder] = {}
+        self._lock = threading.Lock()
+
     def matches(self, context: ModelAdapterContext) -> bool:
         return getattr(context.config, "model_type", None) == _MODEL_TYPE
 
@@ -27,7 +35,19 @@ class DeepSeekV32TextInputAdapter:
 
         encode_kwargs = _build_encode_kwargs(args.template_args, chats)
         try:
-            return encode_messages(chats, **encode_kwargs)
+            key = (
+                encode_kwargs["thinking_mode"],
+                bool(encode_kwargs["drop_thinking"]),
+                bool(encode_kwargs["add_default_bos_token"]),
+            )
+            with self._lock:
+                encoder = self._encoders.get(key)
+                if encoder is None:
+                    encoder = IncrementalEncoder(*key)
+                    self._encoders[key] = encoder
+                return encoder.encode_messages(
+                    chats, context=encode_kwargs["context"]
+                )
         except TypeError as exc:
             raise RuntimeError(
                 "DeepSeek-V3.2 official encoder received unsupported template args. "
@@ -32,4 +32,9 @@ class TemplateTextInputAdapter:
             chats=chats,
             template_args=template_args,
             optional_args=args.template_args,
+            accepted=(
+                context.plan.tokenizer_template_kwargs
+                if context.plan is not None
+                else None
+            ),
         )
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Set
 
 from gpt_task import models
+from gpt_task.models.images import load_image_source
 
 
 def copy_messages(messages: List[models.Message]) -> List[Dict[str, Any]]:
@@ -22,12 +25,68 @@ def copy_tools(tools: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str,
     return [dict(**tool) for tool in tools]
 
 
+@dataclass(frozen=True)
+class AcceptedKwargs:
+    """Keyword arguments a callable accepts, read once from its signature.
+    ``names`` is None when it takes arbitrary keyword arguments."""
+
+    names: FrozenSet[str] | None
+    # Optional args a callable taking arbitrary keyword arguments raised
+    # TypeError for, learned on first use so later calls skip them.
+    rejected: Set[str] = field(default_factory=set, compare=False)
+
+    @classmethod
+    def of(cls, callable_obj: Any) -> AcceptedKwargs | None:
+        """None when the callable has no inspectable signature."""
+        try:
+            signature = inspect.signature(callable_obj)
+        except (TypeError, ValueError):
+            return None
+        parameters = signature.parameters.values()
+        if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters):
+            return cls(names=None)
+        return cls(
+            names=frozenset(
+                p.name
+                for p in parameters
+                if p.kind
+                in (
+                    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                    inspect.Parameter.KEYWORD_ONLY,
+                )
+            )
+        )
+
+    def filter(self, kwargs: Mapping[str, Any]) -> Dict[str, Any]:
+        if self.names is None:
+            return {
+                key: value for key, value in kwargs.items() if key not in self.rejected
+            }
+        return {key: value for key, value in kwargs.items() if key in self.names}
+
+
 def apply_chat_template(
     tokenizer: Any,
     chats: List[Dict[str, Any]],
     template_args: Dict[str, Any],
     optional_args: Optional[Dict[str, Any]] = None,
+    accepted: AcceptedKwargs | None = None,
 ) -> str:
+    """Render ``chats`` with ``template_args`` plus the ``optional_args``
+    the template accepts. When the model's adapter plan lists the accepted
+    names this is a single call. Otherwise, including for the
+    ``**kwargs`` signature of every HF tokenizer, unsupported optional
+    args are found by retrying on TypeError; the plan keeps the ones found,
+    so a model retries once per rejected arg rather than once per
+    request."""
+    if accepted is not None and accepted.names is not None:
+        merged_args = dict(template_args)
+        if optional_args:
+            merged_args.update(accepted.filter(optional_args))
+        return tokenizer.apply_chat_template(chats, **merged_args)
+
+    if optional_args and accepted is not None:
+        optional_args = accepted.filter(optional_args)
     merged_args = dict(template_args)
     if optional_args:
         merged_args.update(optional_args)
@@ -38,15 +97,21 @@ def apply_chat_template(
         if not optional_args:
             raise
 
+    # Probe every optional arg, so all the rejected ones are learned.
     retry_args = dict(template_args)
+    rendered = None
     for key, value in optional_args.items():
         retry_args[key] = value
         try:
-            return tokenizer.apply_chat_template(chats, **retry_args)
+            rendered = tokenizer.apply_chat_template(chats, **retry_args)
         except TypeError:
             retry_args.pop(key, None)
+            if accepted is not None:
+                accepted.rejected.add(key)
 
-    return tokenizer.apply_chat_template(chats, **template_args)
+    if rendered is None:
+        return tokenizer.apply_chat_template(chats, **template_args)
+    return rendered
 
 
 def content_to_text(content: models.MessageContent | None) -> str:
@@ -76,27 +141,53 @@ def contains_image_blocks(messages: List[models.Message]) -> bool:
     )
 
 
-def to_hf_chat_messages(messages: List[models.Message]) -> List[Dict[str, Any]]:
+def image_blocks(messages: List[models.Message]) -> List[Dict[str, Any]]:
+    """Image content blocks of the messages in prompt order."""
+    return [
+        block
+        for message in messages
+        for block in (
+            message.get("content")
+            if isinstance(message.get("content"), list)
+            else []
+        )
+        if block.get("type") == "image"
+    ]
+
+
+def to_hf_chat_messages(
+    messages: List[models.Message],
+    read_sources: bool = True,
+) -> List[Dict[str, Any]]:
+    """Convert messages to transformers chat blocks. With ``read_sources``
+    false, in-process image sources are copied as-is instead of read."""
     hf_messages: List[Dict[str, Any]] = []
     for message in messages:
         mapped: Dict[str, Any] = dict(message)
         content = message.get("content")
         if isinstance(content, list):
-            mapped["content"] = _to_hf_content_blocks(content)
+            mapped["content"] = _to_hf_content_blocks(content, read_sources)
         hf_messages.append(mapped)
     return hf_messages
 
 
 def _to_hf_content_blocks(
     blocks: List[models.MessageContentBlock],
+    read_sources: bool,
 ) -> List[Dict[str, Any]]:
     hf_blocks: List[Dict[str, Any]] = []
     for block in blocks:
         block_type = block.get("type")
         if block_type == "text":
             hf_blocks.append({"type": "text", "text": block.get("text", "")})
-        elif block_type == "image":
+        elif block_type == "image" and "base64" in block:
             hf_blocks.append({"type": "image", "base64": block["base64"]})
+        elif block_type == "image" and not read_sources:
+            hf_blocks.append(dict(block))
+        elif block_type == "image":
+            # In-process sources are read here and reach the processor as
+            # bytes, which the pixel cache decodes.
+            hf_blocks.append({"type": "image", "image": load_image_source(block)})
         else:
             raise RuntimeError(f"Unsupported content block type: {block_type}")
     return hf_blocks
@@ -0,0 +1,199 @@
+"""Visual token budget.
+
+Dynamic-resolution processors turn a large image into thousands of vision
+tokens, and tiling processors into many tiles. The budget caps the pixels
+per image, the tiles per image and the vision tokens per request. It is
+applied before image processing, from the image sizes and the processor
+configuration only, so every node that runs a task makes the same choice:
+
+- ``max_pixels`` downscales each larger image to fit.
+- ``max_vision_tokens`` downscales all images of a request by the same
+  factor when the processor exposes its patch grid (``patch_size`` and
+  ``merge_size``); sizes are floored to whole merged patches, so the token
+  count never exceeds the budget. For tiling processors it lowers the
+  tile limit instead.
+- ``max_tiles`` lowers the tile limit (``max_patches``) of tiling
+  processors. Processors that do not tile ignore it.
+
+The budget comes from the task alone. The node's ``Config.vision`` limits
+never change the pixels a task feeds the model, which would make nodes
+with different configs disagree on the same task; a task beyond them is
+rejected with ``TaskArgsInvalid`` instead.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import math
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Any, Iterator, List, Sequence, Tuple
+
+import torch
+
+from gpt_task import models
+from gpt_task.config import Config
+
+from ....errors import TaskArgsInvalid
+
+
+@dataclass(frozen=True)
+class VisionBudget:
+    max_pixels: int | None = None
+    max_tiles: int | None = None
+    max_vision_tokens: int | None = None
+
+    @property
+    def bounded(self) -> bool:
+        return any(getattr(self, field.name) is not None for field in fields(self))
+
+
+def resolve_vision_budget(args: models.GPTTaskArgs) -> VisionBudget:
+    """The task's own budget."""
+    requested = args.vision_budget or {}
+    return VisionBudget(
+        max_pixels=requested.get("max_pixels"),
+        max_tiles=requested.get("max_tiles"),
+        max_vision_tokens=requested.get("max_vision_tokens"),
+    )
+
+
+def node_vision_limits(config: Config) -> VisionBudget:
+    """The node's limits. Tasks beyond them are rejected, not downscaled."""
+    return VisionBudget(
+        max_pixels=config.vision.max_pixels,
+        max_tiles=config.vision.max_tiles,
+        max_vision_tokens=config.vision.max_vision_tokens,
+    )
+
+
+def check_vision_limit(limits: VisionBudget | None, name: str, value: int | None) -> None:
+    """Raise TaskArgsInvalid when ``value`` exceeds the node limit ``name``."""
+    limit = getattr(limits, name) if limits is not None else None
+    if limit is not None and value is not None and value > limit:
+        raise TaskArgsInvalid(
+            f"Task needs {name}={value} after its vision budget, over the node "
+            f"limit of {limit}."
+        )
+
+
+_budget: contextvars.ContextVar[VisionBudget | None] = contextvars.ContextVar(
+    "gpt_task_vision_budget", default=None
+)
+_limits: contextvars.ContextVar[VisionBudget | None] = contextvars.ContextVar(
+    "gpt_task_vision_limits", default=None
+)
+
+
+@contextmanager
+def use_vision_budget(
+    budget: VisionBudget, limits: VisionBudget | None = None
+) -> Iterator[None]:
+    """Apply ``budget`` to the processor calls made inside the block and
+    reject images that still exceed the node ``limits``."""
+    token = _budget.set(budget if budget.bounded else None)
+    limits_token = _limits.set(limits if limits is not None and limits.bounded else None)
+    try:
+        yield
+    finally:
+        _limits.reset(limits_token)
+        _budget.reset(token)
+
+
+def current_vision_budget() -> VisionBudget | None:
+    return _budget.get()
+
+
+def current_vision_limits() -> VisionBudget | None:
+    return _limits.get()
+
+
+def _patch_factor(image_processor: Any) -> int | None:
+    patch_size = getattr(image_processor, "patch_size", None)
+    merge_size = getattr(image_processor, "merge_size", None)
+    if isinstance(patch_size, int) and isinstance(merge_size, int):
+        return patch_size * merge_size
+    return None
+
+
+def target_sizes(
+    sizes: Sequence[Tuple[int, int]],
+    budget: VisionBudget,
+    image_processor: Any,
+) -> List[Tuple[int, int]]:
+    """Return the (width, height) each image is downscaled to. Images
+    within budget keep their size."""
+    scales = [1.0] * len(sizes)
+    if budget.max_pixels is not None:
+        scales = [
+            min(scale, math.sqrt(budget.max_pixels / (width * height)))
+            for scale, (width, height) in zip(scales, sizes)
+        ]
+
+    factor = _patch_factor(image_processor)
+    snap_all = False
+    if budget.max_vision_tokens is not None and factor is not None:
+        max_area = budget.max_vision_tokens * factor * factor
+        area = sum(
+            (width * scale) * (height * scale)
+            for scale, (width, height) in zip(scales, sizes)
+        )
+        if area > max_area:
+            shrink = math.sqrt(max_area / area)
+            scales = [scale * shrink for scale in scales]
+        # The processor rounds sizes to whole merged patches, possibly up;
+        # snap every image down when that could overshoot the budget.
+        rounded_up = sum(
+            math.ceil(width * min(scale, 1.0) / factor)
+            * math.ceil(height * min(scale, 1.0) / factor)
+            for scale, (width, height) in zip(scales, sizes)
+        )
+        snap_all = rounded_up > budget.max_vision_tokens
+
+    targets: List[Tuple[int, int]] = []
+    for scale, (width, height) in zip(scales, sizes):
+        if scale >= 1.0 and not snap_all:
+            targets.append((width, height))
+            continue
+        scale = min(scale, 1.0)
+        target_width = max(1, math.floor(width * scale))
+        target_height = max(1, math.floor(height * scale))
+        if factor is not None:
+            # Whole merged patches: the processor keeps these sizes as they
+            # are instead of rounding them up.
+            target_width = max(factor, target_width // factor * factor)
+            target_height = max(factor, target_height // factor * factor)
+        targets.append((target_width, target_height))
+    return targets
+
+
+def tile_limit(
+    budget: VisionBudget,
+    processor: Any,
+    num_images: int,
+) -> int | None:
+    """Tile limit per image for tiling image processors, or None when the
+    processor does not tile or the budget does not constrain tiles."""
+    image_processor = getattr(processor, "image_processor", None)
+    current = getattr(image_processor, "max_patches", None)
+    if not isinstance(current, int) or num_images <= 0:
+        return None
+    limit = current
+    if budget.max_tiles is not None:
+        limit = min(limit, budget.max_tiles)
+    tokens_per_tile = getattr(processor, "image_seq_length", None)
+    if budget.max_vision_tokens is not None and isinstance(tokens_per_tile, int):
+        limit = min(limit, budget.max_vision_tokens // (tokens_per_tile * num_images))
+    limit = max(limit, 1)
+    return limit if limit < current else None
+
+
+def count_vision_tokens(model_config: Any, input_ids: Any) -> int | None:
+    """Number of image placeholder tokens in the prompt, or None when the
+    model does not declare its image token."""
+    token_id = getattr(model_config, "image_token_id", None)
+    if token_id is None:
+        token_id = getattr(model_config, "image_token_index", None)
+    if not isinstance(token_id, int) or not torch.is_tensor(input_ids):
+        return None
+    return int((input_ids == token_id).sum().item())
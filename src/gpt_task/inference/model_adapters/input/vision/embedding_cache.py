@@ -0,0 +1,371 @@
+"""Cache of vision encoder outputs for multi-turn chats.
+
+Every turn of a multi-turn VLM chat resends the images of the earlier
+turns, and ``generate()`` runs the vision encoder over all of them again.
+Transformers lets a model receive precomputed encoder outputs through the
+``mm_encoder_outputs`` generate kwarg instead of pixel inputs. The cache
+keeps the encoder output of each image keyed by (model key, image content
+hash, per-image encoder inputs), encodes only the images it has not seen
+and hands the assembled output to ``generate()``.
+
+Encoder outputs follow the transformers layout: ``pooler_output`` holds
+one entry per image and ``deepstack_features``, when present, holds one
+feature tensor per layer. The model forward only reads those fields, so
+the assembled output carries nothing else. Encoder inputs are split per
+image for the two layouts processors produce: one leading row per image,
+or patch rows counted by ``image_grid_thw``. Other layouts encode every
+image of a request on a miss and are served from the cache once all of
+their images are cached.
+
+Entries live on the device of the vision encoder. They are dropped when a
+different model is loaded and released to the VRAM arbiter like any other
+resident LLM state.
+"""
+
+from __future__ import annotations
+
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Sequence, Tuple
+
+import torch
+
+from gpt_task import models
+from gpt_task.cache.residency import get_vram_arbiter
+from gpt_task.config import Config, VisionConfig
+from gpt_task.models.images import load_image_source
+
+from ..utils import image_blocks
+
+_logger = logging.getLogger(__name__)
+
+# Main input names of image encoders (fuyu uses image_patches).
+_PIXEL_KEYS = ("pixel_values", "pixel_values_images", "image_patches")
+
+
+@dataclass(frozen=True)
+class _ImageEntry:
+    """Encoder output of one image and the layout of the output it was
+    split from."""
+
+    pooled: Any
+    deepstack: List[Any] | None
+    output_type: type
+    stacked: bool
+    deepstack_stacked: bool
+
+    @property
+    def nbytes(self) -> int:
+        return _nbytes(self.pooled) + _nbytes(self.deepstack)
+
+
+class VisionEmbeddingCache:
+    """Byte-bounded LRU of per-image vision encoder outputs."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[Hashable, Tuple[_ImageEntry, int]]" = OrderedDict()
+        self._last_used: Dict[Hashable, float] = {}
+        self._size = 0
+        self._model_key: str | None = None
+        get_vram_arbiter().register(self)
+
+    def get(self, key: Hashable) -> _ImageEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._last_used[key] = self._clock()
+            return entry[0]
+
+    def put(self, key: Hashable, value: _ImageEntry, nbytes: int) -> None:
+        with self._lock:
+            if key in self._entries or nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._last_used[key] = self._clock()
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                self._evict_lru()
+
+    def use_model(self, model_key: str) -> None:
+        """Drop the entries of other models: their embeddings are useless
+        once the model is unloaded and only hold device memory."""
+        with self._lock:
+            if self._model_key != model_key:
+                self.clear()
+                self._model_key = model_key
+
+    def _evict_lru(self) -> None:
+        key, (_, nbytes) = self._entries.popitem(last=False)
+        self._last_used.pop(key, None)
+        self._size -= nbytes
+
+    def idle_since(self) -> float | None:
+        with self._lock:
+            if not self._entries:
+                return None
+            return self._last_used[next(iter(self._entries))]
+
+    def release_lru(self) -> bool:
+        with self._lock:
+            if not self._entries:
+                return False
+            self._evict_lru()
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._last_used.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_cache_lock = threading.Lock()
+_cache = VisionEmbeddingCache(VisionConfig().embedding_cache_bytes)
+
+
+def get_vision_embedding_cache(config: Config | None = None) -> VisionEmbeddingCache:
+    """Return the process embedding cache, rebuilt when the configured
+    budget changes."""
+    global _cache
+
+    with _cache_lock:
+        if (
+            config is not None
+            and config.vision.embedding_cache_bytes != _cache.max_bytes
+        ):
+            get_vram_arbiter().unregister(_cache)
+            _cache = VisionEmbeddingCache(config.vision.embedding_cache_bytes)
+        return _cache
+
+
+def _image_digests(messages: Sequence[models.Message]) -> List[str]:
+    return [load_image_source(block).digest for block in image_blocks(messages)]
+
+
+def _nbytes(value: Any) -> int:
+    if torch.is_tensor(value):
+        return value.element_size() * value.nelement()
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+def _input_fingerprint(value: Any) -> Hashable:
+    # Pixel tensors are identified by the image hash; small side inputs
+    # (grids, sizes) are part of the key by value.
+    if torch.is_tensor(value):
+        if value.nelement() <= 64 and not value.is_floating_point():
+            return ("tensor", tuple(value.reshape(-1).tolist()), tuple(value.shape))
+        return ("tensor", str(value.dtype), tuple(value.shape))
+    if isinstance(value, (bool, int, float, str, type(None))):
+        return value
+    return type(value).__name__
+
+
+def _split_encoder_inputs(
+    encoder_kwargs: Mapping[str, Any],
+    pixel_key: str,
+    num_images: int,
+) -> List[Dict[str, Any]] | None:
+    """Split the encoder inputs of a request into per-image inputs, or
+    return None when the layout is unknown."""
+    pixels = encoder_kwargs[pixel_key]
+    grid = encoder_kwargs.get("image_grid_thw")
+    if torch.is_tensor(grid) and grid.ndim == 2 and grid.shape[0] == num_images:
+        counts = [int(count) for count in grid.prod(-1).tolist()]
+        if sum(counts) != pixels.shape[0]:
+            return None
+        bounds = [0]
+        for count in counts:
+            bounds.append(bounds[-1] + count)
+        row_inputs = {pixel_key: [(bounds[i], bounds[i + 1]) for i in range(num_images)]}
+    elif pixels.shape[0] == num_images:
+        row_inputs = {pixel_key: [(i, i + 1) for i in range(num_images)]}
+    else:
+        return None
+
+    per_image: List[Dict[str, Any]] = [{} for _ in range(num_images)]
+    for name, value in encoder_kwargs.items():
+        ranges = row_inputs.get(name)
+        if ranges is None and torch.is_tensor(value) and value.ndim > 0:
+            if value.shape[0] != num_images:
+                return None
+            ranges = [(i, i + 1) for i in range(num_images)]
+        for index, inputs in enumerate(per_image):
+            if ranges is None:
+                inputs[name] = value
+            else:
+                start, end = ranges[index]
+                inputs[name] = value[start:end]
+    return per_image
+
+
+def _merge_encoder_inputs(per_image: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {}
+    for name, value in per_image[0].items():
+        if torch.is_tensor(value) and value.ndim > 0:
+            merged[name] = torch.cat([inputs[name] for inputs in per_image], dim=0)
+        else:
+            merged[name] = value
+    return merged
+
+
+def _split_encoder_output(output: Any, num_images: int) -> List[_ImageEntry] | None:
+    pooled = getattr(output, "pooler_output", None)
+    if pooled is None or len(pooled) != num_images:
+        return None
+    deepstack = getattr(output, "deepstack_features", None)
+    deepstack_stacked = bool(deepstack) and torch.is_tensor(deepstack[0])
+    layers: List[List[Any]] | None = None
+    if deepstack is not None:
+        layers = []
+        for feature in deepstack:
+            if torch.is_tensor(feature):
+                # One tensor per layer over the tokens of every image.
+                feature = torch.split(feature, [len(item) for item in pooled])
+            if len(feature) != num_images:
+                return None
+            layers.append(list(feature))
+    return [
+        _ImageEntry(
+            pooled=pooled[i],
+            deepstack=None if layers is None else [layer[i] for layer in layers],
+            output_type=type(output),
+            stacked=torch.is_tensor(pooled),
+            deepstack_stacked=deepstack_stacked,
+        )
+        for i in range(num_images)
+    ]
+
+
+def _assemble_output(entries: Sequence[_ImageEntry]) -> Any:
+    layout = entries[0]
+    pooled = [entry.pooled for entry in entries]
+    output = layout.output_type()
+    output.pooler_output = torch.stack(pooled, dim=0) if layout.stacked else pooled
+    if layout.deepstack is not None:
+        layers = zip(*(entry.deepstack for entry in entries))
+        if layout.deepstack_stacked:
+            output.deepstack_features = [torch.cat(layer, dim=0) for layer in layers]
+        else:
+            output.deepstack_features = [list(layer) for layer in layers]
+    return output
+
+
+def _image_encoder(model: Any) -> Callable[..., Any] | None:
+    supports = getattr(model, "_supports_mm_encoder_outputs", None)
+    if supports is None or not supports():
+        return None
+    if "image" not in getattr(model, "input_modalities", ()):
+        return None
+    return getattr(model.base_model, "get_image_features", None)
+
+
+def encode_images_with_cache(
+    model: Any,
+    model_key: str,
+    args: models.GPTTaskArgs,
+    encoded: Mapping[str, Any],
+    cache: VisionEmbeddingCache,
+) -> Mapping[str, Any]:
+    """Replace the pixel inputs of ``encoded`` with cached vision encoder
+    outputs, encoding only the images missing from the cache. Returns
+    ``encoded`` unchanged when the cache is disabled or the model does not
+    accept precomputed encoder outputs."""
+    if cache.max_bytes <= 0:
+        return encoded
+    encoder_fn = _image_encoder(model)
+    if encoder_fn is None:
+        return encoded
+    pixel_key = next(
+        (key for key in _PIXEL_KEYS if torch.is_tensor(encoded.get(key))), None
+    )
+    if pixel_key is None:
+        return encoded
+
+    digests = _image_digests(args.messages)
+    if not digests:
+        return encoded
+    encoder_kwargs = {
+        key: encoded[key]
+        for key in inspect.signature(encoder_fn).parameters
+        if key != "kwargs" and key in encoded
+    }
+    if pixel_key not in encoder_kwargs:
+        return encoded
+    per_image = _split_encoder_inputs(encoder_kwargs, pixel_key, len(digests))
+    cache.use_model(model_key)
+
+    if per_image is None:
+        keys = [
+            (model_key, digest, "request", _request_fingerprint(encoder_kwargs))
+            for digest in digests
+        ]
+    else:
+        keys = [
+            (
+                model_key,
+                digest,
+                tuple(
+                    (name, _input_fingerprint(value))
+                    for name, value in sorted(inputs.items())
+                ),
+            )
+            for digest, inputs in zip(digests, per_image)
+        ]
+
+    entries: List[_ImageEntry | None] = [cache.get(key) for key in keys]
+    missing = [index for index, entry in enumerate(entries) if entry is None]
+    if missing:
+        if per_image is None:
+            missing = list(range(len(digests)))
+            miss_kwargs = dict(encoder_kwargs)
+        else:
+            miss_kwargs = _merge_encoder_inputs([per_image[i] for i in missing])
+        with torch.no_grad():
+            output = encoder_fn(**miss_kwargs, return_dict=True)
+        new_entries = _split_encoder_output(output, len(missing))
+        del output
+        if new_entries is None:
+            _logger.debug("Vision encoder output layout is not cacheable")
+            return encoded
+        for index, entry in zip(missing, new_entries):
+            entries[index] = entry
+            cache.put(keys[index], entry, entry.nbytes)
+    _logger.debug(
+        "Vision embedding cache: %d of %d images encoded",
+        len(missing),
+        len(digests),
+    )
+
+    # A fresh output object per call: generate() expands it in place for
+    # multi-sequence tasks.
+    image_output = _assemble_output(entries)
+    result = {key: value for key, value in encoded.items() if key != pixel_key}
+    result["mm_encoder_outputs"] = {"image": image_output}
+    return result
+
+
+def _request_fingerprint(encoder_kwargs: Mapping[str, Any]) -> Hashable:
+    return tuple(
+        (name, _input_fingerprint(value))
+        for name, value in sorted(encoder_kwargs.items())
+    )
+
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import base64
 import copy
-import inspect
 from typing import Any, Dict, Mapping, Sequence
 
 from gpt_task import models
 
 from ...context import ModelAdapterContext
-from ..utils import apply_chat_template, copy_tools, to_hf_chat_messages
+from ..utils import (
+    AcceptedKwargs,
+    apply_chat_template,
+    copy_tools,
+    to_hf_chat_messages,
+)
 
 _MODEL_TYPE = "ernie4_5_moe_vl"
 
@@ -45,9 +50,19 @@ class ErnieVisionInputAdapter:
             chats=copy.deepcopy(messages),
             template_args=template_args,
             optional_args=dict(args.template_args or {}),
+            accepted=(
+                context.plan.processor_template_kwargs
+                if context.plan is not None
+                else None
+            ),
         )
         vision_info = process_vision_info(messages)
-        return _invoke_processor(processor, prompt, vision_info)
+        call_kwargs = (
+            context.plan.processor_call_kwargs
+            if context.plan is not None
+            else AcceptedKwargs.of(processor)
+        )
+        return _invoke_processor(processor, prompt, vision_info, call_kwargs)
 
 
 def _to_image_url_messages(
@@ -62,7 +77,7 @@ def _to_image_url_messages(
                 (
                     {
                         "type": "image_url",
-                        "image_url": {"url": block["base64"]},
+                        "image_url": {"url": _image_url(block)},
                     }
                     if block.get("type") == "image"
                     else dict(block)
@@ -73,35 +88,19 @@ def _to_image_url_messages(
     return transformed
 
 
-def _supported_kwargs(
-    callable_obj: Any,
-    kwargs: Mapping[str, Any],
-) -> Dict[str, Any]:
-    try:
-        signature = inspect.signature(callable_obj)
-    except (TypeError, ValueError):
-        return {}
-    if any(
-        parameter.kind == inspect.Parameter.VAR_KEYWORD
-        for parameter in signature.parameters.values()
-    ):
-        return dict(kwargs)
-    return {
-        key: value
-        for key, value in kwargs.items()
-        if key in signature.parameters
-        and signature.parameters[key].kind
-        in (
-            inspect.Parameter.POSITIONAL_OR_KEYWORD,
-            inspect.Parameter.KEYWORD_ONLY,
-        )
-    }
+def _image_url(block: Mapping[str, Any]) -> str:
+    if "base64" in block:
+        return block["base64"]
+    # The ERNIE processor loads images from URL strings only, so in-process
+    # sources are handed over base64 encoded.
+    return base64.b64encode(block["image"].data).decode()
 
 
 def _invoke_processor(
     processor: Any,
     prompt: str,
     vision_info: Any,
+    accepted: AcceptedKwargs | None,
 ) -> Dict[str, Any]:
     if isinstance(vision_info, Mapping):
         vision_kwargs = dict(vision_info)
@@ -120,7 +119,7 @@ def _invoke_processor(
         "padding": True,
         "return_tensors": "pt",
     }
-    supported = _supported_kwargs(processor, call_kwargs)
+    supported = accepted.filter(call_kwargs) if accepted is not None else {}
     if "text" in supported:
         return processor(**supported)
     return processor(prompt, **supported)
@@ -0,0 +1,410 @@
+"""Content-hash cache of decoded images and processed pixel inputs.
+
+Image sources reach the processor as base64 strings. The cache wraps the
+processor's image processor, replaces the sources with decoded images when
+the processor fetches them, reusing the payload decoded during argument
+validation, and keeps the image processor output keyed by (ordered image
+hashes, image processor config, call kwargs). A multi-turn chat that
+resends the same images skips both decoding and resizing; an image
+repeated inside one request is decoded once. The images of a call are
+decoded in parallel on the preprocessing pool.
+
+Splitting processor output per image is model specific, so processed
+pixels are cached for the ordered image set of a call rather than per
+image.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+import torch
+
+from gpt_task.config import Config, VisionConfig
+from gpt_task.models.images import DecodedImage, ImageSourceError, decode_image
+
+from .budget import (
+    VisionBudget,
+    check_vision_limit,
+    current_vision_budget,
+    current_vision_limits,
+    target_sizes,
+    tile_limit,
+)
+from .preprocess import get_preprocess_pool
+
+_SIMPLE_TYPES = (type(None), bool, int, float, str)
+
+
+class PixelCache:
+    """Byte-bounded LRU shared by decoded images and processed pixels."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        with self._lock:
+            if key in self._entries or nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._size -= evicted_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_cache_lock = threading.Lock()
+_cache = PixelCache(VisionConfig().pixel_cache_bytes)
+
+
+def get_pixel_cache(config: Config | None = None) -> PixelCache:
+    """Return the process pixel cache, rebuilt when the configured budget
+    changes."""
+    global _cache
+
+    with _cache_lock:
+        if config is not None and config.vision.pixel_cache_bytes != _cache.max_bytes:
+            _cache = PixelCache(config.vision.pixel_cache_bytes)
+        return _cache
+
+
+def _load_image(decoded: DecodedImage) -> Any:
+    from PIL import Image
+    from transformers.image_utils import load_image
+
+    # Same conversion as transformers' own base64 loading: EXIF transpose
+    # and RGB conversion.
+    try:
+        return load_image(Image.open(io.BytesIO(decoded.data)))
+    except (OSError, ValueError) as exc:
+        # PIL's UnidentifiedImageError and truncated-file errors are OSErrors.
+        raise ImageSourceError("Image source is not a decodable image.") from exc
+
+
+def _image_nbytes(image: Any) -> int:
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+def _value_nbytes(value: Any) -> int:
+    if torch.is_tensor(value):
+        return value.element_size() * value.nelement()
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_value_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_value_nbytes(item) for item in value.values())
+    return 0
+
+
+# Digests of the images decoded for the processor call in progress on this
+# thread; the image processor fetches and processes them back to back
+# inside one processor __call__.
+_local = threading.local()
+
+
+def load_images(
+    sources: Sequence[DecodedImage],
+    cache: PixelCache,
+) -> Dict[str, Any]:
+    """Return the decoded image of every source keyed by digest. Images
+    missing from the cache are decoded on the preprocessing pool."""
+    images: Dict[str, Any] = {}
+    pending: Dict[str, DecodedImage] = {}
+    for source in sources:
+        if source.digest in images or source.digest in pending:
+            continue
+        image = cache.get(("image", source.digest))
+        if image is None:
+            pending[source.digest] = source
+        else:
+            images[source.digest] = image
+    loaded = get_preprocess_pool().map(_load_image, list(pending.values()))
+    for digest, image in zip(pending, loaded):
+        cache.put(("image", digest), image, _image_nbytes(image))
+        images[digest] = image
+    return images
+
+
+def _as_source(image: Any, include_base64: bool) -> DecodedImage | None:
+    if isinstance(image, DecodedImage):
+        return image
+    if include_base64 and isinstance(image, str):
+        try:
+            return decode_image(image)
+        except ValueError:
+            # Not a base64 payload (URL or path): let transformers fetch it.
+            return None
+    return None
+
+
+def _collect_sources(
+    images: Any,
+    sources: List[DecodedImage],
+    include_base64: bool,
+) -> None:
+    if isinstance(images, (list, tuple)):
+        for item in images:
+            _collect_sources(item, sources, include_base64)
+        return
+    source = _as_source(images, include_base64)
+    if source is not None:
+        sources.append(source)
+
+
+def _replace_sources(
+    images: Any,
+    decoded: Dict[str, Any],
+    digests: Dict[int, str],
+    include_base64: bool,
+) -> Any:
+    if isinstance(images, (list, tuple)):
+        return [
+            _replace_sources(item, decoded, digests, include_base64)
+            for item in images
+        ]
+    source = _as_source(images, include_base64)
+    if source is None:
+        return images
+    image = decoded[source.digest]
+    digests[id(image)] = source.digest
+    return image
+
+
+def _decode_sources(
+    images: Any,
+    cache: PixelCache,
+    digests: Dict[int, str],
+    include_base64: bool | None = None,
+) -> Any:
+    # In-process sources arrive as raw bytes and are always decoded here;
+    # base64 strings are left to transformers when the cache is disabled.
+    if include_base64 is None:
+        include_base64 = cache.max_bytes > 0
+    sources: List[DecodedImage] = []
+    _collect_sources(images, sources, include_base64)
+    if not sources:
+        return images
+    decoded = load_images(sources, cache)
+    return _replace_sources(images, decoded, digests, include_base64)
+
+
+def _flatten(images: Any) -> List[Any]:
+    if isinstance(images, (list, tuple)):
+        return [image for item in images for image in _flatten(item)]
+    return [images]
+
+
+def _resize_image(image: Any, size: Tuple[int, int]) -> Any:
+    from PIL import Image
+
+    return image.resize(size, Image.Resampling.BICUBIC)
+
+
+def _apply_budget(
+    images: Any,
+    budget: VisionBudget,
+    image_processor: Any,
+    cache: PixelCache,
+    digests: Dict[int, str],
+) -> Any:
+    flat = [image for image in _flatten(images) if id(image) in digests]
+    if not flat:
+        return images
+    targets = target_sizes([image.size for image in flat], budget, image_processor)
+    scaled: Dict[int, Any] = {}
+    for image, target in zip(flat, targets):
+        if target == tuple(image.size) or id(image) in scaled:
+            continue
+        digest = digests[id(image)]
+        key = ("scaled", digest, target)
+        resized = cache.get(key)
+        if resized is None:
+            resized = _resize_image(image, target)
+            cache.put(key, resized, _image_nbytes(resized))
+        digests[id(resized)] = f"{digest}@{target[0]}x{target[1]}"
+        scaled[id(image)] = resized
+    if not scaled:
+        return images
+
+    def replace(value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return [replace(item) for item in value]
+        return scaled.get(id(value), value)
+
+    return replace(images)
+
+
+def load_message_images(messages: List[Dict[str, Any]]) -> None:
+    """Decode the raw image sources of chat messages in place, for
+    processors without the hooks the pixel cache installs into."""
+    blocks = [
+        block
+        for message in messages
+        if isinstance(message.get("content"), list)
+        for block in message["content"]
+        if isinstance(block.get("image"), DecodedImage)
+    ]
+    if not blocks:
+        return
+    decoded = load_images([block["image"] for block in blocks], get_pixel_cache())
+    for block in blocks:
+        block["image"] = decoded[block["image"].digest]
+
+
+def is_pixel_caching(processor: Any) -> bool:
+    return isinstance(
+        getattr(processor, "image_processor", None), _PixelCachingImageProcessor
+    )
+
+
+def _image_key(images: Any, digests: Dict[int, str]) -> Tuple[Any, ...] | None:
+    if isinstance(images, (list, tuple)):
+        keys = []
+        for item in images:
+            key = _image_key(item, digests)
+            if key is None:
+                return None
+            keys.append(key)
+        return tuple(keys)
+    return digests.get(id(images))
+
+
+class _UnhashableKwargs(Exception):
+    pass
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, _SIMPLE_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((str(name), _freeze(value[name])) for name in sorted(value, key=str))
+    raise _UnhashableKwargs(type(value).__name__)
+
+
+def _processor_fingerprint(image_processor: Any) -> str:
+    return hashlib.sha256(image_processor.to_json_string().encode()).hexdigest()
+
+
+class _PixelCachingImageProcessor:
+    """Delegate install_pixel_cache puts in place of a processor's image
+    processor. Transformers processors fetch images through
+    ``fetch_images`` and process them by calling the image processor, so
+    both pass through the cache; every other attribute is the wrapped
+    image processor's."""
+
+    def __init__(self, image_processor: Any, processor: Any) -> None:
+        object.__setattr__(self, "_image_processor", image_processor)
+        object.__setattr__(self, "_processor", processor)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name in ("_image_processor", "_processor"):
+            raise AttributeError(name)
+        return getattr(self._image_processor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._image_processor, name, value)
+
+    def __repr__(self) -> str:
+        return repr(self._image_processor)
+
+    def fetch_images(self, images: Any) -> Any:
+        cache = get_pixel_cache()
+        digests: Dict[int, str] = {}
+        _local.digests = digests
+        budget = current_vision_budget()
+        limits = current_vision_limits()
+        images = _decode_sources(
+            images,
+            cache,
+            digests,
+            include_base64=(
+                cache.max_bytes > 0 or budget is not None or limits is not None
+            ),
+        )
+        if budget is not None:
+            images = _apply_budget(
+                images, budget, self._image_processor, cache, digests
+            )
+        if limits is not None:
+            for image in _flatten(images):
+                if id(image) in digests:
+                    width, height = image.size
+                    check_vision_limit(limits, "max_pixels", width * height)
+        return self._image_processor.fetch_images(images)
+
+    def __call__(self, images: Any, *args: Any, **kwargs: Any) -> Any:
+        cache = get_pixel_cache()
+        digests = getattr(_local, "digests", {})
+        _local.digests = {}
+        budget = current_vision_budget()
+        if budget is not None:
+            limit = tile_limit(budget, self._processor, len(_flatten(images)))
+            if limit is not None:
+                kwargs = {**kwargs, "max_patches": limit}
+        tiles = kwargs.get("max_patches", getattr(self._image_processor, "max_patches", None))
+        if isinstance(tiles, int):
+            check_vision_limit(current_vision_limits(), "max_tiles", tiles)
+        image_key = _image_key(images, digests) if cache.max_bytes > 0 else None
+        if image_key is None or args:
+            return self._image_processor(images, *args, **kwargs)
+        try:
+            kwargs_key = _freeze(kwargs)
+        except _UnhashableKwargs:
+            return self._image_processor(images, **kwargs)
+
+        key = (
+            "pixels",
+            image_key,
+            _processor_fingerprint(self._image_processor),
+            kwargs_key,
+        )
+        processed = cache.get(key)
+        if processed is None:
+            processed = self._image_processor(images, **kwargs)
+            cache.put(key, processed, _value_nbytes(dict(processed)))
+        return copy.copy(processed)
+
+
+def install_pixel_cache(processor: Any) -> None:
+    """Route the processor's image decoding and image processing through
+    the pixel cache. Processors without a transformers image processor are
+    left unchanged."""
+    image_processor = getattr(processor, "image_processor", None)
+    if image_processor is None or isinstance(
+        image_processor, _PixelCachingImageProcessor
+    ):
+        return
+    cls = type(image_processor)
+    hooks: List[Callable[..., Any] | None] = [
+        getattr(cls, "fetch_images", None),
+        getattr(cls, "to_json_string", None),
+    ]
+    if not callable(image_processor) or not all(callable(hook) for hook in hooks):
+        return
+    processor.image_processor = _PixelCachingImageProcessor(image_processor, processor)
@@ -0,0 +1,97 @@
+"""Parallel image decoding and prefetching of the next task's images.
+
+Decoding an image (JPEG/PNG decompression, EXIF transpose, RGB
+conversion) dominates preprocessing for requests with many images and ran
+one image after another on the task thread. The images of a processor
+call are decoded on a shared thread pool instead; Pillow releases the GIL
+while decoding, so threads scale without the pickling cost of a process
+pool.
+
+``prefetch_task_inputs`` runs the same decoding in the background and
+lands the images in the pixel cache, where the task's own processor call
+finds them. Classic execution and every tensor parallel rank call it when
+a task starts, so decoding overlaps the model load. A node that queues
+tasks may also call it for the next task while the GPU is busy with the
+current one, in the process that will run it.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+from gpt_task import models
+from gpt_task.config import Config, VisionConfig
+from gpt_task.models.images import load_image_source
+
+from ..utils import image_blocks
+
+_logger = logging.getLogger(__name__)
+
+
+class PreprocessPool:
+    """Thread pool for image decoding. With zero workers every call runs
+    inline on the calling thread."""
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gpt-task-preprocess")
+            if workers > 0
+            else None
+        )
+
+    def map(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+        if self._executor is None or len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if self._executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+            return future
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_pool_lock = threading.Lock()
+_pool = PreprocessPool(VisionConfig().preprocess_workers)
+
+
+def get_preprocess_pool(config: Config | None = None) -> PreprocessPool:
+    """Return the process preprocessing pool, rebuilt when the configured
+    worker count changes."""
+    global _pool
+
+    with _pool_lock:
+        if config is not None and config.vision.preprocess_workers != _pool.workers:
+            _pool.shutdown()
+            _pool = PreprocessPool(config.vision.preprocess_workers)
+        return _pool
+
+
+def prefetch_task_inputs(args: models.GPTTaskArgs) -> Future:
+    """Decode the images of a queued task in the background. The returned
+    future completes once they are in the pixel cache; waiting on it is
+    optional."""
+    from .pixel_cache import get_pixel_cache, load_images
+
+    def prefetch() -> None:
+        cache = get_pixel_cache()
+        if cache.max_bytes <= 0:
+            return
+        load_images(
+            [load_image_source(block) for block in image_blocks(args.messages)],
+            cache,
+        )
+
+    return get_preprocess_pool().submit(prefetch)
@@ -6,6 +6,7 @@ from gpt_task import models
 
 from ...context import ModelAdapterContext
 from ..utils import apply_chat_template, copy_tools, to_hf_chat_messages
+from .pixel_cache import is_pixel_caching, load_message_images
 
 
 class StandardVisionInputAdapter:
@@ -27,9 +28,18 @@ class StandardVisionInputAdapter:
         if tools is not None:
             template_args["tools"] = tools
 
+        chats = to_hf_chat_messages(list(args.messages))
+        if not is_pixel_caching(context.processor):
+            load_message_images(chats)
+
         return apply_chat_template(
             tokenizer=context.processor,
-            chats=to_hf_chat_messages(list(args.messages)),
+            chats=chats,
             template_args=template_args,
             optional_args=dict(args.template_args or {}),
+            accepted=(
+                context.plan.processor_template_kwargs
+                if context.plan is not None
+                else None
+            ),
         )
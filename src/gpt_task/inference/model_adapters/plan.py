@@ -0,0 +1,75 @@
+"""Per-model adapter plan.
+
+Which input adapters serve a model, and which keyword arguments its chat
+templates and processor accept, depend only on the loaded artifacts. The
+plan resolves them once when the model is loaded and is kept alongside
+the cached pipeline (classic execution) or the rank's model shard (tensor
+parallel execution), so rendering a request calls the resolved adapter
+directly instead of scanning the registries and probing signatures.
+"""
+
+from __future__ import annotations
+
+import weakref
+from dataclasses import dataclass
+from typing import Any
+
+from .context import ModelAdapterContext
+from .input.text import TextInputAdapter, resolve_text_input_adapter
+from .input.utils import AcceptedKwargs
+from .input.vision import VisionInputAdapter, resolve_vision_input_adapter
+
+
+@dataclass(frozen=True)
+class ModelAdapterPlan:
+    text_adapter: TextInputAdapter
+    # None when no processor is loaded; image input is rejected then.
+    vision_adapter: VisionInputAdapter | None
+    tokenizer_template_kwargs: AcceptedKwargs | None
+    processor_template_kwargs: AcceptedKwargs | None
+    processor_call_kwargs: AcceptedKwargs | None
+
+
+def _method_kwargs(obj: Any, name: str) -> AcceptedKwargs | None:
+    method = getattr(obj, name, None)
+    return AcceptedKwargs.of(method) if callable(method) else None
+
+
+def build_adapter_plan(context: ModelAdapterContext) -> ModelAdapterPlan:
+    processor = context.processor
+    return ModelAdapterPlan(
+        text_adapter=resolve_text_input_adapter(context),
+        vision_adapter=(
+            resolve_vision_input_adapter(context) if processor is not None else None
+        ),
+        tokenizer_template_kwargs=_method_kwargs(
+            context.tokenizer, "apply_chat_template"
+        ),
+        processor_template_kwargs=_method_kwargs(processor, "apply_chat_template"),
+        processor_call_kwargs=(
+            AcceptedKwargs.of(processor) if callable(processor) else None
+        ),
+    )
+
+
+_plans: "weakref.WeakKeyDictionary[Any, ModelAdapterPlan]" = weakref.WeakKeyDictionary()
+
+
+def attach_adapter_plan(owner: Any, plan: ModelAdapterPlan) -> None:
+    """Keep ``plan`` for as long as ``owner`` (a pipeline or a model
+    shard) is alive."""
+    _plans[owner] = plan
+
+
+def get_adapter_plan(owner: Any, context: ModelAdapterContext) -> ModelAdapterPlan:
+    """Return the plan attached to ``owner``, building and attaching it
+    from ``context`` when the owner was loaded without one."""
+    try:
+        plan = _plans.get(owner)
+    except TypeError:
+        # Not weak-referenceable; nothing to keep the plan with.
+        return build_adapter_plan(context)
+    if plan is None:
+        plan = build_adapter_plan(context)
+        attach_adapter_plan(owner, plan)
+    return plan
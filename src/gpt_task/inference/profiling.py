@@ -0,0 +1,185 @@
+"""Opt-in torch.profiler capture of sampled tasks.
+
+``Config.profiler`` selects the tasks to profile: every N-th task of the
+process, or every task whose model id matches a pattern. The environment
+sets it like any other config field, e.g. ``GPT_PROFILER__SAMPLE_EVERY=100``
+or ``GPT_PROFILER__MODEL_PATTERN='Qwen/*'``.
+
+A sampled task starts the profiler when it enters its first prefill or
+generation phase and stops it when the task ends, so the trace covers
+prefill, decode and the completion decoding after them, but not the
+model load or prompt rendering. The trace is written as a Chrome trace
+(``chrome://tracing``, Perfetto) named after the task tag and rank:
+
+    task-<pid>-<sequence>[-rank<rank>]-<model>.json
+
+Tensor-parallel tasks are selected once by the caller, and every rank
+process writes its own trace under the caller's tag. After each write the
+oldest traces are deleted until the directory holds at most
+``max_bytes`` of them.
+
+torch.profiler is process-wide: while one task is profiled, a concurrent
+sampled task in the same process runs unprofiled. Profiling errors are
+logged and never fail the task.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import itertools
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+import torch
+
+from gpt_task.config import Config, ProfilerConfig
+
+from .task_context import bound_task_context, writable_task_context
+
+_logger = logging.getLogger(__name__)
+
+_sequence = itertools.count(1)
+_sequence_lock = threading.Lock()
+# Held while a profiler runs in this process.
+_profiler_lock = threading.Lock()
+
+
+def select_task_profile(config: Config, model: str | None) -> str | None:
+    """Count a task and return its profile tag when it is sampled."""
+    with _sequence_lock:
+        sequence = next(_sequence)
+    profiler = config.profiler
+    sampled = profiler.sample_every > 0 and sequence % profiler.sample_every == 0
+    matched = (
+        profiler.model_pattern is not None
+        and model is not None
+        and fnmatch.fnmatchcase(model, profiler.model_pattern)
+    )
+    if not (sampled or matched):
+        return None
+    return f"{os.getpid()}-{sequence:06d}"
+
+
+@dataclass
+class TaskProfile:
+    tag: str
+    model: str
+    config: ProfilerConfig
+    rank: int | None = None
+    _profiler: Any = field(default=None, repr=False)
+    # Set once the profiler ran or could not start; it starts only once.
+    _done: bool = field(default=False, repr=False)
+
+    @property
+    def path(self) -> str:
+        model = re.sub(r"[^A-Za-z0-9._-]+", "_", self.model).strip("_")
+        rank = "" if self.rank is None else f"-rank{self.rank}"
+        return os.path.join(self.config.output_dir, f"task-{self.tag}{rank}-{model}.json")
+
+    def start(self) -> None:
+        if self._profiler is not None or self._done:
+            return
+        self._done = True
+        if not _profiler_lock.acquire(blocking=False):
+            _logger.info("Task %s not profiled: another task is being profiled", self.tag)
+            return
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        try:
+            profiler = torch.profiler.profile(
+                activities=activities,
+                record_shapes=self.config.record_shapes,
+                with_stack=self.config.with_stack,
+            )
+            profiler.start()
+        except Exception:
+            _profiler_lock.release()
+            _logger.warning("Failed to start the profiler of task %s", self.tag, exc_info=True)
+            return
+        self._profiler = profiler
+
+    def finish(self) -> str | None:
+        """Stop the profiler and write the trace; returns its path, or None
+        when the task was not profiled."""
+        profiler = self._profiler
+        if profiler is None:
+            return None
+        self._profiler = None
+        try:
+            profiler.stop()
+            os.makedirs(self.config.output_dir, exist_ok=True)
+            path = self.path
+            partial = f"{path}.partial"
+            profiler.export_chrome_trace(partial)
+            os.replace(partial, path)
+        except Exception:
+            _logger.warning("Failed to write the profile of task %s", self.tag, exc_info=True)
+            return None
+        finally:
+            _profiler_lock.release()
+        _rotate_traces(self.config.output_dir, self.config.max_bytes, keep=path)
+        _logger.info("Task profile written to %s", path)
+        return path
+
+
+def _rotate_traces(directory: str, max_bytes: int, keep: str) -> None:
+    """Delete the oldest traces until the directory holds at most
+    ``max_bytes`` of them; ``keep`` is never deleted."""
+    traces = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith("task-") and entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                traces.append((stat.st_mtime, stat.st_size, entry.path))
+    total = 0
+    for _, size, path in sorted(traces, reverse=True):
+        total += size
+        if total > max_bytes and os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                # Another rank rotated it first.
+                pass
+
+
+@contextmanager
+def task_profiling(
+    config: Config,
+    model: str | None,
+    tag: str | None = None,
+    rank: int | None = None,
+) -> Iterator[TaskProfile | None]:
+    """Profile the task run inside the block if it is sampled. Ranks pass
+    the ``tag`` the caller selected; otherwise the task is counted here."""
+    if tag is None and rank is None:
+        tag = select_task_profile(config, model)
+    if tag is None:
+        yield None
+        return
+    context = writable_task_context()
+    profile = TaskProfile(tag, model or "", config.profiler, rank)
+    context.profile = profile
+    try:
+        yield profile
+    finally:
+        context.profile = None
+        profile.finish()
+
+
+@contextmanager
+def profiled_phase() -> Iterator[None]:
+    """Mark a prefill or generation phase; the profile of a sampled task
+    starts at its first phase."""
+    context = bound_task_context()
+    if context is not None and context.profile is not None:
+        context.profile.start()
+    yield
@@ -137,13 +137,31 @@ def find_last_user_index(messages: List[Dict[str, Any]]) -> int:
             break
     return last_user_index
 
+def find_prev_non_tool_index(index: int, messages: List[Dict[str, Any]]) -> int:
+    prev_idx = index - 1
+    while prev_idx >= 0 and messages[prev_idx].get("role") == "tool":
+        prev_idx -= 1
+    return prev_idx
+
 def render_message(index: int, messages: List[Dict[str, Any]], thinking_mode: str) -> str:
+    assert 0 <= index < len(messages)
+    return _render_message(
+        index,
+        messages,
+        thinking_mode,
+        last_user_idx=find_last_user_index(messages),
+        prev_assistant_idx=find_prev_non_tool_index(index, messages),
+    )
+
+# `last_user_idx` and `prev_assistant_idx` (the nearest preceding non-tool
+# message, -1 if none) are passed in, so that encoding a conversation
+# computes them in one pass instead of rescanning it for every message.
+def _render_message(index: int, messages: List[Dict[str, Any]], thinking_mode: str, last_user_idx: int, prev_assistant_idx: int) -> str:
     assert 0 <= index < len(messages)
     assert thinking_mode in ["chat", "thinking"], f"Invalid thinking_mode `{thinking_mode}`"
 
     prompt = ""
     msg = messages[index]
-    last_user_idx = find_last_user_index(messages)
 
     role = msg.get("role")
     content = msg.get("content")
@@ -191,11 +209,7 @@ def render_message(index: int, messages: List[Dict[str, Any]], thinking_mode: st
             prompt += thinking_end_token
 
     elif role == "tool":
-        prev_assistant_idx = index - 1
         assistant_msg = messages[prev_assistant_idx]
-        while prev_assistant_idx >= 0 and assistant_msg.get("role") == "tool":
-            prev_assistant_idx -= 1
-            assistant_msg = messages[prev_assistant_idx]
 
         assert index == 0 or prev_assistant_idx >= 0 and assistant_msg.get("role") == "assistant", f"Invalid messages at {index}:\n{assistant_msg}"
 
@@ -217,7 +231,6 @@ def render_message(index: int, messages: List[Dict[str, Any]], thinking_mode: st
                 prompt += "\n\n" + thinking_end_token
 
     elif role == "assistant":
-        prev_assistant_idx = index
         thinking_part = ""
 
         tool_calls_content = ""
@@ -267,6 +280,23 @@ def drop_thinking_messages(messages: List[Dict[str, Any]], last_user_idx: Option
 
     return messages_wo_thinking
 
+def _render_messages(messages: List[Dict[str, Any]], start: int, stop: int, thinking_mode: str, rendered: Optional[List[Optional[str]]] = None) -> List[str]:
+    """Render `messages[start:stop]` in a single pass. Entries of `rendered`
+    that are not None are taken as the rendering of that index."""
+    assert 0 <= start <= stop
+    last_user_idx = find_last_user_index(messages)
+    prev_assistant_idx = -1
+    parts: List[str] = []
+    for idx in range(stop):
+        if idx >= start:
+            part = rendered[idx] if rendered is not None and idx < len(rendered) else None
+            if part is None:
+                part = _render_message(idx, messages, thinking_mode, last_user_idx=last_user_idx, prev_assistant_idx=prev_assistant_idx)
+            parts.append(part)
+        if idx < len(messages) and messages[idx].get("role") != "tool":
+            prev_assistant_idx = idx
+    return parts
+
 def encode_messages(messages: List[Dict[str, Any]], thinking_mode: str, context: Optional[List[Dict[str, Any]]] = None, drop_thinking: bool = True, add_default_bos_token: bool = True) -> str:
     context = context if context else []
     full_messages = context + messages
@@ -276,10 +306,73 @@ def encode_messages(messages: List[Dict[str, Any]], thinking_mode: str, context:
     if thinking_mode == "thinking" and drop_thinking:
         full_messages = drop_thinking_messages(full_messages)
 
-    for idx in range(len(messages)):
-        prompt += render_message(idx + len(context), full_messages, thinking_mode=thinking_mode)
-
-    return prompt
+    parts = _render_messages(full_messages, len(context), len(context) + len(messages), thinking_mode)
+    return prompt + "".join(parts)
+
+
+class IncrementalEncoder:
+    """`encode_messages` for a conversation that grows between calls.
+
+    The rendering of each message is kept from the previous call and
+    reused while the message and everything before it are unchanged and
+    the last user turn has not moved past it; only the remaining messages
+    are rendered. Output is identical to `encode_messages` with the same
+    arguments. Not thread-safe; callers serialize access.
+    """
+
+    def __init__(self, thinking_mode: str, drop_thinking: bool = True, add_default_bos_token: bool = True) -> None:
+        self.thinking_mode = thinking_mode
+        self.drop_thinking = drop_thinking
+        self.add_default_bos_token = add_default_bos_token
+        self._messages: List[Dict[str, Any]] = []
+        self._last_user_idx = -1
+        self._rendered: List[Optional[str]] = []
+
+    def reset(self) -> None:
+        self._messages = []
+        self._last_user_idx = -1
+        self._rendered = []
+
+    def _reusable(self, full_messages: List[Dict[str, Any]], last_user_idx: int) -> int:
+        # A tool message at index 0 refers to messages[-1], which changes as
+        # the conversation grows.
+        if full_messages and full_messages[0].get("role") == "tool":
+            return 0
+        limit = min(len(full_messages), len(self._messages))
+        if last_user_idx != self._last_user_idx:
+            # Before both last user turns, user/developer messages close the
+            # thinking block and assistants render no reasoning either way.
+            limit = min(limit, last_user_idx, self._last_user_idx)
+        for idx in range(max(limit, 0)):
+            previous = self._messages[idx]
+            current = full_messages[idx]
+            if previous is not current and previous != current:
+                return idx
+        return max(limit, 0)
+
+    def encode_messages(self, messages: List[Dict[str, Any]], context: Optional[List[Dict[str, Any]]] = None) -> str:
+        context = context if context else []
+        full_messages = context + messages
+
+        prompt = bos_token if self.add_default_bos_token and len(context) == 0 else ""
+
+        if self.thinking_mode == "thinking" and self.drop_thinking:
+            full_messages = drop_thinking_messages(full_messages)
+
+        last_user_idx = find_last_user_index(full_messages)
+        reusable = self._reusable(full_messages, last_user_idx)
+        rendered: List[Optional[str]] = self._rendered[:reusable]
+        start, stop = len(context), len(context) + len(messages)
+        parts = _render_messages(full_messages, start, stop, self.thinking_mode, rendered)
+
+        rendered.extend([None] * (len(full_messages) - len(rendered)))
+        for idx, part in enumerate(parts, start):
+            if idx < len(rendered):
+                rendered[idx] = part
+        self._messages = [copy.copy(msg) for msg in full_messages]
+        self._last_user_idx = last_user_idx
+        self._rendered = rendered
+        return prompt + "".join(parts)
 
 def _read_until_stop(index: int, text: str, stop: List[str]) -> Tuple[int, str, Optional[str]]:
     min_pos = len(text)
@@ -0,0 +1,278 @@
+"""Opt-in recorder of the shape of every task.
+
+With ``Config.recorder.path`` set, ``run_task`` and ``run_task_tp`` append
+one JSON line per task to that file:
+
+- ``time``, ``model``, ``model_key``, ``dtype``, ``quantize_bits``;
+- ``mode`` (``device_map`` or ``tensor_parallel``), ``gpu_count``,
+  ``execution_dtype`` and ``determinism``: the execution plan the task took;
+- ``stream``, ``messages``, ``tools``, ``generation_config``;
+- ``images``: the SHA-256 digest and byte size of each image; image
+  content is never stored;
+- ``prompt_tokens``, ``completion_tokens``, ``model_cache_hit``,
+  ``result_cache_hit``, ``duration``, ``time_to_first_token`` and
+  ``stages`` (seconds per stage) from the task report;
+- ``error``: the exception type of a failed task, else null.
+
+Prompts and completions are not recorded. The task thread only queues the
+task arguments and its report; a writer thread hashes the images,
+serializes the record and writes it, so the task never waits on disk.
+When the writer falls behind by ``max_pending`` records, further records
+are dropped and counted rather than blocking the task. The file rotates
+like ``logging.handlers.RotatingFileHandler``: once it would exceed
+``max_bytes`` it is renamed to ``<path>.1`` (shifting older files up to
+``<path>.<backups>``) and a new file is started.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List
+
+from gpt_task import models
+from gpt_task.config import Config, RecorderConfig
+from gpt_task.models.images import load_image_source
+
+from .key import generate_model_key
+from .speculative import resolve_draft_model_id
+from .task_context import bound_task_context, writable_task_context
+from .task_report import TaskReport
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingRecord:
+    """What a task hands to the writer thread."""
+
+    config: Config
+    mode: str
+    stream: bool
+    started_at: float = field(default_factory=time.time)
+    args: models.GPTTaskArgs | None = None
+    report: TaskReport | None = None
+    gpu_count: int | None = None
+    execution_dtype: str | None = None
+    error: str | None = None
+
+
+def _image_entries(args: models.GPTTaskArgs) -> List[Dict[str, Any]]:
+    images = []
+    for message in args.messages:
+        content = message.get("content")
+        if not isinstance(content, list):
+            continue
+        for block in content:
+            if block.get("type") != "image":
+                continue
+            try:
+                decoded = load_image_source(block)
+            except (ValueError, TypeError):
+                # The source is gone (a released buffer, a removed file).
+                images.append({"sha256": None, "bytes": None})
+                continue
+            images.append({"sha256": decoded.digest, "bytes": len(decoded.data)})
+    return images
+
+
+def build_record(pending: PendingRecord) -> Dict[str, Any]:
+    """The JSON record of a finished task."""
+    args = pending.args
+    report = pending.report
+    record: Dict[str, Any] = {
+        "time": pending.started_at,
+        "model": None,
+        "model_key": None,
+        "dtype": None,
+        "quantize_bits": None,
+        # A tensor-parallel task that fell back runs as device_map.
+        "mode": pending.mode if report is None else report.mode,
+        "gpu_count": pending.gpu_count,
+        "execution_dtype": pending.execution_dtype,
+        "determinism": pending.config.determinism,
+        "stream": pending.stream,
+        "messages": None,
+        "tools": None,
+        "generation_config": None,
+        "images": [],
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "model_cache_hit": None,
+        "result_cache_hit": None,
+        "duration": None,
+        "time_to_first_token": None,
+        "stages": {},
+    }
+    if args is not None:
+        record.update(
+            model=args.model,
+            model_key=generate_model_key(
+                args, draft_model=resolve_draft_model_id(pending.config, args)
+            ),
+            dtype=args.dtype,
+            quantize_bits=args.quantize_bits,
+            messages=len(args.messages),
+            tools=len(args.tools) if args.tools else 0,
+            generation_config=(
+                None
+                if args.generation_config is None
+                else {k: v for k, v in args.generation_config.items() if v is not None}
+            ),
+            images=_image_entries(args),
+        )
+    if report is not None:
+        stages: Dict[str, float] = {}
+        for stage in report.stages:
+            stages[stage.name] = stages.get(stage.name, 0.0) + stage.duration
+        record.update(
+            prompt_tokens=report.prompt_tokens,
+            completion_tokens=report.completion_tokens,
+            model_cache_hit=report.model_cache_hit,
+            result_cache_hit=report.result_cache_hit,
+            duration=report.duration,
+            time_to_first_token=report.time_to_first_token,
+            stages=stages,
+        )
+    record["error"] = pending.error
+    return record
+
+
+class TaskRecorder:
+    def __init__(self, config: RecorderConfig) -> None:
+        if config.path is None:
+            raise ValueError("recorder path is not set")
+        self.config = config
+        self.dropped = 0
+        self._queue: "queue.Queue[PendingRecord | None]" = queue.Queue(config.max_pending)
+        self._file: Any = None
+        self._thread = threading.Thread(
+            target=self._run, name="gpt_task_recorder", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, pending: PendingRecord) -> None:
+        """Queue a record for writing; never blocks."""
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Wait until every queued record is written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                pending = self._queue.get()
+                try:
+                    if pending is None:
+                        return
+                    self._write(json.dumps(build_record(pending), default=str) + "\n")
+                except Exception:
+                    _logger.warning("Failed to write a task record", exc_info=True)
+                finally:
+                    self._queue.task_done()
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+    def _write(self, line: str) -> None:
+        data = line.encode("utf-8")
+        path = self.config.path
+        if self._file is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "ab")
+        if self._file.tell() > 0 and self._file.tell() + len(data) > self.config.max_bytes:
+            self._file.close()
+            self._rotate(path)
+            self._file = open(path, "ab")
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self, path: str) -> None:
+        backups = self.config.backups
+        if backups <= 0:
+            os.remove(path)
+            return
+        for index in range(backups - 1, 0, -1):
+            source = f"{path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{index + 1}")
+        os.replace(path, f"{path}.1")
+
+
+_recorder_lock = threading.Lock()
+_recorder: TaskRecorder | None = None
+
+
+def get_task_recorder(config: Config) -> TaskRecorder | None:
+    """Return the process recorder, or None when recording is off. It is
+    rebuilt when the recorder config changes."""
+    global _recorder
+
+    with _recorder_lock:
+        if _recorder is not None and _recorder.config != config.recorder:
+            _recorder.close()
+            _recorder = None
+        if _recorder is None and config.recorder.path is not None:
+            _recorder = TaskRecorder(config.recorder)
+        return _recorder
+
+
+def _close_recorder() -> None:
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.close()
+
+
+atexit.register(_close_recorder)
+
+
+@contextmanager
+def task_recording(config: Config, mode: str, stream: bool) -> Iterator[None]:
+    """Record the task run inside the block. A task delegated to another
+    executor (tensor-parallel falling back to classic) is recorded once,
+    by the outer block."""
+    recorder = get_task_recorder(config)
+    if recorder is None:
+        yield
+        return
+    context = writable_task_context()
+    if context.recording is not None:
+        yield
+        return
+    pending = PendingRecord(config=config, mode=mode, stream=stream)
+    context.recording = pending
+    try:
+        yield
+    except Exception as e:
+        pending.error = type(e).__name__
+        raise
+    finally:
+        context.recording = None
+        pending.report = context.task_report
+        pending.gpu_count = context.executed_gpu_count
+        pending.execution_dtype = context.execution_dtype
+        recorder.submit(pending)
+
+
+def record_task_args(args: models.GPTTaskArgs) -> None:
+    """Attach the bound arguments to the task's record, if one is kept."""
+    context = bound_task_context()
+    if context is not None and context.recording is not None:
+        context.recording.args = args
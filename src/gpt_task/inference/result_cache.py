@@ -0,0 +1,351 @@
+"""Opt-in cache of whole task responses.
+
+Task execution is deterministic: the same model snapshot, prompt,
+generation config, seed and determinism level give the same response.
+Retries, duplicate validation assignments and popular prompts are
+therefore answered from this cache instead of being generated again.
+
+The key is the SHA-256 of a canonical JSON object holding:
+
+- the model key (model, dtype, quantization, draft model) and the snapshot
+  revision of the model and its draft: the Hub commit of a cached repo, or
+  a fingerprint of the file names, sizes and mtimes of a local directory;
+- every task argument, with image sources replaced by the SHA-256 of the
+  image bytes. The rendered prompt is a function of the messages, tools
+  and template arguments and of the snapshot's chat template, so a hit is
+  found without loading the tokenizer or the model;
+- whether the task streams, the execution plan (``device_map`` or
+  ``tensor_parallel`` and the GPU count), the determinism level, the
+  vision budget of image tasks and the torch and transformers versions.
+
+Tasks are not cached under the ``fast`` determinism level, and neither are
+tasks whose model revision or images cannot be read. A failed task is
+never stored.
+
+A response is stored as JSON. A streaming task stores its chunks and a hit
+replays them, in order, to the stream callback. The execution dtype and
+allocator stats of the run are stored with it and restored by a hit, so
+their getters read the same after a hit as after the run. The memory tier
+is a byte-bounded LRU; the optional disk tier keeps one file per result
+and deletes the oldest once the directory exceeds its budget. Disk hits
+are promoted to memory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional
+
+from gpt_task import models
+from gpt_task.cache import AllocatorStats
+from gpt_task.config import Config, ResultCacheConfig
+from gpt_task.models.images import IMAGE_SOURCE_KEYS, load_image_source
+
+from .allocator_stats import get_allocator_stats, set_allocator_stats
+from .execution_dtype import get_execution_dtype, set_execution_dtype
+from .task_report import finish_task_report, get_task_timer
+from .utils import load_model_kwargs
+
+_logger = logging.getLogger(__name__)
+
+StreamCallback = Callable[[models.GPTTaskStreamResponse], None]
+
+
+class ResultCache:
+    """Byte-bounded LRU of serialized results with an optional disk tier."""
+
+    def __init__(self, config: ResultCacheConfig) -> None:
+        self.config = config
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        if config.disk_dir is not None:
+            os.makedirs(config.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+        data = self._read_disk(key)
+        if data is not None:
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        max_bytes = self.config.memory_bytes
+        with self._lock:
+            if key in self._entries or len(data) > max_bytes:
+                return
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        assert self.config.disk_dir is not None
+        return os.path.join(self.config.disk_dir, f"result-{key}.json")
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if self.config.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Reads count as use for the oldest-first eviction.
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        directory = self.config.disk_dir
+        if directory is None or len(data) > self.config.disk_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".result-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            _rotate_results(directory, self.config.disk_bytes)
+        except OSError:
+            _logger.exception("Failed to write a cached result to %s", directory)
+
+
+def _rotate_results(directory: str, max_bytes: int) -> None:
+    """Delete the least recently used results until the directory holds at
+    most ``max_bytes`` of them."""
+    results = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith("result-") and entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                results.append((stat.st_mtime, stat.st_size, entry.path))
+    total = 0
+    for _, size, path in sorted(results, reverse=True):
+        total += size
+        if total > max_bytes:
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process evicted it first.
+                pass
+
+
+_cache_lock = threading.Lock()
+_cache: ResultCache | None = None
+
+
+def get_result_cache(config: Config) -> ResultCache | None:
+    """Return the process result cache, or None when both tiers are off. It
+    is rebuilt when the result cache config changes."""
+    global _cache
+
+    result_config = config.result_cache
+    with _cache_lock:
+        if _cache is not None and _cache.config != result_config:
+            _cache = None
+        if _cache is None and (
+            result_config.memory_bytes > 0 or result_config.disk_dir is not None
+        ):
+            _cache = ResultCache(result_config)
+        return _cache
+
+
+def model_revision(model: str, config: Config) -> str | None:
+    """The snapshot revision of a local model directory or of a Hub repo in
+    the model cache, or None when it is not available locally."""
+    if os.path.isdir(model):
+        files = []
+        for root, _, names in os.walk(model):
+            for name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((os.path.relpath(path, model), stat.st_size, stat.st_mtime_ns))
+        return "dir:" + hashlib.sha256(json.dumps(sorted(files)).encode()).hexdigest()
+
+    from huggingface_hub import try_to_load_from_cache
+
+    try:
+        path = try_to_load_from_cache(
+            model, "config.json", cache_dir=load_model_kwargs(config).get("cache_dir")
+        )
+    except ValueError:
+        # Not a valid repo id.
+        return None
+    if not isinstance(path, str):
+        return None
+    # <cache>/models--org--name/snapshots/<commit>/config.json
+    return os.path.basename(os.path.dirname(path))
+
+
+def _canonical_messages(messages: List[models.Message]) -> List[Dict[str, Any]]:
+    canonical = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            blocks = []
+            for block in content:
+                if block.get("type") == "image":
+                    digest = load_image_source(block).digest
+                    block = {
+                        name: value
+                        for name, value in block.items()
+                        if name not in IMAGE_SOURCE_KEYS and name != "size"
+                    }
+                    block["sha256"] = digest
+                blocks.append(block)
+            message = {**message, "content": blocks}
+        canonical.append(dict(message))
+    return canonical
+
+
+def result_cache_key(
+    config: Config,
+    args: models.GPTTaskArgs,
+    *,
+    mode: str,
+    gpu_count: int,
+    model_key: str,
+    stream: bool,
+    draft_model: str | None = None,
+) -> str | None:
+    """The cache key of a task, or None when the task is not cached."""
+    if get_result_cache(config) is None or config.determinism == "fast":
+        return None
+    import torch
+    import transformers
+
+    revisions = [model_revision(model, config) for model in (args.model, draft_model) if model]
+    if None in revisions:
+        return None
+    try:
+        messages = _canonical_messages(args.messages)
+    except (ValueError, TypeError):
+        # The task fails reading the same image.
+        return None
+    has_images = any(
+        isinstance(message.get("content"), list)
+        and any(block.get("type") == "image" for block in message["content"])
+        for message in messages
+    )
+    fields = {
+        "model_key": model_key,
+        "revisions": revisions,
+        "args": args.model_dump(mode="json", exclude={"messages"}),
+        "messages": messages,
+        "stream": stream,
+        "mode": mode,
+        "gpu_count": gpu_count,
+        "determinism": config.determinism,
+        "num_assistant_tokens": (
+            config.speculative.num_assistant_tokens if draft_model else None
+        ),
+        "vision": config.vision.model_dump(mode="json") if has_images else None,
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+    }
+    try:
+        canonical = json.dumps(
+            fields, ensure_ascii=False, separators=(",", ":"), sort_keys=True
+        )
+    except TypeError:
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cached_task_result(
+    config: Config,
+    key: str | None,
+    stream_callback: Optional[StreamCallback],
+    execute: Callable[[Optional[StreamCallback]], Any],
+) -> Any:
+    """Return the cached result of the task with ``key``, replaying its
+    chunks to ``stream_callback``, or run ``execute(stream_callback)`` and
+    store what it returns or streams."""
+    cache = get_result_cache(config)
+    if cache is None or key is None:
+        return execute(stream_callback)
+
+    timer = get_task_timer()
+    data = cache.get(key)
+    if data is not None:
+        if timer is not None:
+            timer.result_cache_hit = True
+            timer.determinism = config.determinism
+        stored = json.loads(data)
+        usage = stored["usage"]
+        if stored.get("execution_dtype"):
+            set_execution_dtype(stored["execution_dtype"])
+        allocator_stats = (
+            AllocatorStats(**stored["allocator_stats"])
+            if stored.get("allocator_stats")
+            else None
+        )
+        set_allocator_stats(allocator_stats)
+        if stream_callback is not None:
+            for chunk in stored["chunks"]:
+                stream_callback(chunk)
+        finish_task_report(
+            usage.get("prompt_tokens"), usage.get("completion_tokens"), allocator_stats
+        )
+        return stored["response"]
+
+    if timer is not None:
+        timer.result_cache_hit = False
+    chunks: List[str | None] = []
+    usage: Dict[str, Any] = {}
+    callback = stream_callback
+    if stream_callback is not None:
+
+        def callback(chunk: models.GPTTaskStreamResponse) -> None:
+            # Serialized at once: the caller may reuse the chunk.
+            try:
+                chunks.append(json.dumps(chunk, ensure_ascii=False))
+            except TypeError:
+                chunks.append(None)
+            usage.update(chunk.get("usage") or {})
+            stream_callback(chunk)
+
+    response = execute(callback)
+    if response is not None:
+        usage.update(response.get("usage") or {})
+    allocator_stats = get_allocator_stats()
+    try:
+        if None in chunks:
+            raise TypeError("unserializable stream chunk")
+        data = (
+            f'{{"usage":{json.dumps(usage)},'
+            f'"execution_dtype":{json.dumps(get_execution_dtype())},'
+            f'"allocator_stats":'
+            f'{json.dumps(asdict(allocator_stats) if allocator_stats else None)},'
+            f'"response":{json.dumps(response, ensure_ascii=False)},'
+            f'"chunks":[{",".join(chunks)}]}}'  # type: ignore[arg-type]
+        ).encode("utf-8")
+    except TypeError:
+        _logger.warning("Task result is not JSON serializable and is not cached")
+        return response
+    cache.put(key, data)
+    return response
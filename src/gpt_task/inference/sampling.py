@@ -0,0 +1,141 @@
+"""Per-sequence random streams for sampled tasks.
+
+``generate()`` samples every row of a batch with one ``torch.multinomial``
+call on the global generator, so a row's tokens depend on the other rows
+and on every earlier draw in the process. A sampled task is then only
+reproducible when it runs alone.
+
+Sampled tasks instead draw from one CPU generator per output sequence,
+seeded from the task seed and the sequence index. ``SeededSampler`` is a
+logits processor that applies the sampling warpers (temperature, top-k,
+top-p, min-p, typical-p and the model's own cutoffs) in the order
+transformers does. It draws one uniform number per row from that row's
+generator and picks the token by inverse CDF. It returns scores that
+leave only the chosen token, so the sampling step of ``generate()``, and
+the warpers it applies again, always keep that token.
+
+A sequence's tokens therefore depend only on its own logits and its own
+stream. They do not change when the sequence runs in a batch with other
+tasks or sequences, given the same logits. Sequence ``i`` of a task is the
+same whether the task asks for one sequence or several.
+
+Beam search reorders rows between steps and keeps the global generator.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, List, Sequence
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+from transformers.generation.logits_process import (
+    EpsilonLogitsWarper,
+    EtaLogitsWarper,
+    MinPLogitsWarper,
+    TemperatureLogitsWarper,
+    TopHLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+    TypicalLogitsWarper,
+)
+
+from gpt_task import models
+
+
+def sequence_seeds(seed: int, count: int, start: int = 0) -> List[int]:
+    """Seeds of the random streams of sequences ``start`` to
+    ``start + count`` of a task with ``seed``."""
+    return [
+        int.from_bytes(hashlib.sha256(f"{seed}:{index}".encode()).digest()[:8], "little")
+        >> 1
+        for index in range(start, start + count)
+    ]
+
+
+def _sampling_warpers(generation_config: Any, device: torch.device) -> List[LogitsProcessor]:
+    # Mirrors the warpers generate() applies to single-beam sampling.
+    warpers: List[LogitsProcessor] = []
+    temperature = getattr(generation_config, "temperature", None)
+    if temperature is not None and temperature != 1.0:
+        warpers.append(TemperatureLogitsWarper(temperature))
+    top_h = getattr(generation_config, "top_h", None)
+    if top_h is not None:
+        warpers.append(TopHLogitsWarper(top_h=top_h))
+    top_k = getattr(generation_config, "top_k", None)
+    if top_k is not None and top_k != 0:
+        warpers.append(TopKLogitsWarper(top_k=top_k))
+    top_p = getattr(generation_config, "top_p", None)
+    if top_p is not None and top_p < 1.0:
+        warpers.append(TopPLogitsWarper(top_p=top_p))
+    min_p = getattr(generation_config, "min_p", None)
+    if min_p is not None:
+        warpers.append(MinPLogitsWarper(min_p=min_p))
+    typical_p = getattr(generation_config, "typical_p", None)
+    if typical_p is not None and typical_p < 1.0:
+        warpers.append(TypicalLogitsWarper(mass=typical_p))
+    epsilon = getattr(generation_config, "epsilon_cutoff", None)
+    if epsilon is not None and 0.0 < epsilon < 1.0:
+        warpers.append(EpsilonLogitsWarper(epsilon=epsilon))
+    eta = getattr(generation_config, "eta_cutoff", None)
+    if eta is not None and 0.0 < eta < 1.0:
+        warpers.append(EtaLogitsWarper(epsilon=eta, device=str(device)))
+    return warpers
+
+
+class SeededSampler(LogitsProcessor):
+    """Samples row ``i`` of every step from the generator seeded with
+    ``seeds[i]``."""
+
+    def __init__(self, seeds: Sequence[int], generation_config: Any) -> None:
+        self._generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+        self._generation_config = generation_config
+        self._warpers: List[LogitsProcessor] | None = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor):
+        if scores.shape[0] != len(self._generators):
+            raise RuntimeError(
+                f"Sampler has {len(self._generators)} streams for {scores.shape[0]} rows."
+            )
+        if self._warpers is None:
+            self._warpers = _sampling_warpers(self._generation_config, scores.device)
+        for warper in self._warpers:
+            scores = warper(input_ids, scores)
+        cdf = torch.softmax(scores.float(), dim=-1).cumsum(dim=-1)
+        uniforms = torch.cat(
+            [torch.rand(1, generator=generator) for generator in self._generators]
+        ).to(cdf.device)
+        # The first token whose cumulative probability exceeds the draw;
+        # tokens of probability zero are never chosen.
+        tokens = torch.searchsorted(
+            cdf, (uniforms * cdf[:, -1])[:, None], right=True
+        ).clamp_(max=cdf.shape[-1] - 1)
+        # Finite rather than -inf, so the warpers generate() applies after
+        # this processor see a valid distribution.
+        chosen = torch.full_like(scores, torch.finfo(scores.dtype).min)
+        return chosen.scatter_(1, tokens, 0.0)
+
+
+def task_sampler(
+    args: models.GPTTaskArgs, generation_config: Any
+) -> SeededSampler | None:
+    """The sampler of a sampled single-beam task, one stream per returned
+    sequence."""
+    if getattr(generation_config, "do_sample", False) is not True:
+        return None
+    if (getattr(generation_config, "num_beams", None) or 1) > 1:
+        return None
+    count = getattr(generation_config, "num_return_sequences", None) or 1
+    return SeededSampler(sequence_seeds(args.seed, count), generation_config)
+
+
+def add_sampler(
+    generate_kwargs: Dict[str, Any], sampler: SeededSampler | None
+) -> Dict[str, Any]:
+    """``generate_kwargs`` with the sampler appended to its logits
+    processors, after any other custom processor."""
+    if sampler is None:
+        return generate_kwargs
+    processors = LogitsProcessorList(generate_kwargs.get("logits_processor") or [])
+    processors.append(sampler)
+    return {**generate_kwargs, "logits_processor": processors}
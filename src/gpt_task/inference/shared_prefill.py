@@ -0,0 +1,96 @@
+"""Shared prefill for multi-sequence generation.
+
+``generate()`` expands the prompt to ``max(num_beams, num_return_sequences)``
+rows before prefill, so every sequence recomputes the same prompt and its
+activations. For text prompts the prompt minus its last token is instead
+run once at batch size one and the resulting KV cache is repeated for each
+row; ``generate()`` then only feeds the last prompt token per row before it
+starts decoding.
+
+Transformers caches own their tensors per batch row, so the repeated cache
+is a copy rather than copy-on-write: the prefill compute and its
+activation peak are paid once, the KV memory is still paid per row.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Mapping
+
+import torch
+from transformers.cache_utils import Cache
+
+_logger = logging.getLogger(__name__)
+
+# Model inputs the shared prefill knows how to split. Multimodal inputs
+# (pixel values, image grids, rope deltas) stay on the regular path.
+_TEXT_INPUT_KEYS = frozenset({"input_ids", "attention_mask"})
+
+
+def shared_prefill_copies(generation_config: Any) -> int:
+    """Number of rows ``generate()`` expands a single prompt to."""
+    return max(
+        getattr(generation_config, "num_beams", None) or 1,
+        getattr(generation_config, "num_return_sequences", None) or 1,
+    )
+
+
+def prefill_shared_prompt(
+    model: Any,
+    model_inputs: Mapping[str, Any],
+    generation_config: Any,
+) -> Cache | None:
+    """Prefill all but the last prompt token once and return the KV cache
+    repeated for every row of the expanded batch, or None when the task
+    does not qualify and must run the regular prefill."""
+    copies = shared_prefill_copies(generation_config)
+    if copies <= 1:
+        return None
+    if getattr(generation_config, "use_cache", True) is False:
+        return None
+    if getattr(generation_config, "cache_implementation", None) is not None:
+        return None
+    if getattr(model.config, "is_encoder_decoder", False):
+        return None
+    supports_dynamic_cache = getattr(model, "_supports_default_dynamic_cache", None)
+    if supports_dynamic_cache is None or not supports_dynamic_cache():
+        return None
+
+    tensor_keys = {
+        key for key, value in model_inputs.items() if torch.is_tensor(value)
+    }
+    if not tensor_keys <= _TEXT_INPUT_KEYS:
+        return None
+    if model_inputs.get("mm_encoder_outputs") is not None:
+        return None
+    input_ids = model_inputs.get("input_ids")
+    if not torch.is_tensor(input_ids) or input_ids.ndim != 2:
+        return None
+    if input_ids.shape[0] != 1 or input_ids.shape[1] < 2:
+        return None
+    attention_mask = model_inputs.get("attention_mask")
+    if attention_mask is not None and not bool((attention_mask == 1).all()):
+        return None
+
+    forward_kwargs: dict[str, Any] = {"use_cache": True}
+    supports_logits_to_keep = getattr(model, "_supports_logits_to_keep", None)
+    if supports_logits_to_keep is not None and supports_logits_to_keep():
+        forward_kwargs["logits_to_keep"] = 1
+
+    with torch.no_grad():
+        outputs = model(
+            input_ids=input_ids[:, :-1].to(model.device),
+            **forward_kwargs,
+        )
+    cache = getattr(outputs, "past_key_values", None)
+    del outputs
+    if not isinstance(cache, Cache):
+        return None
+
+    cache.batch_repeat_interleave(copies)
+    _logger.debug(
+        "Shared prefill of %d prompt tokens across %d sequences",
+        input_ids.shape[1] - 1,
+        copies,
+    )
+    return cache
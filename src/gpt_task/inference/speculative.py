@@ -0,0 +1,152 @@
+"""Speculative decoding with a configured draft model.
+
+Decode on large models is memory-bandwidth bound. When the node maps a
+target model to a small draft model that shares its tokenizer, greedy tasks
+that set ``speculative`` run Transformers assisted generation: the draft
+proposes tokens and the target verifies them in one forward pass. The
+verification pass runs with other shapes than plain decoding, so near-tie
+argmax decisions may flip; tasks opt in rather than every task on a mapped
+target changing its output. The draft model is loaded with the target
+pipeline and lives and dies with its cache entry.
+"""
+
+from __future__ import annotations
+
+import logging
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, List
+
+from gpt_task import models
+from gpt_task.config import Config
+
+from .task_context import readable_task_context, writable_task_context
+from .utils import load_model_kwargs, supports_assisted_generation
+
+_logger = logging.getLogger(__name__)
+
+# Draft models keyed by the pipeline they were loaded for, so evicting the
+# pipeline from the model cache also releases its draft.
+_draft_models: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+
+
+@dataclass(frozen=True)
+class SpeculativeStats:
+    draft_model: str
+    completion_tokens: int
+    target_forward_passes: int
+    draft_forward_passes: int
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Share of drafted tokens the target accepted. Every target pass
+        yields its accepted draft tokens plus one token of its own."""
+        if self.draft_forward_passes <= 0:
+            return 0.0
+        accepted = max(self.completion_tokens - self.target_forward_passes, 0)
+        return min(accepted / self.draft_forward_passes, 1.0)
+
+    @property
+    def tokens_per_forward(self) -> float:
+        if self.target_forward_passes <= 0:
+            return 0.0
+        return self.completion_tokens / self.target_forward_passes
+
+
+def clear_speculative_stats() -> None:
+    writable_task_context().speculative_stats = None
+
+
+def set_speculative_stats(stats: SpeculativeStats | None) -> None:
+    writable_task_context().speculative_stats = stats
+
+
+def get_speculative_stats() -> SpeculativeStats | None:
+    """Statistics of the last task's assisted generation, or None when the
+    task did not use a draft model."""
+    context = readable_task_context()
+    return None if context is None else context.speculative_stats
+
+
+def resolve_draft_model_id(config: Config, args: models.GPTTaskArgs) -> str | None:
+    """The draft model of a task that opted into speculative decoding."""
+    if not args.speculative:
+        return None
+    return config.speculative.draft_models.get(args.model)
+
+
+def load_draft_model(
+    draft_model_id: str,
+    target_model: Any,
+    config: Config,
+    torch_dtype: Any,
+) -> Any:
+    from transformers import AutoModelForCausalLM
+
+    _logger.info("Start loading draft model %s", draft_model_id)
+    model_kwargs = load_model_kwargs(config=config)
+    draft = AutoModelForCausalLM.from_pretrained(
+        draft_model_id,
+        trust_remote_code=True,
+        local_files_only=config.local_files_only,
+        dtype=torch_dtype if torch_dtype is not None else target_model.dtype,
+        **model_kwargs,
+    )
+    # The draft is small, so it sits on the device holding the target's
+    # embeddings instead of being planned by device_map="auto".
+    draft.to(target_model.device)
+    draft.eval()
+
+    _check_shared_tokenizer(target_model, draft, draft_model_id)
+    if config.speculative.num_assistant_tokens is not None:
+        draft.generation_config.num_assistant_tokens = (
+            config.speculative.num_assistant_tokens
+        )
+    _logger.info("Loading draft model completes")
+    return draft
+
+
+def _check_shared_tokenizer(target_model: Any, draft: Any, draft_model_id: str) -> None:
+    target_config = target_model.config.get_text_config()
+    draft_config = draft.config.get_text_config()
+    for attr in ("vocab_size", "bos_token_id", "eos_token_id", "pad_token_id"):
+        if getattr(target_config, attr, None) != getattr(draft_config, attr, None):
+            raise RuntimeError(
+                f"Draft model {draft_model_id} does not share the target "
+                f"tokenizer ({attr} differs)."
+            )
+
+
+def attach_draft_model(pipe: Any, draft: Any) -> None:
+    _draft_models[pipe] = draft
+
+
+def get_draft_model(pipe: Any) -> Any:
+    try:
+        return _draft_models.get(pipe)
+    except TypeError:
+        return None
+
+
+class _ForwardCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, module: Any, args: Any) -> None:
+        self.count += 1
+
+
+@contextmanager
+def count_forward_passes(*modules: Any) -> Iterator[List[_ForwardCounter]]:
+    """Count top-level forward calls of each module while generating."""
+    counters = [_ForwardCounter() for _ in modules]
+    handles = [
+        module.register_forward_pre_hook(counter)
+        for module, counter in zip(modules, counters)
+    ]
+    try:
+        yield counters
+    finally:
+        for handle in handles:
+            handle.remove()
@@ -0,0 +1,101 @@
+"""Execution state of the current GPT task.
+
+The facts a task reports besides its response (executed GPU count,
+execution dtype, allocator and speculative stats, timing report) live in
+a ``TaskContext`` bound to a context variable instead of module globals,
+so tasks running at the same time in different threads or asyncio tasks
+do not overwrite each other.
+
+A task writes to the context bound where it runs, binding a new one if
+there is none. Each thread therefore keeps the state of the last task it
+ran, and the existing getters (``get_execution_dtype()`` and friends) read
+it as before. A reader without a bound context, such as a coroutine
+that ran the task through ``asyncio.to_thread``, falls back to the context
+written last in the process. That is the previous global behaviour.
+
+Callers that run tasks concurrently should read the result explicitly:
+
+    with task_context() as context:
+        run_task(...)
+    context.execution_dtype
+
+A context holds one task at a time; run concurrent tasks under separate
+``task_context()`` blocks.
+"""
+
+from __future__ import annotations
+
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from gpt_task.cache import AllocatorStats
+
+    from .profiling import TaskProfile
+    from .recorder import PendingRecord
+    from .speculative import SpeculativeStats
+    from .task_report import TaskReport, TaskTimer
+
+
+@dataclass
+class TaskContext:
+    executed_gpu_count: int | None = None
+    execution_dtype: str | None = None
+    allocator_stats: "AllocatorStats | None" = None
+    speculative_stats: "SpeculativeStats | None" = None
+    task_report: "TaskReport | None" = None
+    # Timer, profile and record of the task while it runs.
+    timer: "TaskTimer | None" = field(default=None, repr=False)
+    profile: "TaskProfile | None" = field(default=None, repr=False)
+    recording: "PendingRecord | None" = field(default=None, repr=False)
+
+    @property
+    def model_cache_hit(self) -> bool | None:
+        return None if self.task_report is None else self.task_report.model_cache_hit
+
+    def clear(self) -> None:
+        for item in fields(self):
+            setattr(self, item.name, None)
+
+
+_current: contextvars.ContextVar[TaskContext | None] = contextvars.ContextVar(
+    "gpt_task_context", default=None
+)
+_last_written: TaskContext | None = None
+
+
+@contextmanager
+def task_context() -> Iterator[TaskContext]:
+    """Bind a fresh context for the tasks run inside the block; it holds the
+    state of the last of them."""
+    context = TaskContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def writable_task_context() -> TaskContext:
+    """The context the current task writes to, bound on first use."""
+    global _last_written
+
+    context = _current.get()
+    if context is None:
+        context = TaskContext()
+        _current.set(context)
+    _last_written = context
+    return context
+
+
+def bound_task_context() -> TaskContext | None:
+    """The context bound where the caller runs, if any."""
+    return _current.get()
+
+
+def readable_task_context() -> TaskContext | None:
+    """The bound context, or else the one written last in the process."""
+    context = _current.get()
+    return context if context is not None else _last_written
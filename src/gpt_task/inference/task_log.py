@@ -0,0 +1,170 @@
+"""Size-bounded, lazily formatted task log fields.
+
+Task arguments carry base64 images and responses carry long texts;
+formatting them with f-strings built multi-megabyte log lines, even for
+records the log level then dropped. ``loggable(value)`` wraps a value
+for a ``%s`` placeholder instead:
+
+- nothing is formatted unless a handler actually emits the record;
+- image payloads (base64 strings, raw bytes, decoded images) are replaced
+  by their size, and decoded images by their content digest;
+- long strings are truncated, and long sequences (token ids, messages)
+  are sampled down to their head and tail;
+- tensors are described by shape and dtype only;
+- the whole rendering stops once the line reaches its character budget.
+
+The limits are node configuration (``Config.logging``).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, List
+
+import torch
+from pydantic import BaseModel
+
+from gpt_task.config import Config, LoggingConfig
+from gpt_task.models.images import DecodedImage
+
+_limits = LoggingConfig()
+
+
+def configure_task_log(config: Config) -> None:
+    """Apply the configured limits to the task log fields that follow."""
+    global _limits
+
+    _limits = config.logging
+
+
+class _Budget(Exception):
+    """Raised once the line reaches its character budget."""
+
+
+class _Writer:
+    def __init__(self, limits: LoggingConfig) -> None:
+        self.limits = limits
+        self.parts: List[str] = []
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        remaining = self.limits.max_line_chars - self.size
+        if len(text) > remaining:
+            self.parts.append(text[:remaining])
+            raise _Budget
+        self.parts.append(text)
+        self.size += len(text)
+
+
+def _write_str(writer: _Writer, value: str) -> None:
+    limit = writer.limits.max_field_chars
+    if len(value) <= limit:
+        writer.write(repr(value))
+    else:
+        writer.write(f"{value[:limit]!r}...(+{len(value) - limit} chars)")
+
+
+def _write_items(writer: _Writer, items: Any, depth: int) -> None:
+    limit = writer.limits.max_items
+    count = len(items)
+    if count <= limit:
+        shown = [(index, items[index]) for index in range(count)]
+    else:
+        head = (limit + 1) // 2
+        shown = [(index, items[index]) for index in range(head)]
+        shown.append((None, None))
+        shown += [(index, items[index]) for index in range(count - limit + head, count)]
+    for position, (index, item) in enumerate(shown):
+        if position:
+            writer.write(", ")
+        if index is None:
+            writer.write(f"...({count - limit} more)")
+        else:
+            _write(writer, item, depth)
+
+
+def _write(writer: _Writer, value: Any, depth: int = 0, key: Any = None) -> None:
+    if value is None or isinstance(value, (bool, int, float)):
+        writer.write(repr(value))
+    elif isinstance(value, str):
+        if key == "base64":
+            writer.write(f"<base64: {len(value)} chars>")
+        else:
+            _write_str(writer, value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        size = value.nbytes if isinstance(value, memoryview) else len(value)
+        writer.write(f"<{size} bytes>")
+    elif isinstance(value, DecodedImage):
+        writer.write(f"<image {len(value.data)} bytes sha256:{value.digest[:16]}>")
+    elif torch.is_tensor(value):
+        writer.write(
+            f"tensor(shape={list(value.shape)}, dtype={value.dtype}, "
+            f"device={value.device})"
+        )
+    elif depth >= writer.limits.max_depth:
+        writer.write(f"<{type(value).__name__}>")
+    elif isinstance(value, BaseModel):
+        writer.write(f"{type(value).__name__}(")
+        for position, name in enumerate(type(value).model_fields):
+            if position:
+                writer.write(", ")
+            writer.write(f"{name}=")
+            _write(writer, getattr(value, name), depth + 1, name)
+        writer.write(")")
+    elif isinstance(value, Mapping):
+        writer.write("{")
+        _write_mapping(writer, value, depth + 1)
+        writer.write("}")
+    elif isinstance(value, (list, tuple)):
+        opening, closing = ("[", "]") if isinstance(value, list) else ("(", ")")
+        writer.write(opening)
+        _write_items(writer, value, depth + 1)
+        writer.write(closing)
+    else:
+        writer.write(_truncate(repr(value), writer.limits.max_field_chars))
+
+
+def _write_mapping(writer: _Writer, value: Mapping, depth: int) -> None:
+    limit = writer.limits.max_items
+    for position, name in enumerate(value):
+        if position == limit:
+            writer.write(f", ...({len(value) - limit} more keys)")
+            break
+        if position:
+            writer.write(", ")
+        writer.write(f"{name!r}: ")
+        _write(writer, value[name], depth, name)
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def format_loggable(value: Any, limits: LoggingConfig | None = None) -> str:
+    """Bounded rendering of ``value``, as ``loggable`` emits it."""
+    writer = _Writer(limits or _limits)
+    try:
+        _write(writer, value)
+    except _Budget:
+        writer.parts.append("...(truncated)")
+    return "".join(writer.parts)
+
+
+class _Loggable:
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        return format_loggable(self.value)
+
+    __repr__ = __str__
+
+
+def loggable(value: Any) -> Any:
+    """Wrap ``value`` for a ``%s`` log placeholder; it is rendered with
+    ``format_loggable`` only when the record is emitted."""
+    return _Loggable(value)
@@ -0,0 +1,397 @@
+"""Per-stage timing report of the current GPT task.
+
+Every task records where its time went, as stages measured from the task
+start:
+
+- ``config_load``: model config resolution (tensor-parallel routing only;
+  the classic pipeline loads its config as part of ``model_load``);
+- ``processor_load`` and ``model_load``: absent on a model cache hit;
+- ``adapter_render``: chat template and, for image input, the processor
+  call that also tokenizes the prompt;
+- ``tokenization``: text prompt tokenization;
+- ``prefill``: the shared prefill, if any, and the first forward pass of
+  ``generate()``;
+- ``decode``: the remaining forward passes;
+- ``detokenize``: completion decoding (non-streaming tasks);
+- ``ipc``: tensor-parallel queue transit, both ways.
+
+The report also carries the time to first token, decode throughput and
+the peak allocated GPU memory. It is read with ``get_task_report()`` after
+``run_task`` or ``run_task_tp`` returns, and exported as Prometheus text
+(``to_prometheus``) or OpenTelemetry spans (``to_otlp`` and
+``export_task_spans`` for an OTLP/HTTP collector).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+
+import torch
+
+from gpt_task.cache import AllocatorStats
+
+from .task_context import (
+    bound_task_context,
+    readable_task_context,
+    writable_task_context,
+)
+
+DEFAULT_OTLP_ENDPOINT = "http://127.0.0.1:4318/v1/traces"
+
+
+@dataclass(frozen=True)
+class StageTiming:
+    name: str
+    # Seconds from the task start.
+    start: float
+    duration: float
+
+
+@dataclass(frozen=True)
+class TaskReport:
+    model: str
+    # Execution plan mode: "device_map" or "tensor_parallel".
+    mode: str
+    # Wall-clock task start, in seconds since the epoch.
+    started_at: float
+    duration: float
+    stages: Tuple[StageTiming, ...]
+    model_cache_hit: bool | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    time_to_first_token: float | None = None
+    peak_allocated_bytes: int | None = None
+    # Config.determinism level the task ran with.
+    determinism: str | None = None
+    # Whether the response came from the result cache; None when the task
+    # was not cacheable.
+    result_cache_hit: bool | None = None
+
+    def stage_seconds(self, name: str) -> float | None:
+        """Total duration of a stage, or None when the task skipped it."""
+        durations = [stage.duration for stage in self.stages if stage.name == name]
+        return sum(durations) if durations else None
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        """Completion tokens per second of decode."""
+        decode = self.stage_seconds("decode")
+        if not self.completion_tokens or not decode:
+            return None
+        return self.completion_tokens / decode
+
+    def to_prometheus(self) -> str:
+        """The report in the Prometheus text exposition format."""
+        labels = f'model="{_escape_label(self.model)}",mode="{self.mode}"'
+        lines: List[str] = []
+
+        def gauge(name: str, help_text: str, samples: List[Tuple[str, Any]]) -> None:
+            samples = [(extra, value) for extra, value in samples if value is not None]
+            if not samples:
+                return
+            lines.append(f"# HELP gpt_task_{name} {help_text}")
+            lines.append(f"# TYPE gpt_task_{name} gauge")
+            for extra, value in samples:
+                sample_labels = f"{labels},{extra}" if extra else labels
+                lines.append(f"gpt_task_{name}{{{sample_labels}}} {float(value)!r}")
+
+        stage_names = list(dict.fromkeys(stage.name for stage in self.stages))
+        gauge(
+            "stage_seconds",
+            "Time the last task spent in each stage.",
+            [(f'stage="{name}"', self.stage_seconds(name)) for name in stage_names],
+        )
+        gauge("duration_seconds", "Duration of the last task.", [("", self.duration)])
+        gauge(
+            "time_to_first_token_seconds",
+            "Time from the last task start to its first generated token.",
+            [("", self.time_to_first_token)],
+        )
+        gauge(
+            "tokens_per_second",
+            "Decode throughput of the last task.",
+            [("", self.tokens_per_second)],
+        )
+        gauge("prompt_tokens", "Prompt tokens of the last task.", [("", self.prompt_tokens)])
+        gauge(
+            "completion_tokens",
+            "Completion tokens of the last task.",
+            [("", self.completion_tokens)],
+        )
+        gauge(
+            "peak_allocated_bytes",
+            "Peak allocated GPU memory of the last task.",
+            [("", self.peak_allocated_bytes)],
+        )
+        gauge(
+            "model_cache_hit",
+            "Whether the last task found its model loaded.",
+            [("", None if self.model_cache_hit is None else int(self.model_cache_hit))],
+        )
+        gauge(
+            "result_cache_hit",
+            "Whether the last task's response came from the result cache.",
+            [("", None if self.result_cache_hit is None else int(self.result_cache_hit))],
+        )
+        return "\n".join(lines) + "\n"
+
+    def to_otlp(self, service_name: str = "gpt_task") -> Dict[str, Any]:
+        """The report as an OTLP/JSON trace export request: one task span
+        with a child span per stage."""
+        trace_id = os.urandom(16).hex()
+        root_id = os.urandom(8).hex()
+
+        def nanos(offset: float) -> str:
+            return str(int((self.started_at + offset) * 1e9))
+
+        attributes = {
+            "gpt_task.model": self.model,
+            "gpt_task.mode": self.mode,
+            "gpt_task.model_cache_hit": self.model_cache_hit,
+            "gpt_task.prompt_tokens": self.prompt_tokens,
+            "gpt_task.completion_tokens": self.completion_tokens,
+            "gpt_task.time_to_first_token": self.time_to_first_token,
+            "gpt_task.tokens_per_second": self.tokens_per_second,
+            "gpt_task.peak_allocated_bytes": self.peak_allocated_bytes,
+            "gpt_task.determinism": self.determinism,
+            "gpt_task.result_cache_hit": self.result_cache_hit,
+        }
+        spans = [
+            {
+                "traceId": trace_id,
+                "spanId": root_id,
+                "name": "gpt_task.task",
+                "kind": 1,
+                "startTimeUnixNano": nanos(0.0),
+                "endTimeUnixNano": nanos(self.duration),
+                "attributes": _otlp_attributes(attributes),
+            }
+        ]
+        for stage in self.stages:
+            spans.append(
+                {
+                    "traceId": trace_id,
+                    "spanId": os.urandom(8).hex(),
+                    "parentSpanId": root_id,
+                    "name": f"gpt_task.{stage.name}",
+                    "kind": 1,
+                    "startTimeUnixNano": nanos(stage.start),
+                    "endTimeUnixNano": nanos(stage.start + stage.duration),
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes({"service.name": service_name})
+                    },
+                    "scopeSpans": [{"scope": {"name": "gpt_task"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+def export_task_spans(
+    report: TaskReport,
+    endpoint: str = DEFAULT_OTLP_ENDPOINT,
+    timeout: float = 2.0,
+    service_name: str = "gpt_task",
+) -> None:
+    """Send the report's spans to an OTLP/HTTP collector. Raises OSError
+    when the collector cannot be reached."""
+    request = urllib.request.Request(
+        endpoint,
+        data=json.dumps(report.to_otlp(service_name)).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout):
+        pass
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _otlp_attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    attributes = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+@dataclass
+class TaskTimer:
+    """Stage timings collected while a task runs."""
+
+    model: str
+    mode: str
+    started_at: float = field(default_factory=time.time)
+    stages: List[StageTiming] = field(default_factory=list)
+    model_cache_hit: bool | None = None
+    time_to_first_token: float | None = None
+    determinism: str | None = None
+    result_cache_hit: bool | None = None
+    _origin: float = field(default_factory=time.perf_counter)
+
+    def now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def add_stage(self, name: str, start: float, duration: float) -> None:
+        self.stages.append(StageTiming(name, start, max(duration, 0.0)))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_stage(name, start, self.now() - start)
+
+    def merge(self, report: TaskReport, start: float, duration: float) -> None:
+        """Fold in the report of a task run elsewhere (a tensor-parallel
+        rank) between ``start`` and ``start + duration``; the time not
+        covered by the remote task is queue transit."""
+        offset = report.started_at - self.started_at
+        for stage in report.stages:
+            self.add_stage(stage.name, stage.start + offset, stage.duration)
+        self.add_stage("ipc", start, duration - report.duration)
+        if report.model_cache_hit is not None:
+            self.model_cache_hit = report.model_cache_hit
+        if report.time_to_first_token is not None:
+            self.time_to_first_token = report.time_to_first_token + offset
+        if report.determinism is not None:
+            self.determinism = report.determinism
+
+    def report(
+        self,
+        prompt_tokens: int | None = None,
+        completion_tokens: int | None = None,
+        allocator_stats: AllocatorStats | None = None,
+    ) -> TaskReport:
+        return TaskReport(
+            model=self.model,
+            mode=self.mode,
+            started_at=self.started_at,
+            duration=self.now(),
+            stages=tuple(sorted(self.stages, key=lambda stage: stage.start)),
+            model_cache_hit=self.model_cache_hit,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            time_to_first_token=self.time_to_first_token,
+            peak_allocated_bytes=(
+                None if allocator_stats is None else allocator_stats.peak_allocated_bytes
+            ),
+            determinism=self.determinism,
+            result_cache_hit=self.result_cache_hit,
+        )
+
+
+@contextmanager
+def task_timing(model: str, mode: str) -> Iterator[TaskTimer]:
+    """Time the task run inside the block. A task delegated to another
+    executor (tensor-parallel falling back to classic) keeps the timer of
+    the outer task."""
+    context = writable_task_context()
+    if context.timer is not None:
+        context.timer.mode = mode
+        yield context.timer
+        return
+    context.timer = TaskTimer(model, mode)
+    try:
+        yield context.timer
+    finally:
+        context.timer = None
+
+
+def get_task_timer() -> TaskTimer | None:
+    context = bound_task_context()
+    return None if context is None else context.timer
+
+
+@contextmanager
+def task_stage(name: str) -> Iterator[None]:
+    """Record the block as a stage of the current task, if one is timed."""
+    timer = get_task_timer()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+@contextmanager
+def generation_stages(model: Any) -> Iterator[None]:
+    """Record ``generate()`` in the block as prefill and decode, split at
+    the end of the model's first forward pass."""
+    timer = get_task_timer()
+    if timer is None:
+        yield
+        return
+
+    start = timer.now()
+    first_forward_end: List[float] = []
+
+    def on_forward(module: Any, args: Any, output: Any) -> None:
+        if not first_forward_end:
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            first_forward_end.append(timer.now())
+
+    register = getattr(model, "register_forward_hook", None)
+    handle = register(on_forward) if register is not None else None
+    try:
+        yield
+    finally:
+        if handle is not None:
+            handle.remove()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        end = timer.now()
+        if first_forward_end:
+            timer.add_stage("prefill", start, first_forward_end[0] - start)
+            timer.add_stage("decode", first_forward_end[0], end - first_forward_end[0])
+            timer.time_to_first_token = first_forward_end[0]
+        else:
+            timer.add_stage("prefill", start, end - start)
+
+
+def clear_task_report() -> None:
+    writable_task_context().task_report = None
+
+
+def set_task_report(report: TaskReport | None) -> None:
+    writable_task_context().task_report = report
+
+
+def get_task_report() -> TaskReport | None:
+    """Timing report of the last task, or None when it did not finish."""
+    context = readable_task_context()
+    return None if context is None else context.task_report
+
+
+def finish_task_report(
+    prompt_tokens: int | None = None,
+    completion_tokens: int | None = None,
+    allocator_stats: AllocatorStats | None = None,
+) -> None:
+    """Publish the report of the current task, if one is timed."""
+    timer = get_task_timer()
+    if timer is not None:
+        set_task_report(timer.report(prompt_tokens, completion_tokens, allocator_stats))
@@ -1,5 +1,11 @@
 from ..executed_gpu_count import get_executed_gpu_count
-from .api import run_task_tp
+from .api import run_task_tp, verify_task_tp, verify_tasks_tp
 from .executor import shutdown_tp_executor
 
-__all__ = ["get_executed_gpu_count", "run_task_tp", "shutdown_tp_executor"]
+__all__ = [
+    "get_executed_gpu_count",
+    "run_task_tp",
+    "shutdown_tp_executor",
+    "verify_task_tp",
+    "verify_tasks_tp",
+]
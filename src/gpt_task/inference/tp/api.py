@@ -3,20 +3,44 @@ from __future__ import annotations
 import logging
 import os
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Literal, Mapping, Optional, Sequence, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from gpt_task import models
-from gpt_task.cache import ModelCache
+from gpt_task.cache import ModelCache, get_vram_arbiter
+from gpt_task.cache.residency import ensure_idle_reaper
 from gpt_task.config import Config, get_config
 
+from ..allocator_stats import clear_allocator_stats, set_allocator_stats
 from ..errors import error_context
 from ..executed_gpu_count import clear_executed_gpu_count, set_executed_gpu_count
 from ..execution_dtype import clear_execution_dtype, set_execution_dtype
 from ..inference import run_task
+from ..key import generate_model_key
 from ..model_adapters.input import contains_image_blocks
 from ..model_adapters.tp_plan import validate_effective_tp_plan
-from ..utils import load_model_kwargs
-from .executor import shutdown_tp_executor, submit_tp_task
+from ..profiling import select_task_profile
+from ..recorder import record_task_args, task_recording
+from ..result_cache import cached_task_result, result_cache_key
+from ..task_report import (
+    clear_task_report,
+    finish_task_report,
+    task_stage,
+    task_timing,
+)
+from ..utils import bind_task_args, load_model_kwargs
+from ..verification import VerificationResult, group_by_model_key, verify_tasks
+from .executor import shutdown_tp_executor, submit_tp_task, submit_tp_verification
 from .result import TPTaskResult
 from .runtime_strategy import (
     TP_MODEL_LOADER_CAUSAL_LM,
@@ -220,6 +244,7 @@ def run_task_tp(
     quantize_bits: Literal[4, 8] | None = None,
     config: Config | None = None,
     model_cache: ModelCache | None = None,
+    trusted: bool = False,
 ) -> Union[models.GPTTaskResponse, models.GPTTaskStreamResponse]:
     """Run a GPT task on the tensor parallel executor.
 
@@ -227,69 +252,171 @@ def run_task_tp(
     classic run_task path in-process. When GPT_TP_FALLBACK=reduce_gpus and
     the full visible GPU count cannot shard the model, the largest K >= 2
     that divides all TP-sharded dimensions is used instead.
+
+    ``trusted`` binds the keyword fields without validating them; pass it
+    only for fields that already passed validation.
     """
     if config is None:
         config = get_config()
 
     clear_executed_gpu_count()
     clear_execution_dtype()
-
-    with error_context(local_files_only=config.local_files_only):
-        if args is None:
-            args = models.GPTTaskArgs.model_validate(
-                {
-                    "model": model,
-                    "messages": messages,
-                    "tools": tools,
-                    "generation_config": generation_config,
-                    "template_args": template_args,
-                    "seed": seed,
-                    "dtype": dtype,
-                    "quantize_bits": quantize_bits,
-                }
+    clear_allocator_stats()
+    clear_task_report()
+    ensure_idle_reaper(config.memory.idle_ttl)
+
+    model_name = args.model if args is not None else model
+    with (
+        task_recording(config, "tensor_parallel", stream_callback is not None),
+        task_timing(model_name, "tensor_parallel") as timer,
+    ):
+        with error_context(local_files_only=config.local_files_only):
+            if args is None:
+                args = bind_task_args(
+                    trusted,
+                    model=model,
+                    messages=messages,
+                    tools=tools,
+                    generation_config=generation_config,
+                    template_args=template_args,
+                    seed=seed,
+                    dtype=dtype,
+                    quantize_bits=quantize_bits,
+                )
+
+            import torch
+
+            record_task_args(args)
+            visible_gpus = torch.cuda.device_count()
+            with task_stage("config_load"):
+                resolution = _resolve_tp_task(args, config, visible_gpus)
+
+        # The two execution paths must never hold models in VRAM at the same
+        # time: a classic-fallback task tears down the rank group so its full
+        # model load does not compete with the cached shards, and a TP task
+        # evicts the worker-level cache before the rank group loads shards.
+        if resolution is None:
+            shutdown_tp_executor()
+            # run_task records visible GPU count as the classic executed count
+            # and logs the final device_map execution plan.
+            return run_task(
+                args,
+                stream_callback=stream_callback,
+                config=config,
+                model_cache=model_cache,
             )
 
-        import torch
-
-        visible_gpus = torch.cuda.device_count()
-        resolution = _resolve_tp_task(args, config, visible_gpus)
+        world_size = resolution.world_size
+        set_executed_gpu_count(world_size)
+        _logger.info(
+            "Task execution plan: mode=%s, gpu_count=%d, visible_gpus=%d, model=%s",
+            "tensor_parallel",
+            world_size,
+            visible_gpus,
+            args.model,
+        )
 
-    # The two execution paths must never hold models in VRAM at the same
-    # time: a classic-fallback task tears down the rank group so its full
-    # model load does not compete with the cached shards, and a TP task
-    # evicts the worker-level cache before the rank group loads shards.
-    if resolution is None:
-        shutdown_tp_executor()
-        # run_task records visible GPU count as the classic executed count
-        # and logs the final device_map execution plan.
-        return run_task(
+        def execute(callback):
+            if model_cache is not None:
+                model_cache.clear()
+
+            with get_vram_arbiter().task_scope():
+                submitted = timer.now()
+                result = submit_tp_task(
+                    world_size,
+                    resolution.strategy,
+                    args,
+                    config,
+                    callback,
+                    profile_tag=select_task_profile(config, args.model),
+                )
+            if not isinstance(result, TPTaskResult):
+                raise RuntimeError("Tensor-parallel executor returned an invalid result.")
+            set_execution_dtype(result.execution_dtype)
+            set_allocator_stats(result.allocator_stats)
+            if result.report is not None:
+                timer.merge(result.report, submitted, timer.now() - submitted)
+                finish_task_report(
+                    result.report.prompt_tokens,
+                    result.report.completion_tokens,
+                    result.allocator_stats,
+                )
+            return result.response
+
+        result_key = result_cache_key(
+            config,
             args,
-            stream_callback=stream_callback,
-            config=config,
-            model_cache=model_cache,
+            mode="tensor_parallel",
+            gpu_count=world_size,
+            model_key=generate_model_key(args),
+            stream=stream_callback is not None,
         )
+        return cached_task_result(config, result_key, stream_callback, execute)
 
-    world_size = resolution.world_size
-    set_executed_gpu_count(world_size)
-    _logger.info(
-        "Task execution plan: mode=%s, gpu_count=%d, visible_gpus=%d, model=%s",
-        "tensor_parallel",
-        world_size,
-        visible_gpus,
-        args.model,
-    )
 
-    if model_cache is not None:
-        model_cache.clear()
+def verify_tasks_tp(
+    requests: Sequence[Tuple[models.GPTTaskArgs, Sequence[int]]],
+    *,
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+    tolerance: float = 0.0,
+    batch_size: int = 8,
+) -> List[VerificationResult]:
+    """Verify ``(args, completion_token_ids)`` pairs on the tensor parallel
+    executor; see ``gpt_task.inference.verification``. Models that cannot
+    run under tensor parallelism are verified on the classic path, as
+    ``run_task_tp`` would run their tasks."""
+    if config is None:
+        config = get_config()
 
-    result = submit_tp_task(
-        world_size,
-        resolution.strategy,
-        args,
-        config,
-        stream_callback,
-    )
-    if not isinstance(result, TPTaskResult):
-        raise RuntimeError("Tensor-parallel executor returned an invalid result.")
-    set_execution_dtype(result.execution_dtype)
-    return result.response
+    ensure_idle_reaper(config.memory.idle_ttl)
+
+    import torch
+
+    visible_gpus = torch.cuda.device_count()
+    results: List[VerificationResult | None] = [None] * len(requests)
+    for indices in group_by_model_key(requests, config).values():
+        group = [(requests[index][0], list(requests[index][1])) for index in indices]
+        with error_context(local_files_only=config.local_files_only):
+            resolution = _resolve_tp_task(group[0][0], config, visible_gpus)
+        if resolution is None:
+            shutdown_tp_executor()
+            verified = verify_tasks(
+                group,
+                config=config,
+                model_cache=model_cache,
+                tolerance=tolerance,
+                batch_size=batch_size,
+            )
+        else:
+            if model_cache is not None:
+                model_cache.clear()
+            with get_vram_arbiter().task_scope():
+                verified = submit_tp_verification(
+                    resolution.world_size,
+                    resolution.strategy,
+                    group,
+                    config,
+                    tolerance,
+                    batch_size,
+                )
+        for index, result in zip(indices, verified):
+            results[index] = result
+    return results  # type: ignore[return-value]
+
+
+def verify_task_tp(
+    args: models.GPTTaskArgs,
+    completion_token_ids: Sequence[int],
+    *,
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+    tolerance: float = 0.0,
+) -> VerificationResult:
+    """Tensor parallel counterpart of ``verify_task``."""
+    return verify_tasks_tp(
+        [(args, completion_token_ids)],
+        config=config,
+        model_cache=model_cache,
+        tolerance=tolerance,
+    )[0]
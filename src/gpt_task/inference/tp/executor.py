@@ -5,13 +5,16 @@ import multiprocessing as mp
 import queue as queue_lib
 import socket
 import threading
-from typing import Callable, List, Optional
+import time
+from typing import Any, Callable, List, Optional, Tuple
 
 from gpt_task import models
+from gpt_task.cache.residency import get_vram_arbiter
 from gpt_task.config import Config
 
 from ..errors import (ModelDownloadError, ModelInvalid, ModelNotDownloaded,
                       TaskArgsInvalid, TaskExecutionError)
+from ..model_adapters.input import image_blocks
 from .runtime_strategy import TPRuntimeStrategy
 from .rank_worker import rank_worker_main
 
@@ -39,6 +42,32 @@ def _find_free_port() -> int:
         return s.getsockname()[1]
 
 
+def _picklable_args(args: models.GPTTaskArgs) -> models.GPTTaskArgs:
+    """Copy memoryview image sources to bytes: the task queues pickle their
+    payloads and memoryviews cannot be pickled. File and shared-memory
+    sources travel as their path or name and are read by every rank."""
+    if not any(
+        isinstance(block.get("data"), memoryview)
+        for block in image_blocks(args.messages)
+    ):
+        return args
+    messages = []
+    for message in args.messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            message = dict(message)
+            message["content"] = [
+                (
+                    {**block, "data": bytes(block["data"])}
+                    if isinstance(block.get("data"), memoryview)
+                    else block
+                )
+                for block in content
+            ]
+        messages.append(message)
+    return args.model_copy(update={"messages": messages})
+
+
 def _rebuild_error(name: str, message: str) -> Exception:
     if name == "OutOfMemoryError":
         import torch
@@ -56,11 +85,15 @@ class TPExecutor:
     Spawns one rank process per visible GPU and keeps them alive across
     tasks so per-rank model shards stay cached. Task args go in and results
     come back over multiprocessing queues.
+
+    CUDA reads ``CUDA_LAUNCH_BLOCKING`` when a rank initializes its context,
+    before the first task, so whether launches block is fixed per group.
     """
 
-    def __init__(self, world_size: int) -> None:
+    def __init__(self, world_size: int, launch_blocking: bool = True) -> None:
         assert world_size >= 2
         self._world_size = world_size
+        self._launch_blocking = launch_blocking
         self._seq = 0
 
         ctx = mp.get_context("spawn")
@@ -78,6 +111,7 @@ class TPExecutor:
                     port,
                     self._task_queues[rank],
                     self._result_queue,
+                    launch_blocking,
                 ),
                 daemon=True,
             )
@@ -93,6 +127,10 @@ class TPExecutor:
     def world_size(self) -> int:
         return self._world_size
 
+    @property
+    def launch_blocking(self) -> bool:
+        return self._launch_blocking
+
     def all_ranks_alive(self) -> bool:
         return all(p.is_alive() for p in self._processes)
 
@@ -118,8 +156,10 @@ class TPExecutor:
         args: models.GPTTaskArgs,
         config: Config,
         stream_callback: Optional[Callable] = None,
+        profile_tag: Optional[str] = None,
     ):
-        """Run one task on the rank group. Returns the task response, or
+        """Run one task on the rank group, profiled on every rank under
+        ``profile_tag`` if given. Returns the task response, or
         None in stream mode. Raises the task error reconstructed from the
         failing rank; the caller owns group teardown on failure."""
         self._seq += 1
@@ -129,13 +169,42 @@ class TPExecutor:
             "task",
             seq,
             strategy,
-            args,
+            _picklable_args(args),
             config,
             stream_callback is not None,
+            profile_tag,
+        )
+        for q in self._task_queues:
+            q.put(payload)
+        return self._wait_result(seq, stream_callback)
+
+    def verify(
+        self,
+        strategy: TPRuntimeStrategy,
+        requests: List[Tuple[models.GPTTaskArgs, List[int]]],
+        config: Config,
+        tolerance: float,
+        batch_size: int,
+    ):
+        """Verify completions of tasks that share one model on the rank
+        group. Returns the rank 0 verification results."""
+        self._seq += 1
+        seq = self._seq
+
+        payload = (
+            "verify",
+            seq,
+            strategy,
+            [(_picklable_args(args), list(completion)) for args, completion in requests],
+            config,
+            tolerance,
+            batch_size,
         )
         for q in self._task_queues:
             q.put(payload)
+        return self._wait_result(seq)
 
+    def _wait_result(self, seq: int, stream_callback: Optional[Callable] = None):
         while True:
             try:
                 msg = self._result_queue.get(timeout=_RESULT_POLL_INTERVAL)
@@ -168,6 +237,11 @@ class TPExecutor:
 
 _executor_lock = threading.Lock()
 _executor: Optional[TPExecutor] = None
+# Tasks currently submitted to the rank group and the clock time the last
+# one finished; idle eviction and VRAM requests never tear down a busy group.
+_active_tasks = 0
+_last_used = time.monotonic()
+_clock: Callable[[], float] = time.monotonic
 
 
 def shutdown_tp_executor() -> None:
@@ -182,32 +256,57 @@ def shutdown_tp_executor() -> None:
             _executor = None
 
 
-def submit_tp_task(
-    world_size: int,
-    strategy: TPRuntimeStrategy,
-    args: models.GPTTaskArgs,
-    config: Config,
-    stream_callback: Optional[Callable] = None,
+class _TPExecutorResident:
+    """Exposes the persistent rank group to the VRAM arbiter as a single
+    releasable entry."""
+
+    def idle_since(self) -> Optional[float]:
+        with _executor_lock:
+            if _executor is None or _active_tasks > 0:
+                return None
+            return _last_used
+
+    def release_lru(self) -> bool:
+        global _executor
+
+        with _executor_lock:
+            if _executor is None or _active_tasks > 0:
+                return False
+            _executor.shutdown()
+            _executor = None
+            return True
+
+
+_resident = _TPExecutorResident()
+get_vram_arbiter().register(_resident)
+
+
+def _run_on_executor(
+    world_size: int, config: Config, call: Callable[[TPExecutor], Any]
 ):
-    """Run one task on the lazily-spawned persistent executor, respawning
+    """Run ``call`` on the lazily-spawned persistent executor, respawning
     the rank group if it died, was torn down after a previous failure, or
     was created for a different world_size (reduce_gpus may pick a different
-    K per model)."""
-    global _executor
+    K per model) or launch blocking (only the strict determinism level
+    blocks)."""
+    global _executor, _active_tasks, _last_used
 
+    launch_blocking = config.determinism == "strict"
     with _executor_lock:
         if _executor is not None and (
             not _executor.all_ranks_alive()
             or _executor.world_size != world_size
+            or _executor.launch_blocking != launch_blocking
         ):
             _executor.shutdown()
             _executor = None
         if _executor is None:
-            _executor = TPExecutor(world_size)
+            _executor = TPExecutor(world_size, launch_blocking)
         executor = _executor
+        _active_tasks += 1
 
     try:
-        return executor.submit(strategy, args, config, stream_callback)
+        return call(executor)
     except Exception as e:
         if type(e).__name__ not in _PRE_EXECUTION_ERROR_TYPES:
             with _executor_lock:
@@ -215,3 +314,44 @@ def submit_tp_task(
                     executor.shutdown()
                     _executor = None
         raise
+    finally:
+        with _executor_lock:
+            _active_tasks -= 1
+            _last_used = _clock()
+
+
+def submit_tp_task(
+    world_size: int,
+    strategy: TPRuntimeStrategy,
+    args: models.GPTTaskArgs,
+    config: Config,
+    stream_callback: Optional[Callable] = None,
+    profile_tag: Optional[str] = None,
+):
+    """Run one task on the persistent executor."""
+    return _run_on_executor(
+        world_size,
+        config,
+        lambda executor: executor.submit(
+            strategy, args, config, stream_callback, profile_tag
+        ),
+    )
+
+
+def submit_tp_verification(
+    world_size: int,
+    strategy: TPRuntimeStrategy,
+    requests: List[Tuple[models.GPTTaskArgs, List[int]]],
+    config: Config,
+    tolerance: float = 0.0,
+    batch_size: int = 8,
+):
+    """Verify completions of tasks that share one model on the persistent
+    executor."""
+    return _run_on_executor(
+        world_size,
+        config,
+        lambda executor: executor.verify(
+            strategy, requests, config, tolerance, batch_size
+        ),
+    )
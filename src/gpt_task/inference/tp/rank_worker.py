@@ -6,13 +6,47 @@ import traceback
 from typing import Any, Dict, List, Tuple
 
 from gpt_task import models
+from gpt_task.cache import GPUMemoryManager, get_memory_manager
 from gpt_task.config import Config
 
 from ..execution_dtype import resolve_model_execution_dtype
 from ..input_rendering import encode_rendered_task_input, render_task_input
-from ..model_adapters import ModelAdapterContext
+from ..logits_digest import task_logits_digest
+from ..model_adapters import (
+    ModelAdapterContext,
+    ModelAdapterPlan,
+    attach_adapter_plan,
+    build_adapter_plan,
+    get_adapter_plan,
+)
 from ..model_adapters.artifacts import configure_artifacts
 from ..model_adapters.input import contains_image_blocks
+from ..model_adapters.input.vision.budget import (
+    check_vision_limit,
+    count_vision_tokens,
+    node_vision_limits,
+    resolve_vision_budget,
+    use_vision_budget,
+)
+from ..model_adapters.input.vision.embedding_cache import (
+    encode_images_with_cache,
+    get_vision_embedding_cache,
+)
+from ..model_adapters.input.vision.pixel_cache import get_pixel_cache
+from ..model_adapters.input.vision.preprocess import (
+    get_preprocess_pool,
+    prefetch_task_inputs,
+)
+from ..profiling import profiled_phase, task_profiling
+from ..sampling import add_sampler, task_sampler
+from ..task_log import configure_task_log, loggable
+from ..task_report import (
+    TaskReport,
+    generation_stages,
+    get_task_timer,
+    task_stage,
+    task_timing,
+)
 from .result import TPTaskResult
 from .runtime_strategy import TPRuntimeStrategy
 
@@ -26,6 +60,7 @@ def _prepare_task_inputs(
     tokenizer: Any,
     args: models.GPTTaskArgs,
     device: Any,
+    plan: ModelAdapterPlan | None = None,
 ):
     has_image_input = contains_image_blocks(args.messages)
     if has_image_input and not strategy.requires_processor:
@@ -40,9 +75,12 @@ def _prepare_task_inputs(
         config=model_config,
         processor=processor,
         tokenizer=tokenizer,
+        plan=plan,
     )
-    rendered = render_task_input(context, args, device)
-    return encode_rendered_task_input(rendered, tokenizer, device)
+    with task_stage("adapter_render"):
+        rendered = render_task_input(context, args, device)
+    with task_stage("tokenization"):
+        return encode_rendered_task_input(rendered, tokenizer, device)
 
 
 def _load_rank_artifacts(
@@ -72,11 +110,12 @@ def _load_rank_artifacts(
     }
 
     processor = None
-    if strategy.requires_processor:
-        processor = AutoProcessor.from_pretrained(args.model, **load_kwargs)
-        tokenizer = processor.tokenizer
-    else:
-        tokenizer = AutoTokenizer.from_pretrained(args.model, **load_kwargs)
+    with task_stage("processor_load"):
+        if strategy.requires_processor:
+            processor = AutoProcessor.from_pretrained(args.model, **load_kwargs)
+            tokenizer = processor.tokenizer
+        else:
+            tokenizer = AutoTokenizer.from_pretrained(args.model, **load_kwargs)
 
     if strategy.model_loader == TP_MODEL_LOADER_IMAGE_TEXT_TO_TEXT:
         model_class = AutoModelForImageTextToText
@@ -85,20 +124,21 @@ def _load_rank_artifacts(
     else:
         raise RuntimeError(f"Unsupported TP model loader: {strategy.model_loader}")
 
-    model = model_class.from_pretrained(
-        args.model,
-        tp_plan="auto",
-        dtype=torch_dtype,
-        **load_kwargs,
-    )
-    configure_artifacts(
-        ModelAdapterContext(
-            config=model.config,
-            model=model,
-            processor=processor,
-            tokenizer=tokenizer,
+    with task_stage("model_load"):
+        model = model_class.from_pretrained(
+            args.model,
+            tp_plan="auto",
+            dtype=torch_dtype,
+            **load_kwargs,
         )
+    context = ModelAdapterContext(
+        config=model.config,
+        model=model,
+        processor=processor,
+        tokenizer=tokenizer,
     )
+    configure_artifacts(context)
+    attach_adapter_plan(model, build_adapter_plan(context))
     return model, tokenizer, processor
 
 
@@ -108,6 +148,7 @@ def rank_worker_main(
     port: int,
     task_queue: Any,
     result_queue: Any,
+    launch_blocking: bool = True,
 ):
     """Entry point of one persistent tensor parallel rank process.
 
@@ -116,6 +157,9 @@ def rank_worker_main(
     NVLS is disabled so the floating point reduction order does not depend
     on the machine's interconnect topology, keeping collectives bitwise
     deterministic across nodes with the same GPU model and count.
+    CUDA_LAUNCH_BLOCKING is read when the CUDA context is created, here
+    rather than in a task, so it is set now, either way: ranks inherit the
+    parent environment, which an operator may have set.
     """
     os.environ["MASTER_ADDR"] = "127.0.0.1"
     os.environ["MASTER_PORT"] = str(port)
@@ -125,6 +169,7 @@ def rank_worker_main(
     os.environ["NCCL_ALGO"] = "Ring"
     os.environ["NCCL_PROTO"] = "Simple"
     os.environ["NCCL_NVLS_ENABLE"] = "0"
+    os.environ["CUDA_LAUNCH_BLOCKING"] = "1" if launch_blocking else "0"
 
     import torch
     import torch.distributed as dist
@@ -147,9 +192,33 @@ def rank_worker_main(
             msg = task_queue.get()
             if msg[0] == "stop":
                 break
-            _, seq, strategy, args, config, stream = msg
+            if msg[0] == "verify":
+                _, seq, strategy, requests, config, tolerance, batch_size = msg
+                try:
+                    with error_context(local_files_only=config.local_files_only):
+                        results = _execute_verification(
+                            rank,
+                            strategy,
+                            requests,
+                            config,
+                            tolerance,
+                            batch_size,
+                            model_cache,
+                        )
+                    if rank == 0:
+                        result_queue.put(("result", seq, results))
+                except Exception as e:
+                    result_queue.put(
+                        ("error", seq, type(e).__name__, str(e), traceback.format_exc())
+                    )
+                continue
+            _, seq, strategy, args, config, stream, profile_tag = msg
             try:
-                with error_context(local_files_only=config.local_files_only):
+                with (
+                    error_context(local_files_only=config.local_files_only),
+                    task_timing(args.model, "tensor_parallel"),
+                    task_profiling(config, args.model, tag=profile_tag, rank=rank),
+                ):
                     resp = _execute_task(
                         rank,
                         seq,
@@ -170,34 +239,24 @@ def rank_worker_main(
         dist.destroy_process_group()
 
 
-def _execute_task(
+def _load_cached_model(
     rank: int,
-    seq: int,
     strategy: TPRuntimeStrategy,
     args: models.GPTTaskArgs,
     config: Config,
-    stream: bool,
-    result_queue: Any,
+    model_key: str,
     model_cache: Dict[str, Tuple[Any, Any, Any]],
+    memory_manager: Any,
 ):
     import torch
-    from transformers import set_seed
-
-    from ..inference import TokenStreamer
-    from ..key import generate_model_key
-    from ..utils import resolve_generation_config, use_deterministic_mode
 
-    if rank == 0:
-        _logger.info("TP task starts")
-        _logger.info(f"task args: {args}")
-
-    use_deterministic_mode()
-    set_seed(args.seed)
-
-    model_key = f"{strategy!r}:{generate_model_key(args)}"
+    timer = get_task_timer()
+    if timer is not None:
+        timer.model_cache_hit = model_key in model_cache
     if model_key not in model_cache:
-        model_cache.clear()
-        torch.cuda.empty_cache()
+        if model_cache:
+            model_cache.clear()
+            memory_manager.model_unloaded()
 
         torch_dtype = None
         if args.dtype == "float16":
@@ -219,6 +278,93 @@ def _execute_task(
         model_cache[model_key] = (model, tokenizer, processor)
 
     model, tokenizer, processor = model_cache[model_key]
+    plan = get_adapter_plan(
+        model,
+        ModelAdapterContext(
+            config=model.config,
+            model=model,
+            processor=processor,
+            tokenizer=tokenizer,
+        ),
+    )
+    return model, tokenizer, processor, plan
+
+
+def _execute_task(
+    rank: int,
+    seq: int,
+    strategy: TPRuntimeStrategy,
+    args: models.GPTTaskArgs,
+    config: Config,
+    stream: bool,
+    result_queue: Any,
+    model_cache: Dict[str, Tuple[Any, Any, Any]],
+):
+    from transformers import set_seed
+
+    from ..key import generate_model_key
+    from ..utils import use_deterministic_mode
+
+    configure_task_log(config)
+    if rank == 0:
+        _logger.info("TP task starts")
+        _logger.info("task args: %s", loggable(args))
+
+    use_deterministic_mode(config.determinism)
+    set_seed(args.seed)
+    timer = get_task_timer()
+    if timer is not None:
+        timer.determinism = config.determinism
+
+    model_key = f"{strategy!r}:{generate_model_key(args)}"
+    get_pixel_cache(config)
+    get_preprocess_pool(config)
+    if contains_image_blocks(args.messages):
+        # Decode the images on the pool while the shard loads.
+        prefetch_task_inputs(args)
+    memory_manager = get_memory_manager(config, devices=[rank])
+    memory_manager.begin_task(model_key)
+    try:
+        return _generate_on_rank(
+            rank,
+            seq,
+            strategy,
+            args,
+            config,
+            stream,
+            result_queue,
+            model_cache,
+            model_key,
+            memory_manager,
+        )
+    finally:
+        # _generate_on_rank ends the tasks it finishes, which makes this a
+        # no-op; a failed one still has to end so the trim policy runs.
+        memory_manager.end_task()
+
+
+def _generate_on_rank(
+    rank: int,
+    seq: int,
+    strategy: TPRuntimeStrategy,
+    args: models.GPTTaskArgs,
+    config: Config,
+    stream: bool,
+    result_queue: Any,
+    model_cache: Dict[str, Tuple[Any, Any, Any]],
+    model_key: str,
+    memory_manager: GPUMemoryManager,
+):
+    import torch
+
+    from ..completions import decode_completions
+    from ..inference import TokenStreamer
+    from ..shared_prefill import prefill_shared_prompt
+    from ..utils import resolve_generation_config
+
+    model, tokenizer, processor, plan = _load_cached_model(
+        rank, strategy, args, config, model_key, model_cache, memory_manager
+    )
     execution_dtype = resolve_model_execution_dtype(model)
 
     resolved_generation_config = resolve_generation_config(
@@ -228,16 +374,26 @@ def _execute_task(
         resolved_generation_config.pad_token_id = tokenizer.eos_token_id
     if stream:
         resolved_generation_config.use_cache = True
+    # Every rank computes the chain so all ranks run the same ops.
+    digest = task_logits_digest(args, resolved_generation_config)
 
-    encoded = _prepare_task_inputs(
-        strategy,
-        model.config,
-        processor,
-        tokenizer,
-        args,
-        torch.device(f"cuda:{rank}"),
-    )
+    with use_vision_budget(resolve_vision_budget(args), node_vision_limits(config)):
+        encoded = _prepare_task_inputs(
+            strategy,
+            model.config,
+            processor,
+            tokenizer,
+            args,
+            torch.device(f"cuda:{rank}"),
+            plan,
+        )
     input_tokens: List[int] = encoded["input_ids"][0].tolist()
+    vision_tokens = (
+        count_vision_tokens(model.config, encoded["input_ids"])
+        if contains_image_blocks(args.messages)
+        else None
+    )
+    check_vision_limit(node_vision_limits(config), "max_vision_tokens", vision_tokens)
 
     streamer = None
     if stream and rank == 0:
@@ -247,55 +403,83 @@ def _execute_task(
             args.model,
             lambda resp: result_queue.put(("stream", seq, resp)),
         )
+        streamer.vision_tokens = vision_tokens
+        streamer.logits_digest = digest
+
+    # Every rank takes the same decision from the same inputs, so the
+    # shared prefill forward runs collectively on all ranks or on none.
+    with task_stage("prefill"), profiled_phase():
+        shared_cache = prefill_shared_prompt(
+            model, encoded, resolved_generation_config
+        )
+    # Every rank draws the same tokens from the same per-sequence streams.
+    generate_kwargs: Dict[str, Any] = add_sampler(
+        digest.generate_kwargs() if digest is not None else {},
+        task_sampler(args, resolved_generation_config),
+    )
+    if shared_cache is not None:
+        generate_kwargs["past_key_values"] = shared_cache
+    # Ranks see the same tasks in the same order and hold identical cache
+    # state, so a sharded vision encoder runs on all ranks or on none.
+    encoded = encode_images_with_cache(
+        model,
+        model_key,
+        args,
+        encoded,
+        get_vision_embedding_cache(config),
+    )
 
-    with torch.no_grad():
+    with torch.no_grad(), generation_stages(model), profiled_phase():
         output = model.generate(
             **encoded,
             generation_config=resolved_generation_config,
             streamer=streamer,
+            **generate_kwargs,
         )
+    del shared_cache
 
+    allocator_stats = memory_manager.end_task()
     if rank != 0:
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
         return None
     if stream:
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        return TPTaskResult(response=None, execution_dtype=execution_dtype)
+        usage = streamer.get_usage()
+        return TPTaskResult(
+            response=None,
+            execution_dtype=execution_dtype,
+            allocator_stats=allocator_stats,
+            report=_task_report(
+                usage["prompt_tokens"], usage["completion_tokens"], allocator_stats
+            ),
+        )
 
     prompt_tokens = len(input_tokens)
-    sequences: List[List[int]] = [
-        [int(t) for t in sequence] for sequence in output.tolist()
-    ]
-
-    completion_tokens = 0
-    choices: List[models.ResponseChoice] = []
-    for i, sequence in enumerate(sequences):
-        generated_tokens = sequence[prompt_tokens:]
-        if len(generated_tokens) > 0 and generated_tokens[-1] == tokenizer.eos_token_id:
-            finish_reason = "stop"
-        else:
-            finish_reason = "length"
-        completion_tokens += len(generated_tokens)
-        text = tokenizer.decode(
-            generated_tokens,
-            skip_special_tokens=True,
-            clean_up_tokenization_spaces=True,
-        ).strip()
-        choices.append(
-            {
-                "finish_reason": finish_reason,
-                "message": {"role": "assistant", "content": text},
-                "index": i,
-            }
+    with task_stage("detokenize"):
+        completions = decode_completions(
+            output, prompt_tokens, tokenizer, resolved_generation_config
+        )
+    del output
+    completion_tokens = completions.completion_tokens
+    choices: List[models.ResponseChoice] = [
+        {
+            "finish_reason": finish_reason,
+            "message": {"role": "assistant", "content": text},
+            "index": i,
+        }
+        for i, (finish_reason, text) in enumerate(
+            zip(completions.finish_reasons, completions.texts)
         )
+    ]
+    if digest is not None:
+        for choice, chain in zip(choices, digest.chains(completions.lengths)):
+            choice["logits_digest"] = chain
 
     usage: models.Usage = {
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "total_tokens": prompt_tokens + completion_tokens,
     }
+    if vision_tokens is not None:
+        usage["vision_tokens"] = vision_tokens
 
     resp: models.GPTTaskResponse = {
         "model": args.model,
@@ -303,9 +487,81 @@ def _execute_task(
         "usage": usage,
     }
 
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-
-    _logger.info(f"task response: {resp}")
+    _logger.info("task response: %s", loggable(resp))
     _logger.info("TP text generation completes")
-    return TPTaskResult(response=resp, execution_dtype=execution_dtype)
+    return TPTaskResult(
+        response=resp,
+        execution_dtype=execution_dtype,
+        allocator_stats=allocator_stats,
+        report=_task_report(prompt_tokens, completion_tokens, allocator_stats),
+    )
+
+
+def _execute_verification(
+    rank: int,
+    strategy: TPRuntimeStrategy,
+    requests: List[Tuple[models.GPTTaskArgs, List[int]]],
+    config: Config,
+    tolerance: float,
+    batch_size: int,
+    model_cache: Dict[str, Tuple[Any, Any, Any]],
+):
+    """Verify completions of tasks that share one model; every rank runs
+    the same forward passes."""
+    import torch
+
+    from ..key import generate_model_key
+    from ..utils import resolve_generation_config, use_deterministic_mode
+    from ..verification import check_verifiable, verify_completions
+
+    configure_task_log(config)
+    use_deterministic_mode(config.determinism)
+
+    args = requests[0][0]
+    model_key = f"{strategy!r}:{generate_model_key(args)}"
+    memory_manager = get_memory_manager(config, devices=[rank])
+    memory_manager.begin_task(model_key)
+    try:
+        model, tokenizer, processor, plan = _load_cached_model(
+            rank, strategy, args, config, model_key, model_cache, memory_manager
+        )
+
+        prompts = []
+        generation_configs = []
+        for task_args, _ in requests:
+            generation_config = resolve_generation_config(
+                model.generation_config, task_args
+            )
+            check_verifiable(task_args, generation_config)
+            generation_configs.append(generation_config)
+            encoded = _prepare_task_inputs(
+                strategy,
+                model.config,
+                processor,
+                tokenizer,
+                task_args,
+                torch.device(f"cuda:{rank}"),
+                plan,
+            )
+            prompts.append(encoded["input_ids"][0])
+
+        results = verify_completions(
+            model,
+            prompts,
+            [completion for _, completion in requests],
+            generation_configs,
+            tolerance=tolerance,
+            batch_size=batch_size,
+        )
+    finally:
+        memory_manager.end_task()
+    return results if rank == 0 else None
+
+
+def _task_report(
+    prompt_tokens: int, completion_tokens: int, allocator_stats: Any
+) -> TaskReport | None:
+    timer = get_task_timer()
+    if timer is None:
+        return None
+    return timer.report(prompt_tokens, completion_tokens, allocator_stats)
@@ -3,9 +3,15 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 from gpt_task import models
+from gpt_task.cache import AllocatorStats
+
+from ..task_report import TaskReport
 
 
 @dataclass(frozen=True)
 class TPTaskResult:
     response: models.GPTTaskResponse | None
     execution_dtype: str
+    allocator_stats: AllocatorStats | None = None
+    # Stage timings of rank 0.
+    report: TaskReport | None = None
@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import copy
 import os
+import threading
+import weakref
 from collections import UserDict
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
 
 import torch
 from pydantic import TypeAdapter
@@ -12,6 +15,8 @@ from transformers.utils import ModelOutput
 from gpt_task import models
 from gpt_task.config import Config, get_config
 
+from .model_adapters.input.utils import contains_image_blocks
+
 
 def load_model_kwargs(config: Config | None = None) -> Dict[str, Any]:
     """
@@ -44,6 +49,47 @@ def load_model_kwargs(config: Config | None = None) -> Dict[str, Any]:
     return res
 
 
+# Built once: constructing a TypeAdapter compiles a schema, which costs
+# more than the dump it is used for.
+_generation_config_adapter = TypeAdapter(models.GPTGenerationConfig)
+
+# Private snapshot of each model's generation config, taken on first use.
+# Tasks overlay their args on a shallow copy of it instead of deep-copying
+# the model's config; only the snapshot's top-level attributes are ever
+# reassigned, so the model's config and its nested values stay untouched.
+# Keyed by identity: GenerationConfig hashes and compares by its JSON
+# serialization, which would cost more than the copy saved.
+_frozen_bases: Dict[int, Tuple["weakref.ref[Any]", Any]] = {}
+_frozen_bases_lock = threading.Lock()
+
+
+def _frozen_base(base_generation_config: Any) -> Any:
+    key = id(base_generation_config)
+    with _frozen_bases_lock:
+        entry = _frozen_bases.get(key)
+        if entry is not None and entry[0]() is base_generation_config:
+            return entry[1]
+        frozen = copy.deepcopy(base_generation_config)
+        try:
+            ref = weakref.ref(
+                base_generation_config,
+                lambda _, key=key: _frozen_bases.pop(key, None),
+            )
+        except TypeError:
+            return frozen
+        _frozen_bases[key] = (ref, frozen)
+        return frozen
+
+
+def bind_task_args(trusted: bool = False, **fields: Any) -> models.GPTTaskArgs:
+    """Build task args from ``run_task`` keyword fields. ``trusted`` fields
+    were already validated, e.g. the ``model_dump()`` of validated args,
+    and are bound as given."""
+    if trusted:
+        return models.GPTTaskArgs.trusted(**fields)
+    return models.GPTTaskArgs.model_validate(fields)
+
+
 def resolve_generation_config(base_generation_config: Any, args: models.GPTTaskArgs) -> Any:
     """Resolve the effective GenerationConfig for a task by overlaying the
     task's generation args on the model's own generation config."""
@@ -52,7 +98,7 @@ def resolve_generation_config(base_generation_config: Any, args: models.GPTTaskA
         "max_new_tokens": 256,
     }
     if args.generation_config is not None:
-        customer_config = TypeAdapter(models.GPTGenerationConfig).dump_python(
+        customer_config = _generation_config_adapter.dump_python(
             args.generation_config,
             exclude_none=True,
             exclude_unset=True,
@@ -61,28 +107,77 @@ def resolve_generation_config(base_generation_config: Any, args: models.GPTTaskA
             if v is not None:
                 generation_kwargs[k] = v
 
-    resolved_generation_config = copy.deepcopy(base_generation_config)
+    resolved_generation_config = copy.copy(_frozen_base(base_generation_config))
     for k, v in generation_kwargs.items():
         setattr(resolved_generation_config, k, v)
     # Generation length is controlled exclusively by max_new_tokens, which is
     # always set; max_length (default 20) would conflict and cause a
     # transformers warning.
     resolved_generation_config.max_length = None
+    if getattr(resolved_generation_config, "prompt_lookup_num_tokens", None) is not None:
+        # Prompt lookup keeps the output identical to plain decoding only for
+        # greedy text tasks; any other task silently runs without it.
+        if contains_image_blocks(args.messages) or not supports_assisted_generation(
+            resolved_generation_config
+        ):
+            resolved_generation_config.prompt_lookup_num_tokens = None
     return resolved_generation_config
 
 
-def use_deterministic_mode():
+def supports_assisted_generation(generation_config: Any) -> bool:
+    """Assisted generation is limited to greedy search over one sequence;
+    that is the only case where output is identical to plain decoding."""
+    return (
+        not getattr(generation_config, "do_sample", False)
+        and (getattr(generation_config, "num_beams", None) or 1) == 1
+        and (getattr(generation_config, "num_return_sequences", None) or 1) == 1
+    )
+
+
+@contextmanager
+def launch_blocking(level: str = "strict") -> Iterator[None]:
+    """Set ``CUDA_LAUNCH_BLOCKING`` for the level inside the block and
+    restore the caller's value after it.
+
+    CUDA reads the variable once, when the process creates its context, so
+    entry points enter the block before their first CUDA call and the task
+    that creates the context decides launch blocking for the process.
+    Restoring it keeps a strict task from leaking launch blocking into the
+    environment tensor parallel ranks are later spawned with.
+    """
+    previous = os.environ.get("CUDA_LAUNCH_BLOCKING")
+    os.environ["CUDA_LAUNCH_BLOCKING"] = "1" if level == "strict" else "0"
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("CUDA_LAUNCH_BLOCKING", None)
+        else:
+            os.environ["CUDA_LAUNCH_BLOCKING"] = previous
+
+
+def use_deterministic_mode(level: str = "strict"):
     r"""
-    use deterministic mode
+    use the determinism level of ``Config.determinism``:
+        - strict: deterministic kernels and blocking kernel launches
+        - deterministic: deterministic kernels, asynchronous launches
+        - fast: the fastest kernels, TF32 matmuls, no reproducibility
+
+    Launch blocking is process state, set by ``launch_blocking`` in the
+    classic executor and at spawn by tensor parallel ranks.
     """
-    os.environ["CUDA_LAUNCH_BLOCKING"] = "1"
-    os.environ["CUBLAS_WORKSPACE_CONFIG"] = ":16:8"
-    torch.use_deterministic_algorithms(True, warn_only=True)
+    deterministic = level != "fast"
+    if deterministic:
+        os.environ["CUBLAS_WORKSPACE_CONFIG"] = ":16:8"
+    torch.use_deterministic_algorithms(deterministic, warn_only=True)
 
     if torch.cuda.is_available():
         # Use deterministic CUDA backends for reproducible worker results.
-        torch.backends.cudnn.deterministic = True
+        # Autotuning stays off at every level: decode shapes change every
+        # step and each new shape would be benchmarked again.
+        precision = "ieee" if deterministic else "tf32"
+        torch.backends.cudnn.deterministic = deterministic
         torch.backends.cudnn.benchmark = False
-        torch.backends.fp32_precision = "ieee"
-        torch.backends.cuda.matmul.fp32_precision = "ieee"
-        torch.backends.cudnn.fp32_precision = "ieee"
+        torch.backends.fp32_precision = precision
+        torch.backends.cuda.matmul.fp32_precision = precision
+        torch.backends.cudnn.fp32_precision = precision
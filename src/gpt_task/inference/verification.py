@@ -0,0 +1,367 @@
+"""Teacher-forced verification of greedy completions.
+
+Cross-validation re-runs a task to check a completion another node
+submitted. For a greedy task that check does not need the decode loop: a
+single forward pass over ``prompt + completion`` yields the logits that
+greedy decoding saw before each completion token, and the completion is
+what the task would have produced iff every token is the argmax of those
+logits (after the task's logits processors). The cost drops from one
+forward pass per completion token to one prefill-sized pass.
+
+``verify_task`` checks one completion, ``verify_tasks`` a list of them;
+completions of tasks on the same model are checked together in
+left-padded batches of ``batch_size`` rows. ``run_task_tp``'s counterpart
+is ``gpt_task.inference.tp.verify_tasks_tp``.
+
+A completion is the generated token ids without padding; it may end with
+an EOS token. Verification reports the first position where it departs
+from greedy decoding:
+
+- a token that is not the greedy choice (``expected_token_id`` is the
+  greedy choice);
+- a token after an EOS token or beyond ``max_new_tokens`` (greedy decoding
+  had stopped; ``expected_token_id`` is None);
+- the end of a completion that greedy decoding would have continued, for
+  tasks without ``stop_strings`` (``submitted_token_id`` is None).
+
+Batching and padding change the shape of the matrix products, and a
+one-pass prefill sums in a different order than incremental decoding, so
+logits can differ in the last bits from the run that produced the
+completion. ``tolerance`` accepts a token whose logit is within that
+distance of the maximum; 0 requires an exact argmax.
+
+Only text tasks without sampling or beam search can be verified.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Sequence, Tuple
+
+import torch
+
+from gpt_task import models
+from gpt_task.cache import ModelCache, get_memory_manager, get_vram_arbiter
+from gpt_task.config import Config, get_config
+
+from .errors import TaskArgsInvalid, error_context
+from .input_rendering import render_task_input
+from .key import generate_model_key
+from .model_adapters import ModelAdapterContext, get_adapter_plan
+from .model_adapters.input import contains_image_blocks
+from .speculative import resolve_draft_model_id
+from .utils import (launch_blocking, resolve_generation_config,
+                    use_deterministic_mode)
+
+_logger = logging.getLogger(__name__)
+
+# Generation options whose logits processors verification does not
+# reproduce; a task whose generation config sets one cannot be verified.
+_UNSUPPORTED_PROCESSOR_OPTIONS = (
+    "bad_words_ids",
+    "begin_suppress_tokens",
+    "exponential_decay_length_penalty",
+    "forced_bos_token_id",
+    "forced_eos_token_id",
+    "min_new_tokens",
+    "sequence_bias",
+    "suppress_tokens",
+    "watermarking_config",
+)
+
+
+@dataclass(frozen=True)
+class VerificationResult:
+    verified: bool
+    completion_tokens: int
+    # Completion index of the first token greedy decoding departs from;
+    # None when the completion is verified.
+    first_divergence: int | None = None
+    # The greedy choice at first_divergence; None when greedy decoding had
+    # stopped there.
+    expected_token_id: int | None = None
+    # The submitted token at first_divergence; None when the completion
+    # ended there.
+    submitted_token_id: int | None = None
+
+
+def check_verifiable(args: models.GPTTaskArgs, generation_config: Any) -> None:
+    """Raise TaskArgsInvalid unless the task's output is its greedy
+    decoding of text input."""
+    reason = None
+    if contains_image_blocks(args.messages):
+        reason = "image input"
+    elif getattr(generation_config, "do_sample", False):
+        reason = "sampling"
+    elif (getattr(generation_config, "num_beams", None) or 1) > 1:
+        reason = "beam search"
+    elif (getattr(generation_config, "min_length", None) or 0) > 0:
+        reason = "min_length"
+    else:
+        for option in _UNSUPPORTED_PROCESSOR_OPTIONS:
+            if getattr(generation_config, option, None) is not None:
+                reason = option
+                break
+        else:
+            guidance_scale = getattr(generation_config, "guidance_scale", None)
+            if guidance_scale is not None and guidance_scale != 1:
+                reason = "guidance_scale"
+    if reason is not None:
+        raise TaskArgsInvalid(f"a task with {reason} cannot be verified")
+
+
+def _greedy_logits_processors(generation_config: Any) -> List[Any]:
+    from transformers import (
+        NoRepeatNGramLogitsProcessor,
+        RepetitionPenaltyLogitsProcessor,
+    )
+
+    processors: List[Any] = []
+    penalty = getattr(generation_config, "repetition_penalty", None)
+    if penalty is not None and penalty != 1.0:
+        processors.append(RepetitionPenaltyLogitsProcessor(penalty=penalty))
+    ngram_size = getattr(generation_config, "no_repeat_ngram_size", None)
+    if ngram_size:
+        processors.append(NoRepeatNGramLogitsProcessor(ngram_size))
+    return processors
+
+
+def _eos_token_ids(generation_config: Any) -> List[int]:
+    eos = getattr(generation_config, "eos_token_id", None)
+    if eos is None:
+        return []
+    if isinstance(eos, int):
+        return [eos]
+    return [int(token) for token in eos]
+
+
+def _compare(
+    prompt: torch.Tensor,
+    completion: Sequence[int],
+    logits: torch.Tensor,
+    generation_config: Any,
+    tolerance: float,
+) -> VerificationResult:
+    """Compare a completion with the greedy choices of ``logits``, which
+    hold one row per completion token plus one after the last."""
+    count = len(completion)
+    scores = logits.float()
+    tokens = torch.tensor(completion, dtype=torch.long, device=scores.device)
+    processors = _greedy_logits_processors(generation_config)
+    if processors:
+        # Processors see the ids generate() passed them: the prompt and the
+        # completion up to the scored position.
+        ids = torch.cat([prompt.to(scores.device), tokens])[None]
+        length = prompt.shape[0]
+        rows = []
+        for t in range(count + 1):
+            row = scores[t : t + 1]
+            for processor in processors:
+                row = processor(ids[:, : length + t], row)
+            rows.append(row)
+        scores = torch.cat(rows)
+
+    top_scores, top_ids = scores.max(dim=-1)
+    top_ids = top_ids.tolist()
+    submitted_scores = scores[:count].gather(-1, tokens[:, None])[:, 0]
+    accepted = (submitted_scores >= top_scores[:count] - tolerance).tolist()
+
+    eos_ids = set(_eos_token_ids(generation_config))
+    max_new_tokens = getattr(generation_config, "max_new_tokens", None)
+    for t, token in enumerate(completion):
+        stopped = (max_new_tokens is not None and t >= max_new_tokens) or (
+            t > 0 and completion[t - 1] in eos_ids
+        )
+        if stopped:
+            return VerificationResult(False, count, t, None, token)
+        if not accepted[t]:
+            return VerificationResult(False, count, t, top_ids[t], token)
+
+    ended = (max_new_tokens is not None and count >= max_new_tokens) or (
+        count > 0 and completion[-1] in eos_ids
+    )
+    if not ended and not getattr(generation_config, "stop_strings", None):
+        # Greedy decoding stops here only by emitting EOS.
+        threshold = top_scores[count] - tolerance
+        if not any(bool(scores[count, eos] >= threshold) for eos in eos_ids):
+            return VerificationResult(False, count, count, top_ids[count], None)
+    return VerificationResult(True, count)
+
+
+def verify_completions(
+    model: Any,
+    prompts: Sequence[torch.Tensor],
+    completions: Sequence[Sequence[int]],
+    generation_configs: Sequence[Any],
+    *,
+    tolerance: float = 0.0,
+    batch_size: int = 8,
+) -> List[VerificationResult]:
+    """Verify each completion against its prompt's token ids with one
+    forward pass per batch of ``batch_size`` rows."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    device = model.device
+    supports_logits_to_keep = getattr(model, "_supports_logits_to_keep", None)
+    results: List[VerificationResult] = []
+    for start in range(0, len(prompts), batch_size):
+        rows = [
+            torch.cat(
+                [prompt.to("cpu"), torch.tensor(completion, dtype=torch.long)]
+            )
+            for prompt, completion in zip(
+                prompts[start : start + batch_size],
+                completions[start : start + batch_size],
+            )
+        ]
+        batch_completions = completions[start : start + batch_size]
+        width = max(row.shape[0] for row in rows)
+        keep = max(len(completion) for completion in batch_completions) + 1
+        pad_token_id = getattr(model.generation_config, "pad_token_id", None) or 0
+        # Left padding ends every row at the last column, so the logits of
+        # the trailing ``keep`` columns cover every completion.
+        input_ids = torch.full((len(rows), width), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+        for index, row in enumerate(rows):
+            input_ids[index, width - row.shape[0] :] = row
+            attention_mask[index, width - row.shape[0] :] = 1
+
+        forward_kwargs: Dict[str, Any] = {"use_cache": False}
+        if not bool(attention_mask.all()):
+            forward_kwargs["attention_mask"] = attention_mask.to(device)
+            forward_kwargs["position_ids"] = (
+                (attention_mask.cumsum(-1) - 1).clamp(min=0).to(device)
+            )
+        if supports_logits_to_keep is not None and supports_logits_to_keep():
+            forward_kwargs["logits_to_keep"] = keep
+        with torch.no_grad():
+            logits = model(input_ids=input_ids.to(device), **forward_kwargs).logits
+        logits = logits[:, -keep:]
+
+        for index, completion in enumerate(batch_completions):
+            results.append(
+                _compare(
+                    prompts[start + index],
+                    completion,
+                    logits[index, keep - len(completion) - 1 :],
+                    generation_configs[start + index],
+                    tolerance,
+                )
+            )
+        del logits
+    return results
+
+
+def group_by_model_key(
+    requests: Sequence[Tuple[models.GPTTaskArgs, Sequence[int]]], config: Config
+) -> Dict[str, List[int]]:
+    """Indices of the requests per model key, in request order."""
+    groups: Dict[str, List[int]] = {}
+    for index, (args, _) in enumerate(requests):
+        key = generate_model_key(
+            args, draft_model=resolve_draft_model_id(config, args)
+        )
+        groups.setdefault(key, []).append(index)
+    return groups
+
+
+def _prompt_token_ids(pipe: Any, args: models.GPTTaskArgs) -> torch.Tensor:
+    from .inference import _resolve_pipeline_tokenizer
+
+    context = ModelAdapterContext(
+        config=pipe.model.config,
+        model=pipe.model,
+        processor=getattr(pipe, "processor", None),
+        tokenizer=_resolve_pipeline_tokenizer(pipe),
+    )
+    context = replace(context, plan=get_adapter_plan(pipe, context))
+    rendered = render_task_input(context, args, pipe.model.device)
+    # The pipeline's own preprocessing yields the ids it passes to
+    # generate().
+    model_inputs = pipe.preprocess(rendered.generation_input, **pipe._preprocess_params)
+    return model_inputs["input_ids"][0]
+
+
+def verify_tasks(
+    requests: Sequence[Tuple[models.GPTTaskArgs, Sequence[int]]],
+    *,
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+    tolerance: float = 0.0,
+    batch_size: int = 8,
+) -> List[VerificationResult]:
+    """Verify ``(args, completion_token_ids)`` pairs on the classic
+    executor; results are in request order."""
+    from .inference import use_task_pipeline
+
+    if config is None:
+        config = get_config()
+
+    results: List[VerificationResult | None] = [None] * len(requests)
+    with (
+        launch_blocking(config.determinism),
+        error_context(local_files_only=config.local_files_only),
+    ):
+        use_deterministic_mode(config.determinism)
+        for model_key, indices in group_by_model_key(requests, config).items():
+            args = requests[indices[0]][0]
+            memory_manager = get_memory_manager(config)
+            memory_manager.begin_task(model_key)
+            try:
+                with (
+                    get_vram_arbiter().task_scope(),
+                    use_task_pipeline(
+                        args,
+                        config,
+                        model_key,
+                        resolve_draft_model_id(config, args),
+                        model_cache,
+                    ) as (pipe, _),
+                ):
+                    prompts = []
+                    generation_configs = []
+                    for index in indices:
+                        task_args = requests[index][0]
+                        generation_config = resolve_generation_config(
+                            pipe.model.generation_config, task_args
+                        )
+                        check_verifiable(task_args, generation_config)
+                        generation_configs.append(generation_config)
+                        prompts.append(_prompt_token_ids(pipe, task_args))
+                    verified = verify_completions(
+                        pipe.model,
+                        prompts,
+                        [list(requests[index][1]) for index in indices],
+                        generation_configs,
+                        tolerance=tolerance,
+                        batch_size=batch_size,
+                    )
+            finally:
+                memory_manager.end_task()
+            for index, result in zip(indices, verified):
+                results[index] = result
+    _logger.info(
+        "Verified %d completions, %d diverged",
+        len(requests),
+        sum(1 for result in results if result is not None and not result.verified),
+    )
+    return results  # type: ignore[return-value]
+
+
+def verify_task(
+    args: models.GPTTaskArgs,
+    completion_token_ids: Sequence[int],
+    *,
+    config: Config | None = None,
+    model_cache: ModelCache | None = None,
+    tolerance: float = 0.0,
+) -> VerificationResult:
+    """Check that ``completion_token_ids`` is the greedy completion of the
+    task with one forward pass over prompt and completion."""
+    return verify_tasks(
+        [(args, completion_token_ids)],
+        config=config,
+        model_cache=model_cache,
+        tolerance=tolerance,
+    )[0]
@@ -1,13 +1,18 @@
 from .args import (
+    BytesImageContentBlock,
+    FileImageContentBlock,
     GPTGenerationConfig,
     GPTTaskArgs,
     GPTTaskResponse,
     GPTTaskStreamResponse,
+    GPTVisionBudget,
     ImageContentBlock,
+    LogitsDigest,
     Message,
     MessageContent,
     MessageContentBlock,
     ResponseChoice,
+    SharedMemoryImageContentBlock,
     TextContentBlock,
     Usage,
 )
@@ -20,8 +25,13 @@ __all__ = [
     "MessageContentBlock",
     "TextContentBlock",
     "ImageContentBlock",
+    "BytesImageContentBlock",
+    "FileImageContentBlock",
+    "SharedMemoryImageContentBlock",
     "Usage",
     "ResponseChoice",
     "GPTTaskResponse",
     "GPTTaskStreamResponse",
+    "GPTVisionBudget",
+    "LogitsDigest",
 ]
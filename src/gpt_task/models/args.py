@@ -1,13 +1,15 @@
-import base64
-import binascii
 from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel
 from pydantic import ConfigDict
 from pydantic import Field
+from pydantic import PlainValidator
+from pydantic import ValidationInfo
 from pydantic import field_validator
-from typing_extensions import TypedDict
+from pydantic.json_schema import SkipJsonSchema
+from typing_extensions import NotRequired, TypedDict
 
+from .images import IMAGE_SOURCE_KEYS, LOCAL_IMAGE_SOURCE_KEYS, decode_image
 from .utils import NonEmptyString
 
 
@@ -25,7 +27,48 @@ class ImageContentBlock(TypedDict):
     base64: Annotated[str, Field(min_length=1)]
 
 
-MessageContentBlock = Union[TextContentBlock, ImageContentBlock]
+def _validate_image_bytes(value: Any) -> Any:
+    if not isinstance(value, (bytes, bytearray, memoryview)) or len(value) == 0:
+        raise ValueError("Image field 'data' must be non-empty bytes or memoryview.")
+    return value
+
+
+# In-process image sources. They skip the base64 round trip and are read
+# when the task renders its input. The JSON schema only describes the
+# base64 block used for network transport. File and shared-memory sources
+# read resources of the node and are only accepted by
+# GPTTaskArgs.in_process and trusted binding.
+class BytesImageContentBlock(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="forbid")
+
+    type: Literal["image"]
+    data: Annotated[Any, PlainValidator(_validate_image_bytes)]
+
+
+class FileImageContentBlock(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="forbid")
+
+    type: Literal["image"]
+    path: Annotated[str, Field(min_length=1)]
+
+
+class SharedMemoryImageContentBlock(TypedDict):
+    __pydantic_config__ = ConfigDict(extra="forbid")
+
+    type: Literal["image"]
+    shared_memory: Annotated[str, Field(min_length=1)]
+    # Image bytes at the start of the segment; defaults to the whole
+    # segment, which the OS may round up to a page boundary.
+    size: NotRequired[Annotated[int, Field(ge=1)]]
+
+
+MessageContentBlock = Union[
+    TextContentBlock,
+    ImageContentBlock,
+    SkipJsonSchema[BytesImageContentBlock],
+    SkipJsonSchema[FileImageContentBlock],
+    SkipJsonSchema[SharedMemoryImageContentBlock],
+]
 MessageContent = Union[str, List[MessageContentBlock]]
 
 
@@ -54,15 +97,38 @@ class GPTGenerationConfig(TypedDict, total=False):
 
     num_return_sequences: int
 
+    # Prompt lookup decoding: draft up to prompt_lookup_num_tokens tokens
+    # from n-gram matches (longest n first, up to max_matching_ngram_size)
+    # in the prompt and verify them in one forward pass.
+    prompt_lookup_num_tokens: Annotated[int, Field(ge=1)]
+    max_matching_ngram_size: Annotated[int, Field(ge=1)]
+
+class GPTVisionBudget(TypedDict, total=False):
+    # Caps applied before image processing; see docs/vision_budget.md.
+    __pydantic_config__ = ConfigDict(extra="forbid")
+
+    max_pixels: Annotated[int, Field(ge=1)]
+    max_tiles: Annotated[int, Field(ge=1)]
+    max_vision_tokens: Annotated[int, Field(ge=1)]
+
 class Usage(TypedDict):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    # Image placeholder tokens within prompt_tokens, for image tasks.
+    vision_tokens: NotRequired[int]
+
+class LogitsDigest(TypedDict):
+    # See docs/logits_digest.md.
+    root: str
+    steps: List[str]
 
 class StreamChoice(TypedDict):
     index: int
     delta: Message
     finish_reason: Optional[Literal["stop", "length"]]
+    # On the final chunk of a task with logits_digest.
+    logits_digest: NotRequired[LogitsDigest]
 
 class GPTTaskStreamResponse(TypedDict):
     model: NonEmptyString
@@ -75,26 +141,55 @@ class GPTTaskArgs(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     generation_config: Optional[GPTGenerationConfig] = None
     template_args: Optional[Dict[str, Any]] = None
+    vision_budget: Optional[GPTVisionBudget] = None
 
     seed: int = 0
     dtype: Literal["float16", "bfloat16", "float32", "auto"] = "auto"
     quantize_bits: Optional[Literal[4, 8]] = None
+    # Return the per-step logits digest chain of every choice.
+    logits_digest: bool = False
+    # Decode greedy tasks with the node's draft model for this model, if it
+    # has one. Assisted output can differ from plain greedy decoding at
+    # near-tie argmaxes, so tasks compared across nodes leave it off.
+    speculative: bool = False
 
     @field_validator("messages")
     @classmethod
-    def _validate_messages(cls, messages: List[Message]) -> List[Message]:
+    def _validate_messages(
+        cls, messages: List[Message], info: ValidationInfo
+    ) -> List[Message]:
+        allow_local = bool(info.context and info.context.get(_LOCAL_SOURCES))
         for message in messages:
             content = message.get("content")
             if isinstance(content, list):
                 for block in content:
-                    _validate_content_block(block)
+                    _validate_content_block(block, allow_local)
         return messages
 
+    @classmethod
+    def in_process(cls, **fields: Any) -> "GPTTaskArgs":
+        """Validate fields from an in-process caller, which may also use
+        file and shared-memory image sources. Plain validation, e.g. of
+        task args received from the network, rejects them."""
+        return cls.model_validate(fields, context={_LOCAL_SOURCES: True})
+
+    @classmethod
+    def trusted(cls, **fields: Any) -> "GPTTaskArgs":
+        """Build args from fields that already passed validation, such as
+        the ``model_dump()`` of validated args, without validating them
+        again. Fields left as None keep their defaults. Base64 images are
+        then decoded when the task renders its input; untrusted input must
+        go through ``model_validate``."""
+        return cls.model_construct(
+            **{name: value for name, value in fields.items() if value is not None}
+        )
+
 
 class ResponseChoice(TypedDict):
     index: int
     message: Message
     finish_reason: Literal["stop", "length"]
+    logits_digest: NotRequired[LogitsDigest]
 
 
 class GPTTaskResponse(TypedDict):
@@ -103,7 +198,11 @@ class GPTTaskResponse(TypedDict):
     usage: Usage
 
 
-def _validate_content_block(block: MessageContentBlock) -> None:
+# Validation context key allowing file and shared-memory image sources.
+_LOCAL_SOURCES = "local_image_sources"
+
+
+def _validate_content_block(block: MessageContentBlock, allow_local: bool) -> None:
     block_type = block.get("type")
     if block_type == "text":
         text = block.get("text")
@@ -111,12 +210,26 @@ def _validate_content_block(block: MessageContentBlock) -> None:
             raise ValueError("Text content block must include string field 'text'.")
         return
     if block_type == "image":
-        _validate_image_block(block)
+        _validate_image_block(block, allow_local)
         return
     raise ValueError("Unsupported content block type.")
 
 
-def _validate_image_block(block: ImageContentBlock) -> None:
+def _validate_image_block(block: MessageContentBlock, allow_local: bool) -> None:
+    sources = [key for key in IMAGE_SOURCE_KEYS if key in block]
+    if len(sources) != 1:
+        raise ValueError(
+            "Image content block must include exactly one of the fields "
+            "'base64', 'data', 'path' or 'shared_memory'."
+        )
+    if sources[0] in LOCAL_IMAGE_SOURCE_KEYS and not allow_local:
+        raise ValueError(
+            f"Image field {sources[0]!r} is only accepted from in-process callers."
+        )
+    if sources[0] != "base64":
+        # Bytes, file and shared-memory sources are read lazily.
+        return
+
     base64_value = block.get("base64")
     if not isinstance(base64_value, str) or not base64_value.strip():
         raise ValueError("Image content block must include non-empty string field 'base64'.")
@@ -128,7 +241,9 @@ def _validate_image_block(block: ImageContentBlock) -> None:
 
 
 def _validate_base64_data(data: str) -> None:
+    # The decoded payload is kept for the processor stage, so validation is
+    # the only place an image source is decoded.
     try:
-        base64.b64decode(data, validate=True)
-    except (ValueError, binascii.Error) as exc:
+        decode_image(data)
+    except ValueError as exc:
         raise ValueError("Image content block field 'base64' must be valid base64.") from exc
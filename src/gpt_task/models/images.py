@@ -0,0 +1,153 @@
+"""Image sources of content blocks.
+
+Validating a base64 image block already requires decoding its payload.
+The decoded bytes and their content hash are kept in a bounded LRU keyed
+by a digest of the base64 string, so the processor stage reuses them
+instead of decoding the same payload again, and identical images resent
+within a request or across the turns of a chat are decoded once. Keys are
+fixed-size, so the byte budget bounds what the store holds.
+
+In-process callers can skip base64 altogether and pass raw bytes, a local
+file path or a named shared-memory segment. Those sources are read when
+the task renders its input, not when the arguments are validated. File
+and shared-memory sources name resources of the node, so only arguments
+validated with ``GPTTaskArgs.in_process`` or bound as trusted may use
+them.
+
+A source that cannot be read or decoded raises ``ImageSourceError``; the
+task fails with ``TaskArgsInvalid``.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Mapping, Union
+
+# Keys naming the source of an image content block.
+IMAGE_SOURCE_KEYS = ("base64", "data", "path", "shared_memory")
+
+# Sources that read files or shared memory of the node.
+LOCAL_IMAGE_SOURCE_KEYS = ("path", "shared_memory")
+
+# Decoded payloads kept across requests. Sized for the images of a few
+# concurrent multi-turn chats; the store never grows past it.
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+class ImageSourceError(ValueError):
+    """An image source that cannot be read or decoded."""
+
+
+@dataclass(frozen=True)
+class DecodedImage:
+    data: Union[bytes, bytearray, memoryview]
+    digest: str
+
+    def __deepcopy__(self, memo: Any) -> "DecodedImage":
+        # Immutable, and memoryview payloads cannot be copied.
+        return self
+
+
+class DecodedImageStore:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, DecodedImage]" = OrderedDict()
+        self._size = 0
+
+    def decode(self, source: str) -> DecodedImage:
+        """Decode and hash a base64 image payload, reusing the result of an
+        earlier call with the same payload. Raises ImageSourceError when the
+        payload is not valid base64."""
+        key = hashlib.sha256(source.encode()).digest()
+        with self._lock:
+            decoded = self._entries.get(key)
+            if decoded is not None:
+                self._entries.move_to_end(key)
+                return decoded
+
+        try:
+            data = base64.b64decode(source, validate=True)
+        except (ValueError, binascii.Error) as exc:
+            raise ImageSourceError("Image source is not valid base64.") from exc
+        decoded = DecodedImage(data=data, digest=hashlib.sha256(data).hexdigest())
+
+        with self._lock:
+            if key not in self._entries and len(data) <= self.max_bytes:
+                self._entries[key] = decoded
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted.data)
+        return decoded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_store = DecodedImageStore()
+
+
+def get_decoded_image_store() -> DecodedImageStore:
+    return _store
+
+
+def decode_image(source: str) -> DecodedImage:
+    return _store.decode(source)
+
+
+def _hashed(data: Union[bytes, bytearray, memoryview]) -> DecodedImage:
+    return DecodedImage(data=data, digest=hashlib.sha256(data).hexdigest())
+
+
+def _read_shared_memory(name: str, size: int | None) -> bytes:
+    from multiprocessing import resource_tracker, shared_memory
+
+    segment = shared_memory.SharedMemory(name=name, create=False)
+    try:
+        # Attaching registers the segment with this process's resource
+        # tracker, which would unlink the caller's segment at exit.
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    try:
+        if size is not None and size > segment.size:
+            raise ImageSourceError(
+                f"Shared memory segment {name!r} holds {segment.size} bytes, "
+                f"fewer than the declared size {size}."
+            )
+        return bytes(segment.buf[: size if size is not None else segment.size])
+    finally:
+        segment.close()
+
+
+def load_image_source(block: Mapping[str, Any]) -> DecodedImage:
+    """Return the bytes and content hash of an image content block,
+    reading file and shared-memory sources. Raises ImageSourceError when
+    the source cannot be read."""
+    if "base64" in block:
+        return decode_image(block["base64"])
+    if "data" in block:
+        return _hashed(block["data"])
+    if "path" in block:
+        try:
+            with open(block["path"], "rb") as f:
+                return _hashed(f.read())
+        except OSError as exc:
+            raise ImageSourceError(f"Cannot read image file {block['path']!r}.") from exc
+    if "shared_memory" in block:
+        try:
+            data = _read_shared_memory(block["shared_memory"], block.get("size"))
+        except OSError as exc:
+            raise ImageSourceError(
+                f"Shared memory segment {block['shared_memory']!r} cannot be read."
+            ) from exc
+        return _hashed(data)
+    raise ImageSourceError("Image content block has no image source.")
@@ -0,0 +1,223 @@
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import torch
+
+from gpt_task.inference.input_rendering import render_task_input
+from gpt_task.inference.model_adapters import (
+    ModelAdapterContext,
+    attach_adapter_plan,
+    build_adapter_plan,
+    get_adapter_plan,
+)
+from gpt_task.inference.model_adapters.input.text.template import (
+    TemplateTextInputAdapter,
+)
+from gpt_task.inference.model_adapters.input.utils import (
+    AcceptedKwargs,
+    apply_chat_template,
+)
+from gpt_task.inference.model_adapters.input.vision.ernie import (
+    ErnieVisionInputAdapter,
+)
+from gpt_task.models import GPTTaskArgs
+
+
+class _StrictTokenizer:
+    chat_template = "{{ messages }}"
+
+    def __init__(self):
+        self.calls = []
+
+    def apply_chat_template(
+        self, chats, *, tokenize, add_generation_prompt, enable_thinking=True
+    ):
+        self.calls.append(enable_thinking)
+        return f"prompt thinking={enable_thinking}"
+
+
+class _KwargsTokenizer:
+    """HF-style signature that still rejects some keyword arguments."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def apply_chat_template(self, chats, **kwargs):
+        self.calls += 1
+        if "unsupported" in kwargs:
+            raise TypeError("unexpected keyword argument 'unsupported'")
+        return f"prompt {sorted(kwargs)}"
+
+
+class _ErnieProcessor:
+    def apply_chat_template(self, messages, **kwargs):
+        return "rendered prompt"
+
+    def process_vision_info(self, messages):
+        return ["decoded image"], None
+
+    def __call__(self, text, images, padding, return_tensors):
+        return {"input_ids": torch.tensor([[1, 2]])}
+
+
+def _args(content="hello", **kwargs):
+    return GPTTaskArgs(
+        model="test/model",
+        messages=[{"role": "user", "content": content}],
+        **kwargs,
+    )
+
+
+class AcceptedKwargsTests(unittest.TestCase):
+    def test_reads_keyword_parameters(self):
+        def strict(a, *args, b=1, c, **_unused):
+            pass
+
+        def keyword_only(a, *, b):
+            pass
+
+        self.assertIsNone(AcceptedKwargs.of(strict).names)
+        accepted = AcceptedKwargs.of(keyword_only)
+        self.assertEqual(accepted.names, frozenset({"a", "b"}))
+        self.assertEqual(accepted.filter({"b": 1, "z": 2}), {"b": 1})
+        self.assertIsNone(AcceptedKwargs.of(object()))
+
+    def test_known_kwargs_render_in_one_call(self):
+        tokenizer = _StrictTokenizer()
+        accepted = AcceptedKwargs.of(tokenizer.apply_chat_template)
+        optional = {"enable_thinking": False, "unsupported": 1}
+        template_args = {"tokenize": False, "add_generation_prompt": True}
+
+        planned = apply_chat_template(
+            tokenizer, [], template_args, optional, accepted=accepted
+        )
+        self.assertEqual(tokenizer.calls, [False])
+
+        # Same result as probing for the accepted optional args.
+        self.assertEqual(
+            planned, apply_chat_template(tokenizer, [], template_args, optional)
+        )
+
+    def test_open_signatures_learn_rejected_optional_args_once(self):
+        tokenizer = _KwargsTokenizer()
+        accepted = AcceptedKwargs.of(tokenizer.apply_chat_template)
+        self.assertIsNone(accepted.names)
+
+        for _ in range(2):
+            rendered = apply_chat_template(
+                tokenizer,
+                [],
+                {"tokenize": False},
+                {"enable_thinking": False, "unsupported": 1},
+                accepted=accepted,
+            )
+            self.assertEqual(rendered, "prompt ['enable_thinking', 'tokenize']")
+
+        # The first render probes each optional arg; the second skips the
+        # rejected one and renders in one call.
+        self.assertEqual(tokenizer.calls, 4)
+        self.assertEqual(accepted.rejected, {"unsupported"})
+
+
+class AdapterPlanTests(unittest.TestCase):
+    def test_plan_resolves_adapters_and_signatures(self):
+        plan = build_adapter_plan(
+            ModelAdapterContext(
+                config=SimpleNamespace(model_type="ernie4_5_moe_vl"),
+                processor=_ErnieProcessor(),
+                tokenizer=_StrictTokenizer(),
+            )
+        )
+
+        self.assertIsInstance(plan.text_adapter, TemplateTextInputAdapter)
+        self.assertIsInstance(plan.vision_adapter, ErnieVisionInputAdapter)
+        self.assertEqual(
+            plan.tokenizer_template_kwargs.names,
+            frozenset(
+                {"chats", "tokenize", "add_generation_prompt", "enable_thinking"}
+            ),
+        )
+        self.assertIsNone(plan.processor_template_kwargs.names)
+        self.assertEqual(
+            plan.processor_call_kwargs.names,
+            frozenset({"text", "images", "padding", "return_tensors"}),
+        )
+
+    def test_text_only_plan_has_no_vision_adapter(self):
+        plan = build_adapter_plan(
+            ModelAdapterContext(
+                config=SimpleNamespace(model_type="other"),
+                tokenizer=SimpleNamespace(chat_template=None),
+            )
+        )
+        self.assertIsNone(plan.vision_adapter)
+        self.assertIsNone(plan.processor_call_kwargs)
+
+    def test_plan_is_built_once_per_owner(self):
+        owner = _ErnieProcessor()
+        context = ModelAdapterContext(
+            config=SimpleNamespace(model_type="other"),
+            tokenizer=_StrictTokenizer(),
+        )
+        plan = get_adapter_plan(owner, context)
+        with patch(
+            "gpt_task.inference.model_adapters.plan.build_adapter_plan"
+        ) as build:
+            self.assertIs(get_adapter_plan(owner, context), plan)
+        build.assert_not_called()
+
+        attached = build_adapter_plan(context)
+        attach_adapter_plan(owner, attached)
+        self.assertIs(get_adapter_plan(owner, context), attached)
+
+
+class PlannedRenderingTests(unittest.TestCase):
+    def _context(self, processor=None, model_type="other"):
+        context = ModelAdapterContext(
+            config=SimpleNamespace(model_type=model_type),
+            processor=processor,
+            tokenizer=_StrictTokenizer(),
+        )
+        return replace(context, plan=build_adapter_plan(context))
+
+    def test_rendering_skips_registries_and_probing(self):
+        context = self._context()
+        with (
+            patch(
+                "gpt_task.inference.input_rendering.resolve_text_input_adapter",
+                side_effect=AssertionError("registry scanned"),
+            ),
+            patch.object(
+                AcceptedKwargs, "of", side_effect=AssertionError("signature read")
+            ),
+        ):
+            rendered = render_task_input(
+                context,
+                _args(template_args={"enable_thinking": False, "other": 1}),
+                torch.device("cpu"),
+            )
+
+        self.assertEqual(rendered.generation_input, "prompt thinking=False")
+        self.assertEqual(context.tokenizer.calls, [False])
+
+    def test_ernie_processor_call_uses_planned_signature(self):
+        context = self._context(_ErnieProcessor(), model_type="ernie4_5_moe_vl")
+        args = _args([{"type": "image", "base64": "aQ=="}])
+        with (
+            patch(
+                "gpt_task.inference.input_rendering.resolve_vision_input_adapter",
+                side_effect=AssertionError("registry scanned"),
+            ),
+            patch.object(
+                AcceptedKwargs, "of", side_effect=AssertionError("signature read")
+            ),
+        ):
+            rendered = render_task_input(context, args, torch.device("cpu"))
+
+        self.assertEqual(rendered.encoded["input_ids"].tolist(), [[1, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from gpt_task.benchmark import (
+    ReplayOptions,
+    TraceRequest,
+    compare,
+    load_trace,
+    replay,
+    summarize,
+)
+from gpt_task.benchmark.__main__ import main
+from gpt_task.benchmark.replay import ReplayResult, RequestResult, arrival_times
+from gpt_task.benchmark.summary import percentile
+from gpt_task.models import GPTTaskArgs
+
+_IMAGE = {"type": "image", "base64": "aGk="}
+
+
+def _request(stream=False, **fields):
+    fields.setdefault("model", "test/model")
+    fields.setdefault("messages", [{"role": "user", "content": "hi"}])
+    return TraceRequest(GPTTaskArgs(**fields), stream=stream)
+
+
+def _write_trace(directory, lines):
+    path = os.path.join(directory, "trace.jsonl")
+    with open(path, "w") as f:
+        f.writelines(json.dumps(line) + "\n" for line in lines)
+    return path
+
+
+def _chunk(content, finish_reason=None, completion_tokens=1):
+    return {
+        "model": "test/model",
+        "choices": [
+            {
+                "index": 0,
+                "delta": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 3,
+            "completion_tokens": completion_tokens,
+            "total_tokens": 3 + completion_tokens,
+        },
+    }
+
+
+class TraceTests(unittest.TestCase):
+    def test_replay_keys_and_kinds(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = _write_trace(
+                directory,
+                [
+                    {"model": "m", "messages": [{"role": "user", "content": "hi"}]},
+                    {
+                        "model": "m",
+                        "messages": [{"role": "user", "content": [_IMAGE]}],
+                        "stream": True,
+                        "arrival": 0.5,
+                    },
+                    {
+                        "model": "m",
+                        "messages": [{"role": "user", "content": "hi"}],
+                        "tools": [{"type": "function", "function": {"name": "f"}}],
+                    },
+                ],
+            )
+            requests = load_trace(path)
+
+        self.assertEqual([r.kind for r in requests], ["text", "vlm", "tool_call"])
+        self.assertEqual([r.stream for r in requests], [False, True, False])
+        self.assertEqual(requests[1].arrival, 0.5)
+
+    def test_invalid_line_names_its_position(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = _write_trace(directory, [{"model": "m", "messages": []}, {"model": ""}])
+            with self.assertRaisesRegex(ValueError, r"trace\.jsonl:2:"):
+                load_trace(path)
+
+
+class ArrivalTests(unittest.TestCase):
+    def test_processes(self):
+        requests = [_request()] * 4
+        self.assertEqual(
+            arrival_times(requests, ReplayOptions(rate=2, arrival="uniform")),
+            [0.0, 0.5, 1.0, 1.5],
+        )
+        self.assertEqual(arrival_times(requests, ReplayOptions()), [0.0] * 4)
+        poisson = arrival_times(requests, ReplayOptions(rate=2, seed=3))
+        self.assertEqual(poisson, arrival_times(requests, ReplayOptions(rate=2, seed=3)))
+        self.assertEqual(poisson, sorted(poisson))
+        with self.assertRaises(ValueError):
+            arrival_times(requests, ReplayOptions(arrival="trace"))
+
+
+class ReplayTests(unittest.TestCase):
+    def test_streaming_latencies_and_errors(self):
+        def entry_point(args, stream_callback, config, model_cache):
+            if args.seed == 1:
+                raise RuntimeError("boom")
+            if stream_callback is None:
+                return {"usage": {"prompt_tokens": 3, "completion_tokens": 2}}
+            for tokens in (1, 2):
+                time.sleep(0.01)
+                stream_callback(_chunk("x", completion_tokens=tokens))
+            stream_callback(_chunk("", "stop", completion_tokens=2))
+
+        result = replay(
+            [_request(stream=True), _request(seed=1), _request()],
+            entry_point,
+            ReplayOptions(concurrency=3),
+        )
+        streamed, failed, plain = result.results
+
+        self.assertEqual(len(streamed.inter_token_latencies), 1)
+        self.assertGreaterEqual(streamed.inter_token_latencies[0], 0.009)
+        self.assertGreaterEqual(streamed.time_to_first_token, 0.009)
+        self.assertEqual(streamed.completion_tokens, 2)
+        self.assertEqual(failed.error, "RuntimeError: boom")
+        self.assertIsNone(plain.time_to_first_token)
+        self.assertEqual(plain.completion_tokens, 2)
+
+    def test_concurrency_bounds_running_requests(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def entry_point(args, **kwargs):
+            with lock:
+                running.append(args.seed)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(args.seed)
+
+        result = replay(
+            [_request(seed=i) for i in range(6)], entry_point, ReplayOptions(concurrency=2)
+        )
+
+        self.assertEqual(max(peak), 2)
+        self.assertGreater(max(r.queue_seconds for r in result.results), 0.01)
+
+
+def _result(index, latency, error=None, cache_hit=True):
+    return RequestResult(
+        index=index,
+        kind="text",
+        stream=False,
+        arrival=0.0,
+        started=0.0,
+        finished=latency,
+        completion_tokens=10,
+        model_cache_hit=cache_hit,
+        error=error,
+    )
+
+
+class SummaryTests(unittest.TestCase):
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertAlmostEqual(percentile(range(101), 95), 95)
+
+    def test_summary_and_comparison(self):
+        baseline = summarize(
+            ReplayResult([_result(0, 1.0, cache_hit=False), _result(1, 2.0)], 2.0)
+        )
+        self.assertEqual(baseline["latency"]["p50"], 1.5)
+        self.assertEqual(baseline["output_tokens_per_second"], 10.0)
+        self.assertEqual(baseline["model_cache_hit_rate"], 0.5)
+
+        same = compare(baseline, json.loads(json.dumps(baseline)))
+        self.assertEqual(same, [])
+
+        slower = summarize(
+            ReplayResult([_result(0, 1.0), _result(1, 3.0, error="OOM")], 2.0)
+        )
+        regressions = {r.key: r for r in compare(baseline, slower, tolerance=0.1)}
+        self.assertIn("output_tokens_per_second", regressions)
+        self.assertIn("error_rate", regressions)
+        self.assertNotIn("latency.p50", regressions)
+        self.assertNotIn("model_cache_hit_rate", regressions)
+        self.assertAlmostEqual(regressions["output_tokens_per_second"].change, 0.5)
+
+
+class TinyModelRunTests(unittest.TestCase):
+    def test_cli_replays_trace_on_cpu(self):
+        with tempfile.TemporaryDirectory() as directory:
+            trace = _write_trace(
+                directory,
+                [
+                    {
+                        "model": "unused",
+                        "messages": [{"role": "user", "content": "hello"}],
+                        "generation_config": {"max_new_tokens": 4},
+                    },
+                    {
+                        "model": "unused",
+                        "messages": [{"role": "user", "content": "hello"}],
+                        "generation_config": {"max_new_tokens": 4},
+                        "stream": True,
+                    },
+                    {
+                        "model": "unused",
+                        "messages": [{"role": "user", "content": [_IMAGE]}],
+                    },
+                ],
+            )
+            output = os.path.join(directory, "summary.json")
+            with contextlib.redirect_stdout(io.StringIO()):
+                status = main(["run", trace, "--tiny-model", "--output", output])
+            with open(output) as f:
+                summary = json.load(f)
+
+        self.assertEqual(status, 0)
+        self.assertEqual(summary["failures"], [])
+        self.assertEqual((summary["requests"], summary["skipped"]), (2, 1))
+        self.assertEqual(summary["model_cache_hit_rate"], 0.5)
+        self.assertEqual(summary["completion_tokens"], 8)
+        self.assertIsNotNone(summary["time_to_first_token"])
+        self.assertEqual(summary["by_kind"]["stream"]["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+import torch
+
+from gpt_task.inference.completions import decode_completions, find_prompt_end
+from gpt_task.inference.inference import _find_prompt_tokens
+
+_EOS = 2
+_PAD = 0
+
+
+class _Tokenizer:
+    eos_token_id = _EOS
+
+    def __init__(self):
+        self.calls = 0
+
+    def batch_decode(self, rows, skip_special_tokens, clean_up_tokenization_spaces):
+        self.calls += 1
+        return [
+            " ".join(str(t) for t in row.tolist() if t not in (_EOS, _PAD)) + " "
+            for row in rows
+        ]
+
+
+def _decode(rows, prompt_tokens=2, **generation_config):
+    tokenizer = _Tokenizer()
+    completions = decode_completions(
+        torch.tensor(rows),
+        prompt_tokens,
+        tokenizer,
+        SimpleNamespace(**{"pad_token_id": _PAD, "eos_token_id": _EOS, **generation_config}),
+    )
+    assert tokenizer.calls == 1
+    return completions
+
+
+class FindPromptEndTests(unittest.TestCase):
+    def test_matches_list_search(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            prompt = [rng.randint(1, 5) for _ in range(rng.randint(1, 4))]
+            output = [rng.randint(1, 5) for _ in range(rng.randint(0, 10))]
+            with self.subTest(prompt=prompt, output=output):
+                self.assertEqual(
+                    find_prompt_end(prompt, torch.tensor(output, dtype=torch.long)),
+                    _find_prompt_tokens(prompt, output),
+                )
+
+
+class DecodeCompletionsTests(unittest.TestCase):
+    def test_padded_batch(self):
+        completions = _decode(
+            [
+                [7, 8, 5, 6, _EOS, _PAD],
+                [7, 8, 5, _EOS, _PAD, _PAD],
+                [7, 8, 5, 6, 4, 3],
+            ]
+        )
+
+        self.assertEqual(completions.texts, ["5 6", "5", "5 6 4 3"])
+        self.assertEqual(completions.finish_reasons, ["stop", "stop", "length"])
+        self.assertEqual(completions.completion_tokens, 3 + 2 + 4)
+
+    def test_padding_with_eos_and_other_stop_ids(self):
+        # Padding with EOS ends at the first EOS; another EOS id of the
+        # generation config stops the sequence with reason "length".
+        completions = _decode(
+            [[7, 5, _EOS, _EOS, _EOS], [7, 5, 6, 9, _EOS], [7, 5, 6, 4, 3]],
+            prompt_tokens=1,
+            pad_token_id=_EOS,
+            eos_token_id=[_EOS, 9],
+        )
+
+        self.assertEqual(completions.finish_reasons, ["stop", "length", "length"])
+        self.assertEqual(completions.completion_tokens, 2 + 3 + 4)
+
+    def test_stopped_without_eos_drops_trailing_padding(self):
+        completions = _decode([[7, 8, 5, 6, _PAD, _PAD], [7, 8, 5, 6, 4, 3]])
+        self.assertEqual(completions.finish_reasons, ["length", "length"])
+        self.assertEqual(completions.completion_tokens, 2 + 4)
+
+    def test_prompt_only(self):
+        completions = _decode([[7, 8]], pad_token_id=None)
+        self.assertEqual(completions.texts, [""])
+        self.assertEqual(completions.finish_reasons, ["length"])
+        self.assertEqual(completions.completion_tokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
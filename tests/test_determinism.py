@@ -0,0 +1,139 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import torch
+
+from gpt_task.benchmark import check_reproducibility
+from gpt_task.benchmark.reproducibility import first_divergent_step
+from gpt_task.benchmark.trace import TraceRequest
+from gpt_task.inference import get_task_report, run_task, verify_tasks
+from gpt_task.inference.utils import launch_blocking, use_deterministic_mode
+from gpt_task.models import GPTTaskArgs
+
+from tiny_model import TinyModelTestCase
+
+
+class DeterminismLevelTests(unittest.TestCase):
+    def tearDown(self):
+        torch.use_deterministic_algorithms(True, warn_only=True)
+
+    def test_levels(self):
+        for level, blocking, deterministic in (
+            ("strict", "1", True),
+            ("deterministic", "0", True),
+            ("fast", "0", False),
+        ):
+            with self.subTest(level), patch.dict(os.environ, clear=False):
+                os.environ.pop("CUDA_LAUNCH_BLOCKING", None)
+                with launch_blocking(level):
+                    use_deterministic_mode(level)
+                    self.assertEqual(os.environ["CUDA_LAUNCH_BLOCKING"], blocking)
+                    self.assertEqual(
+                        torch.are_deterministic_algorithms_enabled(), deterministic
+                    )
+                # The environment later rank groups are spawned with.
+                self.assertNotIn("CUDA_LAUNCH_BLOCKING", os.environ)
+
+                os.environ["CUDA_LAUNCH_BLOCKING"] = "1"
+                with launch_blocking(level):
+                    self.assertEqual(os.environ["CUDA_LAUNCH_BLOCKING"], blocking)
+                self.assertEqual(os.environ["CUDA_LAUNCH_BLOCKING"], "1")
+
+
+class TinyModelReproducibilityTests(TinyModelTestCase):
+    def _config(self, level):
+        return self.config.model_copy(update={"determinism": level})
+
+    def _requests(self):
+        def request(stream=False, **generation_config):
+            args = GPTTaskArgs(
+                model=self.model,
+                messages=[{"role": "user", "content": "hello there"}],
+                generation_config={"max_new_tokens": 6, **generation_config},
+                dtype="float32",
+                seed=7,
+            )
+            return TraceRequest(args=args, stream=stream)
+
+        return [
+            request(do_sample=False),
+            request(stream=True, do_sample=True, num_return_sequences=2),
+            request(num_beams=2),
+        ]
+
+    def test_every_level_is_reproducible_on_the_tiny_model(self):
+        for level in ("strict", "deterministic", "fast"):
+            with self.subTest(level):
+                result = check_reproducibility(
+                    self._requests(),
+                    run_task,
+                    runs=3,
+                    config=self._config(level),
+                    model_cache=self.model_cache,
+                )
+                self.assertTrue(result.reproducible, result.mismatches)
+                self.assertEqual((result.requests, result.runs), (3, 3))
+
+    def test_launch_blocking_is_set_before_cuda_is_touched(self):
+        args = self._requests()[0].args
+        for level, inherited, blocking in (
+            ("strict", "0", "1"),
+            ("deterministic", "1", "0"),
+        ):
+            seen = []
+
+            def record(result):
+                def query(*_args, **_kwargs):
+                    seen.append(os.environ.get("CUDA_LAUNCH_BLOCKING"))
+                    return result
+
+                return query
+
+            with (
+                self.subTest(level),
+                patch.dict(os.environ, {"CUDA_LAUNCH_BLOCKING": inherited}),
+                patch("torch.cuda.is_available", side_effect=record(False)),
+                patch("torch.cuda.device_count", side_effect=record(0)),
+            ):
+                config = self._config(level)
+                run_task(args, config=config, model_cache=self.model_cache)
+                verify_tasks([(args, [1])], config=config, model_cache=self.model_cache)
+
+                self.assertTrue(seen)
+                self.assertEqual(set(seen), {blocking})
+                self.assertEqual(os.environ["CUDA_LAUNCH_BLOCKING"], inherited)
+
+    def test_mismatch_names_first_divergent_step(self):
+        outputs = iter(["a", "b"])
+
+        def entry_point(args, **kwargs):
+            steps = ["00", "01", next(outputs)]
+            return {"choices": [{"logits_digest": {"root": "", "steps": steps}}]}
+
+        result = check_reproducibility(self._requests()[:1], entry_point)
+
+        self.assertFalse(result.reproducible)
+        self.assertEqual(result.mismatches[0].first_divergent_step, 2)
+        self.assertIsNone(first_divergent_step({"choices": []}, {"choices": []}))
+
+    def test_report_carries_the_level(self):
+        args = self._requests()[0].args
+        outputs = {}
+        for level in ("strict", "deterministic"):
+            outputs[level] = run_task(
+                args, config=self._config(level), model_cache=self.model_cache
+            )
+            report = get_task_report()
+            root = report.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+            self.assertEqual(report.determinism, level)
+            self.assertIn(
+                {"key": "gpt_task.determinism", "value": {"stringValue": level}},
+                root["attributes"],
+            )
+        # Launch blocking changes when kernels run, never what they compute.
+        self.assertEqual(outputs["strict"], outputs["deterministic"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import json
+import random
+import unittest
+
+from gpt_task.inference.model_adapters import ModelAdapterContext
+from gpt_task.inference.model_adapters.input.text.deepseek_v32 import (
+    DeepSeekV32TextInputAdapter,
+)
+from gpt_task.inference.prompt_adapters.encoding_dsv32 import (
+    IncrementalEncoder,
+    bos_token,
+    drop_thinking_messages,
+    encode_messages,
+    render_message,
+)
+from gpt_task.models import GPTTaskArgs
+
+_TOOLS = [
+    {
+        "type": "function",
+        "function": {"name": "search", "parameters": {"type": "object"}},
+    }
+]
+
+
+def _reference_encode(
+    messages, thinking_mode, context=None, drop_thinking=True, add_default_bos_token=True
+):
+    """Encoder as released upstream: every message is rendered against the
+    whole conversation."""
+    context = context if context else []
+    full_messages = context + messages
+    prompt = bos_token if add_default_bos_token and len(context) == 0 else ""
+    if thinking_mode == "thinking" and drop_thinking:
+        full_messages = drop_thinking_messages(full_messages)
+    for idx in range(len(messages)):
+        prompt += render_message(idx + len(context), full_messages, thinking_mode)
+    return prompt
+
+
+def _tool_calls(rng):
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "search",
+                "arguments": json.dumps({"query": f"q{rng.randint(0, 9)}", "n": i}),
+            },
+        }
+        for i in range(rng.randint(1, 3))
+    ]
+
+
+def _conversation(rng, turns, user_roles=("user", "user", "developer")):
+    messages = [{"role": "system", "content": "be brief", "tools": _TOOLS}]
+    for _ in range(turns):
+        role = rng.choice(user_roles)
+        messages.append({"role": role, "content": f"ask {rng.randint(0, 99)}"})
+        for _ in range(rng.randint(0, 3)):
+            calls = _tool_calls(rng)
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "",
+                    "reasoning_content": "think",
+                    "tool_calls": calls,
+                }
+            )
+            messages.extend(
+                {"role": "tool", "content": f"result {i}"} for i in range(len(calls))
+            )
+        messages.append(
+            {"role": "assistant", "content": "answer", "reasoning_content": "think"}
+        )
+    return messages
+
+
+def _outcome(encode, *args, **kwargs):
+    # Invalid conversations (e.g. developer turns dropped from thinking
+    # history) must fail the same way.
+    try:
+        return encode(*args, **kwargs)
+    except Exception as exc:
+        return type(exc)
+
+
+def _options(rng):
+    return {
+        "thinking_mode": rng.choice(["chat", "thinking"]),
+        "drop_thinking": rng.choice([True, False]),
+        "add_default_bos_token": rng.choice([True, False]),
+    }
+
+
+class EncodeMessagesTests(unittest.TestCase):
+    def test_matches_reference_on_random_conversations(self):
+        rng = random.Random(0)
+        for seed in range(200):
+            messages = _conversation(rng, rng.randint(1, 6))
+            options = _options(rng)
+            split = rng.randint(0, len(messages) - 1)
+            context, tail = messages[:split], messages[split:]
+            with self.subTest(seed=seed):
+                self.assertEqual(
+                    _outcome(encode_messages, tail, context=context, **options),
+                    _outcome(_reference_encode, tail, context=context, **options),
+                )
+
+    def test_invalid_conversations_fail_like_reference(self):
+        for messages in (
+            [{"role": "user", "content": "x"}, {"role": "tool", "content": "r"}],
+            [{"role": "tool", "content": "r"}, {"role": "tool", "content": "r"}],
+            [{"role": "robot", "content": "x"}],
+        ):
+            with self.subTest(messages=messages):
+                with self.assertRaises(Exception) as expected:
+                    _reference_encode(messages, "chat")
+                with self.assertRaises(type(expected.exception)):
+                    encode_messages(messages, "chat")
+
+
+class IncrementalEncoderTests(unittest.TestCase):
+    def test_growing_conversation_matches_reference(self):
+        rng = random.Random(1)
+        for seed in range(30):
+            options = _options(rng)
+            encoder = IncrementalEncoder(**options)
+            messages = _conversation(rng, 8)
+            with self.subTest(seed=seed):
+                for stop in sorted(rng.sample(range(2, len(messages) + 1), 6)):
+                    self.assertEqual(
+                        _outcome(encoder.encode_messages, messages[:stop]),
+                        _outcome(_reference_encode, messages[:stop], **options),
+                    )
+
+    def test_edited_history_and_context_match_reference(self):
+        rng = random.Random(2)
+        encoder = IncrementalEncoder("thinking")
+        messages = _conversation(rng, 4)
+        encoder.encode_messages(messages)
+
+        edited = [dict(message) for message in messages]
+        edited[3]["content"] = "edited"
+        self.assertEqual(
+            encoder.encode_messages(edited), _reference_encode(edited, "thinking")
+        )
+        # A shorter, unrelated conversation after a long one.
+        other = _conversation(rng, 1)
+        self.assertEqual(
+            encoder.encode_messages(other), _reference_encode(other, "thinking")
+        )
+        self.assertEqual(
+            encoder.encode_messages(messages[5:], context=messages[:5]),
+            _reference_encode(messages[5:], "thinking", context=messages[:5]),
+        )
+
+    def _rendered_indices(self, encoder, messages):
+        rendered = []
+        globals_ = IncrementalEncoder.encode_messages.__globals__
+        original = globals_["_render_message"]
+
+        def counting(index, *args, **kwargs):
+            rendered.append(index)
+            return original(index, *args, **kwargs)
+
+        globals_["_render_message"] = counting
+        try:
+            encoder.encode_messages(messages)
+        finally:
+            globals_["_render_message"] = original
+        return rendered
+
+    def test_only_changed_messages_are_rendered(self):
+        encoder = IncrementalEncoder("thinking")
+        messages = _conversation(random.Random(3), 5, user_roles=("user",))
+        last_user = max(
+            idx for idx, message in enumerate(messages) if message["role"] == "user"
+        )
+        encoder.encode_messages(messages[:-1])
+
+        # Same last user turn: only the appended message.
+        self.assertEqual(
+            self._rendered_indices(encoder, messages), [len(messages) - 1]
+        )
+
+        # A new user turn re-renders from the previous one, whose thinking
+        # block is now closed.
+        messages = messages + [{"role": "user", "content": "next"}]
+        self.assertEqual(
+            self._rendered_indices(encoder, messages),
+            list(range(last_user, len(messages))),
+        )
+
+
+class DeepSeekAdapterTests(unittest.TestCase):
+    def test_repeated_turns_render_like_the_official_encoder(self):
+        adapter = DeepSeekV32TextInputAdapter()
+        context = ModelAdapterContext(config=None)
+        rng = random.Random(4)
+        history = _conversation(rng, 3, user_roles=("user",))[1:]
+        for stop in (1, len(history) // 2, len(history)):
+            args = GPTTaskArgs(
+                model="deepseek-ai/DeepSeek-V3.2",
+                messages=history[:stop],
+                tools=_TOOLS,
+                template_args={"thinking": False},
+            )
+            chats = [
+                {"role": "system", "tools": _TOOLS},
+                *[dict(message) for message in args.messages],
+            ]
+            with self.subTest(stop=stop):
+                self.assertEqual(
+                    adapter.render_input(context, args),
+                    _reference_encode(chats, "chat"),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
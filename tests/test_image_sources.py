@@ -0,0 +1,180 @@
+import base64
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+from unittest.mock import patch
+
+from pydantic import ValidationError
+
+from gpt_task.config import Config, VisionConfig
+from gpt_task.inference.errors import TaskArgsInvalid, error_context
+from gpt_task.inference.model_adapters.input import to_hf_chat_messages
+from gpt_task.inference.model_adapters.input.vision import pixel_cache
+from gpt_task.inference.model_adapters.input.vision.pixel_cache import (
+    get_pixel_cache,
+    install_pixel_cache,
+    load_message_images,
+)
+from gpt_task.inference.tp.executor import _picklable_args
+from gpt_task.models import GPTTaskArgs
+from gpt_task.models.images import DecodedImage, ImageSourceError, load_image_source
+
+from test_pixel_cache import _Image, _Processor
+
+_PAYLOAD = b"\x89PNG not really"
+
+
+def _fields(*blocks):
+    return {
+        "model": "test/vlm",
+        "messages": [{"role": "user", "content": [*blocks, {"type": "text", "text": "hi"}]}],
+    }
+
+
+def _args(*blocks):
+    return GPTTaskArgs.in_process(**_fields(*blocks))
+
+
+class ImageSourceValidationTests(unittest.TestCase):
+    def test_accepts_in_process_sources_without_reading_them(self):
+        view = memoryview(_PAYLOAD)
+        args = _args(
+            {"type": "image", "data": view},
+            {"type": "image", "path": "/does/not/exist.png"},
+            {"type": "image", "shared_memory": "missing", "size": 4},
+        )
+        self.assertIs(args.messages[0]["content"][0]["data"], view)
+
+    def test_plain_validation_rejects_local_sources(self):
+        for block in (
+            {"type": "image", "path": "/etc/passwd"},
+            {"type": "image", "shared_memory": "segment"},
+        ):
+            with self.subTest(block=block):
+                with self.assertRaises(ValidationError):
+                    GPTTaskArgs.model_validate_json(json.dumps(_fields(block)))
+                with self.assertRaises(ValidationError):
+                    GPTTaskArgs.model_validate(_fields(block))
+                with self.assertRaises(ValidationError):
+                    GPTTaskArgs(**_fields(block))
+        GPTTaskArgs.model_validate(_fields({"type": "image", "data": b"cat"}))
+
+    def test_rejects_invalid_sources(self):
+        for block in (
+            {"type": "image", "data": "not bytes"},
+            {"type": "image", "data": b""},
+            {"type": "image", "path": ""},
+            {"type": "image", "shared_memory": "s", "size": 0},
+            {"type": "image", "path": "/a.png", "base64": "YQ=="},
+            {"type": "image"},
+        ):
+            with self.subTest(block=block), self.assertRaises(ValidationError):
+                _args(block)
+
+    def test_json_schema_stays_base64_only(self):
+        schema = json.dumps(GPTTaskArgs.model_json_schema())
+        self.assertIn('"base64"', schema)
+        for key in ('"data"', '"path"', '"shared_memory"'):
+            self.assertNotIn(key, schema)
+
+
+class ImageSourceLoadingTests(unittest.TestCase):
+    def test_every_source_kind_yields_the_same_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "image.png")
+            with open(path, "wb") as f:
+                f.write(_PAYLOAD)
+            segment = shared_memory.SharedMemory(create=True, size=len(_PAYLOAD))
+            try:
+                segment.buf[: len(_PAYLOAD)] = _PAYLOAD
+                blocks = [
+                    {"type": "image", "base64": base64.b64encode(_PAYLOAD).decode()},
+                    {"type": "image", "data": _PAYLOAD},
+                    {"type": "image", "data": memoryview(_PAYLOAD)},
+                    {"type": "image", "path": path},
+                    {
+                        "type": "image",
+                        "shared_memory": segment.name,
+                        "size": len(_PAYLOAD),
+                    },
+                ]
+                loaded = [load_image_source(block) for block in blocks]
+
+                # Reading leaves the caller's segment in place.
+                shared_memory.SharedMemory(name=segment.name).close()
+            finally:
+                segment.close()
+                segment.unlink()
+
+        self.assertEqual({bytes(source.data) for source in loaded}, {_PAYLOAD})
+        self.assertEqual(len({source.digest for source in loaded}), 1)
+
+    def test_unreadable_sources_raise_value_error(self):
+        for block in (
+            {"type": "image", "path": "/does/not/exist.png"},
+            {"type": "image", "shared_memory": "gpt-task-missing-segment"},
+        ):
+            with self.subTest(block=block):
+                with self.assertRaises(ImageSourceError):
+                    load_image_source(block)
+                with self.assertRaises(TaskArgsInvalid), error_context():
+                    load_image_source(block)
+
+
+class InProcessSourceRenderingTests(unittest.TestCase):
+    def setUp(self):
+        self.load = patch.object(
+            pixel_cache, "_load_image", side_effect=lambda d: _Image(bytes(d.data))
+        )
+        self.load_image = self.load.start()
+
+    def tearDown(self):
+        self.load.stop()
+        get_pixel_cache(Config()).clear()
+
+    def test_processor_decodes_raw_sources_even_without_cache(self):
+        get_pixel_cache(Config(vision=VisionConfig(pixel_cache_bytes=0)))
+        messages = to_hf_chat_messages(_args({"type": "image", "data": b"cat"}).messages)
+        source = messages[0]["content"][0]["image"]
+        self.assertIsInstance(source, DecodedImage)
+
+        processor = _Processor()
+        install_pixel_cache(processor)
+        _, text = processor(images=[[source]])
+
+        self.assertEqual(text, ["<img:cat>"])
+
+    def test_sources_are_decoded_for_processors_without_hooks(self):
+        messages = to_hf_chat_messages(_args({"type": "image", "data": b"cat"}).messages)
+        load_message_images(messages)
+        self.assertIsInstance(messages[0]["content"][0]["image"], _Image)
+
+    def test_unread_copy_keeps_the_source_block(self):
+        view = memoryview(b"cat")
+        messages = to_hf_chat_messages(
+            _args({"type": "image", "data": view}).messages, read_sources=False
+        )
+        self.assertIs(messages[0]["content"][0]["data"], view)
+        self.load_image.assert_not_called()
+
+
+class TPImageSourceTests(unittest.TestCase):
+    def test_memoryview_sources_become_picklable(self):
+        args = _args({"type": "image", "data": memoryview(b"cat")})
+        with self.assertRaises(TypeError):
+            pickle.dumps(args)
+
+        restored = pickle.loads(pickle.dumps(_picklable_args(args)))
+
+        self.assertEqual(restored.messages[0]["content"][0]["data"], b"cat")
+
+    def test_other_args_pass_through(self):
+        args = _args({"type": "image", "path": "/a.png"})
+        self.assertIs(_picklable_args(args), args)
+
+
+if __name__ == "__main__":
+    unittest.main()
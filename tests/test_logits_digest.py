@@ -0,0 +1,115 @@
+import hashlib
+import unittest
+
+import torch
+
+from gpt_task.inference import run_task
+from gpt_task.inference.errors import TaskArgsInvalid
+from gpt_task.inference.logits_digest import SCALE, LogitsDigest
+from gpt_task.models import GPTTaskArgs
+
+from tiny_model import TinyModelTestCase
+
+
+def _chains(steps, lengths):
+    digest = LogitsDigest()
+    kwargs = digest.generate_kwargs()
+    (processor,) = kwargs["logits_processor"]
+    (criteria,) = kwargs["stopping_criteria"]
+    for scores, tokens in steps:
+        processor(None, scores)
+        criteria(torch.tensor(tokens)[:, None], None)
+    return digest.chains(lengths)
+
+
+class LogitsDigestTests(unittest.TestCase):
+    def setUp(self):
+        generator = torch.Generator().manual_seed(0)
+        self.steps = [
+            (torch.randn(2, 50, generator=generator) * 4, [i, 7]) for i in range(4)
+        ]
+
+    def test_chain_locates_first_divergent_step(self):
+        reference = _chains(self.steps, [4, 3])
+
+        within = [(scores.clone(), tokens) for scores, tokens in self.steps]
+        top = within[2][0][0].argmax()
+        # Nudge the top logit towards the centre of its rounding bucket.
+        value = within[2][0][0, top]
+        within[2][0][0, top] = torch.round(value * SCALE) / SCALE + 0.1 / SCALE
+        self.assertEqual(_chains(within, [4, 3]), reference)
+
+        beyond = [(scores.clone(), tokens) for scores, tokens in self.steps]
+        beyond[2][0][0, top] += 1.0
+        changed = _chains(beyond, [4, 3])
+        self.assertEqual(changed[0]["steps"][:2], reference[0]["steps"][:2])
+        self.assertNotEqual(changed[0]["steps"][2], reference[0]["steps"][2])
+        self.assertNotEqual(changed[0]["root"], reference[0]["root"])
+        self.assertEqual(changed[1], reference[1])
+
+        other_token = list(self.steps)
+        other_token[1] = (self.steps[1][0], [9, 7])
+        self.assertNotEqual(
+            _chains(other_token, [4, 3])[0]["steps"][1], reference[0]["steps"][1]
+        )
+
+    def test_chains_are_cut_to_completion_lengths(self):
+        first, second = _chains(self.steps, [4, 3])
+
+        self.assertEqual((len(first["steps"]), len(second["steps"])), (4, 3))
+        self.assertEqual(second["steps"], _chains(self.steps, [4, 4])[1]["steps"][:3])
+        self.assertEqual(
+            first["root"], hashlib.sha256("".join(first["steps"]).encode()).hexdigest()
+        )
+
+
+class RunTaskDigestTests(TinyModelTestCase):
+    def _run(self, stream_callback=None, **fields):
+        fields.setdefault("generation_config", {"max_new_tokens": 5, "do_sample": False})
+        args = GPTTaskArgs(
+            model=self.model,
+            messages=[{"role": "user", "content": "hello"}],
+            dtype="float32",
+            **fields,
+        )
+        return run_task(
+            args,
+            config=self.config,
+            model_cache=self.model_cache,
+            stream_callback=stream_callback,
+        )
+
+    def test_streamed_and_returned_digests_agree(self):
+        response = self._run(logits_digest=True)
+        chunks = []
+        self._run(chunks.append, logits_digest=True)
+
+        digest = response["choices"][0]["logits_digest"]
+        self.assertEqual(len(digest["steps"]), response["usage"]["completion_tokens"])
+        self.assertEqual(chunks[-1]["choices"][0]["logits_digest"], digest)
+        self.assertTrue(all("logits_digest" not in chunk["choices"][0] for chunk in chunks[:-1]))
+        self.assertNotIn("logits_digest", self._run()["choices"][0])
+
+    def test_one_chain_per_sequence(self):
+        response = self._run(
+            logits_digest=True,
+            generation_config={
+                "max_new_tokens": 4,
+                "do_sample": True,
+                "num_return_sequences": 2,
+            },
+        )
+        digests = [choice["logits_digest"] for choice in response["choices"]]
+        self.assertEqual([len(digest["steps"]) for digest in digests], [4, 4])
+        self.assertNotEqual(digests[0]["root"], digests[1]["root"])
+
+    def test_beam_search_is_rejected(self):
+        with self.assertRaises(TaskArgsInvalid):
+            self._run(
+                logits_digest=True,
+                generation_config={"max_new_tokens": 4, "num_beams": 2},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+import unittest
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from gpt_task.cache import (
+    GPUMemoryManager,
+    MemoryModelCache,
+    ModelSwitchTrimPolicy,
+    NeverTrimPolicy,
+    WatermarkTrimPolicy,
+)
+from gpt_task.cache import allocator
+from gpt_task.config import Config, MemoryConfig
+from gpt_task.inference import inference, run_task, verify_tasks
+from gpt_task.inference.tp import rank_worker
+from gpt_task.models import GPTTaskArgs
+
+_GIB = 1 << 30
+
+
+class _FakeCuda:
+    """Stand-in for the torch.cuda functions the manager reads."""
+
+    def __init__(self, reserved: int, total: int = 10 * _GIB) -> None:
+        self.reserved = reserved
+        self.total = total
+        self.empty_cache_calls = 0
+
+    def patches(self):
+        return (
+            patch("torch.cuda.is_available", return_value=True),
+            patch("torch.cuda.device_count", return_value=1),
+            patch("torch.cuda.memory_stats", side_effect=self.memory_stats),
+            patch(
+                "torch.cuda.get_device_properties",
+                return_value=SimpleNamespace(total_memory=self.total),
+            ),
+            patch("torch.cuda.reset_peak_memory_stats"),
+            patch("torch.cuda.empty_cache", side_effect=self.empty_cache),
+        )
+
+    def memory_stats(self, device=None):
+        return {
+            "allocated_bytes.all.current": 1 * _GIB,
+            "reserved_bytes.all.current": self.reserved,
+            "allocated_bytes.all.peak": 2 * _GIB,
+            "reserved_bytes.all.peak": self.reserved,
+            "inactive_split_bytes.all.current": 3,
+            "num_alloc_retries": 0,
+        }
+
+    def empty_cache(self):
+        self.empty_cache_calls += 1
+
+
+@contextmanager
+def _patched(fake: _FakeCuda):
+    with ExitStack() as stack:
+        for p in fake.patches():
+            stack.enter_context(p)
+        yield
+
+
+class TrimPolicyTests(unittest.TestCase):
+    def test_model_switch_keeps_pool_for_same_model(self):
+        fake = _FakeCuda(reserved=8 * _GIB)
+        manager = GPUMemoryManager(ModelSwitchTrimPolicy())
+
+        with _patched(fake):
+            manager.begin_task("a")
+            first = manager.end_task()
+            manager.begin_task("a")
+            second = manager.end_task()
+
+        self.assertEqual(fake.empty_cache_calls, 0)
+        self.assertFalse(first.trimmed)
+        self.assertFalse(second.trimmed)
+        self.assertEqual(second.reserved_bytes, 8 * _GIB)
+        self.assertEqual(second.peak_allocated_bytes, 2 * _GIB)
+
+    def test_model_switch_trims_on_new_model_and_unload(self):
+        fake = _FakeCuda(reserved=1 * _GIB)
+        manager = GPUMemoryManager(ModelSwitchTrimPolicy())
+
+        with _patched(fake):
+            manager.begin_task("a")
+            manager.end_task()
+            manager.begin_task("b")
+            stats = manager.end_task()
+            manager.model_unloaded()
+
+        self.assertTrue(stats.trimmed)
+        self.assertEqual(fake.empty_cache_calls, 2)
+
+    def test_watermark_trims_only_above_threshold(self):
+        manager = GPUMemoryManager(WatermarkTrimPolicy(0.5))
+
+        low = _FakeCuda(reserved=4 * _GIB)
+        with _patched(low):
+            manager.begin_task("a")
+            self.assertFalse(manager.end_task().trimmed)
+        self.assertEqual(low.empty_cache_calls, 0)
+
+        high = _FakeCuda(reserved=6 * _GIB)
+        with _patched(high):
+            manager.begin_task("a")
+            self.assertTrue(manager.end_task().trimmed)
+        self.assertEqual(high.empty_cache_calls, 1)
+
+    def test_never_policy_does_not_trim_on_unload(self):
+        fake = _FakeCuda(reserved=10 * _GIB)
+        manager = GPUMemoryManager(NeverTrimPolicy())
+
+        with _patched(fake):
+            manager.begin_task("a")
+            manager.model_unloaded()
+            manager.begin_task("b")
+            manager.end_task()
+
+        self.assertEqual(fake.empty_cache_calls, 0)
+
+    def test_ending_a_task_twice_trims_once(self):
+        fake = _FakeCuda(reserved=1 * _GIB)
+        manager = GPUMemoryManager(ModelSwitchTrimPolicy())
+
+        with _patched(fake):
+            manager.begin_task("a")
+            manager.end_task()
+            manager.begin_task("b")
+            self.assertTrue(manager.end_task().trimmed)
+            self.assertIsNone(manager.end_task())
+
+        self.assertEqual(fake.empty_cache_calls, 1)
+
+    def test_rejects_invalid_watermark(self):
+        with self.assertRaises(ValueError):
+            WatermarkTrimPolicy(0)
+
+    def test_no_cuda_reports_no_stats(self):
+        manager = GPUMemoryManager(ModelSwitchTrimPolicy())
+        with patch("torch.cuda.is_available", return_value=False):
+            manager.begin_task("a")
+            self.assertIsNone(manager.end_task())
+
+
+class MemoryManagerConfigTests(unittest.TestCase):
+    def tearDown(self):
+        allocator._manager = None
+        allocator._manager_config = None
+
+    def test_manager_follows_config_policy(self):
+        never = allocator.get_memory_manager(
+            Config(memory=MemoryConfig(trim_policy="never"))
+        )
+        self.assertIsInstance(never.policy, NeverTrimPolicy)
+        self.assertIs(allocator.get_memory_manager(), never)
+
+        watermark = allocator.get_memory_manager(
+            Config(memory=MemoryConfig(trim_policy="watermark", trim_watermark=0.7))
+        )
+        self.assertIsInstance(watermark.policy, WatermarkTrimPolicy)
+        self.assertEqual(watermark.policy.watermark, 0.7)
+
+    def test_cache_eviction_notifies_manager(self):
+        cache = MemoryModelCache()
+        with patch.object(
+            allocator.GPUMemoryManager, "model_unloaded"
+        ) as unloaded:
+            cache.load("a", lambda: "a")
+            cache.load("a", lambda: "a")
+            unloaded.assert_not_called()
+            cache.load("b", lambda: "b")
+            unloaded.assert_called_once()
+            cache.clear()
+            cache.clear()
+
+        self.assertEqual(unloaded.call_count, 2)
+
+
+class FailedTaskTests(unittest.TestCase):
+    """A task that raises still ends, so the trim policy runs."""
+
+    def setUp(self):
+        self.config = Config(local_files_only=True, memory={"allow_cpu_execution": True})
+        self.args = GPTTaskArgs(
+            model="gpt2",
+            messages=[{"role": "user", "content": "hello"}],
+            generation_config={"max_new_tokens": 1},
+        )
+
+    def tearDown(self):
+        allocator._manager = None
+        allocator._manager_config = None
+
+    @contextmanager
+    def _failing_load(self):
+        with (
+            patch.object(
+                inference,
+                "use_task_pipeline",
+                side_effect=RuntimeError("load failed"),
+            ),
+            patch.object(allocator.GPUMemoryManager, "end_task") as end_task,
+        ):
+            yield end_task
+
+    def test_run_task_ends_a_failed_task(self):
+        with self._failing_load() as end_task, self.assertRaises(Exception):
+            run_task(self.args, config=self.config, model_cache=MemoryModelCache())
+        end_task.assert_called_once()
+
+    def test_verify_tasks_ends_a_failed_task(self):
+        with self._failing_load() as end_task, self.assertRaises(Exception):
+            verify_tasks(
+                [(self.args, [1])], config=self.config, model_cache=MemoryModelCache()
+            )
+        end_task.assert_called_once()
+
+    def test_tp_ranks_end_a_failed_task(self):
+        with (
+            patch.object(
+                rank_worker,
+                "_load_cached_model",
+                side_effect=RuntimeError("load failed"),
+            ),
+            patch.object(allocator.GPUMemoryManager, "end_task") as end_task,
+        ):
+            with self.assertRaises(RuntimeError):
+                rank_worker._execute_task(
+                    0, 1, "strategy", self.args, self.config, False, None, {}
+                )
+            end_task.assert_called_once()
+
+            end_task.reset_mock()
+            with self.assertRaises(RuntimeError):
+                rank_worker._execute_verification(
+                    0, "strategy", [(self.args, [1])], self.config, 0.0, 8, {}
+                )
+            end_task.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,269 @@
+import base64
+import hashlib
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import torch
+
+from gpt_task.cache import MemoryModelCache
+from gpt_task.config import Config, VisionConfig
+from gpt_task.inference import inference, run_task
+from gpt_task.inference.model_adapters.input.vision import pixel_cache
+from gpt_task.inference.model_adapters.input.vision.pixel_cache import (
+    get_pixel_cache,
+    install_pixel_cache,
+)
+from gpt_task.inference.model_adapters.input.vision.preprocess import (
+    PreprocessPool,
+    get_preprocess_pool,
+    prefetch_task_inputs,
+)
+from gpt_task.models import GPTTaskArgs
+from gpt_task.models.images import DecodedImageStore
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+class _Image:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.size = (2, 2)
+
+    def getbands(self):
+        return ("R", "G", "B")
+
+
+class _ImageProcessor:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def fetch_images(self, images):
+        return images
+
+    def to_json_string(self) -> str:
+        return '{"size": 2}'
+
+    def __call__(self, images, **kwargs):
+        self.calls += 1
+        flat = [image for batch in images for image in batch]
+        return {"pixel_values": torch.zeros(len(flat), 4)}
+
+
+class _Processor:
+    """Minimal stand-in for the transformers multimodal processor hooks."""
+
+    def __init__(self) -> None:
+        self.image_processor = _ImageProcessor()
+
+    def prepare_inputs_layout(self, images=None, text=None, **kwargs):
+        if images is not None:
+            images = self.image_processor.fetch_images(images)
+        return images, text, None, None
+
+    def _process_images(self, images, **kwargs):
+        processed = self.image_processor(images, **kwargs)
+        flat = [image for batch in images for image in batch]
+        return processed, [f"<img:{image.data.decode()}>" for image in flat]
+
+    def __call__(self, images=None, text=None, **kwargs):
+        images, text, _, _ = self.prepare_inputs_layout(images=images, text=text)
+        return self._process_images(images, **kwargs)
+
+
+class DecodedImageStoreTests(unittest.TestCase):
+    def test_decodes_each_payload_once(self):
+        store = DecodedImageStore()
+        first = store.decode(_b64(b"abc"))
+        self.assertIs(store.decode(_b64(b"abc")), first)
+        self.assertEqual(first.data, b"abc")
+
+    def test_identical_content_shares_digest(self):
+        store = DecodedImageStore()
+        # Non-canonical padding bits encode the same byte.
+        self.assertEqual(store.decode("YQ==").digest, store.decode("YR==").digest)
+
+    def test_evicts_least_recent_payload_over_budget(self):
+        store = DecodedImageStore(max_bytes=6)
+        a = store.decode(_b64(b"aaa"))
+        store.decode(_b64(b"bbb"))
+        store.decode(_b64(b"aaa"))
+        store.decode(_b64(b"ccc"))
+        self.assertIs(store.decode(_b64(b"aaa")), a)
+        self.assertEqual(
+            list(store._entries),
+            [hashlib.sha256(_b64(data).encode()).digest() for data in (b"ccc", b"aaa")],
+        )
+
+    def test_rejects_invalid_base64(self):
+        with self.assertRaises(ValueError):
+            DecodedImageStore().decode("not base64!")
+
+
+class PixelCacheTests(unittest.TestCase):
+    def setUp(self):
+        get_pixel_cache(Config(vision=VisionConfig(pixel_cache_bytes=1 << 20)))
+        get_pixel_cache().clear()
+        self.load = patch.object(
+            pixel_cache, "_load_image", side_effect=lambda d: _Image(d.data)
+        )
+        self.load_image = self.load.start()
+
+    def tearDown(self):
+        self.load.stop()
+        get_pixel_cache(Config()).clear()
+
+    def test_install_wraps_the_image_processor_once_and_skips_other_processors(self):
+        processor = _Processor()
+        image_processor = processor.image_processor
+        install_pixel_cache(processor)
+        install_pixel_cache(processor)
+        self.assertIs(type(processor), _Processor)
+        self.assertTrue(pixel_cache.is_pixel_caching(processor))
+        self.assertIs(processor.image_processor._image_processor, image_processor)
+        processor.image_processor.size = 4
+        self.assertEqual(image_processor.size, 4)
+
+        mock = Mock()
+        mock_image_processor = mock.image_processor
+        install_pixel_cache(mock)
+        self.assertIs(mock.image_processor, mock_image_processor)
+
+    def test_resent_images_skip_decoding_and_processing(self):
+        processor = _Processor()
+        install_pixel_cache(processor)
+        cat, dog = _b64(b"cat"), _b64(b"dog")
+
+        first, first_text = processor(images=[[cat, dog, cat]])
+        second, second_text = processor(images=[[cat, dog, cat]])
+
+        self.assertEqual(processor.image_processor.calls, 1)
+        self.assertEqual(self.load_image.call_count, 2)
+        self.assertEqual(first_text, ["<img:cat>", "<img:dog>", "<img:cat>"])
+        self.assertEqual(second_text, first_text)
+        self.assertIsNot(second, first)
+        self.assertIs(second["pixel_values"], first["pixel_values"])
+
+    def test_new_image_or_kwargs_miss(self):
+        processor = _Processor()
+        install_pixel_cache(processor)
+        cat, dog = _b64(b"cat"), _b64(b"dog")
+
+        processor(images=[[cat]])
+        processor(images=[[cat, dog]])
+        processor(images=[[cat]], size={"longest_edge": 4})
+
+        self.assertEqual(processor.image_processor.calls, 3)
+        self.assertEqual(self.load_image.call_count, 2)
+
+    def test_zero_budget_disables_cache(self):
+        get_pixel_cache(Config(vision=VisionConfig(pixel_cache_bytes=0)))
+        processor = _Processor()
+        install_pixel_cache(processor)
+        with patch.object(_Processor, "_process_images", return_value=({}, [])):
+            processor(images=[[_b64(b"cat")]])
+            processor(images=[[_b64(b"cat")]])
+            self.assertEqual(_Processor._process_images.call_count, 2)
+        self.load_image.assert_not_called()
+
+
+class PreprocessPoolTests(unittest.TestCase):
+    def setUp(self):
+        get_pixel_cache(Config(vision=VisionConfig(pixel_cache_bytes=1 << 20)))
+        get_pixel_cache().clear()
+        get_preprocess_pool(Config(vision=VisionConfig(preprocess_workers=2)))
+        self.threads = []
+
+        def load(decoded):
+            self.threads.append(threading.current_thread().name)
+            return _Image(decoded.data)
+
+        self.load = patch.object(pixel_cache, "_load_image", side_effect=load)
+        self.load_image = self.load.start()
+
+    def tearDown(self):
+        self.load.stop()
+        get_pixel_cache(Config()).clear()
+        get_preprocess_pool(Config())
+
+    def test_images_of_a_call_decode_on_the_pool(self):
+        processor = _Processor()
+        install_pixel_cache(processor)
+        images = [_b64(name.encode()) for name in ("a", "b", "c", "a")]
+
+        _, text = processor(images=[images])
+
+        self.assertEqual(text, ["<img:a>", "<img:b>", "<img:c>", "<img:a>"])
+        self.assertEqual(self.load_image.call_count, 3)
+        self.assertTrue(
+            all(name.startswith("gpt-task-preprocess") for name in self.threads)
+        )
+
+    def test_prefetched_images_are_not_decoded_again(self):
+        cat, dog = _b64(b"cat"), _b64(b"dog")
+        args = GPTTaskArgs(
+            model="test/vlm",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "base64": cat},
+                        {"type": "image", "base64": dog},
+                    ],
+                }
+            ],
+        )
+        prefetch_task_inputs(args).result(timeout=5)
+        self.assertEqual(self.load_image.call_count, 2)
+
+        processor = _Processor()
+        install_pixel_cache(processor)
+        processor(images=[[cat, dog]])
+
+        self.assertEqual(self.load_image.call_count, 2)
+
+    def test_tasks_prefetch_their_images_before_the_model_loads(self):
+        args = GPTTaskArgs(
+            model="test/vlm",
+            messages=[
+                {"role": "user", "content": [{"type": "image", "base64": _b64(b"cat")}]}
+            ],
+        )
+        calls = []
+
+        def load(*_args):
+            calls.append("load")
+            raise RuntimeError("load failed")
+
+        with (
+            patch.object(
+                inference,
+                "prefetch_task_inputs",
+                side_effect=lambda task_args: calls.append(task_args),
+            ),
+            patch.object(inference, "use_task_pipeline", side_effect=load),
+            self.assertRaises(Exception),
+        ):
+            run_task(
+                args,
+                config=Config(local_files_only=True, memory={"allow_cpu_execution": True}),
+                model_cache=MemoryModelCache(),
+            )
+        self.assertEqual(calls, [args, "load"])
+
+    def test_zero_workers_run_inline(self):
+        pool = PreprocessPool(0)
+        self.assertEqual(
+            pool.map(lambda _: threading.current_thread(), [1, 2]),
+            [threading.current_thread()] * 2,
+        )
+        future = pool.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result()
+
+
+if __name__ == "__main__":
+    unittest.main()
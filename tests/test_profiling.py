@@ -0,0 +1,144 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import torch
+
+from gpt_task.config import Config
+from gpt_task.inference import profiling
+from gpt_task.inference.profiling import (
+    profiled_phase,
+    select_task_profile,
+    task_profiling,
+)
+from gpt_task.inference.tp import api
+from gpt_task.inference.tp.result import TPTaskResult
+from gpt_task.models import GPTTaskArgs
+
+
+def _config(output_dir="profiles", **values):
+    return Config(profiler={"output_dir": output_dir, **values})
+
+
+class SelectTaskProfileTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(profiling, "_sequence", itertools.count(1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_samples_every_nth_task(self):
+        config = _config(sample_every=3)
+        tags = [select_task_profile(config, "org/model") for _ in range(6)]
+        self.assertEqual(
+            [tag is not None for tag in tags], [False, False, True, False, False, True]
+        )
+        self.assertEqual(tags[2], f"{os.getpid()}-000003")
+
+    def test_model_pattern(self):
+        config = _config(model_pattern="Qwen/*")
+        self.assertIsNotNone(select_task_profile(config, "Qwen/Qwen3-8B"))
+        self.assertIsNone(select_task_profile(config, "meta/llama"))
+        self.assertIsNone(select_task_profile(_config(), "Qwen/Qwen3-8B"))
+
+
+class TaskProfilingTests(unittest.TestCase):
+    def test_writes_trace_of_phases_tagged_with_rank(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = _config(directory)
+            with task_profiling(config, "org/model", tag="7-000001", rank=1) as profile:
+                torch.ones(4).sum()
+                with profiled_phase():
+                    torch.mm(torch.ones(8, 8), torch.ones(8, 8))
+            path = os.path.join(directory, "task-7-000001-rank1-org_model.json")
+
+            self.assertEqual(os.listdir(directory), [os.path.basename(path)])
+            self.assertEqual(profile.path, path)
+            with open(path) as f:
+                names = {event.get("name") for event in json.load(f)["traceEvents"]}
+        self.assertIn("aten::mm", names)
+        # The profile starts at the first phase.
+        self.assertNotIn("aten::sum", names)
+
+    def test_unsampled_task_and_task_without_phases_write_nothing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with task_profiling(_config(directory), "org/model") as profile:
+                with profiled_phase():
+                    pass
+            self.assertIsNone(profile)
+            with task_profiling(_config(directory), "org/model", tag="1-000001"):
+                pass
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_concurrent_sampled_task_runs_unprofiled(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def first(directory):
+            with task_profiling(_config(directory), "a", tag="1-000001"):
+                with profiled_phase():
+                    started.set()
+                    release.wait(5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            thread = threading.Thread(target=first, args=(directory,))
+            thread.start()
+            started.wait(5)
+            try:
+                with task_profiling(_config(directory), "b", tag="1-000002"):
+                    with profiled_phase():
+                        pass
+            finally:
+                release.set()
+                thread.join(5)
+            self.assertEqual(os.listdir(directory), ["task-1-000001-a.json"])
+
+    def test_rotation_deletes_oldest_traces(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for index, name in enumerate(["task-old.json", "task-mid.json"]):
+                path = os.path.join(directory, name)
+                with open(path, "w") as f:
+                    f.write("x" * 1000)
+                os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+            with open(os.path.join(directory, "notes.json"), "w") as f:
+                f.write("x" * 1000)
+
+            config = _config(directory, max_bytes=2000)
+            with task_profiling(config, "m", tag="1-000001"):
+                with profiled_phase():
+                    torch.ones(1)
+
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["notes.json", "task-1-000001-m.json"]
+            )
+
+
+class TensorParallelProfilingTests(unittest.TestCase):
+    def test_caller_selects_tag_for_ranks(self):
+        resolution = api._TPTaskResolution(
+            2, api.TPRuntimeStrategy(api.TP_MODEL_LOADER_CAUSAL_LM, False)
+        )
+        with (
+            patch.object(api, "_resolve_tp_task", return_value=resolution),
+            patch.object(
+                api,
+                "submit_tp_task",
+                return_value=TPTaskResult(response={"ok": True}, execution_dtype="float16"),
+            ) as submit,
+            patch("torch.cuda.device_count", return_value=2),
+        ):
+            api.run_task_tp(
+                GPTTaskArgs(model="Qwen/x", messages=[{"role": "user", "content": "hi"}]),
+                config=Config(local_files_only=True, profiler={"model_pattern": "Qwen/*"}),
+            )
+
+        tag = submit.call_args.kwargs["profile_tag"]
+        self.assertTrue(tag.startswith(f"{os.getpid()}-"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import torch
+from transformers import GenerationConfig, LlamaConfig, LlamaForCausalLM
+
+from gpt_task.inference.speculative import count_forward_passes
+from gpt_task.inference.utils import resolve_generation_config
+from gpt_task.models import GPTTaskArgs
+
+
+def _args(generation_config, content="hi"):
+    return GPTTaskArgs(
+        model="test/model",
+        messages=[{"role": "user", "content": content}],
+        generation_config=generation_config,
+    )
+
+
+class PromptLookupConfigTests(unittest.TestCase):
+    def test_greedy_task_keeps_prompt_lookup(self):
+        resolved = resolve_generation_config(
+            GenerationConfig(),
+            _args({"prompt_lookup_num_tokens": 4, "max_matching_ngram_size": 3}),
+        )
+        self.assertEqual(resolved.prompt_lookup_num_tokens, 4)
+        self.assertEqual(resolved.max_matching_ngram_size, 3)
+
+    def test_ineligible_tasks_drop_prompt_lookup(self):
+        for generation_config in (
+            {"prompt_lookup_num_tokens": 4, "do_sample": True},
+            {"prompt_lookup_num_tokens": 4, "num_beams": 2},
+            {"prompt_lookup_num_tokens": 4, "num_return_sequences": 2},
+        ):
+            with self.subTest(generation_config=generation_config):
+                resolved = resolve_generation_config(
+                    GenerationConfig(), _args(generation_config)
+                )
+                self.assertIsNone(resolved.prompt_lookup_num_tokens)
+
+    def test_image_task_drops_prompt_lookup(self):
+        args = _args(
+            {"prompt_lookup_num_tokens": 4},
+            content=[{"type": "image", "base64": "aQ=="}],
+        )
+        resolved = resolve_generation_config(GenerationConfig(), args)
+        self.assertIsNone(resolved.prompt_lookup_num_tokens)
+
+    def test_rejects_non_positive_values(self):
+        with self.assertRaises(ValueError):
+            _args({"prompt_lookup_num_tokens": 0})
+
+
+class PromptLookupGenerationTests(unittest.TestCase):
+    def test_greedy_output_matches_baseline_with_fewer_passes(self):
+        torch.manual_seed(0)
+        model = LlamaForCausalLM(
+            LlamaConfig(
+                vocab_size=64,
+                hidden_size=32,
+                intermediate_size=64,
+                num_hidden_layers=2,
+                num_attention_heads=4,
+                num_key_value_heads=2,
+            )
+        ).eval()
+        input_ids = torch.tensor([[1, 5, 6, 7, 8, 9, 5, 6, 7, 8, 9, 5, 6, 7]])
+        args = _args({"max_new_tokens": 30, "prompt_lookup_num_tokens": 4})
+
+        baseline_config = GenerationConfig(
+            do_sample=False, max_new_tokens=30, pad_token_id=0
+        )
+        lookup_config = resolve_generation_config(baseline_config, args)
+        lookup_config.pad_token_id = 0
+
+        with torch.no_grad():
+            with count_forward_passes(model) as (baseline_passes,):
+                baseline = model.generate(
+                    input_ids, generation_config=baseline_config
+                )
+            with count_forward_passes(model) as (lookup_passes,):
+                lookup = model.generate(input_ids, generation_config=lookup_config)
+
+        self.assertEqual(lookup.tolist(), baseline.tolist())
+        self.assertLess(lookup_passes.count, baseline_passes.count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from gpt_task.benchmark import build_tiny_model
+from gpt_task.benchmark.records import trace_from_records
+from gpt_task.benchmark.trace import parse_trace_line
+from gpt_task.config import Config, RecorderConfig
+from gpt_task.inference import recorder, run_task
+from gpt_task.inference.errors import ModelNotDownloaded
+from gpt_task.inference.recorder import (
+    PendingRecord,
+    TaskRecorder,
+    build_record,
+    get_task_recorder,
+)
+from gpt_task.models import GPTTaskArgs
+
+
+def _read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class RecordTests(unittest.TestCase):
+    def test_images_are_hashed_not_stored(self):
+        image = b"\x89PNG fake image bytes"
+        args = GPTTaskArgs(
+            model="org/vlm",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "base64": base64.b64encode(image).decode()},
+                        {"type": "image", "data": image},
+                        {"type": "text", "text": "compare"},
+                    ],
+                }
+            ],
+            tools=[{"type": "function", "function": {"name": "f"}}],
+            generation_config={"max_new_tokens": 8},
+        )
+        record = build_record(
+            PendingRecord(config=Config(), mode="device_map", stream=True, args=args)
+        )
+
+        digest = hashlib.sha256(image).hexdigest()
+        self.assertEqual(record["images"], [{"sha256": digest, "bytes": len(image)}] * 2)
+        self.assertNotIn(base64.b64encode(image).decode(), json.dumps(record))
+        self.assertEqual((record["messages"], record["tools"]), (1, 1))
+        self.assertEqual(record["generation_config"], {"max_new_tokens": 8})
+        self.assertEqual(record["mode"], "device_map")
+        self.assertIsNone(record["prompt_tokens"])
+
+
+class TaskRecorderTests(unittest.TestCase):
+    def test_rotation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tasks.jsonl")
+            task_recorder = TaskRecorder(RecorderConfig(path=path, max_bytes=900, backups=1))
+            try:
+                for _ in range(6):
+                    task_recorder.submit(
+                        PendingRecord(config=Config(), mode="device_map", stream=False)
+                    )
+                task_recorder.flush()
+            finally:
+                task_recorder.close()
+
+            self.assertEqual(sorted(os.listdir(directory)), ["tasks.jsonl", "tasks.jsonl.1"])
+            for name in os.listdir(directory):
+                self.assertLessEqual(os.path.getsize(os.path.join(directory, name)), 900)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        release = threading.Event()
+
+        def slow_record(pending):
+            release.wait(5)
+            return {}
+
+        with tempfile.TemporaryDirectory() as directory:
+            config = RecorderConfig(path=os.path.join(directory, "t.jsonl"), max_pending=1)
+            with patch.object(recorder, "build_record", side_effect=slow_record):
+                task_recorder = TaskRecorder(config)
+                pending = PendingRecord(config=Config(), mode="device_map", stream=False)
+                try:
+                    for _ in range(4):
+                        task_recorder.submit(pending)
+                finally:
+                    release.set()
+                    task_recorder.close()
+
+        self.assertGreaterEqual(task_recorder.dropped, 2)
+
+
+class RunTaskRecordingTests(unittest.TestCase):
+    def test_records_classic_tasks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model = build_tiny_model(os.path.join(directory, "model"))
+            path = os.path.join(directory, "tasks.jsonl")
+            config = Config(
+                local_files_only=True,
+                memory={"allow_cpu_execution": True},
+                recorder={"path": path},
+            )
+            for stream_callback in (None, lambda chunk: None):
+                run_task(
+                    model=model,
+                    messages=[{"role": "user", "content": "hi"}],
+                    generation_config={"max_new_tokens": 3},
+                    dtype="float32",
+                    config=config,
+                    stream_callback=stream_callback,
+                )
+            with self.assertRaises(ModelNotDownloaded):
+                run_task(
+                    model=os.path.join(directory, "missing"),
+                    messages=[{"role": "user", "content": "hi"}],
+                    config=config,
+                )
+            get_task_recorder(config).flush()
+            records = _read(path)
+
+        first, streamed, failed = records
+        self.assertEqual(
+            (first["mode"], first["stream"], streamed["stream"]), ("device_map", False, True)
+        )
+        self.assertEqual((first["completion_tokens"], first["execution_dtype"]), (3, "float32"))
+        self.assertEqual(first["prompt_tokens"], streamed["prompt_tokens"])
+        self.assertEqual(
+            (first["model_cache_hit"], streamed["model_cache_hit"]), (False, False)
+        )
+        self.assertIn("decode", first["stages"])
+        self.assertIsNone(first["error"])
+        self.assertEqual(failed["error"], "ModelNotDownloaded")
+        self.assertIsNotNone(failed["time"])
+
+
+class TraceFromRecordsTests(unittest.TestCase):
+    def test_shapes_trace_like_records(self):
+        records = [
+            {"time": 12.0, "model": "m", "stream": True, "tools": 2, "prompt_tokens": 5,
+             "completion_tokens": 8, "generation_config": {"num_return_sequences": 2},
+             "images": [], "error": None, "dtype": "bfloat16"},
+            {"time": 10.0, "model": "m", "stream": False, "tools": 0, "prompt_tokens": 3,
+             "completion_tokens": 4, "generation_config": None, "images": [], "error": None},
+            {"time": 11.0, "model": "m", "images": [{"sha256": "x", "bytes": 1}], "error": None},
+            {"time": 11.5, "model": "m", "images": [], "error": "OutOfMemoryError"},
+        ]
+
+        lines, skipped = trace_from_records(records, model="tiny")
+
+        self.assertEqual(skipped, 2)
+        requests = [parse_trace_line(json.dumps(line)) for line in lines]
+        self.assertEqual([r.arrival for r in requests], [0.0, 2.0])
+        self.assertEqual([r.kind for r in requests], ["text", "tool_call"])
+        self.assertEqual(requests[1].args.generation_config["max_new_tokens"], 4)
+        self.assertEqual(requests[1].args.model, "tiny")
+        self.assertEqual(requests[1].args.dtype, "bfloat16")
+        self.assertTrue(requests[1].stream)
+        self.assertEqual(requests[0].args.messages[0]["content"], "the the the")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import base64
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from gpt_task.config import Config, ResultCacheConfig
+from gpt_task.cache import AllocatorStats
+from gpt_task.inference import (
+    get_allocator_stats,
+    get_execution_dtype,
+    get_task_report,
+    inference,
+    run_task,
+)
+from gpt_task.inference.result_cache import (
+    ResultCache,
+    get_result_cache,
+    result_cache_key,
+)
+from gpt_task.models import GPTTaskArgs
+
+from tiny_model import TinyModelTestCase
+
+
+class RunTaskResultCacheTests(TinyModelTestCase):
+    config_fields = {"result_cache": {"memory_bytes": 1 << 20}}
+
+    def setUp(self):
+        get_result_cache(self.config).clear()
+
+    def _args(self, **generation_config):
+        return GPTTaskArgs(
+            model=self.model,
+            messages=[{"role": "user", "content": "hello"}],
+            generation_config={"max_new_tokens": 5, "do_sample": True, **generation_config},
+            dtype="float32",
+            seed=3,
+        )
+
+    def _run(self, args, stream_callback=None, config=None):
+        return run_task(
+            args,
+            config=config or self.config,
+            model_cache=self.model_cache,
+            stream_callback=stream_callback,
+        )
+
+    def test_hit_returns_the_stored_response_without_running(self):
+        args = self._args()
+        response = self._run(args)
+        self.assertIs(get_task_report().result_cache_hit, False)
+
+        self.assertEqual(get_execution_dtype(), "float32")
+
+        with patch.object(inference, "_execute_task") as execute:
+            self.assertEqual(self._run(args), response)
+        execute.assert_not_called()
+        report = get_task_report()
+        self.assertIs(report.result_cache_hit, True)
+        self.assertEqual(report.completion_tokens, response["usage"]["completion_tokens"])
+        # The getters read as after the run.
+        self.assertEqual(get_execution_dtype(), "float32")
+
+        self._run(self._args(top_k=2))
+        self.assertIs(get_task_report().result_cache_hit, False)
+
+    def test_hit_replays_stream_chunks_in_order(self):
+        args = self._args()
+        first, second = [], []
+        self.assertIsNone(self._run(args, first.append))
+        with patch.object(inference, "_execute_task") as execute:
+            self.assertIsNone(self._run(args, second.append))
+        execute.assert_not_called()
+
+        self.assertGreater(len(first), 1)
+        self.assertEqual(second, first)
+        # A streamed result does not answer the same task without a stream.
+        self.assertIsNotNone(self._run(args))
+        self.assertIs(get_task_report().result_cache_hit, False)
+
+    def test_hit_restores_the_allocator_stats_of_the_run(self):
+        stats = AllocatorStats(1, 2, 3, 4, 5, 6, True)
+        args = self._args(top_k=3)
+        with patch.object(inference, "get_memory_manager") as manager:
+            manager.return_value.end_task.return_value = stats
+            self._run(args)
+        self.assertEqual(get_allocator_stats(), stats)
+
+        with patch.object(inference, "_execute_task") as execute:
+            self._run(args)
+        execute.assert_not_called()
+        self.assertEqual(get_allocator_stats(), stats)
+        self.assertEqual(get_task_report().peak_allocated_bytes, 3)
+
+    def test_fast_determinism_is_not_cached(self):
+        config = self.config.model_copy(update={"determinism": "fast"})
+        self._run(self._args(), config=config)
+
+        self.assertIsNone(get_task_report().result_cache_hit)
+
+
+class ResultCacheKeyTests(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.model = os.path.join(self._directory.name, "model")
+        os.makedirs(self.model)
+        with open(os.path.join(self.model, "config.json"), "w") as f:
+            f.write("{}")
+        self.config = Config(result_cache={"memory_bytes": 1 << 20})
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _key(self, config=None, mode="device_map", stream=False, **fields):
+        fields.setdefault("messages", [{"role": "user", "content": "hi"}])
+        args = GPTTaskArgs.in_process(model=self.model, **fields)
+        return result_cache_key(
+            config or self.config,
+            args,
+            mode=mode,
+            gpu_count=1,
+            model_key="k",
+            stream=stream,
+        )
+
+    def test_key_covers_what_decides_the_response(self):
+        key = self._key()
+        self.assertEqual(self._key(), key)
+        for changed in (
+            self._key(seed=1),
+            self._key(generation_config={"max_new_tokens": 3}),
+            self._key(messages=[{"role": "user", "content": "hello"}]),
+            self._key(mode="tensor_parallel"),
+            self._key(stream=True),
+            self._key(config=self.config.model_copy(update={"determinism": "deterministic"})),
+        ):
+            self.assertNotEqual(changed, key)
+
+        with open(os.path.join(self.model, "config.json"), "w") as f:
+            f.write('{"changed": true}')
+        self.assertNotEqual(self._key(), key)
+
+        self.assertIsNone(self._key(config=Config()))
+        self.assertIsNone(self._key(config=self.config.model_copy(update={"determinism": "fast"})))
+
+    def test_images_are_keyed_by_content(self):
+        image = b"\x89PNG fake image bytes"
+
+        def key(block):
+            return self._key(
+                messages=[{"role": "user", "content": [block, {"type": "text", "text": "?"}]}]
+            )
+
+        path = os.path.join(self._directory.name, "image.png")
+        with open(path, "wb") as f:
+            f.write(image)
+        by_base64 = key({"type": "image", "base64": base64.b64encode(image).decode()})
+
+        self.assertEqual(key({"type": "image", "data": image}), by_base64)
+        self.assertEqual(key({"type": "image", "path": path}), by_base64)
+        self.assertNotEqual(key({"type": "image", "data": image + b"!"}), by_base64)
+
+
+class ResultCacheTierTests(unittest.TestCase):
+    def test_disk_tier_survives_the_process_cache_and_keeps_its_budget(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = ResultCacheConfig(memory_bytes=100, disk_dir=directory, disk_bytes=250)
+            cache = ResultCache(config)
+            for index in range(4):
+                cache.put(f"key{index}", bytes([index]) * 100)
+                # Distinct mtimes order the eviction.
+                os.utime(cache._path(f"key{index}"), (index, index))
+
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["result-key2.json", "result-key3.json"]
+            )
+            reopened = ResultCache(config)
+            self.assertEqual(reopened.get("key2"), bytes([2]) * 100)
+            self.assertIsNone(reopened.get("key0"))
+            # Larger than the memory budget: kept on disk only.
+            cache.put("large", b"x" * 200)
+            self.assertIsNone(cache._entries.get("large"))
+            self.assertEqual(cache.get("large"), b"x" * 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, GenerationConfig
+
+from gpt_task.inference import run_task
+from gpt_task.inference.sampling import SeededSampler, sequence_seeds
+from gpt_task.models import GPTTaskArgs
+
+from tiny_model import TinyModelTestCase
+
+
+class SeededSamplerTests(TinyModelTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.hf_model = AutoModelForCausalLM.from_pretrained(cls.model).eval()
+        cls.tokenizer = AutoTokenizer.from_pretrained(cls.model)
+        cls.tokenizer.padding_side = "left"
+
+    def _generate(self, prompts, seeds, **sampling):
+        generation_config = GenerationConfig(
+            do_sample=True,
+            max_new_tokens=8,
+            pad_token_id=self.tokenizer.pad_token_id,
+            **sampling,
+        )
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        # The global generator must not matter.
+        torch.manual_seed(len(prompts))
+        with torch.no_grad():
+            output = self.hf_model.generate(
+                **inputs,
+                generation_config=generation_config,
+                logits_processor=[SeededSampler(seeds, generation_config)],
+            )
+        return output[:, inputs["input_ids"].shape[1] :].tolist()
+
+    def test_solo_and_batched_runs_give_identical_samples(self):
+        prompts = ["hello there", "a longer prompt that needs no padding", "hi"]
+        seeds = sequence_seeds(7, len(prompts))
+        for sampling in ({}, {"temperature": 0.7, "top_k": 20, "top_p": 0.9}):
+            with self.subTest(**sampling):
+                solo = [
+                    self._generate([prompt], [seed], **sampling)[0]
+                    for prompt, seed in zip(prompts, seeds)
+                ]
+                batched = self._generate(prompts, seeds, **sampling)
+
+                self.assertEqual(batched, solo)
+                self.assertEqual(self._generate(prompts[::-1], seeds[::-1], **sampling), solo[::-1])
+                self.assertNotEqual(solo[0], self._generate(prompts[:1], [seeds[1]], **sampling)[0])
+
+    def test_top_k_one_samples_the_greedy_tokens(self):
+        greedy = self.hf_model.generate(
+            **self.tokenizer(["hello there"], return_tensors="pt"),
+            do_sample=False,
+            max_new_tokens=8,
+            pad_token_id=self.tokenizer.pad_token_id,
+        )[:, -8:].tolist()
+
+        self.assertEqual(self._generate(["hello there"], [3], top_k=1), greedy)
+
+
+class RunTaskSamplingTests(TinyModelTestCase):
+    def _texts(self, **generation_config):
+        args = GPTTaskArgs(
+            model=self.model,
+            messages=[{"role": "user", "content": "hello"}],
+            generation_config={"max_new_tokens": 8, "do_sample": True, **generation_config},
+            dtype="float32",
+            seed=11,
+        )
+        response = run_task(args, config=self.config, model_cache=self.model_cache)
+        return [choice["message"]["content"] for choice in response["choices"]]
+
+    def test_a_sequence_does_not_depend_on_its_siblings(self):
+        (alone,) = self._texts()
+        together = self._texts(num_return_sequences=3)
+
+        self.assertEqual(together[0], alone)
+        self.assertEqual(self._texts(num_return_sequences=3), together)
+        self.assertGreater(len(set(together)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
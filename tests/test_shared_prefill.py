@@ -0,0 +1,163 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import torch
+from transformers import GenerationConfig, LlamaConfig, LlamaForCausalLM
+
+from gpt_task.config import Config
+from gpt_task.inference.inference import _run_task
+from gpt_task.inference.input_rendering import RenderedTaskInput
+from gpt_task.inference.shared_prefill import (
+    prefill_shared_prompt,
+    shared_prefill_copies,
+)
+from gpt_task.models import GPTTaskArgs
+
+
+def _tiny_model():
+    torch.manual_seed(0)
+    return LlamaForCausalLM(
+        LlamaConfig(
+            vocab_size=64,
+            hidden_size=32,
+            intermediate_size=64,
+            num_hidden_layers=2,
+            num_attention_heads=4,
+            num_key_value_heads=2,
+        )
+    ).eval()
+
+
+class _TokenCounter:
+    def __init__(self):
+        self.tokens = 0
+
+    def __call__(self, module, args, kwargs):
+        input_ids = kwargs.get("input_ids")
+        if input_ids is not None:
+            self.tokens += input_ids.numel()
+
+
+class SharedPrefillTests(unittest.TestCase):
+    def setUp(self):
+        self.model = _tiny_model()
+        self.input_ids = torch.randint(
+            0, 64, (1, 16), generator=torch.Generator().manual_seed(0)
+        )
+        self.inputs = {
+            "input_ids": self.input_ids,
+            "attention_mask": torch.ones_like(self.input_ids),
+        }
+
+    def _generate(self, generation_config, shared):
+        counter = _TokenCounter()
+        handle = self.model.register_forward_pre_hook(counter, with_kwargs=True)
+        try:
+            kwargs = {}
+            if shared:
+                cache = prefill_shared_prompt(self.model, self.inputs, generation_config)
+                self.assertIsNotNone(cache)
+                kwargs["past_key_values"] = cache
+            torch.manual_seed(1)
+            with torch.no_grad():
+                output = self.model.generate(
+                    **self.inputs, generation_config=generation_config, **kwargs
+                )
+        finally:
+            handle.remove()
+        return output.tolist(), counter.tokens
+
+    def test_matches_regular_prefill(self):
+        for generation_config in (
+            GenerationConfig(
+                num_beams=3, num_return_sequences=3, max_new_tokens=8, pad_token_id=0
+            ),
+            GenerationConfig(
+                do_sample=True,
+                top_k=0,
+                num_return_sequences=4,
+                max_new_tokens=8,
+                pad_token_id=0,
+            ),
+        ):
+            with self.subTest(generation_config=generation_config):
+                baseline, baseline_tokens = self._generate(generation_config, False)
+                shared, shared_tokens = self._generate(generation_config, True)
+                self.assertEqual(shared, baseline)
+                copies = shared_prefill_copies(generation_config)
+                # The prompt is prefilled once instead of once per sequence.
+                self.assertEqual(
+                    baseline_tokens - shared_tokens, (copies - 1) * 15
+                )
+
+    def test_skips_tasks_that_do_not_qualify(self):
+        single = GenerationConfig(max_new_tokens=8)
+        self.assertIsNone(prefill_shared_prompt(self.model, self.inputs, single))
+
+        multi = GenerationConfig(num_return_sequences=2, do_sample=True)
+        padded = dict(self.inputs, attention_mask=torch.zeros_like(self.input_ids))
+        self.assertIsNone(prefill_shared_prompt(self.model, padded, multi))
+
+        multimodal = dict(self.inputs, pixel_values=torch.zeros(1, 3))
+        self.assertIsNone(prefill_shared_prompt(self.model, multimodal, multi))
+
+
+class SharedPrefillRunTaskTests(unittest.TestCase):
+    def test_text_pipeline_receives_forked_cache(self):
+        model = Mock(dtype=torch.float32)
+        model.device = torch.device("cpu")
+        tokenizer = Mock(eos_token_id=9)
+        tokenizer.decode.return_value = "answer"
+        tokenizer.batch_decode.side_effect = lambda rows, **kwargs: ["answer"] * len(rows)
+        pipe = Mock(
+            model=model, tokenizer=tokenizer, processor=None, task="text-generation"
+        )
+        pipe._preprocess_params = {}
+        pipe.preprocess.return_value = {"input_ids": torch.tensor([[1, 2]])}
+        pipe.return_value = [
+            {"generated_token_ids": [1, 2, 5, 9]},
+            {"generated_token_ids": [1, 2, 6, 9]},
+        ]
+        model_cache = Mock(spec=["load", "clear"])
+        model_cache.load.return_value = pipe
+        generation_config = SimpleNamespace(
+            do_sample=True, num_beams=1, num_return_sequences=2, pad_token_id=None
+        )
+        shared_cache = object()
+
+        with (
+            patch(
+                "gpt_task.inference.inference.render_task_input",
+                return_value=RenderedTaskInput("prompt", None),
+            ),
+            patch(
+                "gpt_task.inference.inference.resolve_generation_config",
+                return_value=generation_config,
+            ),
+            patch(
+                "gpt_task.inference.inference._resolve_prompt_input_tokens",
+                return_value=[1, 2],
+            ),
+            patch(
+                "gpt_task.inference.inference.prefill_shared_prompt",
+                return_value=shared_cache,
+            ) as prefill,
+            patch("gpt_task.inference.inference.use_deterministic_mode"),
+        ):
+            result = _run_task(
+                GPTTaskArgs(
+                    model="test/model", messages=[{"role": "user", "content": "hi"}]
+                ),
+                config=Config(),
+                model_cache=model_cache,
+            )
+
+        pipe.preprocess.assert_called_once_with("prompt")
+        self.assertIs(prefill.call_args.args[1], pipe.preprocess.return_value)
+        self.assertIs(pipe.call_args.kwargs["past_key_values"], shared_cache)
+        self.assertEqual(len(result["choices"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import torch
+
+from gpt_task.config import Config, SpeculativeConfig
+from gpt_task.inference import get_speculative_stats
+from gpt_task.inference.inference import _run_task
+from gpt_task.inference.input_rendering import RenderedTaskInput
+from gpt_task.inference.key import generate_model_key
+from gpt_task.inference.speculative import (
+    SpeculativeStats,
+    _check_shared_tokenizer,
+    attach_draft_model,
+    clear_speculative_stats,
+    supports_assisted_generation,
+)
+from gpt_task.models import GPTTaskArgs
+
+
+class _Model(torch.nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.linear = torch.nn.Linear(1, 1)
+        self.generation_config = SimpleNamespace()
+        self.config = SimpleNamespace()
+
+    @property
+    def dtype(self):
+        return torch.float32
+
+    @property
+    def device(self):
+        return torch.device("cpu")
+
+    def forward(self, x):
+        return self.linear(x)
+
+
+class _Pipe:
+    """Text pipeline whose call runs a fixed number of draft and target
+    forward passes and returns prompt + completion token ids."""
+
+    task = "text-generation"
+    processor = None
+
+    def __init__(self, completion, target_passes, draft_passes):
+        self.model = _Model()
+        self.tokenizer = Mock(eos_token_id=9)
+        self.tokenizer.decode.return_value = "answer"
+        self.tokenizer.batch_decode.side_effect = lambda rows, **kwargs: ["answer"] * len(rows)
+        self.generation_config = None
+        self.completion = completion
+        self.target_passes = target_passes
+        self.draft_passes = draft_passes
+        self.calls = []
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append(kwargs)
+        draft = kwargs.get("assistant_model")
+        x = torch.zeros(1)
+        for _ in range(self.target_passes):
+            self.model(x)
+        if draft is not None:
+            for _ in range(self.draft_passes):
+                draft(x)
+        return [{"generated_token_ids": [1, 2] + self.completion}]
+
+
+def _config():
+    return Config(
+        speculative=SpeculativeConfig(draft_models={"test/model": "test/draft"})
+    )
+
+
+def _greedy(**overrides):
+    values = dict(do_sample=False, num_beams=1, num_return_sequences=1)
+    values.update(overrides)
+    return SimpleNamespace(pad_token_id=None, **values)
+
+
+class SpeculativeStatsTests(unittest.TestCase):
+    def test_rates(self):
+        stats = SpeculativeStats(
+            draft_model="d",
+            completion_tokens=12,
+            target_forward_passes=4,
+            draft_forward_passes=10,
+        )
+        self.assertEqual(stats.tokens_per_forward, 3.0)
+        self.assertEqual(stats.acceptance_rate, 0.8)
+
+    def test_rates_without_passes(self):
+        stats = SpeculativeStats("d", 0, 0, 0)
+        self.assertEqual(stats.tokens_per_forward, 0.0)
+        self.assertEqual(stats.acceptance_rate, 0.0)
+
+    def test_only_greedy_single_sequence_is_eligible(self):
+        self.assertTrue(supports_assisted_generation(_greedy()))
+        self.assertFalse(supports_assisted_generation(_greedy(do_sample=True)))
+        self.assertFalse(supports_assisted_generation(_greedy(num_beams=2)))
+        self.assertFalse(
+            supports_assisted_generation(_greedy(num_return_sequences=2))
+        )
+
+    def test_draft_must_share_tokenizer(self):
+        def model(vocab_size):
+            config = SimpleNamespace(
+                vocab_size=vocab_size, bos_token_id=1, eos_token_id=2, pad_token_id=None
+            )
+            config.get_text_config = lambda: config
+            return SimpleNamespace(config=config)
+
+        _check_shared_tokenizer(model(100), model(100), "draft")
+        with self.assertRaises(RuntimeError):
+            _check_shared_tokenizer(model(100), model(200), "draft")
+
+    def test_draft_model_changes_cache_key(self):
+        args = GPTTaskArgs(
+            model="test/model", messages=[{"role": "user", "content": "hi"}]
+        )
+        self.assertNotEqual(
+            generate_model_key(args), generate_model_key(args, draft_model="d")
+        )
+        self.assertEqual(generate_model_key(args), generate_model_key(args, None))
+
+
+class SpeculativeRunTaskTests(unittest.TestCase):
+    def setUp(self):
+        clear_speculative_stats()
+
+    def tearDown(self):
+        clear_speculative_stats()
+
+    def _run(self, pipe, generation_config, messages=None, speculative=True):
+        args = GPTTaskArgs(
+            model="test/model",
+            messages=messages or [{"role": "user", "content": "hi"}],
+            speculative=speculative,
+        )
+        self.model_cache = Mock(spec=["load", "clear"])
+        self.model_cache.load.return_value = pipe
+        rendered = RenderedTaskInput("prompt", None)
+        with (
+            patch(
+                "gpt_task.inference.inference.render_task_input",
+                return_value=rendered,
+            ),
+            patch(
+                "gpt_task.inference.inference.resolve_generation_config",
+                return_value=generation_config,
+            ),
+            patch(
+                "gpt_task.inference.inference._resolve_prompt_input_tokens",
+                return_value=[1, 2],
+            ),
+            patch("gpt_task.inference.inference.use_deterministic_mode"),
+        ):
+            return _run_task(args, config=_config(), model_cache=self.model_cache)
+
+    def test_greedy_task_uses_draft_and_records_stats(self):
+        pipe = _Pipe(completion=[5, 6, 7, 9], target_passes=2, draft_passes=4)
+        draft = _Model()
+        attach_draft_model(pipe, draft)
+
+        result = self._run(pipe, _greedy())
+
+        self.assertIs(pipe.calls[0]["assistant_model"], draft)
+        self.assertEqual(result["usage"]["completion_tokens"], 4)
+        stats = get_speculative_stats()
+        self.assertEqual(stats.draft_model, "test/draft")
+        self.assertEqual(stats.target_forward_passes, 2)
+        self.assertEqual(stats.draft_forward_passes, 4)
+        self.assertEqual(stats.tokens_per_forward, 2.0)
+        self.assertEqual(stats.acceptance_rate, 0.5)
+
+    def test_sampling_task_skips_draft(self):
+        pipe = _Pipe(completion=[5, 9], target_passes=2, draft_passes=0)
+        attach_draft_model(pipe, _Model())
+
+        self._run(pipe, _greedy(do_sample=True))
+
+        self.assertNotIn("assistant_model", pipe.calls[0])
+        self.assertIsNone(get_speculative_stats())
+
+    def test_model_key_includes_configured_draft(self):
+        pipe = _Pipe(completion=[5, 9], target_passes=1, draft_passes=0)
+        args = GPTTaskArgs(
+            model="test/model", messages=[{"role": "user", "content": "hi"}]
+        )
+
+        self._run(pipe, _greedy())
+
+        self.assertEqual(
+            self.model_cache.load.call_args.args[0],
+            generate_model_key(args, draft_model="test/draft"),
+        )
+
+    def test_tasks_that_do_not_opt_in_skip_the_draft(self):
+        pipe = _Pipe(completion=[5, 9], target_passes=1, draft_passes=0)
+        attach_draft_model(pipe, _Model())
+        args = GPTTaskArgs(
+            model="test/model", messages=[{"role": "user", "content": "hi"}]
+        )
+
+        self._run(pipe, _greedy(), speculative=False)
+
+        self.assertNotIn("assistant_model", pipe.calls[0])
+        self.assertIsNone(get_speculative_stats())
+        self.assertEqual(
+            self.model_cache.load.call_args.args[0], generate_model_key(args)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import base64
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from transformers import GenerationConfig
+
+from gpt_task.inference.utils import bind_task_args, resolve_generation_config
+from gpt_task.models import GPTTaskArgs
+
+_SCHEMA = os.path.join(
+    os.path.dirname(__file__), os.pardir, "schema", "gpt-inference-task.json"
+)
+_IMAGE = base64.b64encode(b"image bytes").decode()
+
+
+def _fields():
+    return {
+        "model": "test/vlm",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image", "base64": _IMAGE},
+                    {"type": "text", "text": "describe"},
+                ],
+            }
+        ],
+        "tools": None,
+        "generation_config": {"max_new_tokens": 8, "do_sample": True},
+        "template_args": None,
+        "seed": 7,
+        "dtype": "auto",
+        "quantize_bits": None,
+    }
+
+
+class TrustedArgsTests(unittest.TestCase):
+    def test_trusted_args_match_validated_args(self):
+        validated = bind_task_args(**_fields())
+        trusted = bind_task_args(True, **validated.model_dump())
+
+        self.assertIsInstance(trusted, GPTTaskArgs)
+        self.assertEqual(trusted.model_dump(), validated.model_dump())
+        self.assertEqual(
+            GPTTaskArgs.trusted(model="test/llm", messages=[]).seed, 0
+        )
+
+    def test_trusted_args_are_not_validated(self):
+        with patch("gpt_task.models.args.decode_image") as decode:
+            bind_task_args(True, **_fields())
+            decode.assert_not_called()
+            bind_task_args(**_fields())
+            decode.assert_called_once_with(_IMAGE)
+
+
+class ResolveGenerationConfigTests(unittest.TestCase):
+    def test_overlay_leaves_model_config_untouched(self):
+        base = GenerationConfig(eos_token_id=[1, 2])
+        defaults = base.to_dict()
+        args = bind_task_args(**_fields())
+
+        first = resolve_generation_config(base, args)
+        first.pad_token_id = 3
+        second = resolve_generation_config(base, GPTTaskArgs(model="m", messages=[]))
+
+        self.assertEqual((first.max_new_tokens, first.do_sample), (8, True))
+        self.assertEqual(
+            (second.max_new_tokens, second.do_sample), (256, base.do_sample)
+        )
+        self.assertIsNone(second.pad_token_id)
+        self.assertEqual(second.eos_token_id, [1, 2])
+        self.assertEqual(base.to_dict(), defaults)
+
+
+class JsonSchemaTests(unittest.TestCase):
+    def test_published_schema_matches_the_model(self):
+        # Regenerate with generate_json_schema.py after changing GPTTaskArgs.
+        with open(_SCHEMA) as f:
+            self.assertEqual(json.load(f), GPTTaskArgs.model_json_schema())
+
+
+if __name__ == "__main__":
+    unittest.main()
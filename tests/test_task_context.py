@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from gpt_task.inference import get_execution_dtype, task_context
+from gpt_task.inference.execution_dtype import clear_execution_dtype, set_execution_dtype
+from gpt_task.inference.task_report import get_task_timer, task_stage, task_timing
+
+
+class TaskContextTests(unittest.TestCase):
+    def tearDown(self):
+        clear_execution_dtype()
+
+    def test_concurrent_threads_keep_their_own_state(self):
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def run(dtype):
+            set_execution_dtype(dtype)
+            barrier.wait()
+            seen[dtype] = get_execution_dtype()
+
+        threads = [threading.Thread(target=run, args=(dtype,)) for dtype in ("bf16", "fp16")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(seen, {"bf16": "bf16", "fp16": "fp16"})
+
+    def test_block_captures_task_state(self):
+        set_execution_dtype("fp32")
+        with task_context() as context:
+            set_execution_dtype("bf16")
+            with task_timing("test/model", "device_map") as timer:
+                with task_stage("tokenization"):
+                    pass
+                self.assertIs(context.timer, timer)
+
+        self.assertEqual(context.execution_dtype, "bf16")
+        self.assertIsNone(context.timer)
+        self.assertEqual(get_execution_dtype(), "fp32")
+
+    def test_unbound_reader_sees_last_written_state(self):
+        def run():
+            set_execution_dtype("int8")
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(5)
+
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(get_execution_dtype()))
+        reader.start()
+        reader.join(5)
+        self.assertEqual(seen, ["int8"])
+
+    def test_timer_is_not_shared_across_threads(self):
+        seen = []
+        with task_timing("test/model", "device_map"):
+            thread = threading.Thread(target=lambda: seen.append(get_task_timer()))
+            thread.start()
+            thread.join(5)
+        self.assertEqual(seen, [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
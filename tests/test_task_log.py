@@ -0,0 +1,100 @@
+import base64
+import io
+import logging
+import unittest
+
+import torch
+
+from gpt_task.config import Config, LoggingConfig
+from gpt_task.inference.task_log import configure_task_log, format_loggable, loggable
+from gpt_task.models import GPTTaskArgs
+from gpt_task.models.images import DecodedImage
+
+
+class _Exploding:
+    def __repr__(self):
+        raise AssertionError("formatted")
+
+
+class FormatLoggableTests(unittest.TestCase):
+    def test_image_payloads_are_logged_by_size(self):
+        payload = base64.b64encode(b"x" * 300_000).decode()
+        args = GPTTaskArgs(
+            model="test/vlm",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "base64": payload},
+                        {"type": "image", "data": b"raw image"},
+                        {"type": "text", "text": "what is this?"},
+                    ],
+                }
+            ],
+        )
+
+        text = format_loggable(args)
+
+        self.assertNotIn(payload[:64], text)
+        self.assertIn(f"<base64: {len(payload)} chars>", text)
+        self.assertIn("<9 bytes>", text)
+        self.assertIn("'what is this?'", text)
+        self.assertLess(len(text), 1024)
+        self.assertEqual(
+            format_loggable(DecodedImage(b"abc", "f" * 64)),
+            f"<image 3 bytes sha256:{'f' * 16}>",
+        )
+
+    def test_long_fields_are_truncated_and_sampled(self):
+        limits = LoggingConfig(max_field_chars=8, max_items=4)
+        self.assertEqual(
+            format_loggable("abcdefghijk", limits), "'abcdefgh'...(+3 chars)"
+        )
+        self.assertEqual(
+            format_loggable(list(range(100)), limits), "[0, 1, ...(96 more), 98, 99]"
+        )
+        self.assertEqual(
+            format_loggable({str(i): i for i in range(6)}, limits),
+            "{'0': 0, '1': 1, '2': 2, '3': 3, ...(2 more keys)}",
+        )
+        self.assertEqual(
+            format_loggable({"ids": torch.zeros(2, 3, dtype=torch.long)}),
+            "{'ids': tensor(shape=[2, 3], dtype=torch.int64, device=cpu)}",
+        )
+
+    def test_line_stays_within_budget(self):
+        limits = LoggingConfig(max_line_chars=100)
+        text = format_loggable([["word " * 50] * 50] * 50, limits)
+        self.assertEqual(len(text), 100 + len("...(truncated)"))
+        self.assertLessEqual(
+            len(format_loggable([[[[[1]]]]], LoggingConfig(max_depth=2))),
+            len("[[<list>]]"),
+        )
+
+
+class LoggableTests(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger("gpt_task.tests.task_log")
+        self.handler = logging.StreamHandler(self.stream)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        configure_task_log(Config())
+
+    def test_filtered_records_are_not_formatted(self):
+        self.logger.setLevel(logging.INFO)
+        self.logger.debug("value: %s", loggable(_Exploding()))
+        self.assertEqual(self.stream.getvalue(), "")
+
+    def test_emitted_records_use_configured_limits(self):
+        self.logger.setLevel(logging.DEBUG)
+        configure_task_log(Config(logging=LoggingConfig(max_items=2)))
+        self.logger.debug("tokens: %s", loggable([1, 2, 3, 4, 5]))
+        self.assertEqual(self.stream.getvalue(), "tokens: [1, ...(3 more), 5]\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
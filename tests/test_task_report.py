@@ -0,0 +1,196 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import torch
+
+from gpt_task.cache import MemoryModelCache
+from gpt_task.config import Config
+from gpt_task.inference import export_task_spans, get_task_report, run_task
+from gpt_task.inference.input_rendering import RenderedTaskInput
+from gpt_task.inference.task_report import (
+    StageTiming,
+    TaskReport,
+    TaskTimer,
+    generation_stages,
+    task_timing,
+)
+from gpt_task.models import GPTTaskArgs
+
+
+def _report(**values):
+    fields = dict(
+        model='org/model"x',
+        mode="device_map",
+        started_at=1000.0,
+        duration=2.0,
+        stages=(
+            StageTiming("adapter_render", 0.0, 0.25),
+            StageTiming("prefill", 0.25, 0.5),
+            StageTiming("decode", 0.75, 1.0),
+        ),
+        model_cache_hit=True,
+        prompt_tokens=10,
+        completion_tokens=50,
+        time_to_first_token=0.75,
+        peak_allocated_bytes=1024,
+    )
+    fields.update(values)
+    return TaskReport(**fields)
+
+
+class ClassicTaskReportTests(unittest.TestCase):
+    def test_reports_load_and_cache_hit_stages(self):
+        args = GPTTaskArgs(model="test/model", messages=[{"role": "user", "content": "hi"}])
+        tokenizer = MagicMock(eos_token_id=3)
+        tokenizer.batch_decode.side_effect = lambda rows, **kwargs: ["answer"] * len(rows)
+        processor = MagicMock(tokenizer=tokenizer)
+        model = MagicMock(dtype=torch.float32, device=torch.device("cpu"))
+        model.config = SimpleNamespace(model_type="test")
+        pipe = MagicMock(model=model, processor=processor, tokenizer=tokenizer)
+        pipe._preprocess_params = {}
+        pipe._forward_params = {}
+        pipe._postprocess_params = {}
+        pipe.return_value = [{"generated_token_ids": [1, 2, 5, 3]}]
+        model_cache = MemoryModelCache()
+        reports = []
+
+        with (
+            patch("transformers.AutoProcessor.from_pretrained", return_value=processor),
+            patch("transformers.pipeline", return_value=pipe),
+            patch("gpt_task.inference.inference.get_max_memory", return_value={"cpu": 1}),
+            patch("gpt_task.inference.inference.configure_artifacts"),
+            patch(
+                "gpt_task.inference.inference.render_task_input",
+                return_value=RenderedTaskInput("prompt", None),
+            ),
+            patch(
+                "gpt_task.inference.inference._resolve_prompt_input_tokens",
+                return_value=[1, 2],
+            ),
+            patch(
+                "gpt_task.inference.inference.resolve_generation_config",
+                return_value=SimpleNamespace(pad_token_id=None),
+            ),
+            patch("gpt_task.inference.inference.use_deterministic_mode"),
+        ):
+            for _ in range(2):
+                run_task(args, config=Config(), model_cache=model_cache)
+                reports.append(get_task_report())
+
+        first, second = reports
+        self.assertEqual(
+            [stage.name for stage in first.stages],
+            [
+                "processor_load",
+                "model_load",
+                "adapter_render",
+                "tokenization",
+                "prefill",
+                "detokenize",
+            ],
+        )
+        self.assertFalse(first.model_cache_hit)
+        self.assertTrue(second.model_cache_hit)
+        self.assertIsNone(second.stage_seconds("model_load"))
+        self.assertEqual((second.prompt_tokens, second.completion_tokens), (2, 2))
+        self.assertEqual(second.mode, "device_map")
+        for stage in second.stages:
+            self.assertGreaterEqual(stage.start, 0.0)
+            self.assertLessEqual(stage.start + stage.duration, second.duration)
+
+
+class TaskTimerTests(unittest.TestCase):
+    def test_generation_splits_at_first_forward(self):
+        model = torch.nn.Linear(2, 2)
+        with task_timing("test/model", "device_map") as timer:
+            with generation_stages(model):
+                for _ in range(4):
+                    model(torch.zeros(1, 2))
+            report = timer.report(prompt_tokens=3, completion_tokens=4)
+
+        prefill, decode = report.stages
+        self.assertEqual((prefill.name, decode.name), ("prefill", "decode"))
+        self.assertEqual(report.time_to_first_token, decode.start)
+        self.assertEqual(report.tokens_per_second, 4 / decode.duration)
+        self.assertEqual(len(model._forward_hooks), 0)
+
+    def test_merged_rank_report_adds_ipc(self):
+        timer = TaskTimer("test/model", "tensor_parallel", started_at=100.0)
+        timer.add_stage("config_load", 0.0, 0.5)
+        rank = _report(started_at=101.0, duration=2.0)
+
+        timer.merge(rank, start=0.75, duration=2.5)
+        report = timer.report()
+
+        self.assertEqual(
+            [(stage.name, stage.start) for stage in report.stages],
+            [
+                ("config_load", 0.0),
+                ("ipc", 0.75),
+                ("adapter_render", 1.0),
+                ("prefill", 1.25),
+                ("decode", 1.75),
+            ],
+        )
+        self.assertEqual(report.stage_seconds("ipc"), 0.5)
+        self.assertEqual(report.time_to_first_token, 1.75)
+        self.assertTrue(report.model_cache_hit)
+
+
+class ExportTests(unittest.TestCase):
+    def test_prometheus_text(self):
+        text = _report().to_prometheus()
+        labels = 'model="org/model\\"x",mode="device_map"'
+        self.assertIn("# TYPE gpt_task_stage_seconds gauge", text)
+        self.assertIn(f'gpt_task_stage_seconds{{{labels},stage="prefill"}} 0.5\n', text)
+        self.assertIn(f"gpt_task_tokens_per_second{{{labels}}} 50.0\n", text)
+        self.assertIn(f"gpt_task_model_cache_hit{{{labels}}} 1.0\n", text)
+        self.assertNotIn("gpt_task_peak", _report(peak_allocated_bytes=None).to_prometheus())
+
+    def test_spans_reach_collector(self):
+        received = []
+
+        class Collector(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                received.append((self.path, json.loads(self.rfile.read(length))))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Collector)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            export_task_spans(
+                _report(), endpoint=f"http://127.0.0.1:{server.server_port}/v1/traces"
+            )
+        finally:
+            thread.join(5)
+            server.server_close()
+
+        path, body = received[0]
+        spans = body["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root, *stages = spans
+        self.assertEqual(path, "/v1/traces")
+        self.assertEqual(root["name"], "gpt_task.task")
+        self.assertEqual(root["startTimeUnixNano"], str(1000 * 10**9))
+        self.assertEqual(
+            [span["name"] for span in stages],
+            ["gpt_task.adapter_render", "gpt_task.prefill", "gpt_task.decode"],
+        )
+        self.assertTrue(all(span["parentSpanId"] == root["spanId"] for span in stages))
+        self.assertIn(
+            {"key": "gpt_task.prompt_tokens", "value": {"intValue": "10"}},
+            root["attributes"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import os
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -5,6 +6,7 @@ from gpt_task.config import Config
 from gpt_task.inference import get_execution_dtype
 from gpt_task.inference.execution_dtype import set_execution_dtype
 from gpt_task.inference.tp import api, executor, shutdown_tp_executor
+from gpt_task.inference.tp.rank_worker import rank_worker_main
 from gpt_task.inference.tp.result import TPTaskResult
 from gpt_task.models import GPTTaskArgs
 
@@ -33,6 +35,35 @@ class TPExecutorLifecycleTests(unittest.TestCase):
         with executor._executor_lock:
             self.assertIsNone(executor._executor)
 
+    def test_rank_group_is_respawned_when_launch_blocking_changes(self):
+        strict_group = MagicMock()
+        strict_group.all_ranks_alive.return_value = True
+        strict_group.world_size = 2
+        strict_group.launch_blocking = True
+        with executor._executor_lock:
+            executor._executor = strict_group
+
+        with patch.object(executor, "TPExecutor") as spawn:
+            executor.submit_tp_task(
+                2, MagicMock(), _args(), Config(determinism="deterministic")
+            )
+
+        strict_group.shutdown.assert_called_once()
+        spawn.assert_called_once_with(2, False)
+        spawn.return_value.submit.assert_called_once()
+
+    def test_ranks_override_inherited_launch_blocking(self):
+        for blocking, expected in ((True, "1"), (False, "0")):
+            with (
+                self.subTest(blocking=blocking),
+                patch.dict(os.environ, {"CUDA_LAUNCH_BLOCKING": "1"}),
+                # Stop the rank right after it pins its environment.
+                patch("torch.cuda.set_device", side_effect=RuntimeError("stop")),
+            ):
+                with self.assertRaisesRegex(RuntimeError, "stop"):
+                    rank_worker_main(0, 1, 0, None, None, launch_blocking=blocking)
+                self.assertEqual(os.environ["CUDA_LAUNCH_BLOCKING"], expected)
+
     def test_run_task_tp_fallback_shuts_down_before_classic(self):
         order = []
 
@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import patch
+
+from transformers import AutoTokenizer
+
+from gpt_task.config import Config
+from gpt_task.inference import VerificationResult, run_task, verify_task, verify_tasks
+from gpt_task.inference.errors import TaskArgsInvalid
+from gpt_task.inference.tp import api
+from gpt_task.models import GPTTaskArgs
+
+from tiny_model import TinyModelTestCase
+
+
+class TinyModelVerificationTests(TinyModelTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tokenizer = AutoTokenizer.from_pretrained(cls.model)
+
+    def _args(self, content="hello there", **generation_config):
+        generation_config.setdefault("max_new_tokens", 6)
+        return GPTTaskArgs(
+            model=self.model,
+            messages=[{"role": "user", "content": content}],
+            generation_config={"do_sample": False, **generation_config},
+            dtype="float32",
+        )
+
+    def _verify(self, args, completion, **kwargs):
+        return verify_task(
+            args, completion, config=self.config, model_cache=self.model_cache, **kwargs
+        )
+
+    def _greedy_completion(self, args):
+        # Each failed check names the greedy choice at the end.
+        completion = []
+        while not (result := self._verify(args, completion)).verified:
+            self.assertEqual(result.first_divergence, len(completion))
+            completion.append(result.expected_token_id)
+        return completion
+
+    def test_accepts_exactly_the_greedy_completion(self):
+        for generation_config in ({}, {"repetition_penalty": 1.5}):
+            with self.subTest(**generation_config):
+                args = self._args(**generation_config)
+                response = run_task(args, config=self.config, model_cache=self.model_cache)
+                completion = self._greedy_completion(args)
+
+                self.assertEqual(len(completion), response["usage"]["completion_tokens"])
+                self.assertEqual(
+                    self.tokenizer.decode(completion, skip_special_tokens=True).strip(),
+                    response["choices"][0]["message"]["content"],
+                )
+
+    def test_reports_first_divergence(self):
+        args = self._args()
+        completion = self._greedy_completion(args)
+        tampered = list(completion)
+        tampered[3] = (completion[3] + 1) % len(self.tokenizer)
+
+        self.assertEqual(
+            self._verify(args, tampered),
+            VerificationResult(False, 6, 3, completion[3], tampered[3]),
+        )
+        self.assertEqual(
+            self._verify(args, completion[:4]),
+            VerificationResult(False, 4, 4, completion[4], None),
+        )
+
+        # With any token accepted only the stopping rules remain.
+        eos = self.tokenizer.eos_token_id
+        loose = {"tolerance": float("inf")}
+        self.assertEqual(
+            self._verify(args, [completion[0], eos, completion[1]], **loose),
+            VerificationResult(False, 3, 2, None, completion[1]),
+        )
+        self.assertEqual(
+            self._verify(args, completion + [completion[0]], **loose),
+            VerificationResult(False, 7, 6, None, completion[0]),
+        )
+        self.assertTrue(self._verify(args, completion[:2] + [eos], **loose).verified)
+
+    def test_batched_results_match_single_results(self):
+        requests = []
+        for content in ("hi", "a much longer prompt for padding", "hello there"):
+            args = self._args(content)
+            completion = self._greedy_completion(args)
+            requests.append((args, completion))
+            requests.append((args, completion[:2] + [completion[0]] + completion[3:]))
+        single = [self._verify(args, completion) for args, completion in requests]
+
+        batched = verify_tasks(
+            requests, config=self.config, model_cache=self.model_cache, batch_size=4
+        )
+
+        self.assertEqual(batched, single)
+        self.assertEqual([result.verified for result in batched], [True, False] * 3)
+
+    def test_sampling_task_cannot_be_verified(self):
+        with self.assertRaises(TaskArgsInvalid):
+            self._verify(self._args(do_sample=True), [1, 2])
+
+
+class TensorParallelVerificationTests(unittest.TestCase):
+    def test_groups_by_model_and_falls_back_to_classic(self):
+        def args(model):
+            return GPTTaskArgs(model=model, messages=[{"role": "user", "content": "hi"}])
+
+        resolution = api._TPTaskResolution(
+            2, api.TPRuntimeStrategy(api.TP_MODEL_LOADER_CAUSAL_LM, False)
+        )
+        requests = [(args("org/tp"), [1]), (args("org/classic"), [2]), (args("org/tp"), [3])]
+        with (
+            patch.object(
+                api,
+                "_resolve_tp_task",
+                side_effect=lambda args, *_: resolution if args.model == "org/tp" else None,
+            ),
+            patch.object(
+                api,
+                "submit_tp_verification",
+                return_value=[VerificationResult(True, 1), VerificationResult(True, 1)],
+            ) as submit,
+            patch.object(
+                api, "verify_tasks", return_value=[VerificationResult(False, 1, 0, 5, 2)]
+            ) as classic,
+            patch.object(api, "shutdown_tp_executor"),
+            patch("torch.cuda.device_count", return_value=2),
+        ):
+            results = api.verify_tasks_tp(requests, config=Config(local_files_only=True))
+
+        self.assertEqual([result.verified for result in results], [True, False, True])
+        world_size, strategy, group = submit.call_args.args[:3]
+        self.assertEqual((world_size, strategy), (2, resolution.strategy))
+        self.assertEqual([completion for _, completion in group], [[1], [3]])
+        self.assertEqual(classic.call_args.args[0][0][1], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import base64
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import torch
+from pydantic import ValidationError
+
+from gpt_task.config import Config, VisionConfig
+from gpt_task.inference.errors import TaskArgsInvalid
+from gpt_task.inference.model_adapters.input.vision import pixel_cache
+from gpt_task.inference.model_adapters.input.vision.budget import (
+    VisionBudget,
+    check_vision_limit,
+    count_vision_tokens,
+    node_vision_limits,
+    resolve_vision_budget,
+    target_sizes,
+    tile_limit,
+    use_vision_budget,
+)
+from gpt_task.inference.model_adapters.input.vision.pixel_cache import (
+    get_pixel_cache,
+    install_pixel_cache,
+)
+from gpt_task.models import GPTTaskArgs
+
+from test_pixel_cache import _Image, _ImageProcessor, _Processor
+
+_QWEN_GRID = SimpleNamespace(patch_size=14, merge_size=2)
+
+
+def _args(**kwargs):
+    return GPTTaskArgs(
+        model="test/vlm", messages=[{"role": "user", "content": "hi"}], **kwargs
+    )
+
+
+class TargetSizeTests(unittest.TestCase):
+    def test_images_within_budget_keep_their_size(self):
+        budget = VisionBudget(max_pixels=1_000_000, max_vision_tokens=1000)
+        self.assertEqual(
+            target_sizes([(280, 280), (56, 28)], budget, _QWEN_GRID),
+            [(280, 280), (56, 28)],
+        )
+
+    def test_max_pixels_caps_each_image(self):
+        sizes = target_sizes(
+            [(4000, 3000), (100, 100)], VisionBudget(max_pixels=1_000_000), object()
+        )
+        self.assertEqual(sizes[1], (100, 100))
+        width, height = sizes[0]
+        self.assertLessEqual(width * height, 1_000_000)
+        self.assertAlmostEqual(width / height, 4 / 3, places=2)
+
+    def test_vision_tokens_shrink_all_images_to_whole_patches(self):
+        sizes = [(4000, 3000), (1000, 1000), (30, 30)]
+        for max_tokens in (1, 64, 1000, 5000):
+            with self.subTest(max_tokens=max_tokens):
+                targets = target_sizes(
+                    sizes, VisionBudget(max_vision_tokens=max_tokens), _QWEN_GRID
+                )
+                tokens = 0
+                for width, height in targets:
+                    self.assertEqual((width % 28, height % 28), (0, 0))
+                    tokens += (width // 28) * (height // 28)
+                # Every image keeps at least one merged patch.
+                self.assertLessEqual(tokens, max(max_tokens, len(sizes)))
+
+    def test_is_deterministic(self):
+        budget = VisionBudget(max_pixels=500_000, max_vision_tokens=700)
+        sizes = [(1920, 1080), (1024, 768)]
+        self.assertEqual(
+            target_sizes(sizes, budget, _QWEN_GRID),
+            target_sizes(list(sizes), budget, _QWEN_GRID),
+        )
+
+
+class TileLimitTests(unittest.TestCase):
+    def _processor(self, max_patches=12, image_seq_length=256):
+        return SimpleNamespace(
+            image_processor=SimpleNamespace(max_patches=max_patches),
+            image_seq_length=image_seq_length,
+        )
+
+    def test_caps_tiles_by_tile_and_token_budget(self):
+        processor = self._processor()
+        self.assertEqual(tile_limit(VisionBudget(max_tiles=4), processor, 2), 4)
+        self.assertEqual(
+            tile_limit(VisionBudget(max_vision_tokens=2048), processor, 2), 4
+        )
+        self.assertEqual(tile_limit(VisionBudget(max_vision_tokens=1), processor, 2), 1)
+
+    def test_returns_none_when_nothing_changes(self):
+        self.assertIsNone(tile_limit(VisionBudget(max_tiles=20), self._processor(), 1))
+        self.assertIsNone(tile_limit(VisionBudget(max_tiles=2), _Processor(), 1))
+
+
+class ResolveVisionBudgetTests(unittest.TestCase):
+    def test_budget_comes_from_the_task_only(self):
+        budget = resolve_vision_budget(
+            _args(vision_budget={"max_pixels": 2000, "max_tiles": 3})
+        )
+        self.assertEqual(budget, VisionBudget(max_pixels=2000, max_tiles=3))
+        self.assertFalse(resolve_vision_budget(_args()).bounded)
+
+    def test_node_limits_reject_rather_than_shrink(self):
+        limits = node_vision_limits(
+            Config(vision=VisionConfig(max_pixels=1000, max_vision_tokens=50))
+        )
+        self.assertEqual(limits, VisionBudget(max_pixels=1000, max_vision_tokens=50))
+        check_vision_limit(limits, "max_vision_tokens", 50)
+        check_vision_limit(limits, "max_vision_tokens", None)
+        check_vision_limit(limits, "max_tiles", 100)
+        with self.assertRaises(TaskArgsInvalid):
+            check_vision_limit(limits, "max_vision_tokens", 51)
+
+    def test_request_budget_is_validated(self):
+        for budget in ({"max_pixels": 0}, {"max_tokens": 5}):
+            with self.subTest(budget=budget), self.assertRaises(ValidationError):
+                _args(vision_budget=budget)
+
+
+class CountVisionTokensTests(unittest.TestCase):
+    def test_counts_image_placeholders(self):
+        input_ids = torch.tensor([[1, 9, 9, 9, 2]])
+        self.assertEqual(
+            count_vision_tokens(SimpleNamespace(image_token_id=9), input_ids), 3
+        )
+        self.assertEqual(
+            count_vision_tokens(SimpleNamespace(image_token_index=9), input_ids), 3
+        )
+        self.assertIsNone(count_vision_tokens(SimpleNamespace(), input_ids))
+
+
+class _SizedImage(_Image):
+    def __init__(self, data: bytes, size=(2, 2)) -> None:
+        super().__init__(data)
+        self.size = size
+
+
+class _TilingImageProcessor(_ImageProcessor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.max_patches = 12
+        self.kwargs = []
+
+    def __call__(self, images, **kwargs):
+        self.kwargs.append(kwargs)
+        return super().__call__(images, **kwargs)
+
+
+class _TilingProcessor(_Processor):
+    def __init__(self) -> None:
+        self.image_processor = _TilingImageProcessor()
+
+
+class ProcessorBudgetTests(unittest.TestCase):
+    def setUp(self):
+        get_pixel_cache(Config(vision=VisionConfig(pixel_cache_bytes=64 << 20)))
+        get_pixel_cache().clear()
+        self.load = patch.object(
+            pixel_cache,
+            "_load_image",
+            side_effect=lambda d: _SizedImage(d.data, size=(4000, 3000)),
+        )
+        self.load.start()
+        self.resize = patch.object(
+            pixel_cache,
+            "_resize_image",
+            side_effect=lambda image, size: _SizedImage(image.data, size=size),
+        )
+        self.resize_image = self.resize.start()
+
+    def tearDown(self):
+        self.resize.stop()
+        self.load.stop()
+        get_pixel_cache(Config()).clear()
+
+    def test_images_are_scaled_once_before_processing(self):
+        processor = _Processor()
+        install_pixel_cache(processor)
+        seen = []
+        original = _ImageProcessor.__call__
+
+        def record(self, images, **kwargs):
+            seen.extend(image.size for batch in images for image in batch)
+            return original(self, images, **kwargs)
+
+        cat = base64.b64encode(b"cat").decode()
+        with patch.object(_ImageProcessor, "__call__", record):
+            with use_vision_budget(VisionBudget(max_pixels=1_000_000)):
+                processor(images=[[cat]])
+                processor(images=[[cat]])
+            processor(images=[[cat]])
+
+        self.assertEqual(seen, [(1154, 866), (4000, 3000)])
+        self.assertEqual(self.resize_image.call_count, 1)
+
+    def test_tile_limit_reaches_the_processor(self):
+        processor = _TilingProcessor()
+        install_pixel_cache(processor)
+        with use_vision_budget(VisionBudget(max_tiles=2)):
+            processor(images=[[base64.b64encode(b"cat").decode()]])
+        processor(images=[[base64.b64encode(b"dog").decode()]])
+
+        self.assertEqual(processor.image_processor.kwargs, [{"max_patches": 2}, {}])
+
+    def test_node_limits_reject_images_over_them(self):
+        cat = base64.b64encode(b"cat").decode()
+        limits = VisionBudget(max_pixels=1_000_000)
+        processor = _Processor()
+        install_pixel_cache(processor)
+        with use_vision_budget(VisionBudget(), limits), self.assertRaises(TaskArgsInvalid):
+            processor(images=[[cat]])
+        with use_vision_budget(VisionBudget(max_pixels=1_000_000), limits):
+            processor(images=[[cat]])
+        self.assertEqual(self.resize_image.call_count, 1)
+
+        tiling = _TilingProcessor()
+        install_pixel_cache(tiling)
+        limits = VisionBudget(max_tiles=4)
+        with use_vision_budget(VisionBudget(), limits), self.assertRaises(TaskArgsInvalid):
+            tiling(images=[[cat]])
+        with use_vision_budget(VisionBudget(max_tiles=4), limits):
+            tiling(images=[[cat]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import base64
+import functools
+import unittest
+from types import SimpleNamespace
+
+import torch
+from transformers import (
+    CLIPVisionConfig,
+    GenerationConfig,
+    LlamaConfig,
+    LlavaConfig,
+    LlavaForConditionalGeneration,
+)
+
+from gpt_task.cache.residency import VRAMArbiter
+from gpt_task.config import Config, VisionConfig
+from gpt_task.inference.model_adapters.input.vision.embedding_cache import (
+    VisionEmbeddingCache,
+    _ImageEntry,
+    encode_images_with_cache,
+    get_vision_embedding_cache,
+)
+from gpt_task.models import GPTTaskArgs
+
+_IMAGE_TOKEN = 63
+_TOKENS_PER_IMAGE = 4
+
+
+def _tiny_llava():
+    torch.manual_seed(0)
+    config = LlavaConfig(
+        vision_config=CLIPVisionConfig(
+            hidden_size=16,
+            intermediate_size=32,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            image_size=8,
+            patch_size=4,
+            projection_dim=16,
+        ),
+        text_config=LlamaConfig(
+            vocab_size=64,
+            hidden_size=16,
+            intermediate_size=32,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            num_key_value_heads=2,
+        ),
+        image_token_id=_IMAGE_TOKEN,
+        vision_feature_layer=-1,
+        image_seq_length=_TOKENS_PER_IMAGE,
+    )
+    model = LlavaForConditionalGeneration(config).eval()
+
+    # Record how many images each vision encoder call receives.
+    encoder = model.base_model.get_image_features
+    model.encoded_images = []
+
+    @functools.wraps(encoder)
+    def counting_encoder(**kwargs):
+        model.encoded_images.append(kwargs["pixel_values"].shape[0])
+        return encoder(**kwargs)
+
+    model.base_model.get_image_features = counting_encoder
+    return model
+
+
+def _task(payloads):
+    content = [
+        {"type": "image", "base64": base64.b64encode(payload).decode()}
+        for payload in payloads
+    ]
+    content.append({"type": "text", "text": "describe"})
+    args = GPTTaskArgs(model="test/vlm", messages=[{"role": "user", "content": content}])
+
+    ids = [1]
+    for _ in payloads:
+        ids += [_IMAGE_TOKEN] * _TOKENS_PER_IMAGE + [2]
+    input_ids = torch.tensor([ids + [5, 6]])
+    generator = torch.Generator().manual_seed(0)
+    pixels = {
+        payload: torch.randn(3, 8, 8, generator=generator.manual_seed(len(payload)))
+        for payload in payloads
+    }
+    encoded = {
+        "input_ids": input_ids,
+        "attention_mask": torch.ones_like(input_ids),
+        "pixel_values": torch.stack([pixels[payload] for payload in payloads]),
+    }
+    return args, encoded
+
+
+def _greedy(**overrides):
+    values = dict(max_new_tokens=5, do_sample=False, pad_token_id=0)
+    values.update(overrides)
+    return GenerationConfig(**values)
+
+
+class VisionEmbeddingCacheGenerationTests(unittest.TestCase):
+    def setUp(self):
+        self.model = _tiny_llava()
+        self.cache = VisionEmbeddingCache(1 << 20)
+
+    def test_cached_outputs_match_pixel_generation(self):
+        args, encoded = _task([b"a", b"bb"])
+        for config in (_greedy(), _greedy(num_beams=2, num_return_sequences=2)):
+            with self.subTest(num_beams=config.num_beams):
+                expected = self.model.generate(**encoded, generation_config=config)
+                for _ in range(2):
+                    cached = encode_images_with_cache(
+                        self.model, "key", args, encoded, self.cache
+                    )
+                    self.assertNotIn("pixel_values", cached)
+                    output = self.model.generate(**cached, generation_config=config)
+                    self.assertTrue(torch.equal(expected, output))
+
+    def test_only_new_images_are_encoded(self):
+        args, encoded = _task([b"a", b"bb"])
+        encode_images_with_cache(self.model, "key", args, encoded, self.cache)
+        self.model.encoded_images.clear()
+
+        args, encoded = _task([b"a", b"bb", b"ccc"])
+        cached = encode_images_with_cache(self.model, "key", args, encoded, self.cache)
+
+        self.assertEqual(self.model.encoded_images, [1])
+        self.assertEqual(len(cached["mm_encoder_outputs"]["image"].pooler_output), 3)
+        self.assertTrue(
+            torch.equal(
+                self.model.generate(**encoded, generation_config=_greedy()),
+                self.model.generate(**cached, generation_config=_greedy()),
+            )
+        )
+
+    def test_model_switch_drops_entries(self):
+        args, encoded = _task([b"a"])
+        encode_images_with_cache(self.model, "key", args, encoded, self.cache)
+        encode_images_with_cache(self.model, "other", args, encoded, self.cache)
+
+        self.assertEqual(self.model.encoded_images, [1, 1])
+        self.assertEqual(len(self.cache), 1)
+
+    def test_disabled_cache_passes_inputs_through(self):
+        args, encoded = _task([b"a"])
+        cache = VisionEmbeddingCache(0)
+
+        self.assertIs(
+            encode_images_with_cache(self.model, "key", args, encoded, cache), encoded
+        )
+        self.assertEqual(self.model.encoded_images, [])
+
+    def test_model_without_encoder_outputs_passes_inputs_through(self):
+        args, encoded = _task([b"a"])
+        model = SimpleNamespace(_supports_mm_encoder_outputs=lambda: False)
+
+        self.assertIs(
+            encode_images_with_cache(model, "key", args, encoded, self.cache), encoded
+        )
+
+
+def _entry(nbytes):
+    return _ImageEntry(
+        pooled=torch.zeros(nbytes, dtype=torch.uint8),
+        deepstack=None,
+        output_type=object,
+        stacked=False,
+        deepstack_stacked=False,
+    )
+
+
+class VisionEmbeddingCacheBudgetTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = VisionEmbeddingCache(10)
+        cache.put("a", _entry(4), 4)
+        cache.put("b", _entry(4), 4)
+        cache.get("a")
+        cache.put("c", _entry(4), 4)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_skips_entries_over_budget(self):
+        cache = VisionEmbeddingCache(10)
+        cache.put("a", _entry(11), 11)
+        self.assertEqual(len(cache), 0)
+
+    def test_arbiter_releases_entries(self):
+        now = [0.0]
+        arbiter = VRAMArbiter(clock=lambda: now[0], free_bytes=lambda: 0)
+        cache = VisionEmbeddingCache(10, clock=lambda: now[0])
+        arbiter.register(cache)
+        cache.put("a", _entry(4), 4)
+        now[0] = 100.0
+
+        self.assertEqual(arbiter.release_idle(ttl=10.0), 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_rebuilt_when_budget_changes(self):
+        cache = get_vision_embedding_cache(
+            Config(vision=VisionConfig(embedding_cache_bytes=1 << 20))
+        )
+        self.assertEqual(cache.max_bytes, 1 << 20)
+        self.assertIs(get_vision_embedding_cache(), cache)
+        self.assertEqual(get_vision_embedding_cache(Config()).max_bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,10 @@ from unittest.mock import Mock, patch
 import torch
 
 from gpt_task.inference.inference import _run_task, prepare_vlm_inputs
-from gpt_task.inference.input_rendering import RenderedTaskInput
+from gpt_task.inference.input_rendering import (
+    RenderedTaskInput,
+    _move_tensors_to_device,
+)
 from gpt_task.inference.model_adapters import ModelAdapterContext
 from gpt_task.inference.model_adapters.artifacts import (
     configure_artifacts,
@@ -299,13 +302,14 @@ class VLMInputTests(unittest.TestCase):
         tokenizer = Mock()
         tokenizer.eos_token_id = 3
         tokenizer.decode.return_value = "answer"
+        tokenizer.batch_decode.side_effect = lambda rows, **kwargs: ["answer"] * len(rows)
         model = Mock()
         model.dtype = torch.float16
         model.device = torch.device("cpu")
         model.generation_config = Mock()
         model.generate.return_value = torch.tensor([[1, 2, 3]])
         pipe = Mock(processor=processor, tokenizer=tokenizer, model=model)
-        model_cache = Mock()
+        model_cache = Mock(spec=["load", "clear"])
         model_cache.load.return_value = pipe
         prepared = {"input_ids": torch.tensor([[1, 2]])}
         generation_config = Mock(pad_token_id=None)
@@ -482,6 +486,18 @@ class VLMInputTests(unittest.TestCase):
         )
         self.assertEqual(inputs["input_ids"].device.type, "cpu")
 
+    def test_moves_tensors_of_processor_batch_features(self):
+        from transformers import BatchFeature
+
+        features = BatchFeature(
+            {"pixel_values": torch.zeros(2, 3), "image_sizes": [(1, 1)]}
+        )
+        moved = _move_tensors_to_device(features, torch.device("meta"))
+
+        self.assertIsInstance(moved, dict)
+        self.assertEqual(moved["pixel_values"].device.type, "meta")
+        self.assertEqual(moved["image_sizes"], [(1, 1)])
+
 
 class ArtifactAdapterTests(unittest.TestCase):
     def test_resolves_and_configures_ernie_from_loaded_config(self):
@@ -0,0 +1,225 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from gpt_task.cache import MemoryModelCache, VRAMArbiter, use_cached_model
+from gpt_task.inference.tp import executor
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeDevice:
+    """Free VRAM grows by the size of every model the caches drop."""
+
+    def __init__(self, free: int) -> None:
+        self.free = free
+
+    def __call__(self) -> int:
+        return self.free
+
+
+class _Model:
+    def __init__(self, name: str, size: int, device: _FakeDevice) -> None:
+        self.name = name
+        self.size = size
+        self._device = device
+
+    def __del__(self):
+        self._device.free += self.size
+
+
+class IdleEvictionTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.device = _FakeDevice(free=0)
+        self.arbiter = VRAMArbiter(clock=self.clock, free_bytes=self.device)
+        self.cache = MemoryModelCache(max_size=2, clock=self.clock)
+        self.arbiter.register(self.cache)
+
+    def _load(self, name: str, size: int = 10):
+        return self.cache.load(name, lambda: _Model(name, size, self.device))
+
+    def test_releases_everything_after_ttl_without_tasks(self):
+        with self.arbiter.task_scope():
+            self._load("a")
+            self._load("b")
+
+        self.clock.now = 59.0
+        self.assertEqual(self.arbiter.release_idle(60.0), 0)
+
+        self.clock.now = 60.0
+        self.assertEqual(self.arbiter.release_idle(60.0), 2)
+        self.assertIsNone(self.cache.idle_since())
+        self.assertEqual(self.device.free, 20)
+
+    def test_running_task_blocks_idle_eviction(self):
+        with self.arbiter.task_scope():
+            self._load("a")
+            self.clock.now = 1000.0
+            self.assertEqual(self.arbiter.release_idle(60.0), 0)
+
+        self.assertIsNotNone(self.cache.idle_since())
+
+    def test_cache_hit_refreshes_lru_order(self):
+        self._load("a")
+        self.clock.now = 1.0
+        self._load("b")
+        self.clock.now = 2.0
+        self._load("a")
+        self.clock.now = 3.0
+        self._load("c")
+
+        self.assertEqual(list(self.cache._cache), ["a", "c"])
+
+
+class VRAMRequestTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.device = _FakeDevice(free=5)
+        self.arbiter = VRAMArbiter(clock=self.clock, free_bytes=self.device)
+
+    def test_evicts_in_lru_order_across_residents_until_satisfied(self):
+        first = MemoryModelCache(max_size=2, clock=self.clock)
+        second = MemoryModelCache(max_size=1, clock=self.clock)
+        self.arbiter.register(first)
+        self.arbiter.register(second)
+
+        first.load("old", lambda: _Model("old", 10, self.device))
+        self.clock.now = 1.0
+        second.load("mid", lambda: _Model("mid", 10, self.device))
+        self.clock.now = 2.0
+        first.load("new", lambda: _Model("new", 10, self.device))
+
+        self.assertTrue(self.arbiter.request_vram(25))
+
+        self.assertEqual(list(first._cache), ["new"])
+        self.assertIsNone(second.idle_since())
+        self.assertEqual(self.device.free, 25)
+
+    def test_unsatisfiable_request_evicts_all_and_reports_failure(self):
+        cache = MemoryModelCache(clock=self.clock)
+        self.arbiter.register(cache)
+        cache.load("a", lambda: _Model("a", 10, self.device))
+
+        self.assertFalse(self.arbiter.request_vram(100))
+        self.assertIsNone(cache.idle_since())
+
+    def test_satisfied_request_keeps_models(self):
+        cache = MemoryModelCache(clock=self.clock)
+        self.arbiter.register(cache)
+        cache.load("a", lambda: _Model("a", 10, self.device))
+
+        self.assertTrue(self.arbiter.request_vram(5))
+        self.assertIsNotNone(cache.idle_since())
+
+
+class InUseModelTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.device = _FakeDevice(free=0)
+        self.arbiter = VRAMArbiter(clock=self.clock, free_bytes=self.device)
+        self.cache = MemoryModelCache(max_size=1, clock=self.clock)
+        self.arbiter.register(self.cache)
+
+    def _loader(self, name: str):
+        return lambda: _Model(name, 10, self.device)
+
+    def test_model_of_a_running_classic_task_is_not_released(self):
+        with use_cached_model(self.cache, "a", self._loader("a")) as model:
+            self.assertFalse(self.arbiter.request_vram(10))
+            self.clock.now = 1000.0
+            self.assertEqual(self.arbiter.release_idle(60.0), 0)
+            # A second model does not evict it either.
+            self.cache.load("b", self._loader("b"))
+            self.assertIs(self.cache.load("a", self._loader("a")), model)
+        del model
+
+        self.assertTrue(self.arbiter.request_vram(20))
+        self.assertIsNone(self.cache.idle_since())
+
+    def test_vram_request_does_not_wait_for_a_load(self):
+        self.cache.load("a", self._loader("a"))
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_loader():
+            started.set()
+            finish.wait(5)
+            return _Model("b", 10, self.device)
+
+        loading = threading.Thread(
+            target=lambda: self.cache.load("b", slow_loader), daemon=True
+        )
+        self.cache.max_size = 2
+        loading.start()
+        try:
+            self.assertTrue(started.wait(5))
+            results = []
+
+            def request():
+                results.append(self.arbiter.request_vram(10))
+                with self.arbiter.task_scope():
+                    pass
+
+            requesting = threading.Thread(target=request, daemon=True)
+            requesting.start()
+            requesting.join(2)
+            self.assertEqual(results, [True])
+        finally:
+            finish.set()
+            loading.join(5)
+        self.assertEqual(list(self.cache._cache), ["b"])
+
+
+class TPExecutorResidencyTests(unittest.TestCase):
+    def tearDown(self):
+        with executor._executor_lock:
+            executor._executor = None
+            executor._active_tasks = 0
+
+    def test_idle_rank_group_is_released_by_arbiter(self):
+        clock = _FakeClock()
+        arbiter = VRAMArbiter(clock=clock, free_bytes=lambda: 0)
+        arbiter.register(executor._resident)
+        mock_exec = MagicMock()
+        with executor._executor_lock:
+            executor._executor = mock_exec
+
+        clock.now = 100.0
+        self.assertEqual(arbiter.release_idle(60.0), 1)
+        mock_exec.shutdown.assert_called_once()
+        self.assertIsNone(executor._executor)
+
+    def test_busy_rank_group_is_not_released(self):
+        arbiter = VRAMArbiter(free_bytes=lambda: 0)
+        arbiter.register(executor._resident)
+        mock_exec = MagicMock()
+        mock_exec.all_ranks_alive.return_value = True
+        mock_exec.world_size = 2
+        mock_exec.launch_blocking = False
+
+        def submit(*args, **kwargs):
+            self.assertFalse(arbiter.request_vram(1))
+            return "result"
+
+        mock_exec.submit.side_effect = submit
+        with executor._executor_lock:
+            executor._executor = mock_exec
+
+        with patch.object(executor, "_clock", return_value=42.0):
+            self.assertEqual(
+                executor.submit_tp_task(2, MagicMock(), MagicMock(), MagicMock()),
+                "result",
+            )
+
+        mock_exec.shutdown.assert_not_called()
+        self.assertEqual(executor._resident.idle_since(), 42.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
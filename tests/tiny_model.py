@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+from typing import Any, Dict
+
+from gpt_task.benchmark import build_tiny_model
+from gpt_task.cache import MemoryModelCache
+from gpt_task.config import Config
+
+
+class TinyModelTestCase(unittest.TestCase):
+    """Runs tasks on a tiny random model built once per test class, on the
+    CPU and with a model cache of its own."""
+
+    # Config fields on top of local files only and CPU execution.
+    config_fields: Dict[str, Any] = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._directory = tempfile.TemporaryDirectory()
+        cls.model = build_tiny_model(os.path.join(cls._directory.name, "model"))
+        cls.config = Config(
+            local_files_only=True,
+            memory={"allow_cpu_execution": True},
+            **cls.config_fields,
+        )
+        cls.model_cache = MemoryModelCache()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_cache.clear()
+        cls._directory.cleanup()
+        super().tearDownClass()